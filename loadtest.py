@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+并发负载生成器
+
+直接导入【文本生成视频】【图片生成视频】【文本生成图片】【查询任务状态】四个工具类，
+模拟 N 个并发的 Dify 调用（每个调用一个线程），请求发往本地模拟平台：
+- 模拟平台在独立子进程中运行，实现 DashScope / Ark 的提交、查询、取消、文生图接口，
+  以及图片、视频下载；可注入延迟、错误率和限流（429）
+- 工具的接入点通过凭证 aliyun_endpoints / volcengine_endpoints 指向模拟平台（见 utils/endpoints.py）
+
+插件运行时（dify_plugin）启动时执行 gevent.monkey.patch_all()：线程、socket 和 time.sleep
+都是协程式的，等待中的调用不占用系统线程。--gevent 在导入其他模块之前执行同样的补丁，
+结果与插件运行时一致；不加时按原生线程运行，每个等待占一个系统线程，可用于对比两种模型。
+因此工具统一使用同步的 utils/http_client，不另外提供 asyncio 实现。
+
+报告：总吞吐与持续吞吐（去掉首尾窗口的每 WINDOW 秒完成数中位数）、各类调用的耗时分位数、
+线程数 / socket 数峰值、内存增长、错误分类。用于找出并发上限，
+并验证优化效果（对比优化前后的 --json 结果）。
+
+用法:
+    python loadtest.py --concurrency 50 --duration 120 --mix t2v=4,i2v=2,t2i=2,query=2
+    python loadtest.py --gevent --concurrency 200 --task-seconds 30 --json result.json
+"""
+
+import sys
+
+GEVENT_PATCHED = False
+if __name__ == "__main__" and "--gevent" in sys.argv[1:]:
+    # 必须在导入 threading / socket 等模块之前打补丁
+    try:
+        from gevent import monkey
+    except ImportError:
+        sys.exit("❌ --gevent 需要安装 gevent（pip install gevent）")
+    monkey.patch_all()
+    GEVENT_PATCHED = True
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+KINDS = ("t2v", "i2v", "t2i", "query")
+DEFAULT_MIX = "t2v=4,i2v=2,t2i=2,query=2"
+# 资源采样间隔（秒）
+SAMPLE_INTERVAL = 1.0
+# 持续吞吐的统计窗口（秒）
+WINDOW = 10
+# 错误分类时错误信息保留的长度
+ERROR_LENGTH = 80
+
+
+# ========== 模拟平台 ==========
+
+def _png(width: int, height: int) -> bytes:
+    """纯色 PNG"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + b"\x80" * width * 3 for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _mp4(seconds: int) -> bytes:
+    """只含 ftyp + moov/mvhd 的最小 MP4（足够读取时长）"""
+    mvhd = struct.pack(">I4sBxxxIIII", 108, b"mvhd", 0, 0, 0, 1000, seconds * 1000) + b"\x00" * 80
+    return struct.pack(">I4s4sI", 16, b"ftyp", b"isom", 0) + struct.pack(">I4s", 8 + len(mvhd), b"moov") + mvhd
+
+
+class MockProvider(ThreadingHTTPServer):
+    """模拟 DashScope / Ark 平台"""
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple, task_seconds: float = 10, latency: float = 0,
+        error_rate: float = 0, rate_limit_rate: float = 0,
+    ):
+        super().__init__(address, MockHandler)
+        self.task_seconds = task_seconds
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.tasks: dict[str, float] = {}  # 任务ID -> 创建时间
+        self.lock = threading.Lock()
+        self.image = _png(1280, 720)
+        self.video = _mp4(5)
+
+    def create_task(self) -> str:
+        task_id = f"mock-{uuid.uuid4().hex[:16]}"
+        with self.lock:
+            self.tasks[task_id] = time.time()
+        return task_id
+
+    def task_status(self, task_id: str) -> str:
+        """pending / running / succeeded（未知任务视为已完成，便于查询任意任务ID）"""
+        with self.lock:
+            created = self.tasks.get(task_id, 0)
+        elapsed = time.time() - created
+        if elapsed >= self.task_seconds:
+            return "succeeded"
+        return "pending" if elapsed < self.task_seconds / 4 else "running"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockProvider
+
+    ALIYUN_STATUS = {"pending": "PENDING", "running": "RUNNING", "succeeded": "SUCCEEDED"}
+    VOLCENGINE_STATUS = {"pending": "queued", "running": "running", "succeeded": "succeeded"}
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _base(self) -> str:
+        return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+    def _injected_error(self) -> bool:
+        """提交接口的错误注入：返回 True 表示已响应错误"""
+        roll = random.random()
+        if roll < self.server.error_rate:
+            self._json(500, {"code": "InternalError", "message": "mock internal error",
+                             "error": {"message": "mock internal error"}})
+            return True
+        if roll < self.server.error_rate + self.server.rate_limit_rate:
+            self._json(429, {"code": "Throttling", "message": "mock rate limited",
+                             "error": {"message": "mock rate limited"}}, {"Retry-After": "1"})
+            return True
+        return False
+
+    def _prepare(self) -> str:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            # chunked 请求体（utils/spool.py 流式编码）：读完所有块，保持连接可复用
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                self.rfile.read(size + 2)
+                if not size:
+                    break
+        else:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+        return urlsplit(self.path).path
+
+    def do_POST(self) -> None:
+        path = self._prepare()
+        if path == "/api/v1/services/aigc/video-generation/video-synthesis":
+            if not self._injected_error():
+                task_id = self.server.create_task()
+                self._json(200, {"output": {"task_id": task_id, "task_status": "PENDING"}})
+        elif path == "/api/v3/contents/generations/tasks":
+            if not self._injected_error():
+                self._json(200, {"id": self.server.create_task()})
+        elif path == "/api/v3/images/generations":
+            if not self._injected_error():
+                url = f"{self._base()}/images/{uuid.uuid4().hex[:8]}.png"
+                self._json(200, {"data": [{"url": url, "size": "1280x720"}]})
+        elif path.startswith("/api/v1/tasks/") and path.endswith("/cancel"):
+            self._json(200, {"request_id": uuid.uuid4().hex})
+        else:
+            self._json(404, {"message": f"unknown path {path}"})
+
+    def do_GET(self) -> None:
+        path = self._prepare()
+        if path.startswith("/api/v1/tasks/"):
+            task_id = path.rsplit("/", 1)[-1]
+            status = self.server.task_status(task_id)
+            output = {"task_id": task_id, "task_status": self.ALIYUN_STATUS[status]}
+            if status == "succeeded":
+                output["video_url"] = f"{self._base()}/videos/{task_id}.mp4"
+            self._json(200, {"output": output})
+        elif path.startswith("/api/v3/contents/generations/tasks/"):
+            task_id = path.rsplit("/", 1)[-1]
+            status = self.server.task_status(task_id)
+            payload = {"id": task_id, "status": self.VOLCENGINE_STATUS[status]}
+            if status == "succeeded":
+                payload["content"] = {"video_url": f"{self._base()}/videos/{task_id}.mp4", "duration": 5}
+            self._json(200, payload)
+        elif path.startswith("/images/"):
+            self._send(200, self.server.image, "image/png")
+        elif path.startswith("/videos/"):
+            self._video()
+        else:
+            self._json(404, {"message": f"unknown path {path}"})
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self) -> None:
+        path = self._prepare()
+        if path.startswith("/api/v3/contents/generations/tasks/"):
+            self._json(200, {})
+        else:
+            self._json(404, {"message": f"unknown path {path}"})
+
+    def _video(self) -> None:
+        video = self.server.video
+        range_header = self.headers.get("Range", "")
+        if range_header.startswith("bytes="):
+            start, _, end = range_header[6:].partition("-")
+            start = int(start or 0)
+            end = min(int(end) if end else len(video) - 1, len(video) - 1)
+            self._send(206, video[start:end + 1], "video/mp4", {
+                "Content-Range": f"bytes {start}-{end}/{len(video)}",
+            })
+        else:
+            self._send(200, video, "video/mp4")
+
+
+def serve_mock(port_queue, options: dict) -> None:
+    """在子进程中运行模拟平台，把端口号放入队列"""
+    server = MockProvider(("127.0.0.1", options.get("port", 0)), **{
+        key: value for key, value in options.items() if key != "port"
+    })
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+# ========== 资源采样 ==========
+
+def open_sockets() -> int | None:
+    """本进程打开的 socket 数（仅 Linux）"""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}").startswith("socket:"):
+                count += 1
+        except OSError:
+            continue
+    return count
+
+
+def _proc_status(field: str) -> int | None:
+    """读取 /proc/self/status 中的数值字段（仅 Linux）"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rss_bytes() -> int | None:
+    """本进程当前常驻内存（字节，仅 Linux）"""
+    kb = _proc_status("VmRSS")
+    return kb * 1024 if kb is not None else None
+
+
+def system_threads() -> int:
+    """
+    本进程的系统线程数
+
+    gevent 补丁后 threading 统计的是协程，这里优先读取 /proc（非 Linux 时退回 threading 的统计）
+    """
+    return _proc_status("Threads") or threading.active_count()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """线性插值分位数（q: 0~1）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = q * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """解析调用比例，如 "t2v=4,i2v=2,t2i=2,query=2" """
+    mix = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"未知的调用类型: {kind}（可选 {', '.join(KINDS)}）")
+        mix[kind] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("调用比例不能为空")
+    return mix
+
+
+class Stats:
+    """调用结果与资源采样"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results: list[tuple[str, float, float, str]] = []  # (类型, 开始, 结束, 错误)
+        self.samples: list[tuple[float, int, int | None, int | None]] = []  # (时间, 线程, socket, RSS)
+        self.task_ids: list[str] = []
+
+    def add(self, kind: str, start: float, end: float, error: str, task_id: str = "") -> None:
+        with self.lock:
+            self.results.append((kind, start, end, error))
+            if task_id:
+                self.task_ids.append(task_id)
+
+    def sample(self) -> None:
+        with self.lock:
+            self.samples.append((time.time(), system_threads(), open_sockets(), rss_bytes()))
+
+    def summary(self, started: float, finished: float) -> dict:
+        with self.lock:
+            results = list(self.results)
+            samples = list(self.samples)
+        wall = max(finished - started, 1e-9)
+        ok = [r for r in results if not r[3]]
+
+        # 持续吞吐：按完成时间分窗，去掉首尾窗口（爬坡 / 收尾）
+        windows = Counter(int((end - started) // WINDOW) for _, _, end, _ in results)
+        counts = [windows.get(i, 0) for i in range(int(wall // WINDOW) + 1)]
+        steady = counts[1:-1] if len(counts) >= 3 else counts
+        sustained = statistics.median(steady) / WINDOW if steady else 0.0
+
+        latency = {}
+        for kind in KINDS:
+            durations = [end - start for k, start, end, error in results if k == kind and not error]
+            if durations:
+                latency[kind] = {
+                    "count": len(durations),
+                    "p50": round(percentile(durations, 0.5), 2),
+                    "p95": round(percentile(durations, 0.95), 2),
+                    "max": round(max(durations), 2),
+                }
+
+        def series(index: int) -> list:
+            return [sample[index] for sample in samples if sample[index] is not None]
+
+        threads, sockets, rss = series(1), series(2), series(3)
+        return {
+            "wall_seconds": round(wall, 1),
+            "invocations": len(results),
+            "succeeded": len(ok),
+            "failed": len(results) - len(ok),
+            "throughput": round(len(results) / wall, 3),
+            "sustained_throughput": round(sustained, 3),
+            "latency": latency,
+            "threads": {"peak": max(threads, default=0), "final": threads[-1] if threads else 0},
+            "sockets": {"peak": max(sockets, default=0), "final": sockets[-1] if sockets else 0},
+            "rss_mb": {
+                "start": round(rss[0] / 2**20, 1) if rss else None,
+                "peak": round(max(rss) / 2**20, 1) if rss else None,
+                "growth": round((rss[-1] - rss[0]) / 2**20, 1) if rss else None,
+            },
+            "errors": dict(Counter(f"{kind}: {error}" for kind, _, _, error in results if error).most_common(20)),
+        }
+
+
+# ========== 负载 ==========
+
+class LoadGenerator:
+    """按比例并发调用工具类"""
+
+    def __init__(self, args: argparse.Namespace, base_url: str):
+        # 延迟导入：工具依赖 dify_plugin，模拟平台和统计部分不需要
+        from tools.image_to_video import ImageToVideoTool
+        from tools.query_task import QueryTaskTool
+        from tools.text_to_image import TextToImageTool
+        from tools.text_to_video import TextToVideoTool
+
+        for tool_class in (TextToVideoTool, ImageToVideoTool):
+            tool_class.POLL_INTERVAL = args.poll_interval
+        self.tool_classes = {
+            "t2v": TextToVideoTool,
+            "i2v": ImageToVideoTool,
+            "t2i": TextToImageTool,
+            "query": QueryTaskTool,
+        }
+        self.args = args
+        self.base_url = base_url
+        self.mix = parse_mix(args.mix)
+        self.credentials = {
+            "aliyun_api_key": "mock-aliyun-key",
+            "volcengine_api_key": "mock-volcengine-key",
+            "aliyun_endpoints": f"{base_url}/api/v1",
+            "volcengine_endpoints": f"{base_url}/api/v3",
+        }
+        self.stats = Stats()
+        self.stop = threading.Event()
+        self.remaining = args.requests or None
+        self.remaining_lock = threading.Lock()
+
+    def _params(self, kind: str, index: int) -> dict:
+        prompt = f"负载测试 {index} {uuid.uuid4().hex[:6]}：海边日落，镜头缓慢推进"
+        common = {"output_mode": "compact"}
+        if kind == "t2v":
+            return {**common, "provider": self.args.provider, "prompt": prompt, "duration": "5",
+                    "resolution": "720p", "aspect_ratio": "16:9", "wait_for_completion": True}
+        if kind == "i2v":
+            return {**common, "provider": self.args.provider, "prompt": prompt, "duration": "5",
+                    "resolution": "720p", "image_url": f"{self.base_url}/images/input.png",
+                    "wait_for_completion": True}
+        if kind == "t2i":
+            return {**common, "prompt": prompt, "size": "1280x720", "num_images": 1}
+        with self.stats.lock:
+            task_id = random.choice(self.stats.task_ids) if self.stats.task_ids else ""
+        return {**common, "provider": self.args.provider, "task_id": task_id or f"mock-{uuid.uuid4().hex[:16]}"}
+
+    def _take(self) -> bool:
+        if self.stop.is_set():
+            return False
+        if self.remaining is None:
+            return True
+        with self.remaining_lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def _invoke(self, kind: str, index: int) -> None:
+        tool = self.tool_classes[kind].from_credentials(self.credentials)
+        start = time.time()
+        error, task_id = "", ""
+        try:
+            final = None
+            for message in tool.invoke(self._params(kind, index)):
+                payload = getattr(getattr(message, "message", None), "json_object", None)
+                if isinstance(payload, dict):
+                    final = payload
+            if final is None:
+                error = "no json output"
+            elif final.get("success") is False:
+                error = str(final.get("error_message") or final.get("status") or "failed")
+            else:
+                task_id = final.get("task_id") or ""
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.stats.add(kind, start, time.time(), error[:ERROR_LENGTH], task_id)
+
+    def _worker(self, number: int) -> None:
+        if self.args.ramp:
+            time.sleep(self.args.ramp * number / self.args.concurrency)
+        kinds, weights = zip(*self.mix.items())
+        index = 0
+        while self._take():
+            self._invoke(random.choices(kinds, weights)[0], number * 1_000_000 + index)
+            index += 1
+
+    def _sampler(self) -> None:
+        while not self.stop.wait(SAMPLE_INTERVAL):
+            self.stats.sample()
+
+    def run(self) -> dict:
+        self.stats.sample()
+        started = time.time()
+        sampler = threading.Thread(target=self._sampler, name="loadtest-sampler", daemon=True)
+        sampler.start()
+        workers = [
+            threading.Thread(target=self._worker, args=(i,), name=f"loadtest-{i}", daemon=True)
+            for i in range(self.args.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        deadline = started + self.args.duration if self.args.duration else None
+        try:
+            while any(worker.is_alive() for worker in workers):
+                if deadline and time.time() >= deadline:
+                    self.stop.set()  # 不再发起新调用，等待进行中的调用结束
+                self._progress(started)
+                time.sleep(min(5, self.args.duration or 5))
+        except KeyboardInterrupt:
+            self.stop.set()
+            print("\n⏹️ 已中止，正在汇总...", file=sys.stderr)
+        self.stop.set()
+        finished = time.time()
+        self.stats.sample()
+        return self.stats.summary(started, finished)
+
+    def _progress(self, started: float) -> None:
+        with self.stats.lock:
+            done = len(self.stats.results)
+            failed = sum(1 for result in self.stats.results if result[3])
+        print(
+            f"⏳ {int(time.time() - started)}秒 完成 {done}（失败 {failed}），线程 {threading.active_count()}",
+            file=sys.stderr,
+        )
+
+
+def print_report(summary: dict, args: argparse.Namespace) -> None:
+    print("\n" + "=" * 60)
+    print(
+        f"📊 负载测试结果 - 并发 {args.concurrency}，比例 {args.mix}，"
+        f"{'gevent 协程' if args.gevent else '原生线程'}"
+    )
+    print("=" * 60)
+    print(f"⏱️ 总耗时: {summary['wall_seconds']}秒")
+    print(f"📨 调用: {summary['invocations']}（成功 {summary['succeeded']}，失败 {summary['failed']}）")
+    print(f"🚀 吞吐: {summary['throughput']} 次/秒（持续 {summary['sustained_throughput']} 次/秒）")
+    for kind, item in summary["latency"].items():
+        print(f"   {kind:<6} {item['count']:>6} 次  p50 {item['p50']}秒  p95 {item['p95']}秒  max {item['max']}秒")
+    print(f"🧵 线程: 峰值 {summary['threads']['peak']}，结束时 {summary['threads']['final']}")
+    print(f"🔌 socket: 峰值 {summary['sockets']['peak']}，结束时 {summary['sockets']['final']}")
+    rss = summary["rss_mb"]
+    if rss["start"] is not None:
+        print(f"💾 内存: 起始 {rss['start']} MB，峰值 {rss['peak']} MB，增长 {rss['growth']} MB")
+    if summary["errors"]:
+        print("❌ 错误分类:")
+        for error, count in summary["errors"].items():
+            print(f"   {count:>6}  {error}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="AI视频生成插件并发负载生成器（本地模拟平台）")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发调用数（默认 20）")
+    parser.add_argument("--duration", type=float, default=60, help="发起调用的时长（秒，0 表示按 --requests）")
+    parser.add_argument("--requests", type=int, default=0, help="总调用数（0 表示不限，按 --duration）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"调用比例（默认 {DEFAULT_MIX}）")
+    parser.add_argument("--provider", choices=("volcengine", "aliyun"), default="volcengine")
+    parser.add_argument("--gevent", action="store_true",
+                        help="先执行 gevent.monkey.patch_all()，与插件运行时一致（仅命令行运行时有效）")
+    parser.add_argument("--ramp", type=float, default=0, help="并发爬坡时间（秒）")
+    parser.add_argument("--poll-interval", type=float, default=1, help="工具轮询间隔（秒，默认 1）")
+    parser.add_argument("--task-seconds", type=float, default=10, help="模拟任务完成耗时（秒）")
+    parser.add_argument("--latency", type=float, default=0, help="模拟平台每个请求的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="提交接口返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="提交接口返回 429 的比例")
+    parser.add_argument("--provider-url", default="", help="使用已运行的模拟平台（如 http://127.0.0.1:8900）")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="只运行模拟平台（前台）")
+    parser.add_argument("--json", dest="json_path", default="", help="把结果写入 JSON 文件")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    mock_options = {
+        "task_seconds": args.task_seconds,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+    }
+    if args.serve is not None:
+        server = MockProvider(("127.0.0.1", args.serve), **mock_options)
+        print(f"🧪 模拟平台: http://127.0.0.1:{server.server_address[1]}")
+        server.serve_forever()
+        return 0
+    if not args.duration and not args.requests:
+        print("❌ --duration 和 --requests 至少指定一个", file=sys.stderr)
+        return 2
+    if args.gevent and not GEVENT_PATCHED:
+        # 补丁必须在导入 threading / socket 之前执行，被其他模块导入后调用 main() 时已来不及
+        print("❌ --gevent 仅在命令行运行 loadtest.py 时有效", file=sys.stderr)
+        return 2
+
+    # 任务登记表等写到临时目录，不影响本机插件数据
+    workdir = tempfile.mkdtemp(prefix="ai_video_loadtest_")
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(workdir, "tasks.json")
+    os.environ["AI_VIDEO_SPEECH_STORE"] = os.path.join(workdir, "speech.json")
+
+    process = None
+    base_url = args.provider_url.rstrip("/")
+    if not base_url:
+        # 模拟平台放在子进程中，线程 / socket / 内存统计只反映插件一侧
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=serve_mock, args=(queue, mock_options), daemon=True)
+        process.start()
+        base_url = f"http://127.0.0.1:{queue.get(timeout=10)}"
+    print(f"🧪 模拟平台: {base_url}", file=sys.stderr)
+
+    try:
+        summary = LoadGenerator(args, base_url).run()
+    finally:
+        if process is not None:
+            process.terminate()
+    print_report(summary, args)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), **summary}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
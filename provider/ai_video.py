@@ -4,101 +4,181 @@ AI视频生成工具 - Provider凭证验证模块
 支持的平台：
 - 阿里云百炼 (DashScope)
 - 火山方舟 (Ark API)
+- JXINCM (Sora2，第三方服务)
+
+各平台可配置多个 API Key（逗号或换行分隔，见 utils/keypool.py），所有 Key 并发验证，
+验证结果按 API Key 指纹缓存 CACHE_TTL 秒，重复保存凭证时不再逐个请求平台。
 
 参考: https://marketplace.dify.ai/plugins/allenwriter/doubao_image
 """
 
+import hashlib
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from dify_plugin import ToolProvider
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
 
+from utils import endpoints, keypool, staging
+
+# 验证结果缓存：Key 指纹 -> (过期时间, 错误信息)，错误信息为空表示验证通过
+_validation_cache: dict[str, tuple[float, str]] = {}
+_validation_cache_lock = threading.Lock()
+
 
 class AIVideoProvider(ToolProvider):
     """AI视频生成工具提供者"""
 
     ALIYUN_API_BASE = "https://dashscope.aliyuncs.com/api/v1"
     VOLCENGINE_API_BASE = "https://ark.cn-beijing.volces.com/api/v3"
+    JXINCM_API_BASE = "https://api.jxincm.cn/v1"
+    API_BASES = {
+        "aliyun": ALIYUN_API_BASE,
+        "volcengine": VOLCENGINE_API_BASE,
+        "jxincm": JXINCM_API_BASE,
+    }
+
+    # 验证结果缓存时间（秒）
+    CACHE_TTL = 300
+    # 单个平台验证超时（秒）
+    VALIDATION_TIMEOUT = 10
+    # 并发验证的线程数上限
+    MAX_VALIDATION_WORKERS = 8
 
     def _validate_credentials(self, credentials: dict[str, Any]) -> None:
         """
         验证凭证有效性
-        
-        至少需要配置一个平台的凭证
+
+        至少需要配置一个平台的凭证，已配置的平台并发验证
         """
-        aliyun_key = credentials.get("aliyun_api_key", "").strip()
-        volcengine_key = credentials.get("volcengine_api_key", "").strip()
-        
-        has_aliyun = bool(aliyun_key)
-        has_volcengine = bool(volcengine_key)
-        
-        if not has_aliyun and not has_volcengine:
+        validators = {
+            "aliyun": self._validate_aliyun_credentials,
+            "volcengine": self._validate_volcengine_credentials,
+            "jxincm": self._validate_jxincm_credentials,
+        }
+        staging_error = staging.validate(credentials)
+        if staging_error:
+            raise ToolProviderCredentialValidationError(staging_error)
+
+        # 每个平台可配置多个 Key（逗号或换行分隔），逐个验证
+        keys = {provider: keypool.keys(credentials, provider) for provider in validators}
+        keys = {provider: provider_keys for provider, provider_keys in keys.items() if provider_keys}
+
+        if not keys:
             raise ToolProviderCredentialValidationError(
                 "请至少配置一个平台的凭证：\n"
                 "- 阿里云百炼：需要 API Key\n"
-                "- 火山方舟：需要 API Key"
-            )
-        
-        # 验证阿里云凭证
-        if has_aliyun:
-            self._validate_aliyun_credentials(aliyun_key)
-        
-        # 验证火山引擎凭证
-        if has_volcengine:
-            self._validate_volcengine_credentials(volcengine_key)
-
-    def _validate_aliyun_credentials(self, api_key: str) -> None:
-        """验证阿里云百炼凭证"""
-        try:
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            # 查询一个不存在的任务来验证凭证
-            response = requests.get(
-                f"{self.ALIYUN_API_BASE}/tasks/test-validation-task",
-                headers=headers,
-                timeout=10
+                "- 火山方舟：需要 API Key\n"
+                "- JXINCM (Sora2)：需要 API Key"
             )
-            
-            # 401 表示凭证无效
-            if response.status_code == 401:
-                raise ToolProviderCredentialValidationError(
-                    "阿里云百炼 API Key 无效，请检查是否正确配置"
+
+        # 并发验证，总耗时约等于最慢的一个 Key
+        jobs = [
+            (provider, index, key)
+            for provider, provider_keys in keys.items()
+            for index, key in enumerate(provider_keys)
+        ]
+        # 配置了多个接入点时，使用第一个接入点验证（各地域的 Key 可能不通用）
+        api_bases = {
+            provider: endpoints.configured(credentials, provider, self.API_BASES[provider])[0]
+            for provider in keys
+        }
+        with ThreadPoolExecutor(max_workers=min(len(jobs), self.MAX_VALIDATION_WORKERS)) as executor:
+            futures = [
+                executor.submit(
+                    self._validate_cached, provider, key, api_bases[provider], validators[provider]
                 )
-            
-            # 其他状态码（如404任务不存在）表示凭证有效
-            
-        except requests.RequestException as e:
-            raise ToolProviderCredentialValidationError(
-                f"阿里云百炼凭证验证失败: 网络错误 - {str(e)}"
-            )
+                for provider, _, key in jobs
+            ]
+            errors = []
+            for (provider, index, _), future in zip(jobs, futures):
+                error = future.result()
+                if error and len(keys[provider]) > 1:
+                    error = f"[第 {index + 1} 个 Key] {error}"
+                errors.append(error)
+
+        errors = [error for error in errors if error]
+        if errors:
+            raise ToolProviderCredentialValidationError("\n".join(errors))
+
+    def _validate_cached(self, provider: str, api_key: str, api_base: str, validator) -> str:
+        """
+        带缓存的单平台验证
+
+        Returns:
+            错误信息，验证通过返回空字符串
+        """
+        fingerprint = hashlib.sha256(f"{provider}:{api_base}:{api_key}".encode("utf-8")).hexdigest()
+        now = time.time()
+        with _validation_cache_lock:
+            cached = _validation_cache.get(fingerprint)
+        if cached and cached[0] > now:
+            return cached[1]
 
-    def _validate_volcengine_credentials(self, api_key: str) -> None:
-        """验证火山方舟凭证 (Ark API)"""
         try:
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            # 查询一个不存在的任务来验证凭证
-            response = requests.get(
-                f"{self.VOLCENGINE_API_BASE}/contents/generations/tasks/test-validation",
-                headers=headers,
-                timeout=10
-            )
-            
-            # 401/403 表示凭证无效
-            if response.status_code in [401, 403]:
-                raise ToolProviderCredentialValidationError(
-                    "火山方舟 API Key 无效，请检查是否正确配置"
-                )
-            
-            # 其他状态码表示凭证有效（如404任务不存在）
-            
+            error = validator(api_key, api_base)
         except requests.RequestException as e:
-            raise ToolProviderCredentialValidationError(
-                f"火山方舟凭证验证失败: 网络错误 - {str(e)}"
-            )
+            # 网络错误不缓存，下次保存时重新验证
+            return f"{self._provider_name(provider)}凭证验证失败: 网络错误 - {str(e)}"
+
+        with _validation_cache_lock:
+            _validation_cache[fingerprint] = (now + self.CACHE_TTL, error)
+        return error
+
+    @staticmethod
+    def _provider_name(provider: str) -> str:
+        return {
+            "aliyun": "阿里云百炼",
+            "volcengine": "火山方舟",
+            "jxincm": "JXINCM",
+        }.get(provider, provider)
+
+    def _validate_aliyun_credentials(self, api_key: str, api_base: str) -> str:
+        """验证阿里云百炼凭证"""
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        # 查询一个不存在的任务来验证凭证（只读、无计费）
+        response = requests.get(
+            f"{api_base}/tasks/test-validation-task",
+            headers=headers,
+            timeout=self.VALIDATION_TIMEOUT
+        )
+
+        # 401 表示凭证无效，其他状态码（如404任务不存在）表示凭证有效
+        if response.status_code == 401:
+            return "阿里云百炼 API Key 无效，请检查是否正确配置"
+        return ""
+
+    def _validate_volcengine_credentials(self, api_key: str, api_base: str) -> str:
+        """验证火山方舟凭证 (Ark API)"""
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        # 查询一个不存在的任务来验证凭证（只读、无计费）
+        response = requests.get(
+            f"{api_base}/contents/generations/tasks/test-validation",
+            headers=headers,
+            timeout=self.VALIDATION_TIMEOUT
+        )
+
+        # 401/403 表示凭证无效，其他状态码表示凭证有效（如404任务不存在）
+        if response.status_code in [401, 403]:
+            return "火山方舟 API Key 无效，请检查是否正确配置"
+        return ""
+
+    def _validate_jxincm_credentials(self, api_key: str, api_base: str) -> str:
+        """验证 JXINCM (Sora2) 凭证"""
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        # 查询一个不存在的任务来验证凭证（只读、无计费）
+        response = requests.get(
+            f"{api_base}/video/query?id=test-validation",
+            headers=headers,
+            timeout=self.VALIDATION_TIMEOUT
+        )
+
+        # 401/403 表示凭证无效，其他状态码表示凭证有效
+        if response.status_code in [401, 403]:
+            return "JXINCM API Key 无效，请检查是否正确配置"
+        return ""
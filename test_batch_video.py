@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+批量视频生成测试脚本
+
+提交与查询以桩函数替代，测试：
+1. 各平台同时进行中的任务不超过并发上限
+2. 缓慢的提交不阻塞其他镜头的提交与输出
+3. 清单按镜头顺序排列
+4. 等待超时时的 not_submitted / 超时条目
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+batch_video = pytest.importorskip("tools.batch_video")
+
+from utils import breaker, http_client, task_api
+
+CREDENTIALS = {
+    "aliyun_api_key": "sk-test",
+    "volcengine_api_key": "ark-test",
+}
+
+
+def _make_tool(polls_to_finish: int = 2, submit_delays: dict | None = None):
+    """
+    构造工具实例
+
+    Args:
+        polls_to_finish: 任务查询几次后完成
+        submit_delays: {镜头序号: 提交耗时（秒）}
+    """
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    breaker._breakers.clear()
+
+    tool = batch_video.BatchVideoTool.__new__(batch_video.BatchVideoTool)
+    tool.runtime = type("Runtime", (), {"credentials": dict(CREDENTIALS)})()
+    tool.POLL_INTERVAL = 0
+    tool.TICK_INTERVAL = 0.01
+    tool.in_flight = {}
+    tool.max_in_flight = {}
+    lock = threading.Lock()
+    polls = {}
+
+    def submit_scene(entry):
+        time.sleep((submit_delays or {}).get(entry["index"], 0))
+        provider = entry["provider"]
+        with lock:
+            tool.in_flight[provider] = tool.in_flight.get(provider, 0) + 1
+            tool.max_in_flight[provider] = max(
+                tool.max_in_flight.get(provider, 0), tool.in_flight[provider]
+            )
+        return f"task-{entry['index']}", ""
+
+    def fetch_status(provider, api_base, api_key, task_id, timeout=30):
+        with lock:
+            polls[task_id] = polls.get(task_id, 0) + 1
+            if polls[task_id] < polls_to_finish:
+                return "running", {}
+            tool.in_flight[provider] -= 1
+        return "succeeded", {"content": {"video_url": f"https://example.com/{task_id}.mp4"}}
+
+    tool._submit_scene = submit_scene
+    tool.stubs = [
+        (task_api, "fetch_status", fetch_status),
+        (http_client, "sleep", time.sleep),
+    ]
+    return tool
+
+
+def _run(tool, parameters: dict):
+    """执行批量调用（期间替换平台接口），返回 (文本消息列表, 最终清单)"""
+    originals = [(module, name, getattr(module, name)) for module, name, _ in tool.stubs]
+    for module, name, stub in tool.stubs:
+        setattr(module, name, stub)
+    texts, payloads = [], []
+    try:
+        for message in tool._invoke(parameters):
+            payload = task_api.get_json_object(message)
+            if payload is not None:
+                payloads.append(payload)
+            else:
+                texts.append(task_api.get_text(message))
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+    return texts, payloads[-1]
+
+
+def test_provider_limits():
+    """测试平台并发上限"""
+    print("=" * 60)
+    print("测试1: 平台并发上限")
+    print("=" * 60)
+
+    tool = _make_tool(polls_to_finish=3)
+    scenes = [{"prompt": f"镜头{i}"} for i in range(7)]
+    _, manifest = _run(tool, {"scenes": scenes, "provider": "aliyun", "model": "wan2.5-t2v-preview"})
+
+    assert manifest["succeeded"] == 7
+    assert tool.max_in_flight["aliyun"] == tool.PROVIDER_CONCURRENCY["aliyun"]
+    print("✅ 同时进行中的任务不超过并发上限")
+
+
+def test_slow_submission_does_not_block():
+    """测试缓慢的提交不阻塞其他镜头"""
+    print("=" * 60)
+    print("测试2: 缓慢的提交不阻塞其他镜头")
+    print("=" * 60)
+
+    tool = _make_tool(submit_delays={0: 0.5})
+    scenes = [{"prompt": f"镜头{i}"} for i in range(3)]
+    texts, manifest = _run(
+        tool, {"scenes": scenes, "provider": "volcengine", "model": "doubao-seedance-1-5-pro-251215"}
+    )
+
+    assert manifest["succeeded"] == 3
+    finished_2 = next(i for i, text in enumerate(texts) if text.startswith("✅ 镜头 2 完成"))
+    submitted_1 = next(i for i, text in enumerate(texts) if text.startswith("📤 镜头 1 已提交"))
+    assert finished_2 < submitted_1
+    print("✅ 其他镜头先完成并输出")
+
+
+def test_manifest_order():
+    """测试清单按镜头顺序排列"""
+    print("=" * 60)
+    print("测试3: 清单顺序")
+    print("=" * 60)
+
+    tool = _make_tool(submit_delays={0: 0.3, 1: 0.1})
+    scenes = [{"prompt": f"镜头{i}"} for i in range(4)]
+    _, manifest = _run(
+        tool, {"scenes": scenes, "provider": "volcengine", "model": "doubao-seedance-1-5-pro-251215"}
+    )
+
+    assert [item["index"] for item in manifest["scenes"]] == [0, 1, 2, 3]
+    assert [item["task_id"] for item in manifest["scenes"]] == [f"task-{i}" for i in range(4)]
+    assert all(item["video_url"].endswith(f"task-{item['index']}.mp4") for item in manifest["scenes"])
+    print("✅ 清单按镜头顺序排列")
+
+
+def test_timeout_entries():
+    """测试等待超时"""
+    print("=" * 60)
+    print("测试4: 等待超时")
+    print("=" * 60)
+
+    tool = _make_tool(polls_to_finish=10 ** 6)
+    tool.BATCH_MAX_WAIT = 0.2
+    scenes = [{"prompt": f"镜头{i}"} for i in range(4)]
+    _, manifest = _run(tool, {
+        "scenes": scenes, "provider": "aliyun", "model": "wan2.5-t2v-preview", "max_concurrency": 1,
+    })
+
+    statuses = [item["status"] for item in manifest["scenes"]]
+    assert statuses == ["running", "not_submitted", "not_submitted", "not_submitted"]
+    assert "等待超时" in manifest["scenes"][0]["error_message"]
+    assert manifest["success"] is False
+    print("✅ 超时条目标记正确")
+
+
+def main():
+    test_provider_limits()
+    test_slow_submission_does_not_block()
+    test_manifest_order()
+    test_timeout_entries()
+    print("\n🎉 所有测试通过!")
+
+
+if __name__ == "__main__":
+    main()
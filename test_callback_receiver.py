@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+任务回调接收器测试脚本
+
+测试：
+1. 回调投递唤醒等待中的任务
+2. token 校验（拒绝伪造回调）
+3. 回调早于等待方注册到达时的缓存
+4. 火山方舟 / 阿里云百炼回调格式解析
+5. token 按凭证派生（跨进程 / 重启一致），端口绑定失败结果缓存
+"""
+
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+from utils import callbacks
+from utils.callbacks import CallbackReceiver, parse_event
+
+
+def _post(url: str, payload: dict) -> int:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_callback_wakes_waiter():
+    """测试回调唤醒等待方"""
+    print("=" * 60)
+    print("测试1: 回调唤醒等待方")
+    print("=" * 60)
+
+    receiver = CallbackReceiver(host="127.0.0.1", port=0)
+    receiver.start()
+    try:
+        waiter = receiver.register("cgt-001")
+        url = receiver.callback_url(f"http://127.0.0.1:{receiver.port}", "volcengine")
+        payload = {"id": "cgt-001", "status": "succeeded"}
+        threading.Timer(0.1, _post, args=(url, payload)).start()
+
+        assert waiter.wait(5), "回调未唤醒等待方"
+        assert waiter.payload == payload
+        # 唤醒后重置，等待下一次状态变化
+        assert not waiter.wait(0.1)
+        print("✅ 回调到达后等待方被唤醒")
+    finally:
+        receiver.stop()
+
+
+def test_bad_token_rejected():
+    """测试 token 校验"""
+    print("=" * 60)
+    print("测试2: token 校验")
+    print("=" * 60)
+
+    receiver = CallbackReceiver(host="127.0.0.1", port=0)
+    receiver.start()
+    try:
+        waiter = receiver.register("cgt-002")
+        base = f"http://127.0.0.1:{receiver.port}"
+        status = _post(f"{base}/callbacks/volcengine?token=forged", {"id": "cgt-002"})
+        assert status == 403
+        assert not waiter.wait(0)
+        print("✅ 伪造回调被拒绝")
+    finally:
+        receiver.stop()
+
+
+def test_early_event_buffered():
+    """测试回调早于注册到达"""
+    print("=" * 60)
+    print("测试3: 提前到达的回调")
+    print("=" * 60)
+
+    receiver = CallbackReceiver(host="127.0.0.1", port=0)
+    # 不启动 HTTP 服务，直接通过 handle() 投递
+    assert receiver.handle({"output": {"task_id": "ali-003", "task_status": "SUCCEEDED"}})
+    waiter = receiver.register("ali-003")
+    assert waiter.wait(0)
+    assert waiter.payload["output"]["task_status"] == "SUCCEEDED"
+    waiter.close()
+    print("✅ 提前到达的回调在注册时立即生效")
+
+
+def test_parse_event():
+    """测试回调格式解析"""
+    print("=" * 60)
+    print("测试4: 回调格式解析")
+    print("=" * 60)
+
+    assert parse_event({"id": "cgt-1", "status": "running"}) == "cgt-1"
+    assert parse_event({"output": {"task_id": "ali-1"}}) == "ali-1"
+    assert parse_event({"task_id": "jx-1"}) == "jx-1"
+    assert parse_event({"status": "running"}) == ""
+    assert parse_event([]) == ""
+    print("✅ 各平台回调格式解析正确")
+
+
+def test_shared_token():
+    """测试确定性 token 与绑定失败缓存"""
+    print("=" * 60)
+    print("测试5: 确定性 token")
+    print("=" * 60)
+
+    credentials = {"callback_base_url": "https://plugin.example.com", "volcengine_api_key": "ark-test"}
+    token = callbacks.callback_token(credentials)
+    assert token == callbacks.callback_token({**credentials, "callback_base_url": "https://plugin.example.com/"})
+    assert token != callbacks.callback_token({**credentials, "volcengine_api_key": "ark-other"})
+    assert token != callbacks.callback_token({**credentials, "callback_secret": "s"})
+
+    # 另一个进程（或重启前）生成的回调地址，本进程的接收器同样接受
+    url = CallbackReceiver(token=token).callback_url(credentials["callback_base_url"], "volcengine")
+    receiver = CallbackReceiver(host="127.0.0.1", port=0, token=token)
+    receiver.start()
+    try:
+        waiter = receiver.register("cgt-005")
+        query = url.split("?", 1)[1]
+        assert _post(f"http://127.0.0.1:{receiver.port}/callbacks/volcengine?{query}", {"id": "cgt-005"}) == 200
+        assert waiter.wait(0)
+        print("✅ 同一凭证的 token 跨进程一致")
+
+        # 端口已被占用：绑定失败后 BIND_RETRY_INTERVAL 内不再尝试
+        callbacks._receiver, callbacks._bind_failed_at = None, 0.0
+        created = []
+        original = callbacks.CallbackReceiver
+
+        class CountingReceiver(original):
+            def __init__(self, *args, **kwargs):
+                created.append(1)
+                super().__init__(*args, **kwargs)
+
+        callbacks.CallbackReceiver = CountingReceiver
+        try:
+            with socket.socket() as sock:
+                sock.bind(("0.0.0.0", 0))
+                sock.listen()
+                busy = {**credentials, "callback_port": str(sock.getsockname()[1])}
+                assert callbacks.get_receiver(busy) is None
+                assert callbacks.callback_url(busy, "volcengine") == ""
+            assert len(created) == 1, created
+        finally:
+            callbacks.CallbackReceiver = original
+            callbacks._bind_failed_at = 0.0
+        print("✅ 端口绑定失败结果被缓存")
+    finally:
+        receiver.stop()
+
+
+def main():
+    test_callback_wakes_waiter()
+    test_bad_token_rejected()
+    test_early_event_buffered()
+    test_parse_event()
+    test_shared_token()
+    print("\n🎉 所有测试通过！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+HTTP 录制 / 回放测试脚本
+
+测试：
+1. 录制：请求头、URL、请求体、响应体中的密钥 / 签名脱敏
+2. 回放：同一请求依次返回录制的响应，用完后重复最后一个；二进制响应体
+3. 回放时序：replay 不等待，replay_timed 按录制耗时等待
+4. 未录制的请求报错
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from utils import cassette
+
+API_KEY = "sk-0123456789abcdef"
+TASK_URL = "https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks/cgt-1"
+VIDEO_URL = "https://ark-content.tos-cn-beijing.volces.com/v.mp4?X-Tos-Algorithm=x&X-Tos-Signature=abc123"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body, headers: dict | None = None):
+        self.status_code = status_code
+        self.headers = headers or {"Content-Type": "application/json"}
+        self.content = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+
+
+def record(path: str, delay: float = 0.0) -> None:
+    """录制一次提交 + 两次轮询 + 视频下载"""
+    responses = iter([
+        FakeResponse(200, {"id": "cgt-1", "echo": API_KEY}),
+        FakeResponse(200, {"status": "running"}),
+        FakeResponse(200, {"status": "succeeded", "content": {"video_url": VIDEO_URL}}),
+        FakeResponse(200, b"\x00\x00\x00\x18ftypmp42\xff", {"Content-Type": "video/mp4"}),
+    ])
+
+    def send():
+        time.sleep(delay)
+        return next(responses)
+
+    headers = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+    with cassette.use(path, "record") as recorder:
+        recorder.request(
+            "POST", TASK_URL.rsplit("/", 1)[0], send, headers=headers,
+            json={"model": "seedance", "api_key": API_KEY},
+        )
+        recorder.request("GET", TASK_URL, send, headers=headers)
+        recorder.request("GET", TASK_URL, send, headers=headers)
+        recorder.request("GET", VIDEO_URL, send)
+
+
+def test_record():
+    """测试录制与脱敏"""
+    print("=" * 60)
+    print("测试1: 录制与脱敏")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "run.json")
+    record(path)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    assert API_KEY not in text
+    assert "abc123" not in text
+    interactions = json.loads(text)["interactions"]
+    assert len(interactions) == 4
+    assert interactions[0]["request"]["headers"]["Authorization"] == cassette.REDACTED
+    assert json.loads(interactions[0]["request"]["body"])["api_key"] == cassette.REDACTED
+    assert "X-Tos-Signature=REDACTED" in interactions[2]["body"]
+    assert "body_base64" in interactions[3]
+    print("✅ 认证头、请求体、签名 URL、回显的 Key 均已脱敏")
+
+
+def test_replay():
+    """测试回放"""
+    print("\n" + "=" * 60)
+    print("测试2: 回放")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "run.json")
+    record(path)
+
+    def send():
+        raise AssertionError("回放时不应发送请求")
+
+    with cassette.use(path) as player:
+        assert cassette.active() is player
+        submitted = player.request("POST", TASK_URL.rsplit("/", 1)[0], send)
+        assert submitted.json()["id"] == "cgt-1"
+        statuses = [player.request("GET", TASK_URL, send).json()["status"] for _ in range(3)]
+        assert statuses == ["running", "succeeded", "succeeded"], statuses
+        video_url = player.request("GET", TASK_URL, send).json()["content"]["video_url"]
+        # 响应体中的签名 URL 已脱敏，按脱敏后的 URL 仍能匹配到下载记录
+        video = player.request("GET", video_url, send)
+        assert video.headers["content-type"] == "video/mp4"
+        assert b"".join(video.iter_content(4)) == video.content and video.content[4:8] == b"ftyp"
+    assert cassette.active() is None
+    print("✅ 按录制顺序回放，轮询用完后重复最后一个响应")
+
+
+def test_timing():
+    """测试回放时序"""
+    print("\n" + "=" * 60)
+    print("测试3: 回放时序")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "run.json")
+    record(path, delay=0.05)
+
+    def replay(mode: str) -> float:
+        start = time.monotonic()
+        with cassette.use(path, mode) as player:
+            for _ in range(2):
+                player.request("GET", TASK_URL, None)
+                player.sleep(0.05)
+        return time.monotonic() - start
+
+    fast = replay("replay")
+    timed = replay("replay_timed")
+    assert fast < 0.05, fast
+    assert timed >= 0.2, timed
+    print(f"✅ 快速回放 {fast:.3f}秒，按原始时序回放 {timed:.3f}秒")
+
+
+def test_missing():
+    """测试未录制的请求"""
+    print("\n" + "=" * 60)
+    print("测试4: 未录制的请求")
+    print("=" * 60)
+
+    path = os.path.join(tempfile.mkdtemp(), "run.json")
+    record(path)
+    with cassette.use(path) as player:
+        try:
+            player.request("GET", TASK_URL.replace("cgt-1", "cgt-2"), None)
+        except cassette.CassetteError as e:
+            print(f"✅ 报错: {e}")
+        else:
+            raise AssertionError("未录制的请求应报错")
+
+
+def main():
+    test_record()
+    test_replay()
+    test_timing()
+    test_missing()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
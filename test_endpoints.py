@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+多地域接入点测试脚本
+
+测试：
+1. 接入点配置解析
+2. 按探测延迟选择健康接入点，连续失败的接入点不再选择
+3. 任务固定使用创建时的接入点
+4. TCP 连接探测
+"""
+
+import os
+import socket
+import tempfile
+
+from utils import endpoints, task_store
+
+DEFAULT = "https://ark.cn-beijing.volces.com/api/v3"
+BEIJING = "https://ark.cn-beijing.volces.com/api/v3"
+SHANGHAI = "https://ark.cn-shanghai.volces.com/api/v3"
+
+
+def reset():
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    endpoints._stats.clear()
+    endpoints._probing.clear()
+
+
+def test_configured():
+    """测试接入点配置解析"""
+    print("=" * 60)
+    print("测试1: 配置解析")
+    print("=" * 60)
+
+    assert endpoints.configured({}, "volcengine", DEFAULT) == [DEFAULT]
+    credentials = {"volcengine_endpoints": f"{SHANGHAI}/, {BEIJING}\n{SHANGHAI} ftp://x"}
+    assert endpoints.configured(credentials, "volcengine", DEFAULT) == [SHANGHAI, BEIJING]
+    # 只有一个接入点时不探测
+    assert endpoints.select({}, "volcengine", DEFAULT) == DEFAULT
+    assert not endpoints._probing
+    print("✅ 解析正确")
+
+
+def test_select():
+    """测试按延迟选择"""
+    print("\n" + "=" * 60)
+    print("测试2: 按延迟选择")
+    print("=" * 60)
+
+    reset()
+    credentials = {"volcengine_endpoints": f"{BEIJING},{SHANGHAI}"}
+    # 标记为探测中，避免测试中发起真实探测
+    endpoints._probing.update([BEIJING, SHANGHAI])
+    assert endpoints.select(credentials, "volcengine", DEFAULT) == BEIJING
+    print("✅ 无探测结果时使用第一个")
+
+    endpoints.record(BEIJING, 0.040)
+    endpoints.record(SHANGHAI, 0.005)
+    assert endpoints.select(credentials, "volcengine", DEFAULT) == SHANGHAI
+    print("✅ 选择延迟最低的接入点")
+
+    endpoints.record(SHANGHAI, 0.200)
+    assert abs(endpoints._stats[SHANGHAI]["latency"] - (0.3 * 0.2 + 0.7 * 0.005)) < 1e-9
+    assert endpoints.select(credentials, "volcengine", DEFAULT) == BEIJING
+    print("✅ 延迟按 EWMA 平滑")
+
+    endpoints.record(SHANGHAI, 0.001)
+    for _ in range(endpoints.FAILURE_THRESHOLD):
+        endpoints.record(SHANGHAI, None)
+    assert endpoints.select(credentials, "volcengine", DEFAULT) == BEIJING
+    print("✅ 连续探测失败的接入点不再选择")
+
+
+def test_for_task():
+    """测试任务固定接入点"""
+    print("\n" + "=" * 60)
+    print("测试3: 任务固定接入点")
+    print("=" * 60)
+
+    reset()
+    credentials = {"volcengine_endpoints": f"{BEIJING},{SHANGHAI}"}
+    task_store.record("task-sh", provider="volcengine", api_base=SHANGHAI)
+    assert endpoints.for_task(credentials, "volcengine", "task-sh", DEFAULT) == SHANGHAI
+    assert endpoints.for_task({}, "volcengine", "task-sh", DEFAULT) == SHANGHAI
+    assert endpoints.for_task(credentials, "volcengine", "unknown", DEFAULT) == BEIJING
+    print("✅ 续等 / 查询使用创建任务的接入点")
+
+
+def test_measure():
+    """测试 TCP 连接探测"""
+    print("\n" + "=" * 60)
+    print("测试4: 连接探测")
+    print("=" * 60)
+
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    port = server.getsockname()[1]
+    try:
+        latency = endpoints.measure(f"http://127.0.0.1:{port}/api/v3")
+        assert latency is not None and latency < endpoints.PROBE_TIMEOUT
+    finally:
+        server.close()
+    assert endpoints.measure(f"http://127.0.0.1:{port}/api/v3") is None
+    print("✅ 可连接返回耗时，不可连接返回 None")
+
+
+def main():
+    test_configured()
+    test_select()
+    test_for_task()
+    test_measure()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
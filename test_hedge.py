@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+文生视频对冲模式测试脚本
+
+平台查询 / 取消接口以桩函数替代，测试：
+1. 主平台失败后立即追加提交到备用平台，失败计入熔断器
+2. 先完成的任务胜出，落败任务被取消，对冲阶段的等待计入累计等待
+3. 无法取消的落败任务标记为已放弃
+4. 等待超时的输出（任务列表与进度）
+"""
+
+import os
+import tempfile
+import time
+
+import pytest
+
+text_to_video = pytest.importorskip("tools.text_to_video")
+
+from utils import breaker, http_client, task_api, task_store
+
+PARAMS = {
+    "prompt": "海边日落",
+    "provider": "aliyun",
+    "hedge_provider": "volcengine",
+    "duration": "5",
+}
+
+
+def _make_tool(statuses: dict, cancellable: bool = True):
+    """
+    构造工具实例
+
+    Args:
+        statuses: {平台: 依次返回的状态列表}，列表用完后重复最后一个状态
+        cancellable: 取消接口是否成功
+    """
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    breaker._breakers.clear()
+
+    tool = text_to_video.TextToVideoTool.__new__(text_to_video.TextToVideoTool)
+    tool.runtime = type("Runtime", (), {"credentials": {}})()
+    tool.cancelled = []
+    tool.submitted = []
+    tool.sleeps = 0
+
+    def submit_for_hedge(provider, params):
+        task_id = f"{provider}-task"
+        tool.submitted.append(provider)
+        tool.submitted_after_sleeps = tool.sleeps
+        task_store.record(task_id, provider=provider, model="m", submitted_at=time.time())
+        task = {
+            "provider": provider,
+            "api_base": "https://example.com",
+            "api_key": "key",
+            "task_id": task_id,
+            "model": "m",
+            "status": "pending",
+            "tracker": text_to_video.progress.ProgressTracker(provider, task_id, "m"),
+            "polled_from": time.time() - 1,  # 便于检查对冲阶段的等待是否计入
+        }
+        return task
+        yield
+
+    def wait_task(provider, api_key, task_id, model):
+        yield tool.create_json_message({
+            "success": True,
+            "task_id": task_id,
+            "waited_seconds": task_store.get(task_id)["waited_seconds"],
+        })
+
+    def fetch_status(provider, api_base, api_key, task_id, timeout=30):
+        queue = statuses[provider]
+        status = queue.pop(0) if len(queue) > 1 else queue[0]
+        return status, {"output": {"task_status": status.upper()}}
+
+    def cancel_task(provider, api_base, api_key, task_id, timeout=30):
+        tool.cancelled.append(task_id)
+        return (True, "") if cancellable else (False, "任务已开始生成")
+
+    tool._submit_for_hedge = submit_for_hedge
+    tool._wait_task = wait_task
+    def sleep(seconds):
+        # 轮询间隔缩短为 10 毫秒（对冲延迟取 0.001 秒时第二轮必定追加提交）
+        tool.sleeps += 1
+        time.sleep(0.01)
+
+    tool.stubs = [
+        (task_api, "fetch_status", fetch_status),
+        (task_api, "cancel_task", cancel_task),
+        (http_client, "sleep", sleep),
+    ]
+    return tool
+
+
+def _run(tool, params: dict = PARAMS):
+    """执行对冲调用（期间替换平台接口），返回 (文本消息列表, JSON 消息列表)"""
+    originals = [(module, name, getattr(module, name)) for module, name, _ in tool.stubs]
+    for module, name, stub in tool.stubs:
+        setattr(module, name, stub)
+    texts, payloads = [], []
+    try:
+        for message in tool._invoke_hedged(dict(params)):
+            payload = task_api.get_json_object(message)
+            if payload is not None:
+                payloads.append(payload)
+            else:
+                texts.append(task_api.get_text(message))
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+    return texts, payloads
+
+
+def test_primary_failure_hedges_at_once():
+    """测试主平台失败后立即追加提交"""
+    print("=" * 60)
+    print("测试1: 主平台失败后立即追加提交")
+    print("=" * 60)
+
+    tool = _make_tool({"aliyun": ["failed"], "volcengine": ["running", "succeeded"]})
+    texts, payloads = _run(tool)
+
+    assert tool.submitted == ["aliyun", "volcengine"]
+    assert tool.submitted_after_sleeps == 0  # 未等待轮询间隔
+    assert task_store.get("aliyun-task")["status"] == "failed"
+    assert breaker.get("aliyun").failures == 1
+    assert any(text.startswith("[volcengine] ⏳ 正在生成") for text in texts)
+    assert payloads[-1]["task_id"] == "volcengine-task"
+    print("✅ 主平台失败后备用平台接手")
+
+
+def test_first_success_wins():
+    """测试先完成的任务胜出"""
+    print("=" * 60)
+    print("测试2: 先完成的任务胜出")
+    print("=" * 60)
+
+    tool = _make_tool({"aliyun": ["pending", "pending", "succeeded"], "volcengine": ["running"]})
+    texts, payloads = _run(tool, {**PARAMS, "hedge_delay": "0.001"})
+
+    assert tool.submitted == ["aliyun", "volcengine"]
+    assert tool.cancelled == ["volcengine-task"]
+    assert any("🏁 aliyun 先完成" in text for text in texts)
+    # 对冲阶段的等待计入胜出任务的累计等待
+    assert payloads[-1]["task_id"] == "aliyun-task"
+    assert payloads[-1]["waited_seconds"] > 0
+    print("✅ 胜出任务输出结果，落败任务已取消")
+
+
+def test_uncancellable_loser_abandoned():
+    """测试无法取消的落败任务"""
+    print("=" * 60)
+    print("测试3: 无法取消的落败任务标记为已放弃")
+    print("=" * 60)
+
+    tool = _make_tool(
+        {"aliyun": ["pending", "pending", "succeeded"], "volcengine": ["running"]}, cancellable=False
+    )
+    texts, _ = _run(tool, {**PARAMS, "hedge_delay": "0.001"})
+
+    assert task_store.get("volcengine-task")["status"] == task_store.ABANDONED
+    assert any("未能取消 volcengine" in text for text in texts)
+    print("✅ 落败任务已标记为放弃")
+
+
+def test_timeout_output():
+    """测试等待超时的输出"""
+    print("=" * 60)
+    print("测试4: 等待超时")
+    print("=" * 60)
+
+    tool = _make_tool({"aliyun": ["pending"], "volcengine": ["running"]})
+    tool.MAX_POLL_ATTEMPTS = 3
+    texts, payloads = _run(tool, {**PARAMS, "hedge_delay": "0.001"})
+
+    result = payloads[-1]
+    assert result["status"] == "running"
+    assert result["task_id"] == "aliyun-task"
+    assert [t["task_id"] for t in result["hedge_tasks"]] == ["aliyun-task", "volcengine-task"]
+    assert result["progress"] is not None
+    assert any("⏰" in text for text in texts)
+    assert task_store.get("volcengine-task")["waited_seconds"] > 0
+    assert not tool.cancelled
+    print("✅ 超时结果包含全部任务与进度")
+
+
+def main():
+    test_primary_failure_hedges_at_once()
+    test_first_success_wins()
+    test_uncancellable_loser_abandoned()
+    test_timeout_output()
+    print("\n🎉 所有测试通过!")
+
+
+if __name__ == "__main__":
+    main()
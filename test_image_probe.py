@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+图片头部探测测试脚本
+
+测试：
+1. 各格式尺寸解析（PNG、GIF、BMP、TIFF、WEBP、AVIF）
+2. 大段 EXIF 的 JPEG：分段读取跳过 EXIF，读取方向
+3. 服务器不支持 Range 时流式读取
+4. 按 URL / 内容哈希缓存
+"""
+
+import re
+import struct
+
+from utils import image_probe
+
+
+def _box(box_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(body)) + box_type + body
+
+
+def _jpeg(width: int, height: int, orientation: int, exif_padding: int) -> bytes:
+    """SOI + APP1(EXIF，带大段填充模拟缩略图) + SOF0 + 数据"""
+    tiff = b"MM\x00*" + struct.pack(">I", 8) + struct.pack(">H", 1)
+    tiff += struct.pack(">HHIHH", 274, 3, 1, orientation, 0) + struct.pack(">I", 0)
+    app1 = b"Exif\x00\x00" + tiff + b"\x00" * exif_padding
+    sof = b"\x08" + struct.pack(">HH", height, width) + b"\x03" + b"\x00" * 9
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe1" + struct.pack(">H", 2 + len(app1)) + app1
+        + b"\xff\xc0" + struct.pack(">H", 2 + len(sof)) + sof
+        + b"\xff\xda" + b"\x00" * 50000
+    )
+
+
+class FakeServer:
+    """模拟支持 / 不支持 Range 的文件服务器，统计传输字节数"""
+
+    def __init__(self, files: dict, ranges: bool = True):
+        self.files = files
+        self.ranges = ranges
+        self.requests = 0
+        self.transferred = 0
+
+    def get(self, url, headers, timeout):
+        self.requests += 1
+        data = self.files[url]
+        server = self
+
+        class Response:
+            def __init__(self):
+                match = re.match(r"bytes=(\d+)-(\d+)", headers.get("Range", ""))
+                if server.ranges and match:
+                    start, end = int(match.group(1)), int(match.group(2))
+                    self.status_code = 206
+                    self.content = data[start:end + 1]
+                    self.headers = {"Content-Range": f"bytes {start}-{end}/{len(data)}"}
+                    server.transferred += len(self.content)
+                else:
+                    self.status_code = 200
+                    self.headers = {}
+
+            def iter_content(self, size):
+                for i in range(0, len(data), size):
+                    server.transferred += len(data[i:i + size])
+                    yield data[i:i + size]
+
+            def close(self):
+                pass
+
+        return Response()
+
+
+def _with_server(server: FakeServer):
+    image_probe._url_cache.clear()
+    image_probe._content_cache.clear()
+    image_probe._get = server.get
+
+
+def test_formats():
+    """测试各格式解析"""
+    print("=" * 60)
+    print("测试1: 各格式尺寸解析")
+    print("=" * 60)
+
+    png = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 1920, 1080)
+    gif = b"GIF89a" + struct.pack("<HH", 320, 240)
+    bmp = b"BM" + b"\x00" * 12 + struct.pack("<Iii", 40, 800, -600)
+    tiff = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 3)
+    tiff += struct.pack("<HHII", 256, 4, 1, 3000)
+    tiff += struct.pack("<HHIHH", 257, 3, 1, 2000, 0)
+    tiff += struct.pack("<HHIHH", 274, 3, 1, 8, 0)
+    webp = b"RIFF" + b"\x00" * 4 + b"WEBPVP8X" + b"\x00" * 8 + bytes([0xFF, 0x03, 0x00, 0x37, 0x02, 0x00])
+    ipco = _box(b"ipco", _box(b"ispe", b"\x00" * 4 + struct.pack(">II", 160, 120))
+                + _box(b"ispe", b"\x00" * 4 + struct.pack(">II", 4032, 3024))
+                + _box(b"irot", b"\x01"))
+    avif = _box(b"ftyp", b"avif" + b"\x00" * 4 + b"mif1") + _box(b"meta", b"\x00" * 4 + _box(b"iprp", ipco))
+
+    cases = [
+        (png, "png", (1920, 1080), (1920, 1080)),
+        (gif, "gif", (320, 240), (320, 240)),
+        (bmp, "bmp", (800, 600), (800, 600)),
+        (tiff, "tiff", (3000, 2000), (2000, 3000)),
+        (webp, "webp", (1024, 568), (1024, 568)),
+        (avif, "avif", (4032, 3024), (3024, 4032)),
+    ]
+    for data, image_format, size, shown in cases:
+        info = image_probe.parse(data)
+        assert info and info["format"] == image_format, image_format
+        assert (info["width"], info["height"]) == size, image_format
+        assert image_probe.display_size(info) == shown, image_format
+        print(f"✅ {image_format}: {size}")
+
+    assert image_probe.parse(b"not an image") is None
+    assert image_probe.parse(png[:20]) is None
+
+
+def test_large_exif_jpeg():
+    """测试大段 EXIF 的 JPEG"""
+    print("=" * 60)
+    print("测试2: 大段 EXIF 的 JPEG")
+    print("=" * 60)
+
+    jpeg = _jpeg(4000, 3000, orientation=6, exif_padding=60000)
+    # 原实现只读前 64KB，同样内容在 64KB 内已找不到 SOF 时直接失败
+    assert image_probe.parse(jpeg[:4096]) is None
+
+    server = FakeServer({"http://x/a.jpg": jpeg})
+    _with_server(server)
+    info = image_probe.probe("http://x/a.jpg")
+    assert (info["width"], info["height"], info["orientation"]) == (4000, 3000, 6)
+    assert image_probe.display_size(info) == (3000, 4000)
+    assert server.requests == 2
+    assert server.transferred <= 2 * image_probe.READ_SIZE
+    print(f"✅ {server.requests} 次请求，传输 {server.transferred} 字节（文件 {len(jpeg)} 字节）")
+
+
+def test_without_range():
+    """测试服务器不支持 Range"""
+    print("=" * 60)
+    print("测试3: 不支持 Range 时流式读取")
+    print("=" * 60)
+
+    jpeg = _jpeg(640, 480, orientation=1, exif_padding=20000)
+    server = FakeServer({"http://x/b.jpg": jpeg}, ranges=False)
+    _with_server(server)
+    info = image_probe.probe("http://x/b.jpg")
+    assert image_probe.display_size(info) == (640, 480)
+    assert server.transferred < len(jpeg)
+    print(f"✅ 解析完成即停止读取（{server.transferred}/{len(jpeg)} 字节）")
+
+
+def test_cache():
+    """测试缓存"""
+    print("=" * 60)
+    print("测试4: URL / 内容哈希缓存")
+    print("=" * 60)
+
+    jpeg = _jpeg(1280, 720, orientation=1, exif_padding=30000)
+    server = FakeServer({"http://x/c.jpg?sig=1": jpeg, "http://x/c.jpg?sig=2": jpeg})
+    _with_server(server)
+    image_probe.probe("http://x/c.jpg?sig=1")
+    first = server.requests
+    image_probe.probe("http://x/c.jpg?sig=1")
+    assert server.requests == first
+    # 新的签名 URL，首段内容相同：一次请求即命中
+    info = image_probe.probe("http://x/c.jpg?sig=2")
+    assert server.requests == first + 1
+    assert (info["width"], info["height"]) == (1280, 720)
+    print("✅ 缓存命中")
+
+
+def main():
+    test_formats()
+    test_large_exif_jpeg()
+    test_without_range()
+    test_cache()
+    print("\n🎉 所有测试通过！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+图片→视频流水线测试脚本
+
+文生图、视频提交与查询以桩函数替代，测试：
+1. 图片与视频阶段重叠（先完成的图片先提交视频）
+2. 缓慢的提交占满并发名额时，其余帧的查询与输出不受阻塞
+3. 等待超时时各阶段的条目状态
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+image_video_chain = pytest.importorskip("tools.image_video_chain")
+
+from utils import breaker, http_client, task_api
+
+CREDENTIALS = {"volcengine_api_key": "ark-1,ark-2"}
+PARAMETERS = {"video_provider": "volcengine", "video_model": "doubao-seedance-1-5-pro-251215"}
+
+
+def _make_tool(image_delays: dict | None = None, submit_delays: dict | None = None,
+               polls_to_finish: int = 2):
+    """
+    构造工具实例
+
+    Args:
+        image_delays: {帧序号: 图片生成耗时（秒）}
+        submit_delays: {帧序号: 视频提交耗时（秒）}
+        polls_to_finish: 视频任务查询几次后完成
+    """
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    breaker._breakers.clear()
+
+    tool = image_video_chain.ImageVideoChainTool.__new__(image_video_chain.ImageVideoChainTool)
+    tool.runtime = type("Runtime", (), {"credentials": dict(CREDENTIALS)})()
+    tool.POLL_INTERVAL = 0
+    tool.TICK_INTERVAL = 0.01
+    tool.IMAGE_CONCURRENCY = 20
+    lock = threading.Lock()
+    polls = {}
+
+    def generate_image(model, prompt, size, seed):
+        index = int(prompt.removeprefix("帧"))
+        time.sleep((image_delays or {}).get(index, 0))
+        return f"https://example.com/frame-{index}.png", ""
+
+    def submit_frame(entry):
+        time.sleep((submit_delays or {}).get(entry["index"], 0))
+        return f"task-{entry['index']}", ""
+
+    def fetch_status(provider, api_base, api_key, task_id, timeout=30):
+        with lock:
+            polls[task_id] = polls.get(task_id, 0) + 1
+            if polls[task_id] < polls_to_finish:
+                return "running", {}
+        return "succeeded", {"content": {"video_url": f"https://example.com/{task_id}.mp4"}}
+
+    tool._generate_image = generate_image
+    tool._submit_frame = submit_frame
+    tool._cancel_late_submission = lambda provider, future: None
+    tool.stubs = [
+        (task_api, "fetch_status", fetch_status),
+        (http_client, "sleep", time.sleep),
+    ]
+    return tool
+
+
+def _run(tool, frame_count: int, **parameters):
+    """执行流水线（期间替换平台接口），返回 (文本消息列表, 最终清单)"""
+    originals = [(module, name, getattr(module, name)) for module, name, _ in tool.stubs]
+    for module, name, stub in tool.stubs:
+        setattr(module, name, stub)
+    frames = [{"prompt": f"帧{i}"} for i in range(frame_count)]
+    texts, payloads = [], []
+    try:
+        for message in tool._invoke({"frames": frames, **PARAMETERS, **parameters}):
+            payload = task_api.get_json_object(message)
+            if payload is not None:
+                payloads.append(payload)
+            else:
+                texts.append(task_api.get_text(message))
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+    return texts, payloads[-1]
+
+
+def _position(texts: list[str], prefix: str) -> int:
+    return next(i for i, text in enumerate(texts) if text.startswith(prefix))
+
+
+def test_pipeline_overlap():
+    """测试图片与视频阶段重叠"""
+    print("=" * 60)
+    print("测试1: 图片与视频阶段重叠")
+    print("=" * 60)
+
+    tool = _make_tool(image_delays={0: 0.5})
+    texts, manifest = _run(tool, 3)
+
+    assert manifest["succeeded"] == 3
+    assert _position(texts, "✅ 第 2 帧") < _position(texts, "🖼️ 第 1 帧")
+    assert [item["index"] for item in manifest["frames"]] == [0, 1, 2]
+    assert manifest["frames"][0]["image_url"].endswith("frame-0.png")
+    print("✅ 先完成的图片先提交视频，清单按帧顺序排列")
+
+
+def test_slow_submissions_do_not_block_polling():
+    """测试缓慢的提交不阻塞查询"""
+    print("=" * 60)
+    print("测试2: 缓慢的提交不阻塞查询")
+    print("=" * 60)
+
+    # 2 个 Key × 5 = 10 个名额：9 个提交缓慢时，第 10 帧仍能提交、查询并输出
+    tool = _make_tool(submit_delays={i: 0.5 for i in range(9)})
+    texts, manifest = _run(tool, 10)
+
+    assert manifest["succeeded"] == 10
+    finished_last = _position(texts, "✅ 第 10 帧")
+    assert all(finished_last < _position(texts, f"📤 第 {i + 1} 帧") for i in range(9))
+    print("✅ 其余帧的查询与输出不受阻塞")
+
+
+def test_timeout():
+    """测试等待超时"""
+    print("=" * 60)
+    print("测试3: 等待超时")
+    print("=" * 60)
+
+    tool = _make_tool(image_delays={2: 1.0}, submit_delays={1: 1.0}, polls_to_finish=10 ** 6)
+    tool.CHAIN_MAX_WAIT = 0.3
+    tool.DRAIN_WAIT = 0.05
+    _, manifest = _run(tool, 3)
+
+    frames = manifest["frames"]
+    assert frames[0]["status"] == "running"
+    assert "等待超时" in frames[0]["error_message"]
+    assert frames[1]["status"] == "submitting"
+    assert frames[2]["status"] == "not_submitted"
+    assert manifest["success"] is False
+    print("✅ 超时条目标记正确")
+
+
+def main():
+    test_pipeline_overlap()
+    test_slow_submissions_do_not_block_polling()
+    test_timeout()
+    print("\n🎉 所有测试通过!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+API Key 池测试脚本
+
+测试：
+1. Key 列表解析（分隔符、去重、额度）
+2. 轮流 / 进行中最少 / 按额度选择
+3. 401 / 429 隔离
+4. 按任务取回提交时的 Key
+5. 提交占位在请求结束（包括异常）后释放
+"""
+
+import os
+import tempfile
+
+from utils import keypool, task_store
+
+
+def reset():
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    keypool._cursors.clear()
+    keypool._quarantined.clear()
+    keypool._reservations.clear()
+
+
+def test_parse():
+    """测试 Key 列表解析"""
+    print("=" * 60)
+    print("测试1: 解析")
+    print("=" * 60)
+
+    assert keypool.parse("sk-a, sk-b\nsk-c;sk-a") == [("sk-a", None), ("sk-b", None), ("sk-c", None)]
+    assert keypool.parse("sk-a#3,sk-b#x") == [("sk-a", 3), ("sk-b", None)]
+    assert keypool.parse("") == [] and keypool.parse(None) == []
+    assert keypool.keys({"aliyun_api_key": "sk-a#3, sk-b"}, "aliyun") == ["sk-a", "sk-b"]
+    assert keypool.acquire({"aliyun_api_key": "sk-only"}, "aliyun") == "sk-only"
+    assert keypool.acquire({}, "aliyun") == ""
+    print("✅ 解析正确")
+
+
+def test_strategies():
+    """测试选择策略"""
+    print("\n" + "=" * 60)
+    print("测试2: 选择策略")
+    print("=" * 60)
+
+    reset()
+    credentials = {"volcengine_api_key": "k1,k2,k3"}
+    picked = [keypool.acquire(credentials, "volcengine") for _ in range(4)]
+    assert picked == ["k1", "k2", "k3", "k1"], picked
+    print("✅ 轮流使用")
+
+    reset()
+    credentials = {"volcengine_api_key": "k1,k2", "api_key_strategy": "least_in_flight"}
+    for i in range(2):
+        task_store.record(f"t{i}", provider="volcengine", key_id=keypool.key_id("k1"))
+    task_store.record("done", provider="volcengine", key_id=keypool.key_id("k2"), status="succeeded")
+    assert keypool.acquire(credentials, "volcengine") == "k2"
+    # 尚未登记的选择同样计入进行中
+    assert keypool.acquire(credentials, "volcengine") == "k2"
+    assert keypool.acquire(credentials, "volcengine") == "k1"
+    print("✅ 进行中任务最少")
+
+    reset()
+    credentials = {"aliyun_api_key": "k1#1,k2#4", "api_key_strategy": "quota"}
+    task_store.record("t0", provider="aliyun", key_id=keypool.key_id("k2"))
+    assert keypool.acquire(credentials, "aliyun") == "k2"  # 剩余 3 > 1
+    keypool.release("k2")
+    assert keypool.acquire(credentials, "aliyun") == "k2"
+    print("✅ 按剩余额度")
+
+
+def test_quarantine():
+    """测试隔离"""
+    print("\n" + "=" * 60)
+    print("测试3: 隔离")
+    print("=" * 60)
+
+    reset()
+    credentials = {"jxincm_api_key": "k1,k2"}
+    keypool.report("k1", 401)
+    assert keypool.quarantined("k1")
+    assert [keypool.acquire(credentials, "jxincm") for _ in range(3)] == ["k2", "k2", "k2"]
+
+    keypool.report("k2", 429, {"Retry-After": "5"})
+    # 全部隔离时选择最早解除的
+    assert keypool.acquire(credentials, "jxincm") == "k2"
+    remaining = keypool._quarantined[keypool.key_id("k2")] - keypool._quarantined[keypool.key_id("k1")]
+    assert remaining < 0
+    print("✅ 401 / 429 隔离")
+
+
+def test_for_task():
+    """测试按任务取回 Key"""
+    print("\n" + "=" * 60)
+    print("测试4: 按任务取回 Key")
+    print("=" * 60)
+
+    reset()
+    credentials = {"aliyun_api_key": "k1,k2,k3"}
+    task_store.record("task-x", provider="aliyun", key_id=keypool.key_id("k3"))
+    assert keypool.for_task(credentials, "aliyun", "task-x") == "k3"
+    assert keypool.for_task(credentials, "aliyun", "unknown") == "k1"
+    assert keypool.for_task({"aliyun_api_key": "k1"}, "aliyun", "task-x") == "k1"
+    assert "k3" not in open(os.environ["AI_VIDEO_TASK_STORE"], encoding="utf-8").read()
+    print("✅ 续等 / 查询使用提交时的 Key，登记表不保存 Key 本身")
+
+
+def test_reserve():
+    """测试提交占位"""
+    print("\n" + "=" * 60)
+    print("测试5: 提交占位")
+    print("=" * 60)
+
+    reset()
+    credentials = {"volcengine_api_key": "k1,k2", "api_key_strategy": "least_in_flight"}
+    with keypool.reserve(credentials, "volcengine") as api_key:
+        assert api_key == "k1"
+        # 请求进行中，另一个提交选择其他 Key
+        assert keypool.acquire(credentials, "volcengine") == "k2"
+        keypool.release("k2")
+    try:
+        with keypool.reserve(credentials, "volcengine") as api_key:
+            assert api_key == "k1"
+            raise ConnectionError("提交请求失败")
+    except ConnectionError:
+        pass
+    assert not any(keypool._reservations.values()), "请求结束后占位应释放"
+
+    # 重试沿用同一个 Key
+    with keypool.reserve(credentials, "volcengine", "k2") as api_key:
+        assert api_key == "k2"
+        assert keypool.acquire(credentials, "volcengine") == "k1"
+    print("✅ 请求结束（包括异常）后释放占位")
+
+
+def main():
+    test_parse()
+    test_strategies()
+    test_quarantine()
+    test_for_task()
+    test_reserve()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+负载生成器测试脚本
+
+测试：
+1. 模拟平台：DashScope / Ark 提交、轮询状态流转、文生图、视频 Range 下载
+2. 错误注入（500 / 429）
+3. 调用比例解析、分位数与汇总统计
+"""
+
+import http.client
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import loadtest
+
+
+def start_mock(**options) -> tuple[loadtest.MockProvider, str]:
+    server = loadtest.MockProvider(("127.0.0.1", 0), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def fetch(url: str, method: str = "GET", body: dict | None = None, headers: dict | None = None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def test_mock_provider():
+    """测试模拟平台接口"""
+    print("=" * 60)
+    print("测试1: 模拟平台")
+    print("=" * 60)
+
+    server, base = start_mock(task_seconds=0.4)
+    try:
+        status, _, body = fetch(f"{base}/api/v1/services/aigc/video-generation/video-synthesis", "POST", {})
+        task_id = json.loads(body)["output"]["task_id"]
+        assert status == 200 and task_id.startswith("mock-")
+        output = json.loads(fetch(f"{base}/api/v1/tasks/{task_id}")[2])["output"]
+        assert output["task_status"] == "PENDING" and "video_url" not in output
+        time.sleep(0.5)
+        output = json.loads(fetch(f"{base}/api/v1/tasks/{task_id}")[2])["output"]
+        assert output["task_status"] == "SUCCEEDED" and output["video_url"].endswith(f"{task_id}.mp4")
+        print("✅ DashScope 提交 / 轮询")
+
+        task_id = json.loads(fetch(f"{base}/api/v3/contents/generations/tasks", "POST", {})[2])["id"]
+        assert json.loads(fetch(f"{base}/api/v3/contents/generations/tasks/{task_id}")[2])["status"] == "queued"
+        finished = json.loads(fetch(f"{base}/api/v3/contents/generations/tasks/unknown")[2])
+        assert finished["status"] == "succeeded" and finished["content"]["duration"] == 5
+        assert fetch(f"{base}/api/v3/contents/generations/tasks/{task_id}", "DELETE")[0] == 200
+        print("✅ Ark 提交 / 轮询 / 取消")
+
+        url = json.loads(fetch(f"{base}/api/v3/images/generations", "POST", {})[2])["data"][0]["url"]
+        status, headers, image = fetch(url)
+        assert status == 200 and image.startswith(b"\x89PNG") and headers["Content-Type"] == "image/png"
+        status, headers, part = fetch(f"{base}/videos/x.mp4", headers={"Range": "bytes=0-15"})
+        assert status == 206 and len(part) == 16 and part[4:8] == b"ftyp"
+        assert headers["Content-Range"] == f"bytes 0-15/{len(server.video)}"
+        print("✅ 图片 / 视频下载")
+
+        # chunked 请求体读完后，同一连接可继续使用
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+        connection.request(
+            "POST", "/api/v3/images/generations", body=iter([b'{"image": "', b"QUJD" * 1000, b'"}']),
+            encode_chunked=True, headers={"Content-Type": "application/json"},
+        )
+        assert connection.getresponse().read() and connection.sock is not None
+        connection.request("GET", "/api/v1/tasks/unknown")
+        assert connection.getresponse().status == 200
+        connection.close()
+        print("✅ chunked 请求体与连接复用")
+    finally:
+        server.shutdown()
+
+
+def test_error_injection():
+    """测试错误注入"""
+    print("\n" + "=" * 60)
+    print("测试2: 错误注入")
+    print("=" * 60)
+
+    server, base = start_mock(error_rate=1)
+    try:
+        assert fetch(f"{base}/api/v3/contents/generations/tasks", "POST", {})[0] == 500
+    finally:
+        server.shutdown()
+
+    server, base = start_mock(rate_limit_rate=1)
+    try:
+        status, headers, _ = fetch(f"{base}/api/v3/images/generations", "POST", {})
+        assert status == 429 and headers["Retry-After"] == "1"
+        # 轮询接口不注入错误
+        assert fetch(f"{base}/api/v1/tasks/unknown")[0] == 200
+    finally:
+        server.shutdown()
+    print("✅ 500 / 429 注入只作用于提交接口")
+
+
+def test_summary():
+    """测试比例解析与汇总统计"""
+    print("\n" + "=" * 60)
+    print("测试3: 汇总统计")
+    print("=" * 60)
+
+    assert loadtest.parse_mix("t2v=4, i2v=2,query") == {"t2v": 4.0, "i2v": 2.0, "query": 1.0}
+    for bad in ("t2x=1", "", "t2v=0"):
+        try:
+            loadtest.parse_mix(bad)
+            raise AssertionError(f"应拒绝: {bad!r}")
+        except ValueError:
+            pass
+    assert loadtest.percentile([], 0.5) == 0
+    assert loadtest.percentile([1, 2, 3, 4], 0.5) == 2.5
+    assert loadtest.percentile([5, 1, 3], 1) == 5
+    print("✅ 比例解析与分位数")
+
+    stats = loadtest.Stats()
+    started = 1000.0
+    # 35 秒内：前 10 秒 2 次（爬坡），中间两个窗口各 10 次，最后 5 秒 1 次
+    for i in range(2):
+        stats.add("t2v", started, started + 5 + i, "")
+    for window in (1, 2):
+        for i in range(10):
+            stats.add("t2i", started, started + window * 10 + i, "" if i else "HTTP 500")
+    stats.add("query", started, started + 33, "", task_id="task-1")
+    stats.samples = [(started, 10, 4, 50 * 2**20), (started + 20, 40, 30, 80 * 2**20), (started + 35, 12, 5, 60 * 2**20)]
+
+    summary = stats.summary(started, started + 35)
+    assert summary["invocations"] == 23 and summary["failed"] == 2
+    assert summary["sustained_throughput"] == 1.0, summary["sustained_throughput"]
+    assert summary["latency"]["t2v"]["count"] == 2 and summary["latency"]["t2v"]["max"] == 6
+    assert summary["threads"] == {"peak": 40, "final": 12}
+    assert summary["sockets"] == {"peak": 30, "final": 5}
+    assert summary["rss_mb"] == {"start": 50.0, "peak": 80.0, "growth": 10.0}
+    assert summary["errors"] == {"t2i: HTTP 500": 2}
+    assert stats.task_ids == ["task-1"]
+    print("✅ 持续吞吐、资源峰值与错误分类")
+
+
+def main():
+    test_mock_provider()
+    test_error_injection()
+    test_summary()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
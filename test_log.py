@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+结构化日志测试脚本
+
+测试：
+1. 状态变化：同一任务同一状态只记录一次，输出为单行 JSON
+2. 调试日志：未开启时不求值，开启后按任务采样
+3. 按事件限流并报告丢弃条数
+"""
+
+import json
+import logging
+import os
+
+from utils import log
+
+
+class CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(record.getMessage()))
+
+
+def capture() -> CaptureHandler:
+    handler = CaptureHandler()
+    log.logger.handlers = [handler]
+    log.logger.setLevel(logging.INFO)
+    log.logger.propagate = False
+    log._buckets.clear()
+    log._task_status.clear()
+    log._debug_times.clear()
+    return handler
+
+
+def test_transition():
+    """测试状态变化日志"""
+    print("=" * 60)
+    print("测试1: 状态变化")
+    print("=" * 60)
+
+    handler = capture()
+    for status in ("queued", "queued", "running", "running", "running", "succeeded"):
+        log.transition("task-1", status, provider="volcengine")
+    log.transition("task-2", "running")
+
+    events = [(line["task_id"], line["previous"], line["status"]) for line in handler.lines]
+    assert events == [
+        ("task-1", None, "queued"),
+        ("task-1", "queued", "running"),
+        ("task-1", "running", "succeeded"),
+        ("task-2", None, "running"),
+    ], events
+    assert handler.lines[0]["event"] == "task_status" and handler.lines[0]["provider"] == "volcengine"
+    print("✅ 只记录状态变化")
+
+
+def test_debug():
+    """测试调试日志"""
+    print("\n" + "=" * 60)
+    print("测试2: 调试日志")
+    print("=" * 60)
+
+    handler = capture()
+    calls = []
+
+    def payload():
+        calls.append(1)
+        return {"status": "running", "content": "x" * (log.MAX_FIELD_LENGTH + 100)}
+
+    os.environ.pop(log.DEBUG_ENV, None)
+    log.debug("poll", task_id="task-1", response=payload)
+    assert not handler.lines and not calls
+    print("✅ 未开启调试时不输出、不求值")
+
+    os.environ[log.DEBUG_ENV] = "1"
+    try:
+        for _ in range(5):
+            log.debug("poll", task_id="task-1", response=payload)
+        log.debug("poll", task_id="task-2", response=payload)
+    finally:
+        os.environ.pop(log.DEBUG_ENV, None)
+    assert [line["task_id"] for line in handler.lines] == ["task-1", "task-2"]
+    assert len(calls) == 2
+    assert handler.lines[0]["response"].endswith("...")
+    print("✅ 按任务采样，字段输出时才求值并截断")
+
+
+def test_rate_limit():
+    """测试按事件限流"""
+    print("\n" + "=" * 60)
+    print("测试3: 限流")
+    print("=" * 60)
+
+    handler = capture()
+    for i in range(log.EVENT_BURST + 20):
+        log.event("flood", index=i)
+    assert len(handler.lines) == log.EVENT_BURST
+
+    # 补充令牌后，下一条报告此前丢弃的条数
+    log._buckets["flood"][1] -= 1
+    log.event("flood", index=-1)
+    assert handler.lines[-1]["dropped"] == 20
+    print(f"✅ 限流 {log.EVENT_BURST} 条，丢弃 20 条已报告")
+
+
+def main():
+    test_transition()
+    test_debug()
+    test_rate_limit()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+MP4 无损拼接测试脚本
+
+测试：
+1. 两个片段（一个 moov 在前、一个 moov 在后）拼接：样本数据逐字节一致、faststart、时长累加
+2. 编辑列表：每个片段一段编辑，起始偏移按媒体时间累加
+3. 编码参数不同的片段拒绝拼接
+4. parse_duration 读取 mvhd 时长
+"""
+
+import io
+import os
+import struct
+import tempfile
+
+from utils import mp4
+
+VIDEO_TIMESCALE = 15360
+AUDIO_TIMESCALE = 48000
+MOVIE_TIMESCALE = 1000
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def full(box_type: bytes, body: bytes, version: int = 0) -> bytes:
+    return box(box_type, struct.pack(">I", version << 24) + body)
+
+
+def trak(track_id, handler, timescale, sample_delta, sizes, chunks, offsets, stsd_entry,
+         ctts=None, sync=None, media_time=None):
+    media_duration = sample_delta * len(sizes)
+    movie_duration = media_duration * MOVIE_TIMESCALE // timescale
+    children = [full(b"tkhd", struct.pack(">IIIII", 0, 0, track_id, 0, movie_duration) + b"\x00" * 60)]
+    if media_time is not None:
+        segment = (media_duration - media_time) * MOVIE_TIMESCALE // timescale
+        children.append(box(b"edts", full(b"elst", struct.pack(">IIiI", 1, segment, media_time, 0x10000))))
+
+    stbl = [
+        full(b"stsd", struct.pack(">I", 1) + box(b"avc1" if handler == b"vide" else b"mp4a", stsd_entry)),
+        full(b"stts", struct.pack(">III", 1, len(sizes), sample_delta)),
+    ]
+    if ctts:
+        stbl.append(full(b"ctts", struct.pack(f">I{len(ctts) * 2}I", len(ctts), *[v for p in ctts for v in p])))
+    if sync:
+        stbl.append(full(b"stss", struct.pack(f">I{len(sync)}I", len(sync), *sync)))
+    stbl.append(full(b"stsc", struct.pack(">IIII", 1, 1, chunks, 1)))
+    if len(set(sizes)) == 1:
+        stbl.append(full(b"stsz", struct.pack(">II", sizes[0], len(sizes))))
+    else:
+        stbl.append(full(b"stsz", struct.pack(f">II{len(sizes)}I", 0, len(sizes), *sizes)))
+    stbl.append(full(b"stco", struct.pack(f">I{len(offsets)}I", len(offsets), *offsets)))
+
+    hdlr = full(b"hdlr", struct.pack(">I4s", 0, handler) + b"\x00" * 13)
+    mdhd = full(b"mdhd", struct.pack(">IIII", 0, 0, timescale, media_duration) + b"\x00" * 4)
+    minf = box(b"minf", box(b"dinf", b"") + box(b"stbl", b"".join(stbl)))
+    children.append(box(b"mdia", mdhd + hdlr + minf))
+    return box(b"trak", b"".join(children))
+
+
+def make_clip(tag: bytes, frames: int = 6, moov_first: bool = False, params: bytes = b"sps-pps") -> tuple[bytes, list, list]:
+    """生成测试片段：视频每块 1 帧（大小不一），音频每块 2 帧（固定大小），交错存放"""
+    video = [tag + b"V%03d" % i + b"x" * (i * 7) for i in range(frames)]
+    audio = [tag + b"A%03d" % i for i in range(frames * 2)]
+
+    def build(data_base: int) -> tuple[bytes, bytes]:
+        payload = b""
+        video_offsets, audio_offsets = [], []
+        for i in range(frames):
+            video_offsets.append(data_base + len(payload))
+            payload += video[i]
+            audio_offsets.append(data_base + len(payload))
+            payload += audio[2 * i] + audio[2 * i + 1]
+        duration = frames * 512 * MOVIE_TIMESCALE // VIDEO_TIMESCALE
+        moov = box(b"moov", b"".join([
+            full(b"mvhd", struct.pack(">IIII", 0, 0, MOVIE_TIMESCALE, duration) + b"\x00" * 80),
+            trak(1, b"vide", VIDEO_TIMESCALE, 512, [len(v) for v in video], 1, video_offsets, params,
+                 ctts=[(frames, 1024)], sync=[1, 4], media_time=1024),
+            trak(2, b"soun", AUDIO_TIMESCALE, 1024, [len(a) for a in audio], 2, audio_offsets, b"aac"),
+        ]))
+        return moov, payload
+
+    ftyp = box(b"ftyp", b"isom\x00\x00\x02\x00isomavc1")
+    if moov_first:
+        moov, _ = build(0)
+        moov, payload = build(len(ftyp) + len(moov) + 8)
+        data = ftyp + moov + box(b"mdat", payload)
+    else:
+        _, payload = build(len(ftyp) + 8)
+        moov, _ = build(len(ftyp) + 8)
+        data = ftyp + box(b"mdat", payload) + box(b"free", b"\x00" * 5) + moov
+    return data, video, audio
+
+
+def source(data: bytes) -> mp4.FileSource:
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return mp4.FileSource(path, temporary=True)
+
+
+def samples(movie: mp4.Movie, track: mp4.Track) -> list:
+    """按样本表读取轨道的全部样本"""
+    result = []
+    sample = 0
+    for offset, size in zip(track.offsets, track.chunk_sizes):
+        chunk = movie.source.read_at(offset, size)
+        position = 0
+        while position < size:
+            result.append(chunk[position:position + track.sizes[sample]])
+            position += track.sizes[sample]
+            sample += 1
+    return result
+
+
+def test_concat():
+    """测试两个片段拼接"""
+    print("=" * 60)
+    print("测试1: 拼接")
+    print("=" * 60)
+
+    clip_a, video_a, audio_a = make_clip(b"a", frames=6, moov_first=True)
+    clip_b, video_b, audio_b = make_clip(b"b", frames=9, moov_first=False)
+    movies = [mp4.Movie(source(clip_a)), mp4.Movie(source(clip_b))]
+    out = io.BytesIO()
+    info = mp4.concat(movies, out)
+    data = out.getvalue()
+    print(f"输出: {info}")
+
+    assert info["size"] == len(data)
+    result = mp4.Movie(source(data))
+    order = [box_type for box_type, _, _ in mp4.top_level_boxes(result.source)]
+    assert order == [b"ftyp", b"moov", b"mdat"], order
+
+    video, audio = result.tracks
+    assert samples(result, video) == video_a + video_b
+    assert samples(result, audio) == audio_a + audio_b
+    assert audio.fixed_size == 5
+    assert video.sync == (1, 4, 7, 10)
+    assert video.ctts == [(15, 1024)]
+    assert video.media_duration == 15 * 512
+    print("✅ 样本数据、同步帧、合成时间偏移正确")
+
+    # 每个片段一段编辑，第二段从第一个片段的媒体时长之后开始
+    assert [media_time for _, media_time in video.edits] == [1024, 6 * 512 + 1024]
+    assert [media_time for _, media_time in audio.edits] == [0, 12 * 1024]
+    assert info["duration"] == mp4.parse_duration(data)
+    print(f"✅ 编辑列表正确，时长 {info['duration']}秒")
+
+    for movie in movies + [result]:
+        movie.source.close()
+
+
+def test_incompatible():
+    """测试编码参数不同的片段"""
+    print("\n" + "=" * 60)
+    print("测试2: 编码参数不同")
+    print("=" * 60)
+
+    movies = [
+        mp4.Movie(source(make_clip(b"a")[0])),
+        mp4.Movie(source(make_clip(b"b", params=b"other-sps")[0])),
+    ]
+    try:
+        mp4.concat(movies, io.BytesIO())
+    except mp4.Mp4Error as e:
+        print(f"✅ 拒绝: {e}")
+    else:
+        raise AssertionError("编码参数不同的片段应拒绝拼接")
+    for movie in movies:
+        movie.source.close()
+
+
+def test_parse_duration():
+    """测试 parse_duration"""
+    print("\n" + "=" * 60)
+    print("测试3: parse_duration")
+    print("=" * 60)
+
+    data, _, _ = make_clip(b"a", frames=30, moov_first=True)
+    assert mp4.parse_duration(data) == 1.0
+    assert mp4.parse_duration(data[:40]) == 0
+    assert mp4.parse_duration(b"not an mp4 file") == 0
+    print("✅ 时长解析正确")
+
+
+def main():
+    test_concat()
+    test_incompatible()
+    test_parse_duration()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
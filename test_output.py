@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+紧凑输出模式测试脚本
+
+测试：
+1. full 模式保持原有输出
+2. compact 模式只输出最终 JSON 和 blob
+3. compact_progress 模式保留稀疏进度
+4. 没有 JSON 时按错误文本生成结果；中止时关闭工具生成器
+"""
+
+from types import SimpleNamespace
+
+from utils import output
+
+
+class FakeTool:
+    def create_text_message(self, text):
+        return SimpleNamespace(message=SimpleNamespace(text=text))
+
+    def create_json_message(self, data):
+        return SimpleNamespace(message=SimpleNamespace(json_object=data))
+
+    def create_blob_message(self, blob, meta=None):
+        return SimpleNamespace(message=SimpleNamespace(blob=blob), meta=meta)
+
+    @output.compactable
+    def _invoke(self, tool_parameters):
+        yield self.create_text_message("🎬 开始生成")
+        for i in range(3):
+            yield self.create_text_message(f"⏳ 正在生成... running ({i * 10}秒)")
+        if tool_parameters.get("fail"):
+            yield self.create_text_message("❌ 错误：提示词不能为空")
+            return
+        yield self.create_blob_message(b"\x00\x01", meta={"mime_type": "video/mp4"})
+        yield self.create_text_message("✅ 完成\n```json\n{\"success\": true}\n```")
+        yield self.create_json_message({"success": True, "video_url": "https://example.com/a.mp4"})
+
+
+def describe(messages) -> list[str]:
+    kinds = []
+    for message in messages:
+        body = message.message
+        if hasattr(body, "json_object"):
+            kinds.append("json")
+        elif hasattr(body, "blob"):
+            kinds.append("blob")
+        else:
+            kinds.append(body.text[:1])
+    return kinds
+
+
+def test_full():
+    """测试 full 模式"""
+    print("=" * 60)
+    print("测试1: full 模式")
+    print("=" * 60)
+
+    tool = FakeTool()
+    assert describe(tool._invoke({})) == ["🎬", "⏳", "⏳", "⏳", "blob", "✅", "json"]
+    assert describe(tool._invoke({"output_mode": "full"})) == ["🎬", "⏳", "⏳", "⏳", "blob", "✅", "json"]
+    print("✅ 默认保持原有输出")
+
+
+def test_compact():
+    """测试 compact 模式"""
+    print("\n" + "=" * 60)
+    print("测试2: compact 模式")
+    print("=" * 60)
+
+    messages = list(FakeTool()._invoke({"output_mode": "compact"}))
+    assert describe(messages) == ["blob", "json"]
+    assert messages[-1].message.json_object["video_url"] == "https://example.com/a.mp4"
+    print("✅ 只输出 blob 和最终 JSON")
+
+
+def test_compact_progress():
+    """测试 compact_progress 模式"""
+    print("\n" + "=" * 60)
+    print("测试3: compact_progress 模式")
+    print("=" * 60)
+
+    # 间隔内的多条进度只保留第一条
+    assert describe(FakeTool()._invoke({"output_mode": "compact_progress"})) == ["⏳", "blob", "json"]
+    print("✅ 进度按间隔稀疏输出")
+
+
+def test_synthesized_and_close():
+    """测试无 JSON 时的结果与生成器关闭"""
+    print("\n" + "=" * 60)
+    print("测试4: 错误结果与中止")
+    print("=" * 60)
+
+    messages = list(FakeTool()._invoke({"output_mode": "compact", "fail": True}))
+    assert describe(messages) == ["json"]
+    assert messages[0].message.json_object == {"success": False, "error_message": "错误：提示词不能为空"}
+    print("✅ 按错误文本生成 JSON")
+
+    closed = []
+
+    def invoke():
+        try:
+            while True:
+                yield FakeTool().create_text_message("⏳ 正在生成...")
+        finally:
+            closed.append(True)
+
+    stream = output.compact(FakeTool(), invoke(), with_progress=True)
+    next(stream)
+    stream.close()
+    assert closed == [True]
+    print("✅ 中止时关闭工具生成器")
+
+
+def main():
+    test_full()
+    test_compact()
+    test_compact_progress()
+    test_synthesized_and_close()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
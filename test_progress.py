@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+任务进度与预计剩余时间测试脚本
+
+测试：
+1. 各平台进度 / 排队位次字段解析
+2. 基于历史耗时的整体时间估算
+3. 进度输出按时间节流（与轮询次数无关）
+"""
+
+import os
+import tempfile
+
+from utils import progress, task_store
+
+
+def test_parse_progress():
+    """测试进度字段解析"""
+    print("=" * 60)
+    print("测试1: 进度字段解析")
+    print("=" * 60)
+
+    # JXINCM: 顶层 progress
+    assert progress.parse_progress({"status": "processing", "progress": 45})["progress"] == 45
+    # 阿里云百炼: output.task_metrics
+    info = progress.parse_progress({
+        "output": {"task_status": "RUNNING", "task_metrics": {"TOTAL": 4, "SUCCEEDED": 1, "FAILED": 0}}
+    })
+    assert info["progress"] == 25
+    # 排队位次与 0-1 小数进度
+    info = progress.parse_progress({"status": "queued", "queue_position": 3, "progress": 0.5})
+    assert info["queue_position"] == 3
+    assert info["progress"] == 50
+    # 无进度字段
+    assert progress.parse_progress({"status": "running"}) == {"progress": None, "queue_position": None}
+    print("✅ 进度字段解析正确")
+
+
+def test_expected_duration():
+    """测试历史耗时估算"""
+    print("=" * 60)
+    print("测试2: 历史耗时估算")
+    print("=" * 60)
+
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+
+    # 无历史数据时使用默认耗时
+    assert progress.expected_duration("volcengine", "m", "720p") == progress.DEFAULT_DURATIONS["volcengine"]
+
+    for i, seconds in enumerate((60, 90, 300)):
+        task_store.record(f"t{i}", provider="volcengine", model="m", resolution="720p", submitted_at=1000)
+        task_store.record(f"t{i}", status="succeeded", finished_at=1000 + seconds)
+
+    # 取中位数
+    assert progress.expected_duration("volcengine", "m", "720p") == 90
+    # 分辨率样本不足时放宽到同模型
+    assert progress.expected_duration("volcengine", "m", "1080p") == 90
+    print("✅ 历史耗时估算正确")
+
+
+def test_report_interval():
+    """测试进度输出节流"""
+    print("=" * 60)
+    print("测试3: 进度输出节流")
+    print("=" * 60)
+
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    tracker = progress.ProgressTracker("volcengine", "cgt-1", "m")
+    assert tracker.update("running", {}).startswith("⏳")
+    # 间隔内的查询不输出，排队位次变化时立即输出
+    assert tracker.update("running", {}) == ""
+    assert "排队第 3 位" in tracker.update("queued", {"queue_position": 3})
+    assert tracker.update("queued", {"queue_position": 3}) == ""
+    # 超过间隔后的下一次查询即输出（启用回调后轮询间隔很长，也不会再等若干次查询）
+    tracker._reported_at -= progress.REPORT_INTERVAL
+    assert tracker.update("running", {})
+    print("✅ 按时间节流")
+
+
+def main():
+    test_parse_progress()
+    test_expected_duration()
+    test_report_interval()
+    print("\n🎉 所有测试通过！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+URL 公网可达性判断测试脚本
+
+测试：
+1. IP 字面量（私有网段、CGNAT、IPv6 ULA、链路本地等）
+2. 域名解析到内网 IP
+3. 非标准端口
+4. DNS 与判断结果缓存
+"""
+
+from utils import reachability
+
+
+def _fake_resolver(table: dict, calls: list):
+    def resolve(host):
+        calls.append(host)
+        if host not in table:
+            raise OSError("not found")
+        return table[host]
+    return resolve
+
+
+def test_ip_literals():
+    """测试 IP 字面量"""
+    print("=" * 60)
+    print("测试1: IP 字面量")
+    print("=" * 60)
+
+    cases = {
+        "http://8.8.8.8/a.png": True,
+        "https://[2606:4700::1111]/a.png": True,
+        "http://10.1.2.3/a.png": False,
+        "http://172.20.0.5/a.png": False,
+        "http://192.168.1.10/a.png": False,
+        "http://127.0.0.1/a.png": False,
+        "http://169.254.1.1/a.png": False,
+        "http://100.64.3.4/a.png": False,       # CGNAT
+        "http://[fd12:3456::1]/a.png": False,    # IPv6 ULA
+        "http://[::1]/a.png": False,
+        "http://[::ffff:10.0.0.1]/a.png": False,  # IPv4 映射地址
+        "http://localhost/a.png": False,
+        "ftp://8.8.8.8/a.png": False,
+    }
+    for url, expected in cases.items():
+        assert reachability.is_public_url(url) == expected, url
+    print("✅ IP 字面量判断正确")
+
+
+def test_hostname_resolution():
+    """测试域名解析"""
+    print("=" * 60)
+    print("测试2: 域名解析到内网 IP")
+    print("=" * 60)
+
+    calls = []
+    original = reachability._resolve
+    reachability._resolve = _fake_resolver({
+        "files.internal.example": ("10.0.0.8",),
+        "cdn.example": ("93.184.216.34", "2001:4860::8888"),
+        "docs.example": ("203.0.113.10",),
+        "mixed.example": ("93.184.216.34", "192.168.0.2"),
+    }, calls)
+    try:
+        assert not reachability.is_public_url("https://files.internal.example/a.png")
+        assert reachability.is_public_url("https://cdn.example/a.png")
+        assert not reachability.is_public_url("https://docs.example/a.png")  # 文档保留网段
+        assert not reachability.is_public_url("https://mixed.example/a.png")
+        assert not reachability.is_public_url("https://unknown.example/a.png")
+    finally:
+        reachability._resolve = original
+    print("✅ 按解析后的 IP 判断")
+
+
+def test_port_and_cache():
+    """测试非标准端口与缓存"""
+    print("=" * 60)
+    print("测试3: 非标准端口与缓存")
+    print("=" * 60)
+
+    assert not reachability.is_public_url("http://8.8.8.8:8080/a.png")
+
+    calls = []
+    original = reachability._resolve
+    reachability._resolve = _fake_resolver({"public.example": ("8.8.4.4",)}, calls)
+    try:
+        assert reachability.is_public_url("https://public.example/a.png")
+        assert reachability.is_public_url("https://public.example/b.png")
+        assert reachability.resolve("public.example") == ("8.8.4.4",)
+    finally:
+        reachability._resolve = original
+    assert calls == ["public.example"]
+    print("✅ 同一主机只解析一次")
+
+
+def main():
+    test_ip_literals()
+    test_hostname_resolution()
+    test_port_and_cache()
+    print("\n🎉 所有测试通过！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+平台 / 模型自动路由测试脚本
+
+测试：
+1. 能力过滤（API Key、时长、图片输入）
+2. 速度优先 / 费用优先
+3. 熔断器状态（半开时只放行一次试探）
+4. 费用与耗时约束
+5. 凭证覆盖单价
+"""
+
+import os
+import tempfile
+
+from utils import breaker, router, task_store
+
+CREDENTIALS = {
+    "aliyun_api_key": "sk-test",
+    "volcengine_api_key": "ark-test",
+    "jxincm_api_key": "jx-test",
+}
+
+
+def _use_temp_store():
+    os.environ["AI_VIDEO_TASK_STORE"] = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    breaker._breakers.clear()
+
+
+def _add_history(provider: str, model: str, seconds: list):
+    for i, value in enumerate(seconds):
+        task_id = f"{model}-{i}"
+        task_store.record(task_id, provider=provider, model=model, resolution="720p",
+                          duration="5", submitted_at=1000)
+        task_store.record(task_id, status="succeeded", finished_at=1000 + value)
+
+
+def test_capability_filter():
+    """测试能力过滤"""
+    print("=" * 60)
+    print("测试1: 能力过滤")
+    print("=" * 60)
+
+    _use_temp_store()
+    # 只配置了火山方舟
+    route, rejected = router.choose(
+        "text_to_video", {"duration": "5"}, {"volcengine_api_key": "ark-test"}
+    )
+    assert route["provider"] == "volcengine"
+    assert any("未配置 API Key" in reason for reason in rejected)
+
+    # 15 秒只有通义万相 2.6 和 Sora-2 支持
+    route, _ = router.choose("text_to_video", {"duration": "15"}, CREDENTIALS)
+    assert route["model"] in ("wan2.6-t2v", "sora-2", "sora-2-pro")
+
+    # 带图片时排除阿里云文生视频模型
+    route, rejected = router.choose(
+        "text_to_video", {"duration": "5", "_image_url": "https://example.com/a.png"}, CREDENTIALS
+    )
+    assert route["provider"] != "aliyun"
+    print("✅ 能力过滤正确")
+
+
+def test_objectives():
+    """测试速度优先 / 费用优先"""
+    print("=" * 60)
+    print("测试2: 速度优先 / 费用优先")
+    print("=" * 60)
+
+    _use_temp_store()
+    _add_history("aliyun", "wan2.5-t2v-preview", [40, 45, 50])
+    _add_history("volcengine", "doubao-seedance-1-0-lite-t2v-250428", [200, 210, 220])
+
+    route, _ = router.choose("text_to_video", {"duration": "5", "resolution": "720p"}, CREDENTIALS)
+    assert route["model"] == "wan2.5-t2v-preview"
+    assert route["p50"] == 45 and route["samples"] == 3
+
+    route, _ = router.choose(
+        "text_to_video", {"duration": "5", "resolution": "720p", "route_objective": "cost"}, CREDENTIALS
+    )
+    assert route["model"] == "doubao-seedance-1-0-lite-t2v-250428"
+    print("✅ 路由目标生效")
+
+
+def test_circuit_breaker():
+    """测试熔断器"""
+    print("=" * 60)
+    print("测试3: 熔断器")
+    print("=" * 60)
+
+    _use_temp_store()
+    _add_history("aliyun", "wan2.5-t2v-preview", [40, 45, 50])
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        breaker.get("aliyun").record_failure()
+    assert breaker.get("aliyun").state == breaker.OPEN
+
+    route, rejected = router.choose("text_to_video", {"duration": "5"}, CREDENTIALS)
+    assert route["provider"] != "aliyun"
+    assert any("熔断" in reason for reason in rejected)
+
+    breaker.get("aliyun").record_success()
+    assert breaker.get("aliyun").state == breaker.CLOSED
+    print("✅ 熔断平台被排除")
+
+    # 冷却结束进入半开：只有第一次路由拿到试探名额
+    aliyun_only = {"aliyun_api_key": "sk-test"}
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        breaker.get("aliyun").record_failure()
+    breaker.get("aliyun").opened_at -= breaker.RECOVERY_TIMEOUT + 1
+    assert breaker.get("aliyun").state == breaker.HALF_OPEN
+
+    route, _ = router.choose("text_to_video", {"duration": "5"}, aliyun_only)
+    assert route["provider"] == "aliyun"
+    route, rejected = router.choose("text_to_video", {"duration": "5"}, aliyun_only)
+    assert route is None
+    assert any("试探中" in reason for reason in rejected)
+    route, _ = router.choose("text_to_video", {"duration": "5"}, CREDENTIALS)
+    assert route["provider"] != "aliyun"
+
+    breaker.get("aliyun").record_success()
+    route, _ = router.choose("text_to_video", {"duration": "5"}, aliyun_only)
+    assert route["provider"] == "aliyun"
+    print("✅ 半开状态只放行一次试探")
+
+
+def test_constraints():
+    """测试费用与耗时约束"""
+    print("=" * 60)
+    print("测试4: 费用与耗时约束")
+    print("=" * 60)
+
+    _use_temp_store()
+    route, rejected = router.choose(
+        "text_to_video", {"duration": "5", "resolution": "1080p", "max_cost": 0.1}, CREDENTIALS
+    )
+    assert route is None
+    assert rejected
+
+    route, _ = router.choose(
+        "text_to_video", {"duration": "5", "max_latency": 250}, CREDENTIALS
+    )
+    # 默认估算 p95 = 2 × p50，只有火山方舟（默认 120 秒）满足
+    assert route["provider"] == "volcengine"
+    print("✅ 约束生效")
+
+
+def test_configured_prices():
+    """测试凭证覆盖单价"""
+    print("=" * 60)
+    print("测试5: 凭证覆盖单价")
+    print("=" * 60)
+
+    table = router.prices({"route_prices": "wan2.6-t2v@720p=0.2, sora-2=0.05\nbad, x@4k=1, y=abc"})
+    assert table["wan2.6-t2v"] == {"720p": 0.2, "1080p": 1.0}
+    assert table["sora-2"] == {"480p": 0.05, "720p": 0.05, "1080p": 0.05}
+    assert "x" not in table and "y" not in table and "bad" not in table
+    assert router.PRICES["wan2.6-t2v"]["720p"] == 0.6, "不应修改内置参考价"
+
+    _use_temp_store()
+    # 覆盖后 wan2.5 最便宜，费用优先选中它
+    route, _ = router.choose(
+        "text_to_video",
+        {"duration": "5", "resolution": "720p", "route_objective": "cost"},
+        {**CREDENTIALS, "route_prices": "wan2.5-t2v-preview=0.01"},
+    )
+    assert route["model"] == "wan2.5-t2v-preview" and route["cost"] == 0.05
+
+    # wan2.5-i2v-preview 只支持 5 秒
+    route, rejected = router.choose(
+        "image_to_video", {"duration": "10", "_image_url": "https://example.com/a.png"}, {"aliyun_api_key": "sk"}
+    )
+    assert route["model"] == "wan2.6-i2v"
+    assert any("wan2.5-i2v-preview" in reason for reason in rejected)
+    print("✅ 凭证单价生效")
+
+
+def main():
+    test_capability_filter()
+    test_objectives()
+    test_circuit_breaker()
+    test_constraints()
+    test_configured_prices()
+    print("\n🎉 所有测试通过！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+配音时长预测测试脚本
+
+测试：
+1. 朗读时间估算：中文、英文、数字、标点、参数后缀
+2. 按模型学习校正系数（忽略上下限样本）
+3. 校正样本持久化（多进程记录不丢失）
+"""
+
+import math
+import multiprocessing
+import os
+import tempfile
+
+os.environ["AI_VIDEO_SPEECH_STORE"] = os.path.join(tempfile.mkdtemp(), "speech.json")
+
+from utils import speech
+
+
+def _factor(model: str) -> float:
+    return speech.predict_duration("", model)[1]["factor"]
+
+
+def test_estimate():
+    """测试朗读时间估算"""
+    print("=" * 60)
+    print("测试1: 朗读时间估算")
+    print("=" * 60)
+
+    plain = speech.estimate("今天天气很好我们去海边")
+    assert plain == round(11 * speech.CJK_SECONDS, 2)
+    # 句中标点增加停顿，句末标点不计
+    assert speech.estimate("今天天气很好，我们去海边。") == round(plain + speech.CLAUSE_PAUSE, 2)
+    # 数字按位计，小数点读作"点"而不是句末停顿
+    assert speech.estimate("增长12.5") == round(2 * speech.CJK_SECONDS + 3 * speech.DIGIT_SECONDS + speech.CJK_SECONDS, 2)
+    # 英文按音节计：hello(2) world(1) make(1)
+    assert speech.estimate("hello world make") == round(4 * speech.SYLLABLE_SECONDS, 2)
+    # 参数后缀不计入
+    assert speech.estimate("清晨的海边 --rs 720p --dur 5") == speech.estimate("清晨的海边")
+    print("✅ 估算正确")
+
+    duration, detail = speech.predict_duration("你好", "model-a")
+    assert duration == speech.MIN_DURATION and detail["factor"] == 1.0
+    duration, _ = speech.predict_duration("很长的旁白" * 40, "model-a")
+    assert duration == speech.MAX_DURATION
+    print("✅ 时长限制在范围内")
+
+
+def test_learning():
+    """测试校正系数学习"""
+    print("\n" + "=" * 60)
+    print("测试2: 校正系数")
+    print("=" * 60)
+
+    assert _factor("model-b") == 1.0
+    # 实际朗读比估算慢 40%
+    for _ in range(30):
+        assert speech.observe("model-b", 5.0, 5.0 * 1.4 + speech.TAIL_MARGIN)
+    factor = _factor("model-b")
+    print(f"学习后的校正系数: {factor}")
+    assert 1.3 < factor <= 1.4
+    # 其他模型不受影响
+    assert _factor("model-a") == 1.0
+
+    # 落在上下限的样本可能被截断，不记录
+    assert not speech.observe("model-b", 5.0, speech.MAX_DURATION)
+    assert not speech.observe("model-b", 1.0, speech.MIN_DURATION)
+    assert not speech.observe("model-b", 0, 6)
+
+    # 少量样本时向 1.0 收缩
+    speech.observe("model-c", 4.0, 4.0 * 2 + speech.TAIL_MARGIN)
+    assert 1.0 < _factor("model-c") < 1.5
+
+    duration, detail = speech.predict_duration("今天天气很好，我们一起去海边看日出吧。" * 2, "model-b")
+    print(f"预测: {duration}秒 {detail}")
+    assert detail["samples"] == 30
+    assert duration == min(speech.MAX_DURATION, math.ceil(detail["speech_seconds"] * factor + speech.TAIL_MARGIN))
+    print("✅ 校正系数学习正确")
+
+
+def test_persistence():
+    """测试样本持久化与数量上限"""
+    print("\n" + "=" * 60)
+    print("测试3: 持久化")
+    print("=" * 60)
+
+    for _ in range(speech.MAX_SAMPLES + 10):
+        speech.observe("model-d", 5.0, 6.0)
+    samples = speech._load()
+    assert len(samples["model-d"]) == speech.MAX_SAMPLES
+    assert os.path.exists(os.environ["AI_VIDEO_SPEECH_STORE"])
+    print("✅ 样本已持久化并限制数量")
+
+
+def _observe_many(path: str, worker: int, count: int):
+    os.environ["AI_VIDEO_SPEECH_STORE"] = path
+    for _ in range(count):
+        speech.observe(f"model-w{worker}", 5.0, 6.0)
+
+
+def test_multiprocess():
+    """测试多进程记录样本"""
+    print("\n" + "=" * 60)
+    print("测试4: 多进程记录")
+    print("=" * 60)
+
+    path = os.environ["AI_VIDEO_SPEECH_STORE"]
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_observe_many, args=(path, worker, 10)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    samples = speech._load()
+    assert [len(samples.get(f"model-w{worker}", [])) for worker in range(4)] == [10] * 4
+    print("✅ 多进程记录的样本不丢失")
+
+
+def main():
+    test_estimate()
+    test_learning()
+    test_persistence()
+    test_multiprocess()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
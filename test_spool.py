@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+图片缓冲测试脚本
+
+测试：
+1. 小内容留在内存，超过阈值转存临时文件（mmap 读取）
+2. 分块 Base64 编码与整体编码一致
+3. 缓冲 JSON 请求体与 json.dumps 输出一致，作为文件对象读取（requests data=）
+4. chunked 流式请求体：输出一致，小片段合并成块
+"""
+
+import base64
+import json
+
+from utils import spool
+
+
+def image_bytes(size: int) -> bytes:
+    return (b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * (size // 256 + 1))[:size]
+
+
+def test_spooling():
+    """测试内存 / 临时文件切换"""
+    print("=" * 60)
+    print("测试1: 缓冲区")
+    print("=" * 60)
+
+    content = image_bytes(10_000)
+    small = spool.from_chunks([content[:4000], content[4000:]], "image/png")
+    assert not small.spooled and len(small) == 10_000
+    assert small.getvalue() == content and small.head(8) == content[:8]
+    print("✅ 小于阈值时留在内存")
+
+    content = image_bytes(300_000)
+    large = spool.SpooledBuffer("image/png", threshold=100_000)
+    for start in range(0, len(content), 64 * 1024):
+        large.write(content[start:start + 64 * 1024])
+    assert large.spooled and len(large) == len(content)
+    assert large.getvalue() == content
+    try:
+        large.write(b"more")
+        raise AssertionError("读取后应拒绝写入")
+    except ValueError:
+        pass
+    large.close()
+    assert large.closed
+    print("✅ 超过阈值转存临时文件，读取时 mmap")
+
+    empty = spool.SpooledBuffer(threshold=0)
+    empty.write(b"")
+    assert empty.getvalue() == b"" and list(empty.iter_base64()) == []
+    print("✅ 空内容")
+
+
+def test_base64():
+    """测试分块 Base64 编码"""
+    print("\n" + "=" * 60)
+    print("测试2: Base64")
+    print("=" * 60)
+
+    for size in (0, 1, 2, 3, 1000, 200_001):
+        content = image_bytes(size)
+        buffer = spool.from_chunks([content])
+        encoded = b"".join(buffer.iter_base64(chunk_size=3000))
+        assert encoded == base64.b64encode(content), size
+        assert buffer.base64_length() == len(encoded)
+        value = spool.Base64Value(buffer, "data:image/png;base64,")
+        assert len(value) == len("data:image/png;base64,") + len(encoded)
+        assert len(spool.Base64Value(buffer)) == len(encoded)
+    print("✅ 分块编码与整体编码一致，len() 为编码后长度")
+
+
+def test_encode_json():
+    """测试流式 JSON 请求体"""
+    print("\n" + "=" * 60)
+    print("测试3: JSON 请求体")
+    print("=" * 60)
+
+    content = image_bytes(150_000)
+    buffer = spool.SpooledBuffer("image/png", threshold=50_000)
+    buffer.write(content)
+    data_url = "data:image/png;base64," + base64.b64encode(content).decode("ascii")
+    payload = {
+        "model": "doubao-seedream-4-5-251128",
+        "prompt": "海边日落 \"引号\"\n换行",
+        "image": [spool.Base64Value(buffer, "data:image/png;base64,"), "https://example.com/a.png"],
+        "n": 1, "seed": None, "guidance_scale": 7.5, "watermark": False,
+    }
+    expected = {**payload, "image": [data_url, "https://example.com/a.png"]}
+
+    assert spool.contains_values(payload)
+    assert not spool.contains_values(expected)
+    body = spool.encode_json(payload)
+    assert body.read() == json.dumps(expected).encode("ascii")
+    assert len(body) == len(json.dumps(expected))
+    print("✅ 与 json.dumps 输出一致")
+
+    threshold = spool.SPOOL_THRESHOLD
+    spool.SPOOL_THRESHOLD = 100_000
+    try:
+        body = spool.encode_json(payload)
+    finally:
+        spool.SPOOL_THRESHOLD = threshold
+    assert body.spooled, "大请求体应转存临时文件"
+    print("✅ 大请求体转存临时文件")
+
+    # 文件对象读取：requests 按 len() 设置 Content-Length，再分块 read()
+    body.seek(0)
+    chunks = []
+    while True:
+        chunk = body.read(8192)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    assert b"".join(chunks) == json.dumps(expected).encode("ascii")
+    assert body.tell() == len(body)
+    body.close()
+    buffer.close()
+    print("✅ 文件方式分块读取")
+
+
+def test_stream_json():
+    """测试 chunked 流式请求体"""
+    print("\n" + "=" * 60)
+    print("测试4: 流式请求体")
+    print("=" * 60)
+
+    images = [spool.from_chunks([image_bytes(size)]) for size in (10, 100_000, 300_000)]
+    payload = {
+        "model": "doubao-seedream-4-5-251128",
+        "prompt": "参考图生图",
+        "image": [spool.Base64Value(image, "data:image/png;base64,") for image in images],
+        "size": "2k",
+    }
+    expected = json.dumps({
+        **payload,
+        "image": [
+            "data:image/png;base64," + base64.b64encode(image.getvalue()).decode("ascii")
+            for image in images
+        ],
+    }).encode("ascii")
+
+    chunks = list(spool.stream_json(payload))
+    assert b"".join(chunks) == expected
+    # 除最后一块外每块至少 WRITE_CHUNK，JSON 片段不会各自成为一个 chunk
+    assert all(len(chunk) >= spool.WRITE_CHUNK for chunk in chunks[:-1])
+    assert max(len(chunk) for chunk in chunks) <= spool.ENCODE_CHUNK // 3 * 4 + spool.WRITE_CHUNK
+    assert len(chunks) < 20, len(chunks)
+    # 生成器只在发送时编码，可重复生成（411 时改用 encode_json 重发）
+    assert b"".join(spool.stream_json(payload)) == expected
+    with spool.encode_json(payload) as body:
+        assert body.read() == expected
+    for image in images:
+        image.close()
+    print(f"✅ 输出一致，{len(expected)} 字节分 {len(chunks)} 块发送")
+
+
+def main():
+    test_spooling()
+    test_base64()
+    test_encode_json()
+    test_stream_json()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+本地任务登记表测试脚本
+
+测试：
+1. 任务登记与查询
+2. 跨调用累计等待时间
+3. 按请求指纹找回未完成任务
+4. 多进程并发写入不丢失更新，读取缓存随文件变化失效
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+
+from utils import task_store
+
+
+def _use_temp_store():
+    path = os.path.join(tempfile.mkdtemp(), "tasks.json")
+    os.environ["AI_VIDEO_TASK_STORE"] = path
+    return path
+
+
+def test_record_and_get():
+    """测试任务登记与查询"""
+    print("=" * 60)
+    print("测试1: 任务登记与查询")
+    print("=" * 60)
+
+    path = _use_temp_store()
+    task_store.record("cgt-001", provider="volcengine", model="doubao-seedance-1-5-pro-251215")
+    entry = task_store.get("cgt-001")
+
+    assert os.path.exists(path)
+    assert entry["provider"] == "volcengine"
+    assert entry["status"] == "pending"
+    assert entry["waited_seconds"] == 0
+    assert task_store.get("missing") is None
+
+    # 更新状态不覆盖已有字段
+    task_store.record("cgt-001", status="running")
+    entry = task_store.get("cgt-001")
+    assert entry["status"] == "running"
+    assert entry["model"] == "doubao-seedance-1-5-pro-251215"
+    print("✅ 登记与查询正确")
+
+
+def test_wait_accumulates():
+    """测试累计等待时间"""
+    print("=" * 60)
+    print("测试2: 跨调用累计等待时间")
+    print("=" * 60)
+
+    _use_temp_store()
+    task_store.record("sora-002", provider="jxincm", model="sora-2")
+    task_store.add_wait("sora-002", 480)
+    assert task_store.add_wait("sora-002", 300.5) == 780.5
+    assert task_store.get("sora-002")["waited_seconds"] == 780.5
+    # 未登记的任务不累计
+    assert task_store.add_wait("missing", 10) == 0
+    print("✅ 等待时间跨调用累计")
+
+
+def test_find_unfinished():
+    """测试按请求指纹找回未完成任务"""
+    print("=" * 60)
+    print("测试3: 按请求指纹找回未完成任务")
+    print("=" * 60)
+
+    _use_temp_store()
+    key = task_store.fingerprint("text_to_video", "aliyun", "wan2.6-t2v", "一只猫", None, "")
+    other = task_store.fingerprint("text_to_video", "aliyun", "wan2.6-t2v", "一只狗", None, "")
+    assert key != other
+
+    task_store.record("ali-1", provider="aliyun", fingerprint=key, status="succeeded")
+    assert task_store.find_unfinished(key) is None
+
+    task_store.record("ali-2", provider="aliyun", fingerprint=key, status="running")
+    assert task_store.find_unfinished(key)["task_id"] == "ali-2"
+    assert task_store.find_unfinished(other) is None
+
+    # 已放弃（平台无法取消）的任务不再找回，但仍计入进行中的任务
+    task_store.record("ali-2", status=task_store.ABANDONED)
+    assert task_store.find_unfinished(key) is None
+    assert [entry["task_id"] for entry in task_store.unfinished("aliyun")] == ["ali-2"]
+    assert "finished_at" not in task_store.get("ali-2")
+    print("✅ 只找回相同请求且未完成的任务")
+
+
+def _record_many(path: str, worker: int, count: int):
+    os.environ["AI_VIDEO_TASK_STORE"] = path
+    for i in range(count):
+        task_store.record(f"w{worker}-{i}", provider="aliyun")
+        task_store.add_wait("shared", 1)
+
+
+def test_multiprocess():
+    """测试多进程写入与读取缓存"""
+    print("=" * 60)
+    print("测试4: 多进程写入")
+    print("=" * 60)
+
+    path = _use_temp_store()
+    task_store.record("shared", provider="aliyun")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_record_many, args=(path, worker, 20)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f)
+    assert len(records) == 1 + 4 * 20, len(records)
+    assert records["shared"]["waited_seconds"] == 4 * 20
+    # 其他进程写入后，本进程的读取缓存失效
+    assert task_store.get("shared")["waited_seconds"] == 4 * 20
+    assert task_store._load() is task_store._load(), "文件未变化时应复用缓存"
+    print("✅ 多进程更新不丢失，读取缓存随文件变化失效")
+
+
+def main():
+    test_record_and_get()
+    test_wait_accumulates()
+    test_find_unfinished()
+    test_multiprocess()
+    print("\n🎉 所有测试通过！")
+
+
+if __name__ == "__main__":
+    main()
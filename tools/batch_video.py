@@ -0,0 +1,397 @@
+"""
+批量视频生成工具 (Batch Video)
+
+分镜脚本通常需要 10~40 个镜头。原先在 Dify 迭代节点中逐个调用【视频生成】，
+总耗时是所有镜头耗时之和。本工具一次接收全部镜头：
+1. 按平台并发上限（PROVIDER_CONCURRENCY）并行提交，名额释放后立即补充提交
+2. 所有进行中的任务一起轮询（并行查询）
+3. 每个镜头完成时立即输出结果
+4. 最后输出按镜头顺序排列的清单（manifest）
+
+总耗时接近最慢的单个镜头，而不是所有镜头之和。
+
+提交逻辑复用【视频生成】工具各平台的实现（不等待完成），任务同样登记到本地任务登记表，
+超时未完成的镜头可用【查询任务状态】或【视频生成】的续等任务ID继续获取结果。
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Generator
+
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from tools import text_to_video
+from utils import breaker, http_client, keypool, output, router, task_api, task_store
+
+
+class BatchVideoTool(text_to_video.TextToVideoTool):
+    """批量视频生成工具 - 按平台限流并行提交、统一轮询"""
+
+    # 各平台同时进行中的任务上限（平台账号默认并发配额的保守值）
+    PROVIDER_CONCURRENCY = {
+        "aliyun": 2,
+        "volcengine": 5,
+        "jxincm": 3,
+    }
+    # 单次调用最多镜头数
+    MAX_SCENES = 50
+    # 并行提交的工作线程数
+    MAX_WORKERS = 8
+    # 批量等待上限（秒）- Dify 插件有 10 分钟硬性超时
+    BATCH_MAX_WAIT = 480
+    # 主循环间隔（秒）：收取提交结果的频率，任务查询仍按 POLL_INTERVAL
+    TICK_INTERVAL = 1
+    # 等待超时后，等待已发出的提交返回任务 ID 的最长时间（秒）
+    DRAIN_WAIT = 30
+    # 整体进度的输出间隔（秒）
+    REPORT_INTERVAL = 30
+
+    @output.compactable
+    def _invoke(
+        self, tool_parameters: dict[str, Any]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """批量生成视频"""
+        scenes, error = self._parse_scenes(tool_parameters.get("scenes", ""))
+        if error:
+            yield self.create_text_message(f"❌ 错误：{error}")
+            yield self.create_json_message({"success": False, "error_message": error})
+            return
+
+        entries = [self._plan_scene(index, scene, tool_parameters) for index, scene in enumerate(scenes)]
+        limits = self._concurrency_limits(tool_parameters)
+
+        lines = "\n".join(
+            f"   {entry['index'] + 1}. [{entry['provider'] or '-'}] {entry['prompt'][:30]}"
+            for entry in entries
+        )
+        yield self.create_text_message(
+            f"🎬 **批量生成视频** - 共 {len(entries)} 个镜头\n"
+            f"🚦 并发上限: {', '.join(f'{p}={n}' for p, n in limits.items())}\n"
+            f"{lines}"
+        )
+        for entry in entries:
+            if entry["status"] == "failed":
+                yield self.create_text_message(f"❌ 镜头 {entry['index'] + 1}: {entry['error_message']}")
+
+        yield from self._run_batch(entries, limits)
+
+        succeeded = sum(1 for entry in entries if entry["status"] == "succeeded")
+        manifest = [
+            {key: entry[key] for key in (
+                "index", "prompt", "provider", "model", "task_id", "status", "video_url",
+                "error_message", "elapsed_seconds",
+            )}
+            for entry in entries
+        ]
+        yield self.create_text_message(
+            f"🏁 **批量生成结束**: 成功 {succeeded}/{len(entries)}\n" + "\n".join(
+                f"   {item['index'] + 1}. {self._status_icon(item['status'])} "
+                f"{item['video_url'] or item['error_message'] or item['task_id'] or item['status']}"
+                for item in manifest
+            )
+        )
+        yield self.create_json_message({
+            "success": succeeded == len(entries),
+            "total": len(entries),
+            "succeeded": succeeded,
+            "scenes": manifest,
+        })
+
+    @staticmethod
+    def _status_icon(status: str) -> str:
+        return {"succeeded": "✅", "failed": "❌", "canceled": "🛑"}.get(status, "⏳")
+
+    def _parse_scenes(self, raw: Any) -> tuple[list[dict], str]:
+        """
+        解析镜头列表
+
+        支持 JSON 数组（字符串或对象）：[{"prompt", "image", "duration", "seed"}, ...]，
+        也支持每行一个提示词的纯文本。
+        """
+        if isinstance(raw, str):
+            text = raw.strip()
+            if not text:
+                return [], "镜头列表不能为空"
+            if text.startswith("["):
+                try:
+                    raw = json.loads(text)
+                except json.JSONDecodeError as e:
+                    return [], f"镜头列表 JSON 格式无效: {e}"
+            else:
+                raw = [{"prompt": line.strip()} for line in text.splitlines() if line.strip()]
+        if not isinstance(raw, list):
+            return [], "镜头列表必须是数组"
+
+        scenes = []
+        for i, item in enumerate(raw):
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not isinstance(item, dict) or not str(item.get("prompt", "")).strip():
+                return [], f"第 {i + 1} 个镜头缺少 prompt"
+            scenes.append(item)
+        if len(scenes) > self.MAX_SCENES:
+            return [], f"单次最多 {self.MAX_SCENES} 个镜头，当前 {len(scenes)} 个"
+        return scenes, ""
+
+    def _plan_scene(self, index: int, scene: dict, tool_parameters: dict) -> dict:
+        """确定镜头的平台、模型和提交参数"""
+        prompt = str(scene["prompt"]).strip()
+        image_url, img_error = self._extract_image_url(scene.get("image") or scene.get("image_url"))
+        params = {
+            "prompt": prompt,
+            "duration": str(scene.get("duration") or tool_parameters.get("duration") or 5),
+            "resolution": tool_parameters.get("resolution") or "720p",
+            "aspect_ratio": tool_parameters.get("aspect_ratio") or "16:9",
+            "enable_audio": tool_parameters.get("enable_audio", False),
+            "route_objective": tool_parameters.get("route_objective"),
+            "wait_for_completion": False,
+            "_image_url": image_url,
+        }
+        if scene.get("seed") is not None:
+            params["seed"] = scene["seed"]
+
+        entry = {
+            "index": index,
+            "prompt": prompt,
+            "provider": "",
+            "model": "",
+            "task_id": "",
+            "status": "failed",
+            "video_url": "",
+            "error_message": "",
+            "elapsed_seconds": None,
+            "params": params,
+        }
+        if img_error:
+            entry["error_message"] = img_error
+            return entry
+
+        provider = tool_parameters.get("provider") or "auto"
+        model = (tool_parameters.get("model") or "").strip()
+        if provider == "auto":
+            route, rejected = router.choose("text_to_video", params, self.runtime.credentials)
+            if route is None:
+                entry["error_message"] = "自动路由失败：" + "; ".join(rejected[:3])
+                return entry
+            provider, model = route["provider"], route["model"]
+        elif provider == "aliyun" and image_url:
+            entry["error_message"] = "阿里云百炼不支持图片镜头，请使用火山方舟 / JXINCM 或自动选择"
+            return entry
+        elif not model:
+            model = self._default_model(provider, params)
+
+        if not self.runtime.credentials.get(f"{provider}_api_key"):
+            entry["error_message"] = f"未配置 {provider} API Key"
+            return entry
+
+        params["provider"] = provider
+        params["model"] = model
+        params["_fingerprint"] = task_store.fingerprint(
+            "text_to_video", provider, model, prompt, None, image_url
+        )
+        entry.update(provider=provider, model=model, status="queued")
+        return entry
+
+    @staticmethod
+    def _default_model(provider: str, params: dict) -> str:
+        """未指定模型时，选择目录中第一个支持该时长 / 图片输入的模型"""
+        try:
+            duration = int(params["duration"])
+        except (TypeError, ValueError):
+            duration = 5
+        candidates = [c for c in router.CATALOG["text_to_video"] if c["provider"] == provider]
+        for candidate in candidates:
+            if duration in candidate["durations"] and (candidate["image"] or not params["_image_url"]):
+                return candidate["model"]
+        return candidates[0]["model"] if candidates else ""
+
+    def _concurrency_limits(self, tool_parameters: dict) -> dict[str, int]:
+        # 配置了多个 API Key 时，并发上限按 Key 数量放大
+        limits = {
+            provider: limit * max(1, len(keypool.keys(self.runtime.credentials, provider)))
+            for provider, limit in self.PROVIDER_CONCURRENCY.items()
+        }
+        try:
+            cap = int(tool_parameters.get("max_concurrency") or 0)
+        except (TypeError, ValueError):
+            cap = 0
+        if cap > 0:
+            limits = {provider: min(limit, cap) for provider, limit in limits.items()}
+        return limits
+
+    def _submit_scene(self, entry: dict) -> tuple[str, str]:
+        """
+        提交单个镜头（在工作线程中执行）
+
+        Returns:
+            (任务ID, 错误信息)
+        """
+        provider = entry["provider"]
+        if provider == "aliyun":
+            messages = self._invoke_aliyun(entry["params"])
+        elif provider == "volcengine":
+            messages = self._invoke_volcengine(entry["params"])
+        else:
+            messages = self._invoke_jxincm(entry["params"])
+
+        error = "提交失败"
+        try:
+            for message in messages:
+                payload = task_api.get_json_object(message)
+                if payload is not None:
+                    if payload.get("success") and payload.get("task_id"):
+                        return payload["task_id"], ""
+                    error = payload.get("error_message") or error
+                    continue
+                text = task_api.get_text(message)
+                if text.startswith("❌"):
+                    error = text.lstrip("❌ ")
+        except Exception as e:
+            error = str(e)
+        return "", error
+
+    def _run_batch(
+        self, entries: list[dict], limits: dict[str, int]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        按平台并发上限提交并统一轮询，完成一个输出一个
+
+        提交在线程池中执行，每轮只收取已返回的提交：个别提交缓慢时不阻塞其他镜头的提交、轮询和输出。
+        """
+        queued = [entry for entry in entries if entry["status"] == "queued"]
+        submitting: dict = {}        # 正在提交的镜头
+        active: list[dict] = []      # 已提交、等待完成的镜头
+        start_time = time.time()
+        last_poll = 0.0
+        last_report = start_time
+
+        submit_pool = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        # 查询使用独立的线程池（大小为同时进行中的任务上限），不与缓慢的提交争抢线程
+        poll_pool = ThreadPoolExecutor(max_workers=max(1, min(sum(limits.values()), len(queued))))
+        try:
+            while queued or submitting or active:
+                # 1. 有空闲名额的平台补充提交（按镜头顺序）
+                in_flight = active + list(submitting.values())
+                for entry in list(queued):
+                    provider = entry["provider"]
+                    if sum(1 for e in in_flight if e["provider"] == provider) < limits.get(provider, 1):
+                        queued.remove(entry)
+                        in_flight.append(entry)
+                        entry["submitted_at"] = time.time()
+                        submitting[submit_pool.submit(self._submit_scene, entry)] = entry
+
+                # 2. 收取已返回的提交结果
+                for future in [f for f in submitting if f.done()]:
+                    entry = submitting.pop(future)
+                    yield from self._accept_submission(entry, *future.result(), active)
+
+                # 3. 定期并行查询进行中的任务
+                if active and time.time() - last_poll >= self.POLL_INTERVAL:
+                    last_poll = time.time()
+                    results = poll_pool.map(
+                        lambda e: task_api.fetch_status(
+                            e["provider"], self._api_base(e["provider"], e["task_id"]),
+                            keypool.for_task(self.runtime.credentials, e["provider"], e["task_id"]),
+                            e["task_id"],
+                        ),
+                        list(active),
+                    )
+                    for entry, (status, result) in zip(list(active), results):
+                        if status not in task_api.FINAL_STATUSES:
+                            if status != "unknown":
+                                entry["status"] = status
+                            continue
+                        active.remove(entry)
+                        yield from self._finish_scene(entry, status, result)
+
+                if time.time() - start_time >= self.BATCH_MAX_WAIT:
+                    break
+
+                if time.time() - last_report >= self.REPORT_INTERVAL:
+                    last_report = time.time()
+                    done = sum(1 for e in entries if e["status"] in task_api.FINAL_STATUSES)
+                    yield self.create_text_message(
+                        f"⏳ 已完成 {done}/{len(entries)}，进行中 {len(active)}，"
+                        f"提交中 {len(submitting)}，待提交 {len(queued)} ({int(time.time() - start_time)}秒)"
+                    )
+                http_client.sleep(self.TICK_INTERVAL)
+
+            if submitting:
+                # 等待超时：尚未开始的提交直接取消；已发出的提交仍会在平台创建付费任务，
+                # 短暂等待以取得任务 ID
+                for future in [f for f in submitting if f.cancel()]:
+                    queued.append(submitting.pop(future))
+                wait(list(submitting), timeout=self.DRAIN_WAIT)
+                for future in [f for f in submitting if f.done()]:
+                    entry = submitting.pop(future)
+                    yield from self._accept_submission(entry, *future.result(), active)
+        except GeneratorExit:
+            # 调用被中止（如工作流被停止）：取消进行中的任务，释放平台配额与并发名额
+            for entry in active:
+                self._cancel_abandoned(
+                    entry["provider"],
+                    keypool.for_task(self.runtime.credentials, entry["provider"], entry["task_id"]),
+                    entry["task_id"],
+                )
+            raise
+        finally:
+            # 仍未返回的提交在后台完成后立即取消，避免产生无人等待的付费任务
+            for future, entry in submitting.items():
+                future.add_done_callback(
+                    lambda f, provider=entry["provider"]: self._cancel_late_submission(provider, f)
+                )
+            submit_pool.shutdown(wait=False, cancel_futures=True)
+            poll_pool.shutdown(wait=False)
+
+        for entry in active:
+            entry["error_message"] = "等待超时，请使用【查询任务状态】获取结果"
+            task_store.add_wait(entry["task_id"], time.time() - entry["submitted_at"])
+        for entry in queued:
+            entry.update(status="not_submitted", error_message="等待超时，未提交")
+        for entry in submitting.values():
+            entry.update(status="submitting", error_message=(
+                "等待超时，提交未返回（JXINCM 无法取消，任务创建后仍会计费）"
+                if entry["provider"] == "jxincm"
+                else "等待超时，提交未返回，任务创建后将自动取消"
+            ))
+
+    def _accept_submission(
+        self, entry: dict, task_id: str, error: str, active: list[dict]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """记录镜头的提交结果：成功的加入轮询列表，失败的计入平台熔断器"""
+        if task_id:
+            entry.update(task_id=task_id, status="pending")
+            active.append(entry)
+            yield self.create_text_message(
+                f"📤 镜头 {entry['index'] + 1} 已提交 ({entry['provider']}) `{task_id}`"
+            )
+        else:
+            breaker.get(entry["provider"]).record_failure()
+            entry.update(status="failed", error_message=error)
+            yield self.create_text_message(f"❌ 镜头 {entry['index'] + 1} 提交失败: {error}")
+
+    def _finish_scene(
+        self, entry: dict, status: str, result: dict
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """记录已结束的镜头并立即输出结果"""
+        video_url, error = task_api.extract_video(entry["provider"], result)
+        elapsed = round(time.time() - entry["submitted_at"], 1)
+        entry.update(status=status, video_url=video_url, elapsed_seconds=elapsed)
+        task_store.record(entry["task_id"], status=status)
+        task_store.add_wait(entry["task_id"], elapsed)
+
+        if status == "succeeded":
+            breaker.get(entry["provider"]).record_success()
+            yield self.create_text_message(
+                f"✅ 镜头 {entry['index'] + 1} 完成 ({elapsed}秒)\n📹 {video_url}"
+            )
+            if video_url:
+                yield self.create_image_message(video_url)
+        else:
+            if status == "failed":
+                breaker.get(entry["provider"]).record_failure()
+            entry["error_message"] = error or f"任务状态: {status}"
+            yield self.create_text_message(
+                f"❌ 镜头 {entry['index'] + 1} {status}: {entry['error_message']}"
+            )
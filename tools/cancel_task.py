@@ -0,0 +1,98 @@
+"""
+任务取消工具 (Cancel Task)
+
+支持三大平台：
+- 阿里云百炼：POST /tasks/{task_id}/cancel（仅排队中的任务可取消）
+- 火山方舟：DELETE /contents/generations/tasks/{task_id}（仅排队中的任务可取消）
+- JXINCM：未提供取消接口，仅在本地标记为已取消（不再续等）
+
+取消排队中的任务可以释放平台配额与并发名额，让后续任务尽快开始。
+"""
+
+from typing import Any, Generator
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils import endpoints, keypool, output, task_api, task_store
+
+
+class CancelTaskTool(Tool):
+    """任务取消工具 - 三平台支持"""
+
+    ALIYUN_API_BASE = "https://dashscope.aliyuncs.com/api/v1"
+    VOLCENGINE_API_BASE = "https://ark.cn-beijing.volces.com/api/v3"
+    JXINCM_API_BASE = "https://api.jxincm.cn/v1"
+
+    PROVIDER_NAMES = {
+        "aliyun": "阿里云百炼",
+        "volcengine": "火山方舟",
+        "jxincm": "JXINCM (Sora2)",
+    }
+
+    @output.compactable
+    def _invoke(
+        self, tool_parameters: dict[str, Any]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """取消任务"""
+        task_id = tool_parameters.get("task_id", "").strip()
+        if not task_id:
+            yield self.create_text_message("❌ 错误：任务ID不能为空")
+            return
+
+        # 本地登记过的任务以登记的平台为准
+        record = task_store.get(task_id) or {}
+        provider = record.get("provider") or tool_parameters.get("provider", "aliyun")
+        if provider not in self.PROVIDER_NAMES:
+            yield self.create_text_message(f"❌ 错误：不支持的平台 {provider}")
+            return
+
+        api_key = keypool.for_task(self.runtime.credentials, provider, task_id)
+        if not api_key:
+            yield self.create_text_message(f"❌ 错误：请配置{self.PROVIDER_NAMES[provider]} API Key")
+            return
+
+        yield self.create_text_message(
+            f"🛑 **取消任务**\n\n"
+            f"🏢 平台: {self.PROVIDER_NAMES[provider]}\n"
+            f"🔖 任务ID: `{task_id}`"
+        )
+
+        if provider == "jxincm":
+            task_store.record(task_id, provider=provider, status=task_store.ABANDONED)
+            yield self.create_text_message(
+                "⚠️ JXINCM 未提供取消接口，已在本地标记为放弃（不再续等），平台侧任务仍会继续执行"
+            )
+            yield self.create_json_message({
+                "success": False,
+                "provider": provider,
+                "task_id": task_id,
+                "status": task_store.ABANDONED,
+                "error_message": "平台不支持取消，任务仍在执行，仅本地标记为放弃"
+            })
+            return
+
+        default = self.ALIYUN_API_BASE if provider == "aliyun" else self.VOLCENGINE_API_BASE
+        api_base = endpoints.for_task(self.runtime.credentials, provider, task_id, default)
+        cancelled, error = task_api.cancel_task(
+            provider, api_base, api_key, task_id
+        )
+
+        if cancelled:
+            yield self.create_text_message("✅ 任务已取消")
+            yield self.create_json_message({
+                "success": True,
+                "provider": provider,
+                "task_id": task_id,
+                "status": "canceled"
+            })
+        else:
+            yield self.create_text_message(
+                f"❌ 取消失败: {error}\n\n"
+                f"💡 提示: 平台仅支持取消排队中的任务，生成中的任务无法取消"
+            )
+            yield self.create_json_message({
+                "success": False,
+                "provider": provider,
+                "task_id": task_id,
+                "error_message": error
+            })
@@ -0,0 +1,160 @@
+"""
+视频拼接工具 (Concat Videos)
+
+分镜生成完成后，原先要在下游下载全部片段再用 ffmpeg 转码拼接。
+同一平台 / 同一模型生成的片段编码参数相同，本工具直接改写 MP4 box 无损拼接（见 utils/mp4.py）：
+- 只按 Range 读取各片段的 moov，样本表合并后重写块偏移
+- 媒体数据分块流式复制，不解码、不转码，内存占用与视频大小无关
+- 输出单个 faststart MP4（moov 在前，可边下边播）
+
+配置了暂存存储时从临时文件流式上传拼接结果并返回签名 URL；否则以文件形式返回，
+此时结果需整块读入内存，超过 MAX_BLOB_SIZE 时报错并提示配置暂存存储。
+编码参数不同的片段（不同平台 / 模型 / 分辨率）无法无损拼接，会提示具体是哪个片段。
+"""
+
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generator
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils import mp4, output, staging
+
+
+class ConcatVideosTool(Tool):
+    """视频拼接工具 - MP4 无损拼接"""
+
+    # 单次最多拼接片段数
+    MAX_CLIPS = 50
+    # 并行读取片段 moov 的线程数
+    MAX_WORKERS = 8
+    # 未配置（或上传失败）暂存存储时，以文件形式返回的结果大小上限（字节）
+    MAX_BLOB_SIZE = 64 * 1024 * 1024
+
+    @output.compactable
+    def _invoke(
+        self, tool_parameters: dict[str, Any]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """拼接视频"""
+        urls, error = self._parse_videos(tool_parameters.get("videos", ""))
+        if error:
+            yield self.create_text_message(f"❌ 错误：{error}")
+            yield self.create_json_message({"success": False, "error_message": error})
+            return
+
+        filename = (tool_parameters.get("filename") or "").strip() or "concat.mp4"
+        if not filename.lower().endswith(".mp4"):
+            filename += ".mp4"
+        yield self.create_text_message(f"🎞️ **视频拼接** - 共 {len(urls)} 个片段，正在读取片段信息...")
+
+        with tempfile.TemporaryFile() as out:
+            start_time = time.time()
+            movies: list = [None] * len(urls)
+            try:
+                with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                    results = list(executor.map(self._open_movie, urls))
+                movies = [movie for movie, _ in results]
+                for index, (_, error) in enumerate(results):
+                    if error:
+                        raise mp4.Mp4Error(f"第 {index + 1} 个片段读取失败: {error}")
+                info = mp4.concat(movies, out)
+            except Exception as e:
+                yield self.create_text_message(f"❌ 拼接失败: {e}")
+                yield self.create_json_message({"success": False, "error_message": str(e)})
+                return
+            finally:
+                for movie in movies:
+                    if movie is not None:
+                        movie.source.close()
+
+            elapsed = round(time.time() - start_time, 1)
+            yield self.create_text_message(
+                f"✅ 拼接完成 ({elapsed}秒)\n"
+                f"⏱️ 总时长: {info['duration']}秒\n"
+                f"📦 文件大小: {info['size'] / 1024 / 1024:.1f} MB"
+            )
+
+            video_url = ""
+            stager = staging.from_credentials(self.runtime.credentials)
+            if stager is not None:
+                try:
+                    video_url = stager.stage_file(out, "video/mp4")
+                except Exception as e:
+                    yield self.create_text_message(f"⚠️ 上传暂存存储失败: {e}，改为返回文件")
+
+            if video_url:
+                yield self.create_text_message(f"📹 {video_url}")
+                yield self.create_image_message(video_url)
+            elif info["size"] > self.MAX_BLOB_SIZE:
+                error = (
+                    f"拼接结果 {info['size'] / 1024 / 1024:.1f} MB 超过文件返回上限 "
+                    f"{self.MAX_BLOB_SIZE // 1024 // 1024} MB，请配置图片暂存存储以返回签名 URL"
+                )
+                yield self.create_text_message(f"❌ {error}")
+                yield self.create_json_message({"success": False, "error_message": error})
+                return
+            else:
+                out.seek(0)
+                yield self.create_blob_message(
+                    blob=out.read(),
+                    meta={"mime_type": "video/mp4", "filename": filename}
+                )
+        yield self.create_json_message({
+            "success": True,
+            "video_url": video_url,
+            "filename": filename,
+            "clips": info["clips"],
+            "duration": info["duration"],
+            "size": info["size"],
+            "elapsed_seconds": elapsed,
+        })
+
+    def _parse_videos(self, raw: Any) -> tuple[list[str], str]:
+        """
+        解析片段列表
+
+        支持 JSON 数组（URL 字符串或含 video_url 的对象）、【批量视频生成】/【图片→视频流水线】
+        输出的清单 JSON（scenes / frames），也支持每行一个 URL。
+        """
+        if isinstance(raw, str):
+            text = raw.strip()
+            if not text:
+                return [], "片段列表不能为空"
+            if text[0] in "[{":
+                try:
+                    raw = json.loads(text)
+                except json.JSONDecodeError as e:
+                    return [], f"片段列表 JSON 格式无效: {e}"
+            else:
+                raw = [line.strip() for line in text.splitlines() if line.strip()]
+        if isinstance(raw, dict):
+            raw = raw.get("scenes") or raw.get("frames") or raw.get("videos") or []
+        if not isinstance(raw, list):
+            return [], "片段列表必须是数组"
+
+        urls = []
+        for i, item in enumerate(raw):
+            url = item.get("video_url", "") if isinstance(item, dict) else item
+            if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+                return [], f"第 {i + 1} 个片段没有有效的视频URL"
+            urls.append(url)
+        if not urls:
+            return [], "片段列表不能为空"
+        if len(urls) > self.MAX_CLIPS:
+            return [], f"单次最多拼接 {self.MAX_CLIPS} 个片段，当前 {len(urls)} 个"
+        return urls, ""
+
+    @staticmethod
+    def _open_movie(url: str) -> tuple[Any, str]:
+        """读取片段的 moov（在工作线程中执行），返回 (Movie, 错误信息)"""
+        source = None
+        try:
+            source = mp4.open_url(url)
+            return mp4.Movie(source), ""
+        except Exception as e:
+            if source is not None:
+                source.close()
+            return None, str(e)
@@ -11,15 +11,19 @@
 - https://github.com/wwwzhouhui/sora2 (JXINCM Sora2)
 """
 
-import time
-import base64
+import math
 import requests
 from typing import Any, Generator
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils import (
+    callbacks, fetch, http_client, image_probe, keypool, output, progress, reachability,
+    router, spool, staging, task_store, task_wait,
+)
 
-class ImageToVideoTool(Tool):
+
+class ImageToVideoTool(task_wait.TaskWaitMixin, Tool):
     """图片生成视频工具 - 三平台支持"""
 
     # ========== 阿里云百炼配置 ==========
@@ -74,6 +78,10 @@ class ImageToVideoTool(Tool):
     # 轮询配置 - Dify 插件有 10 分钟硬性超时，设置 8 分钟以留出余量
     POLL_INTERVAL = 5
     MAX_POLL_ATTEMPTS = 96  # 96 * 5 = 480秒 = 8分钟
+    # 配置回调后轮询降为兜底：每 6 个间隔（30秒）查询一次，收到回调立即查询
+    CALLBACK_FALLBACK_EVERY = 6
+    # 跨调用累计等待上限（秒）- 长任务可分多次调用续等，超过后不再继续等待
+    MAX_TOTAL_WAIT = 3600
 
     def _convert_to_internal_url(self, image_url: str) -> str:
         """将 Dify 外部文件 URL 转换为内部访问 URL"""
@@ -98,9 +106,15 @@ class ImageToVideoTool(Tool):
         except Exception:
             return image_url
 
-    def _convert_image_to_base64(self, image_url: str, with_prefix: bool = True) -> tuple[str, str]:
+    def _convert_image_to_base64(
+        self, image_url: str, with_prefix: bool = True
+    ) -> tuple[spool.Base64Value | str, str]:
         """下载图片并转换为Base64格式
         
+        配置了 Dify 内部地址时，内部地址与原地址竞速下载，先成功者胜出（见 utils/fetch.py）
+        返回的 Base64 字段值只引用图片缓冲区（大图片转存临时文件），len() 为编码后长度，
+        提交时才分块编码写入请求体（见 utils/spool.py）
+        
         Args:
             image_url: 图片URL
             with_prefix: 是否包含 data:image/...;base64, 前缀
@@ -111,39 +125,62 @@ class ImageToVideoTool(Tool):
         internal_url = self._convert_to_internal_url(image_url)
         
         try:
-            response = requests.get(internal_url, timeout=30, stream=True)
-            response.raise_for_status()
-            content_type = response.headers.get('Content-Type', 'image/jpeg')
-            if not content_type.startswith('image/'):
-                content_type = 'image/jpeg'
-            image_format = content_type.split('/')[-1].lower()
-            format_map = {'jpg': 'jpeg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
-            image_format = format_map.get(image_format, 'jpeg')
-            base64_data = base64.b64encode(response.content).decode('utf-8')
-            if with_prefix:
-                return f"data:image/{image_format};base64,{base64_data}", ""
-            else:
-                return base64_data, ""
+            content_type, buffer = fetch.fetch_buffer(
+                image_url, internal_url, timeout=30
+            )
         except Exception as e:
-            # 如果内部 URL 失败且与原 URL 不同，尝试原 URL
-            if internal_url != image_url:
-                try:
-                    response = requests.get(image_url, timeout=30, stream=True)
-                    response.raise_for_status()
-                    content_type = response.headers.get('Content-Type', 'image/jpeg')
-                    if not content_type.startswith('image/'):
-                        content_type = 'image/jpeg'
-                    image_format = content_type.split('/')[-1].lower()
-                    format_map = {'jpg': 'jpeg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
-                    image_format = format_map.get(image_format, 'jpeg')
-                    base64_data = base64.b64encode(response.content).decode('utf-8')
-                    if with_prefix:
-                        return f"data:image/{image_format};base64,{base64_data}", ""
-                    else:
-                        return base64_data, ""
-                except Exception as e2:
-                    return "", f"图片处理失败: 内部URL({internal_url})错误:{str(e)}, 原URL错误:{str(e2)}"
             return "", f"图片处理失败: {str(e)}"
+        
+        if not content_type.startswith('image/'):
+            content_type = 'image/jpeg'
+        image_format = content_type.split('/')[-1].split(';')[0].lower()
+        format_map = {'jpg': 'jpeg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
+        image_format = format_map.get(image_format, 'jpeg')
+        if with_prefix:
+            return spool.Base64Value(buffer, f"data:image/{image_format};base64,"), ""
+        else:
+            return spool.Base64Value(buffer), ""
+
+    def _probe_image_size(self, image_url: str) -> tuple[int, int] | None:
+        """
+        只读取图片头部获取显示尺寸（宽, 高），不下载完整图片（见 utils/image_probe.py）
+
+        优先使用 Dify 内部地址，失败返回 None
+        """
+        for url in dict.fromkeys((self._convert_to_internal_url(image_url), image_url)):
+            info = image_probe.probe(url)
+            if info:
+                return image_probe.display_size(info)
+        return None
+
+    def _closest_aspect_ratio(self, width: int, height: int, size_map: dict) -> str:
+        """从 size_map 中选择宽高比与图片最接近的一项（按对数比例距离）"""
+        target = math.log(width / height)
+
+        def distance(item: tuple[str, str]) -> float:
+            w, h = map(int, item[1].split("*"))
+            return abs(math.log(w / h) - target)
+
+        return min(size_map.items(), key=distance)[0]
+
+    def _stage_image(self, image_url: str) -> tuple[str, str]:
+        """
+        下载图片并暂存到配置的对象存储，返回 (签名URL, 错误信息)
+
+        未配置暂存存储时返回 ("", "")，调用方继续使用 Base64（见 utils/staging.py）
+        """
+        stager = staging.from_credentials(self.runtime.credentials)
+        if stager is None:
+            return "", ""
+        internal_url = self._convert_to_internal_url(image_url)
+        try:
+            content_type, buffer = fetch.fetch_buffer(
+                image_url, internal_url, timeout=30
+            )
+            with buffer:
+                return stager.stage_file(buffer, content_type), ""
+        except Exception as e:
+            return "", f"图片暂存失败: {str(e)}"
 
     def _is_public_accessible_url(self, url: str) -> bool:
         """判断URL是否可能被火山引擎公网访问
@@ -151,37 +188,10 @@ class ImageToVideoTool(Tool):
         注意：Dify 生成的图片 URL 通常带有签名参数，且使用非标准端口(如 8080)
         火山引擎服务器可能无法访问这些 URL，因此需要转换为 Base64
         
-        只有标准端口(80/443)的公网 URL 才认为是可直接访问的
+        只有标准端口(80/443)、且主机解析到公网 IP 的 URL 才认为是可直接访问的
+        （私有网段、回环、链路本地、CGNAT、IPv6 ULA 均视为内网，见 utils/reachability.py）
         """
-        from urllib.parse import urlparse
-        try:
-            parsed = urlparse(url)
-            host = parsed.hostname or ""
-            
-            # 私有网络地址（一定需要转 Base64）
-            private_patterns = [
-                'localhost', '127.0.0.1', '127.',  # 本地回环
-                '10.',                               # 10.0.0.0/8
-                '172.16.', '172.17.', '172.18.', '172.19.',  # 172.16.0.0/12
-                '172.20.', '172.21.', '172.22.', '172.23.', 
-                '172.24.', '172.25.', '172.26.', '172.27.', 
-                '172.28.', '172.29.', '172.30.', '172.31.', 
-                '192.168.',                          # 192.168.0.0/16
-                '169.254.',                          # 链路本地
-            ]
-            
-            for pattern in private_patterns:
-                if host.startswith(pattern) or host == pattern.rstrip('.'):
-                    return False
-            
-            # 非标准端口也需要转 Base64（火山引擎可能无法访问带签名的 Dify URL）
-            port = parsed.port
-            if port and port not in [80, 443]:
-                return False
-            
-            return True
-        except Exception:
-            return False
+        return reachability.is_public_url(url)
 
     def _extract_image_url(self, image_param: Any) -> tuple[str, str]:
         """从参数中提取图片URL，返回 (url, error)"""
@@ -209,12 +219,19 @@ class ImageToVideoTool(Tool):
         
         return "", f"不支持的图片参数类型: {type(image_param)}"
 
+    @output.compactable
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
         """执行工具调用"""
         provider = tool_parameters.get("provider", "aliyun")
         
+        # 续等已提交的任务（不重新提交）
+        resume_task_id = (tool_parameters.get("task_id") or "").strip()
+        if resume_task_id:
+            yield from self._resume_task(resume_task_id, tool_parameters)
+            return
+        
         # 兼容 image (file类型) 和 image_url (string类型)
         image_param = tool_parameters.get("image") or tool_parameters.get("image_url")
         image_url, error = self._extract_image_url(image_param)
@@ -226,14 +243,52 @@ class ImageToVideoTool(Tool):
         # 将提取的 URL 放回参数中供后续使用
         tool_parameters["image_url"] = image_url
         
+        # 自动路由：按历史耗时、平台熔断状态和参考价格选择平台与模型
+        if provider == "auto":
+            route, rejected = router.choose("image_to_video", tool_parameters, self.runtime.credentials)
+            if route is None:
+                reasons = "\n".join(f"   - {reason}" for reason in rejected)
+                yield self.create_text_message(f"❌ 自动路由失败：没有满足条件的平台/模型\n{reasons}")
+                yield self.create_json_message({
+                    "success": False,
+                    "provider": "auto",
+                    "error_message": "没有满足条件的平台/模型"
+                })
+                return
+            provider = route["provider"]
+            tool_parameters["provider"] = provider
+            tool_parameters["model"] = route["model"]
+            samples_text = f"{route['samples']}个历史样本" if route["samples"] else "无历史数据，按默认值估算"
+            cost_text = f"约 ¥{route['cost']}（按单价估算，以平台账单为准）" if route["cost"] is not None else "未知"
+            yield self.create_text_message(
+                f"🧭 **自动路由** ({'费用优先' if route['objective'] == 'cost' else '速度优先'})\n"
+                f"🏢 平台: {provider}\n"
+                f"📝 模型: {route['model']}\n"
+                f"⏱️ 预计耗时: p50 {route['p50']}秒 / p95 {route['p95']}秒 ({samples_text})\n"
+                f"💰 预计费用: {cost_text}"
+            )
+        
+        # 请求指纹 - 相同请求的未完成任务可直接续等
+        tool_parameters["_fingerprint"] = task_store.fingerprint(
+            "image_to_video", provider, tool_parameters.get("model"), tool_parameters.get("prompt"),
+            tool_parameters.get("narration"), tool_parameters.get("audio_url"), image_url
+        )
+        if tool_parameters.get("resume_pending", False):
+            pending = task_store.find_unfinished(tool_parameters["_fingerprint"])
+            if pending:
+                yield from self._resume_task(pending["task_id"], tool_parameters)
+                return
+        
         if provider == "aliyun":
-            yield from self._invoke_aliyun(tool_parameters)
+            messages = self._invoke_aliyun(tool_parameters)
         elif provider == "volcengine":
-            yield from self._invoke_volcengine(tool_parameters)
+            messages = self._invoke_volcengine(tool_parameters)
         elif provider == "jxincm":
-            yield from self._invoke_jxincm(tool_parameters)
+            messages = self._invoke_jxincm(tool_parameters)
         else:
             yield self.create_text_message(f"❌ 错误：不支持的平台 {provider}")
+            return
+        yield from self._track_submission(provider, messages)
 
     def _url_has_query_params(self, url: str) -> bool:
         """检查URL是否带有查询参数（签名等）"""
@@ -272,15 +327,15 @@ class ImageToVideoTool(Tool):
         - wan2.5-i2v-preview: 通义万相 2.5 (固定5秒)
         - wan2.6-i2v: 通义万相 2.6 (支持5/10/15秒，多分辨率)
         """
-        api_key = self.runtime.credentials.get("aliyun_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "aliyun"):
             yield self.create_text_message("❌ 错误：请配置阿里云百炼 API Key")
             return
+        api_base = self._api_base("aliyun")
         
         model = params.get("model", "wan2.5-i2v-preview")
         image_url = params.get("image_url", "")
         prompt = params.get("prompt", "让图片动起来")
-        aspect_ratio = params.get("aspect_ratio", "16:9")
+        aspect_ratio = params.get("aspect_ratio") or "auto"
         wait_for_completion = params.get("wait_for_completion", True)
         
         # 处理 duration 参数，确保空字符串或无效值使用默认值
@@ -319,9 +374,21 @@ class ImageToVideoTool(Tool):
         # 分辨率映射
         if is_wan26:
             size_map = self.ALIYUN_26_SIZE_MAP.get(resolution, self.ALIYUN_26_SIZE_MAP["720p"])
-            size = size_map.get(aspect_ratio, "1280*720")
         else:
-            size = self.ALIYUN_SIZE_MAP.get(aspect_ratio, "1280*720")
+            size_map = self.ALIYUN_SIZE_MAP
+        
+        # auto: 按图片实际宽高比选择最接近的尺寸，避免平台裁剪或拒绝
+        if aspect_ratio == "auto":
+            image_size = self._probe_image_size(image_url)
+            if image_size:
+                aspect_ratio = self._closest_aspect_ratio(*image_size, size_map)
+                yield self.create_text_message(
+                    f"📐 自动宽高比: 图片 {image_size[0]}x{image_size[1]} → {aspect_ratio}"
+                )
+            else:
+                aspect_ratio = "16:9"
+                yield self.create_text_message("⚠️ 无法读取图片尺寸，使用默认宽高比 16:9")
+        size = size_map.get(aspect_ratio, "1280*720")
         
         # 检查URL是否需要转换为Base64
         # 重要：阿里云OSS的签名URL可以直接被阿里云API访问，不需要转Base64！
@@ -329,12 +396,25 @@ class ImageToVideoTool(Tool):
         final_image_url = image_url
         final_image_base64 = ""
         used_base64 = False
+        staged_url = ""
         
         # 阿里云OSS URL可以直接使用，无需转换
         is_oss_url = self._is_aliyun_oss_url(image_url)
+        # 上游平台生成的公网图片（如图片→视频流水线中的 Seedream 结果）直接使用
+        need_conversion = not is_oss_url and not params.get("_public_image") and (
+            self._url_has_query_params(image_url) or not self._is_public_accessible_url(image_url)
+        )
+        if need_conversion:
+            # 配置了暂存存储时上传一次并使用签名 URL，避免 Base64 超出 61440 字符限制
+            staged_url, stage_error = self._stage_image(image_url)
+            if stage_error:
+                yield self.create_text_message(f"⚠️ {stage_error}，改用Base64")
         if is_oss_url:
             yield self.create_text_message(f"✅ 检测到阿里云OSS图片，直接使用URL（无需转Base64）")
-        elif self._url_has_query_params(image_url) or not self._is_public_accessible_url(image_url):
+        elif staged_url:
+            final_image_url = staged_url
+            yield self.create_text_message("☁️ 图片已暂存到对象存储，使用签名URL提交")
+        elif need_conversion:
             yield self.create_text_message(f"🔄 检测到非OSS图片URL带有签名参数，正在转换为Base64格式...")
             # 阿里云使用纯 Base64 数据（不带前缀）
             base64_data, error = self._convert_image_to_base64(image_url, with_prefix=False)
@@ -383,7 +463,6 @@ class ImageToVideoTool(Tool):
         yield self.create_text_message(info_text)
         
         headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
             "X-DashScope-Async": "enable"
         }
@@ -434,12 +513,15 @@ class ImageToVideoTool(Tool):
                 input_data["prompt"] = enhanced_prompt
         
         try:
-            response = requests.post(
-                f"{self.ALIYUN_API_BASE}/services/aigc/video-generation/video-synthesis",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            with keypool.reserve(self.runtime.credentials, "aliyun") as api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+                response = http_client.post(
+                    f"{api_base}/services/aigc/video-generation/video-synthesis",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+            keypool.report(api_key, response.status_code, response.headers)
             
             result = response.json()
             
@@ -459,9 +541,14 @@ class ImageToVideoTool(Tool):
                 return
             
             yield self.create_text_message(f"✅ 任务已提交\n🔖 任务ID: `{task_id}`")
+            task_store.record(
+                task_id, provider="aliyun", model=model, resolution=params.get("resolution", ""),
+                duration=params.get("duration", ""), fingerprint=params.get("_fingerprint", ""),
+                key_id=keypool.key_id(api_key), api_base=api_base,
+            )
             
             if wait_for_completion:
-                yield from self._poll_aliyun(api_key, task_id, model)
+                yield from self._wait_task("aliyun", api_key, task_id, model)
             else:
                 yield self.create_json_message({
                     "success": True,
@@ -477,20 +564,31 @@ class ImageToVideoTool(Tool):
             yield self.create_text_message(f"❌ 错误: {str(e)}")
 
     def _poll_aliyun(
-        self, api_key: str, task_id: str, model: str
+        self, api_key: str, task_id: str, model: str,
+        max_attempts: int | None = None, waited: float = 0
     ) -> Generator[ToolInvokeMessage, None, None]:
         """轮询阿里云任务状态"""
         headers = {"Authorization": f"Bearer {api_key}"}
         
-        for attempt in range(self.MAX_POLL_ATTEMPTS):
+        # 配置了回调地址时，收到回调立即查询，轮询降为兜底
+        waiter = callbacks.waiter_for(self.runtime.credentials, task_id)
+        
+        # 进度跟踪：解析平台返回的进度 / 排队位次，结合历史耗时估算剩余时间
+        tracker = progress.ProgressTracker("aliyun", task_id, model, waited)
+        
+        for attempt, response in http_client.poll(
+            f"{self._api_base('aliyun', task_id)}/tasks/{task_id}",
+            headers=headers,
+            interval=self.POLL_INTERVAL,
+            max_attempts=max_attempts or self.MAX_POLL_ATTEMPTS,
+            waiter=waiter,
+            fallback_every=self.CALLBACK_FALLBACK_EVERY
+        ):
+            if response is None:
+                continue  # 网络错误，等待下次轮询
             try:
-                response = requests.get(
-                    f"{self.ALIYUN_API_BASE}/tasks/{task_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                output = response.json().get("output", {})
+                result = response.json()
+                output = result.get("output", {})
                 status = output.get("task_status", "UNKNOWN")
                 
                 if status == "SUCCEEDED":
@@ -530,13 +628,13 @@ class ImageToVideoTool(Tool):
                     return
                     
                 else:
-                    if attempt % 6 == 0:
-                        elapsed = attempt * self.POLL_INTERVAL
-                        yield self.create_text_message(f"⏳ 正在生成... {status} ({elapsed}秒)")
-                    time.sleep(self.POLL_INTERVAL)
+                    # 每30秒（或排队位次变化时）输出一次进度与预计剩余时间
+                    progress_text = tracker.update(status, result)
+                    if progress_text:
+                        yield self.create_text_message(progress_text)
                     
             except Exception:
-                time.sleep(self.POLL_INTERVAL)
+                continue
         
         yield self.create_text_message(
             f"⏰ 视频生成仍在进行中，已超过等待时间\n"
@@ -544,6 +642,7 @@ class ImageToVideoTool(Tool):
             f"💡 请使用【查询任务状态】工具，输入以下信息查询结果：\n"
             f"   - 平台: aliyun\n"
             f"   - 任务ID: {task_id}"
+            f"\n\n🔄 也可再次调用本工具并填写【续等任务ID】继续等待"
         )
         yield self.create_json_message({
             "success": True,  # 改为 True，因为任务仍在进行中
@@ -551,12 +650,14 @@ class ImageToVideoTool(Tool):
             "model": model,
             "task_id": task_id,
             "status": "RUNNING",
-            "error_message": "等待超时，任务仍在进行中，请使用query_task查询结果"
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待或使用query_task查询结果",
+            **tracker.snapshot()
         })
 
     # ========== 火山方舟实现 (Ark API) ==========
     def _submit_volcengine_task(
-        self, api_key: str, model: str, image_url: str, full_prompt: str, parameters: dict = None
+        self, api_key: str, model: str, image_url: str | spool.Base64Value, full_prompt: str,
+        parameters: dict = None, api_base: str = "",
     ) -> tuple[dict, str]:
         """提交火山引擎任务，返回 (result, error)"""
         headers = {
@@ -572,12 +673,17 @@ class ImageToVideoTool(Tool):
         }
         if parameters:
             payload["parameters"] = parameters
+        # 任务状态回调（配置 callback_base_url 后启用，轮询作为兜底）
+        callback_url = callbacks.callback_url(self.runtime.credentials, "volcengine")
+        if callback_url:
+            payload["callback_url"] = callback_url
             
         try:
-            response = requests.post(
-                f"{self.VOLCENGINE_API_BASE}/contents/generations/tasks",
+            response = http_client.post(
+                f"{api_base or self.VOLCENGINE_API_BASE}/contents/generations/tasks",
                 headers=headers, json=payload, timeout=30
             )
+            keypool.report(api_key, response.status_code, response.headers)
             if response.status_code != 200:
                 return {}, f"{response.status_code} - {response.text}"
             return response.json(), ""
@@ -588,10 +694,10 @@ class ImageToVideoTool(Tool):
         self, params: dict
     ) -> Generator[ToolInvokeMessage, None, None]:
         """调用火山方舟 Ark API (图生视频) - 智能重试"""
-        api_key = self.runtime.credentials.get("volcengine_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "volcengine"):
             yield self.create_text_message("❌ 错误：请配置火山方舟 API Key")
             return
+        api_base = self._api_base("volcengine")
         
         # 获取 endpoint_id，如果配置了则使用 endpoint_id，否则使用 model 名称
         endpoint_id = self.runtime.credentials.get("volcengine_endpoint_id", "").strip()
@@ -729,10 +835,20 @@ class ImageToVideoTool(Tool):
             model_name = f"{model_name} (Endpoint: {endpoint_id[:20]}...)" if len(endpoint_id) > 20 else f"{model_name} (Endpoint: {endpoint_id})"
         
         # 智能策略：判断是否需要预先转换 Base64
-        need_base64 = not self._is_public_accessible_url(image_url)
+        need_base64 = not params.get("_public_image") and not self._is_public_accessible_url(image_url)
         final_image_url = image_url
         used_base64 = False
         
+        if need_base64:
+            # 配置了暂存存储时上传一次并使用签名 URL，避免请求体内联 Base64
+            staged_url, stage_error = self._stage_image(image_url)
+            if stage_error:
+                yield self.create_text_message(f"⚠️ {stage_error}，改用Base64")
+            if staged_url:
+                final_image_url = staged_url
+                need_base64 = False
+                yield self.create_text_message("☁️ 图片已暂存到对象存储，使用签名URL提交")
+        
         if need_base64:
             # 明确的内网地址，直接转 Base64
             yield self.create_text_message(f"🔄 检测到内网图片地址，正在转换为Base64格式...")
@@ -791,8 +907,11 @@ class ImageToVideoTool(Tool):
             f"✅ 使用官方参数：generate_audio=\"true\""
         )
         
-        # 第一次尝试提交
-        result, error = self._submit_volcengine_task(api_key, model, final_image_url, full_prompt, api_parameters)
+        # 第一次尝试提交（转 Base64 重试时沿用同一个 Key）
+        with keypool.reserve(self.runtime.credentials, "volcengine") as api_key:
+            result, error = self._submit_volcengine_task(
+                api_key, model, final_image_url, full_prompt, api_parameters, api_base
+            )
         
         # 智能重试：如果是 URL 方式且返回 "image not found" 错误，自动转 Base64 重试
         if error and not used_base64 and "image" in error.lower() and "not found" in error.lower():
@@ -803,7 +922,10 @@ class ImageToVideoTool(Tool):
                 yield self.create_json_message({"success": False, "provider": "volcengine", "error_message": convert_error})
                 return
             yield self.create_text_message(f"✅ 图片转换成功，重新提交...")
-            result, error = self._submit_volcengine_task(api_key, model, base64_url, full_prompt, api_parameters)
+            with keypool.reserve(self.runtime.credentials, "volcengine", api_key):
+                result, error = self._submit_volcengine_task(
+                    api_key, model, base64_url, full_prompt, api_parameters, api_base
+                )
             used_base64 = True
         
         if error:
@@ -817,9 +939,14 @@ class ImageToVideoTool(Tool):
             return
         
         yield self.create_text_message(f"✅ 任务已提交\n🔖 任务ID: `{task_id}`")
+        task_store.record(
+            task_id, provider="volcengine", model=model, resolution=params.get("resolution", ""),
+            duration=params.get("duration", ""), fingerprint=params.get("_fingerprint", ""),
+            key_id=keypool.key_id(api_key), api_base=api_base,
+        )
         
         if wait_for_completion:
-            yield from self._poll_volcengine(api_key, task_id, model)
+            yield from self._wait_task("volcengine", api_key, task_id, model)
         else:
             yield self.create_json_message({
                 "success": True,
@@ -830,7 +957,8 @@ class ImageToVideoTool(Tool):
             })
 
     def _poll_volcengine(
-        self, api_key: str, task_id: str, model: str
+        self, api_key: str, task_id: str, model: str,
+        max_attempts: int | None = None, waited: float = 0
     ) -> Generator[ToolInvokeMessage, None, None]:
         """轮询火山方舟任务状态 (Ark API)"""
         headers = {
@@ -838,14 +966,23 @@ class ImageToVideoTool(Tool):
             "Content-Type": "application/json"
         }
         
-        for attempt in range(self.MAX_POLL_ATTEMPTS):
+        # 配置了回调地址时，收到回调立即查询，轮询降为兜底
+        waiter = callbacks.waiter_for(self.runtime.credentials, task_id)
+        
+        # 进度跟踪：解析平台返回的进度 / 排队位次，结合历史耗时估算剩余时间
+        tracker = progress.ProgressTracker("volcengine", task_id, model, waited)
+        
+        for attempt, response in http_client.poll(
+            f"{self._api_base('volcengine', task_id)}/contents/generations/tasks/{task_id}",
+            headers=headers,
+            interval=self.POLL_INTERVAL,
+            max_attempts=max_attempts or self.MAX_POLL_ATTEMPTS,
+            waiter=waiter,
+            fallback_every=self.CALLBACK_FALLBACK_EVERY
+        ):
+            if response is None:
+                continue  # 网络错误，等待下次轮询
             try:
-                response = requests.get(
-                    f"{self.VOLCENGINE_API_BASE}/contents/generations/tasks/{task_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
                 if response.status_code != 200:
                     yield self.create_text_message(f"❌ 查询失败: {response.text}")
                     return
@@ -902,13 +1039,13 @@ class ImageToVideoTool(Tool):
                     return
                     
                 else:
-                    if attempt % 6 == 0:
-                        elapsed = attempt * self.POLL_INTERVAL
-                        yield self.create_text_message(f"⏳ 正在生成... ({elapsed}秒)")
-                    time.sleep(self.POLL_INTERVAL)
+                    # 每30秒（或排队位次变化时）输出一次进度与预计剩余时间
+                    progress_text = tracker.update(status, result)
+                    if progress_text:
+                        yield self.create_text_message(progress_text)
                     
             except Exception:
-                time.sleep(self.POLL_INTERVAL)
+                continue
         
         yield self.create_text_message(
             f"⏰ 视频生成仍在进行中，已超过等待时间\n"
@@ -916,6 +1053,7 @@ class ImageToVideoTool(Tool):
             f"💡 请使用【查询任务状态】工具，输入以下信息查询结果：\n"
             f"   - 平台: volcengine\n"
             f"   - 任务ID: {task_id}"
+            f"\n\n🔄 也可再次调用本工具并填写【续等任务ID】继续等待"
         )
         yield self.create_json_message({
             "success": True,  # 改为 True，因为任务仍在进行中
@@ -923,7 +1061,8 @@ class ImageToVideoTool(Tool):
             "model": model,
             "task_id": task_id,
             "status": "running",
-            "error_message": "等待超时，任务仍在进行中，请使用query_task查询结果"
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待或使用query_task查询结果",
+            **tracker.snapshot()
         })
 
     # ========== JXINCM (Sora2) 实现 ==========
@@ -938,10 +1077,10 @@ class ImageToVideoTool(Tool):
         注意：视频时长固定为15秒
         """
         # 获取凭证
-        api_key = self.runtime.credentials.get("jxincm_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "jxincm"):
             yield self.create_text_message("❌ 错误：请配置 JXINCM API Key")
             return
+        api_base = self._api_base("jxincm")
         
         # 解析参数
         model = params.get("model", "sora-2")
@@ -953,9 +1092,25 @@ class ImageToVideoTool(Tool):
             yield self.create_text_message("❌ 错误：图片URL不能为空")
             return
         
+        if not params.get("_public_image") and not self._is_public_accessible_url(image_url):
+            # 内网图片平台无法访问，配置了暂存存储时改用签名 URL
+            staged_url, stage_error = self._stage_image(image_url)
+            if stage_error:
+                yield self.create_text_message(f"⚠️ {stage_error}，仍使用原图片URL")
+            if staged_url:
+                image_url = staged_url
+                yield self.create_text_message("☁️ 图片已暂存到对象存储，使用签名URL提交")
+        
         # JXINCM 使用 landscape/portrait 方向参数
         # 根据图片宽高比自动判断，默认横屏
         orientation = "landscape"
+        aspect_ratio = params.get("aspect_ratio") or "auto"
+        if aspect_ratio == "auto":
+            image_size = self._probe_image_size(params.get("image_url", ""))
+            if image_size and image_size[1] > image_size[0]:
+                orientation = "portrait"
+        elif aspect_ratio == "9:16":
+            orientation = "portrait"
         
         model_name = self.JXINCM_MODELS.get(model, {}).get("name", model)
         
@@ -974,7 +1129,6 @@ class ImageToVideoTool(Tool):
         
         # 构建请求头
         headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
@@ -992,12 +1146,15 @@ class ImageToVideoTool(Tool):
         
         try:
             # 提交任务
-            response = requests.post(
-                f"{self.JXINCM_API_BASE}/video/create",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            with keypool.reserve(self.runtime.credentials, "jxincm") as api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+                response = http_client.post(
+                    f"{api_base}/video/create",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+            keypool.report(api_key, response.status_code, response.headers)
             
             if response.status_code != 200:
                 error_text = response.text
@@ -1023,10 +1180,15 @@ class ImageToVideoTool(Tool):
                 return
             
             yield self.create_text_message(f"✅ 任务已提交\n🔖 任务ID: `{task_id}`")
+            task_store.record(
+                task_id, provider="jxincm", model=model, resolution=params.get("resolution", ""),
+                duration=params.get("duration", ""), fingerprint=params.get("_fingerprint", ""),
+                key_id=keypool.key_id(api_key), api_base=api_base,
+            )
             
             # 是否等待完成
             if wait_for_completion:
-                yield from self._poll_jxincm(api_key, task_id, model)
+                yield from self._wait_task("jxincm", api_key, task_id, model)
             else:
                 yield self.create_json_message({
                     "success": True,
@@ -1044,7 +1206,8 @@ class ImageToVideoTool(Tool):
             yield self.create_text_message(f"❌ 错误: {str(e)}")
 
     def _poll_jxincm(
-        self, api_key: str, task_id: str, model: str
+        self, api_key: str, task_id: str, model: str,
+        max_attempts: int | None = None, waited: float = 0
     ) -> Generator[ToolInvokeMessage, None, None]:
         """轮询 JXINCM 任务状态"""
         headers = {
@@ -1052,21 +1215,24 @@ class ImageToVideoTool(Tool):
             "Content-Type": "application/json"
         }
         
-        for attempt in range(self.MAX_POLL_ATTEMPTS):
+        # 进度跟踪：解析平台返回的进度 / 排队位次，结合历史耗时估算剩余时间
+        tracker = progress.ProgressTracker("jxincm", task_id, model, waited)
+        
+        for attempt, response in http_client.poll(
+            f"{self._api_base('jxincm', task_id)}/video/query?id={task_id}",
+            headers=headers,
+            interval=self.POLL_INTERVAL,
+            max_attempts=max_attempts or self.MAX_POLL_ATTEMPTS
+        ):
+            if response is None:
+                continue  # 网络错误，等待下次轮询
             try:
-                response = requests.get(
-                    f"{self.JXINCM_API_BASE}/video/query?id={task_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
                 if response.status_code != 200:
                     yield self.create_text_message(f"❌ 查询失败: {response.text}")
                     return
                 
                 result = response.json()
                 status = result.get("status", "unknown")
-                progress = result.get("progress", 0)
                 
                 if status == "completed":
                     detail = result.get("detail", {})
@@ -1110,18 +1276,19 @@ class ImageToVideoTool(Tool):
                     return
                     
                 else:
-                    if attempt % 6 == 0:
-                        elapsed = attempt * self.POLL_INTERVAL
-                        yield self.create_text_message(f"⏳ 正在生成... {status} ({progress}% - {elapsed}秒)")
-                    time.sleep(self.POLL_INTERVAL)
+                    # 每30秒（或排队位次变化时）输出一次进度与预计剩余时间
+                    progress_text = tracker.update(status, result)
+                    if progress_text:
+                        yield self.create_text_message(progress_text)
                     
             except Exception:
-                time.sleep(self.POLL_INTERVAL)
+                continue
         
         yield self.create_text_message(
             f"⏰ 视频生成仍在进行中，已超过等待时间\n"
             f"🔖 任务ID: `{task_id}`\n\n"
             f"💡 请使用【查询任务状态】工具查询结果"
+            f"\n\n🔄 也可再次调用本工具并填写【续等任务ID】继续等待"
         )
         yield self.create_json_message({
             "success": True,
@@ -1129,5 +1296,6 @@ class ImageToVideoTool(Tool):
             "model": model,
             "task_id": task_id,
             "status": "running",
-            "error_message": "等待超时，任务仍在进行中"
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待",
+            **tracker.snapshot()
         })
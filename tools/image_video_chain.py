@@ -0,0 +1,464 @@
+"""
+图片→视频流水线工具 (Image Video Chain)
+
+常见流程是【文生图】(Seedream) 生成若干帧，再对每一帧调用【图生视频】。
+两个节点串联时，工作流要等所有图片生成完毕，图生视频再逐张下载图片、重新编码 Base64。
+本工具把两个阶段串成流水线：
+1. 所有帧的文生图请求并行发起（IMAGE_CONCURRENCY 路）
+2. 每张图片生成后立即把平台返回的图片 URL 直接提交图生视频（不下载、不转 Base64），
+   此时其余帧仍在生成图片，两个阶段相互重叠
+3. 进行中的视频任务统一轮询，每个完成即输出
+4. 最后输出按帧顺序排列的清单（manifest）
+
+达到 CHAIN_MAX_WAIT 时，已发出的提交仍会在平台创建付费任务：短暂等待（DRAIN_WAIT）取得任务 ID
+一并输出，仍未返回的提交在创建任务后立即取消。
+
+Seedream 返回的图片 URL 是公网可访问的签名地址，提交时标记为公网图片，
+跳过图生视频中「带签名参数的 URL 转 Base64」的处理。
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Generator
+
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from tools import image_to_video, text_to_image
+from utils import breaker, http_client, keypool, output, router, task_api, task_store
+
+
+class ImageVideoChainTool(image_to_video.ImageToVideoTool):
+    """图片→视频流水线 - 每张图片生成后立即提交图生视频"""
+
+    # 同时进行的文生图请求数
+    IMAGE_CONCURRENCY = 2
+    # 文生图请求超时（秒）
+    IMAGE_TIMEOUT = 120
+    # 各平台同时进行中的视频任务上限
+    PROVIDER_CONCURRENCY = {
+        "aliyun": 2,
+        "volcengine": 5,
+        "jxincm": 3,
+    }
+    # 单次调用最多帧数
+    MAX_FRAMES = 20
+    # 流水线等待上限（秒）- Dify 插件有 10 分钟硬性超时
+    CHAIN_MAX_WAIT = 480
+    # 主循环间隔（秒）- 图片完成后最多延迟这么久提交视频
+    TICK_INTERVAL = 1
+    # 等待超时后，继续等待进行中的提交 / 图片请求的时间（秒），以便输出已创建的任务
+    DRAIN_WAIT = 30
+
+    @output.compactable
+    def _invoke(
+        self, tool_parameters: dict[str, Any]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """生成图片并流水线式提交图生视频"""
+        frames, error = self._parse_frames(tool_parameters.get("frames", ""))
+        if not error:
+            error = self._check_parameters(tool_parameters)
+        if error:
+            yield self.create_text_message(f"❌ 错误：{error}")
+            yield self.create_json_message({"success": False, "error_message": error})
+            return
+
+        provider = tool_parameters.get("video_provider") or "volcengine"
+        image_model = tool_parameters.get("image_model") or "doubao-seedream-4-5-251128"
+        image_size = tool_parameters.get("image_size") or "1280x720"
+        entries = [
+            self._plan_frame(index, frame, provider, tool_parameters)
+            for index, frame in enumerate(frames)
+        ]
+        limit = self._concurrency_limit(provider, tool_parameters)
+
+        yield self.create_text_message(
+            f"🎞️ **图片→视频流水线** - 共 {len(entries)} 帧\n"
+            f"🖼️ 图片: {image_model} ({image_size})\n"
+            f"🎬 视频: {provider} / {entries[0]['model']}，并发上限 {limit}"
+        )
+
+        yield from self._run_chain(entries, image_model, image_size, limit)
+
+        succeeded = sum(1 for entry in entries if entry["status"] == "succeeded")
+        manifest = [
+            {key: entry[key] for key in (
+                "index", "prompt", "image_url", "provider", "model", "task_id", "status",
+                "video_url", "error_message", "elapsed_seconds",
+            )}
+            for entry in entries
+        ]
+        yield self.create_text_message(
+            f"🏁 **流水线结束**: 成功 {succeeded}/{len(entries)}\n" + "\n".join(
+                f"   {item['index'] + 1}. {self._status_icon(item['status'])} "
+                f"{item['video_url'] or item['error_message'] or item['task_id'] or item['status']}"
+                for item in manifest
+            )
+        )
+        yield self.create_json_message({
+            "success": succeeded == len(entries),
+            "total": len(entries),
+            "succeeded": succeeded,
+            "frames": manifest,
+        })
+
+    @staticmethod
+    def _status_icon(status: str) -> str:
+        return {"succeeded": "✅", "failed": "❌", "canceled": "🛑"}.get(status, "⏳")
+
+    def _parse_frames(self, raw: Any) -> tuple[list[dict], str]:
+        """
+        解析帧列表
+
+        支持 JSON 数组（字符串或对象）：[{"prompt", "motion", "duration", "seed"}, ...]，
+        prompt 为图片提示词，motion 为视频（运动）提示词；也支持每行一个图片提示词的纯文本。
+        """
+        if isinstance(raw, str):
+            text = raw.strip()
+            if not text:
+                return [], "帧列表不能为空"
+            if text.startswith("["):
+                try:
+                    raw = json.loads(text)
+                except json.JSONDecodeError as e:
+                    return [], f"帧列表 JSON 格式无效: {e}"
+            else:
+                raw = [{"prompt": line.strip()} for line in text.splitlines() if line.strip()]
+        if not isinstance(raw, list):
+            return [], "帧列表必须是数组"
+
+        frames = []
+        for i, item in enumerate(raw):
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not isinstance(item, dict) or not str(item.get("prompt", "")).strip():
+                return [], f"第 {i + 1} 帧缺少 prompt"
+            frames.append(item)
+        if not frames:
+            return [], "帧列表不能为空"
+        if len(frames) > self.MAX_FRAMES:
+            return [], f"单次最多 {self.MAX_FRAMES} 帧，当前 {len(frames)} 帧"
+        return frames, ""
+
+    def _check_parameters(self, tool_parameters: dict) -> str:
+        """检查凭证与图片尺寸，返回错误信息"""
+        credentials = self.runtime.credentials
+        provider = tool_parameters.get("video_provider") or "volcengine"
+        if provider not in self.PROVIDER_CONCURRENCY:
+            return f"不支持的视频平台: {provider}"
+        if not credentials.get("volcengine_api_key"):
+            return "未配置火山方舟 API Key（文生图使用 Seedream）"
+        if not credentials.get(f"{provider}_api_key"):
+            return f"未配置 {provider} API Key"
+        image_size = tool_parameters.get("image_size") or "1280x720"
+        try:
+            width, height = (int(v) for v in image_size.lower().split("x"))
+        except ValueError:
+            return f"图片尺寸格式无效: {image_size}（应为 宽x高）"
+        if (width, height) not in text_to_image.TextToImageTool.SUPPORTED_SIZES_T2I:
+            return f"不支持的图片尺寸: {image_size}"
+        return ""
+
+    def _plan_frame(self, index: int, frame: dict, provider: str, tool_parameters: dict) -> dict:
+        """确定帧的视频模型和提交参数"""
+        prompt = str(frame["prompt"]).strip()
+        motion = str(frame.get("motion") or tool_parameters.get("video_prompt") or prompt).strip()
+        image_size = tool_parameters.get("image_size") or "1280x720"
+        width, height = (int(v) for v in image_size.lower().split("x"))
+        params = {
+            "prompt": motion,
+            "duration": str(frame.get("duration") or tool_parameters.get("duration") or 5),
+            "resolution": tool_parameters.get("resolution") or "720p",
+            # 图片尺寸由本工具指定，无需再探测
+            "aspect_ratio": "16:9" if width > height else "9:16" if height > width else "1:1",
+            "enable_audio": tool_parameters.get("enable_audio", False),
+            "wait_for_completion": False,
+            "provider": provider,
+            # 平台返回的图片 URL 可公网访问，直接提交
+            "_public_image": True,
+        }
+        if frame.get("seed") is not None:
+            params["seed"] = frame["seed"]
+        params["model"] = (tool_parameters.get("video_model") or "").strip() or self._default_model(
+            provider, params["duration"]
+        )
+        return {
+            "index": index,
+            "prompt": prompt,
+            "image_url": "",
+            "provider": provider,
+            "model": params["model"],
+            "task_id": "",
+            "status": "queued",
+            "video_url": "",
+            "error_message": "",
+            "elapsed_seconds": None,
+            "seed": frame.get("seed"),
+            "params": params,
+        }
+
+    @staticmethod
+    def _default_model(provider: str, duration: str) -> str:
+        """未指定模型时，选择目录中第一个支持该时长的图生视频模型"""
+        try:
+            seconds = int(duration)
+        except (TypeError, ValueError):
+            seconds = 5
+        candidates = [c for c in router.CATALOG["image_to_video"] if c["provider"] == provider]
+        for candidate in candidates:
+            if seconds in candidate["durations"]:
+                return candidate["model"]
+        return candidates[0]["model"] if candidates else ""
+
+    def _concurrency_limit(self, provider: str, tool_parameters: dict) -> int:
+        # 配置了多个 API Key 时，并发上限按 Key 数量放大
+        limit = self.PROVIDER_CONCURRENCY.get(provider, 1) * max(
+            1, len(keypool.keys(self.runtime.credentials, provider))
+        )
+        try:
+            cap = int(tool_parameters.get("max_concurrency") or 0)
+        except (TypeError, ValueError):
+            cap = 0
+        return min(limit, cap) if cap > 0 else limit
+
+    def _generate_image(self, model: str, prompt: str, size: str, seed: Any) -> tuple[str, str]:
+        """
+        调用 Seedream 生成单张图片（在工作线程中执行）
+
+        Returns:
+            (图片URL, 错误信息)
+        """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "size": size,
+            "n": 1,
+            "response_format": "url",
+        }
+        if seed is not None:
+            payload["seed"] = int(seed)
+        try:
+            with keypool.reserve(self.runtime.credentials, "volcengine") as api_key:
+                response = http_client.post(
+                    f"{self._api_base('volcengine')}/images/generations",
+                    headers={
+                        "Authorization": f"Bearer {api_key}",
+                        "Content-Type": "application/json"
+                    },
+                    json=payload,
+                    timeout=self.IMAGE_TIMEOUT
+                )
+            keypool.report(api_key, response.status_code, response.headers)
+            if response.status_code != 200:
+                error_text = response.text
+                try:
+                    error_text = response.json().get("error", {}).get("message", error_text)
+                except Exception:
+                    pass
+                return "", f"{response.status_code} - {error_text}"
+            images = response.json().get("data") or []
+            if not images or not images[0].get("url"):
+                return "", "未返回图片数据"
+            return images[0]["url"], ""
+        except Exception as e:
+            return "", str(e)
+
+    def _submit_frame(self, entry: dict) -> tuple[str, str]:
+        """
+        提交单帧图生视频（在工作线程中执行）
+
+        Returns:
+            (任务ID, 错误信息)
+        """
+        provider = entry["provider"]
+        params = entry["params"]
+        params["image_url"] = entry["image_url"]
+        params["_fingerprint"] = task_store.fingerprint(
+            "image_to_video", provider, params["model"], params["prompt"], None, None, entry["image_url"]
+        )
+        if provider == "aliyun":
+            messages = self._invoke_aliyun(params)
+        elif provider == "volcengine":
+            messages = self._invoke_volcengine(params)
+        else:
+            messages = self._invoke_jxincm(params)
+
+        error = "提交失败"
+        try:
+            for message in messages:
+                payload = task_api.get_json_object(message)
+                if payload is not None:
+                    if payload.get("success") and payload.get("task_id"):
+                        return payload["task_id"], ""
+                    error = payload.get("error_message") or error
+                    continue
+                text = task_api.get_text(message)
+                if text.startswith("❌"):
+                    error = text.lstrip("❌ ")
+        except Exception as e:
+            error = str(e)
+        return "", error
+
+    def _run_chain(
+        self, entries: list[dict], image_model: str, image_size: str, limit: int
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """图片生成、视频提交、视频轮询三个阶段重叠执行"""
+        start_time = time.time()
+        last_poll = 0.0
+        provider = entries[0]["provider"]
+        credentials = self.runtime.credentials
+
+        image_pool = ThreadPoolExecutor(max_workers=self.IMAGE_CONCURRENCY)
+        # 视频提交与查询各用一个线程池，大小均为并发上限：同时进行的提交 / 查询不会超过上限，
+        # 提交缓慢时也不占用查询线程
+        workers = max(1, min(limit, len(entries)))
+        submit_pool = ThreadPoolExecutor(max_workers=workers)
+        poll_pool = ThreadPoolExecutor(max_workers=workers)
+        images = {
+            image_pool.submit(
+                self._generate_image, image_model, entry["prompt"], image_size, entry["seed"]
+            ): entry
+            for entry in entries
+        }
+        ready: list[dict] = []       # 图片已生成、等待视频名额
+        submitting: dict = {}        # 正在提交的视频任务
+        active: list[dict] = []      # 已提交、等待完成的视频任务
+        try:
+            while images or ready or submitting or active:
+                # 1. 收取已生成的图片
+                for future in [f for f in images if f.done()]:
+                    entry = images.pop(future)
+                    image_url, error = future.result()
+                    if error:
+                        entry.update(status="failed", error_message=f"图片生成失败: {error}")
+                        yield self.create_text_message(f"❌ 第 {entry['index'] + 1} 帧图片生成失败: {error}")
+                        continue
+                    entry.update(image_url=image_url, status="image_ready")
+                    ready.append(entry)
+                    yield self.create_text_message(
+                        f"🖼️ 第 {entry['index'] + 1} 帧图片完成 ({int(time.time() - start_time)}秒)\n{image_url}"
+                    )
+                    yield self.create_image_message(image_url)
+
+                # 2. 有空闲名额时立即提交视频（按帧顺序）
+                ready.sort(key=lambda e: e["index"])
+                while ready and len(active) + len(submitting) < limit:
+                    entry = ready.pop(0)
+                    entry["submitted_at"] = time.time()
+                    submitting[submit_pool.submit(self._submit_frame, entry)] = entry
+
+                # 3. 收取提交结果
+                for future in [f for f in submitting if f.done()]:
+                    entry = submitting.pop(future)
+                    task_id, error = future.result()
+                    if task_id:
+                        entry.update(task_id=task_id, status="pending")
+                        active.append(entry)
+                        yield self.create_text_message(
+                            f"📤 第 {entry['index'] + 1} 帧视频已提交 ({provider}) `{task_id}`"
+                        )
+                    else:
+                        breaker.get(provider).record_failure()
+                        entry.update(status="failed", error_message=error)
+                        yield self.create_text_message(f"❌ 第 {entry['index'] + 1} 帧视频提交失败: {error}")
+
+                # 4. 定期并行查询进行中的视频任务
+                if active and time.time() - last_poll >= self.POLL_INTERVAL:
+                    last_poll = time.time()
+                    results = poll_pool.map(
+                        lambda e: task_api.fetch_status(
+                            provider, self._api_base(provider, e["task_id"]),
+                            keypool.for_task(credentials, provider, e["task_id"]), e["task_id"],
+                        ),
+                        list(active),
+                    )
+                    for entry, (status, result) in zip(list(active), results):
+                        if status not in task_api.FINAL_STATUSES:
+                            if status != "unknown":
+                                entry["status"] = status
+                            continue
+                        active.remove(entry)
+                        yield from self._finish_frame(entry, status, result)
+
+                if time.time() - start_time >= self.CHAIN_MAX_WAIT:
+                    break
+                http_client.sleep(self.TICK_INTERVAL)
+
+            if images or submitting:
+                # 等待超时：尚未开始的图片请求直接取消；已发出的提交 / 图片请求仍会在平台计费，
+                # 短暂等待以取得任务 ID 和图片 URL
+                for future in images:
+                    future.cancel()
+                wait(list(images) + list(submitting), timeout=self.DRAIN_WAIT)
+                for future in [f for f in submitting if f.done()]:
+                    entry = submitting.pop(future)
+                    task_id, error = future.result()
+                    if task_id:
+                        entry.update(task_id=task_id, status="pending")
+                        active.append(entry)
+                        yield self.create_text_message(
+                            f"📤 第 {entry['index'] + 1} 帧视频已提交 ({provider}) `{task_id}`"
+                        )
+                    else:
+                        breaker.get(provider).record_failure()
+                        entry.update(status="failed", error_message=error)
+                for future in [f for f in images if f.done() and not f.cancelled()]:
+                    entry = images.pop(future)
+                    image_url, error = future.result()
+                    if error:
+                        entry.update(status="failed", error_message=f"图片生成失败: {error}")
+                    else:
+                        entry.update(image_url=image_url, status="image_ready")
+                        ready.append(entry)
+        except GeneratorExit:
+            # 调用被中止（如工作流被停止）：取消进行中的视频任务
+            for entry in active:
+                self._cancel_abandoned(
+                    provider, keypool.for_task(credentials, provider, entry["task_id"]), entry["task_id"]
+                )
+            raise
+        finally:
+            # 仍未返回的提交在后台完成后立即取消，避免产生无人等待的付费任务
+            for future in submitting:
+                future.add_done_callback(lambda f: self._cancel_late_submission(provider, f))
+            image_pool.shutdown(wait=False, cancel_futures=True)
+            submit_pool.shutdown(wait=False)
+            poll_pool.shutdown(wait=False)
+
+        for entry in active:
+            entry["error_message"] = "等待超时，请使用【查询任务状态】获取结果"
+            task_store.add_wait(entry["task_id"], time.time() - entry["submitted_at"])
+        for entry in ready:
+            entry.update(status="not_submitted", error_message="等待超时，图片已生成，未提交视频")
+        for entry in images.values():
+            entry.update(status="not_submitted", error_message="等待超时，图片未生成，未提交视频")
+        for entry in submitting.values():
+            entry.update(status="submitting", error_message=(
+                "等待超时，提交未返回（JXINCM 无法取消，任务创建后仍会计费）" if provider == "jxincm"
+                else "等待超时，提交未返回，任务创建后将自动取消"
+            ))
+
+    def _finish_frame(
+        self, entry: dict, status: str, result: dict
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """记录已结束的视频任务并立即输出结果"""
+        video_url, error = task_api.extract_video(entry["provider"], result)
+        elapsed = round(time.time() - entry["submitted_at"], 1)
+        entry.update(status=status, video_url=video_url, elapsed_seconds=elapsed)
+        task_store.record(entry["task_id"], status=status)
+        task_store.add_wait(entry["task_id"], elapsed)
+
+        if status == "succeeded":
+            breaker.get(entry["provider"]).record_success()
+            yield self.create_text_message(
+                f"✅ 第 {entry['index'] + 1} 帧视频完成 ({elapsed}秒)\n📹 {video_url}"
+            )
+            if video_url:
+                yield self.create_image_message(video_url)
+        else:
+            if status == "failed":
+                breaker.get(entry["provider"]).record_failure()
+            entry["error_message"] = error or f"任务状态: {status}"
+            yield self.create_text_message(
+                f"❌ 第 {entry['index'] + 1} 帧视频 {status}: {entry['error_message']}"
+            )
@@ -16,6 +16,8 @@ from typing import Any, Generator
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils import endpoints, http_client, keypool, output
+
 
 class QueryTaskTool(Tool):
     """任务状态查询工具 - 三平台支持"""
@@ -48,6 +50,7 @@ class QueryTaskTool(Tool):
         "unknown": "未知"
     }
 
+    @output.compactable
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -72,10 +75,11 @@ class QueryTaskTool(Tool):
         self, task_id: str
     ) -> Generator[ToolInvokeMessage, None, None]:
         """查询阿里云百炼任务状态"""
-        api_key = self.runtime.credentials.get("aliyun_api_key", "")
+        api_key = keypool.for_task(self.runtime.credentials, "aliyun", task_id)
         if not api_key:
             yield self.create_text_message("❌ 错误：请配置阿里云百炼 API Key")
             return
+        api_base = endpoints.for_task(self.runtime.credentials, "aliyun", task_id, self.ALIYUN_API_BASE)
         
         yield self.create_text_message(
             f"🔍 **查询任务状态**\n\n"
@@ -86,8 +90,8 @@ class QueryTaskTool(Tool):
         headers = {"Authorization": f"Bearer {api_key}"}
         
         try:
-            response = requests.get(
-                f"{self.ALIYUN_API_BASE}/tasks/{task_id}",
+            response = http_client.get(
+                f"{api_base}/tasks/{task_id}",
                 headers=headers,
                 timeout=30
             )
@@ -168,10 +172,11 @@ class QueryTaskTool(Tool):
         self, task_id: str
     ) -> Generator[ToolInvokeMessage, None, None]:
         """查询火山方舟任务状态 (Ark API)"""
-        api_key = self.runtime.credentials.get("volcengine_api_key", "")
+        api_key = keypool.for_task(self.runtime.credentials, "volcengine", task_id)
         if not api_key:
             yield self.create_text_message("❌ 错误：请配置火山方舟 API Key")
             return
+        api_base = endpoints.for_task(self.runtime.credentials, "volcengine", task_id, self.VOLCENGINE_API_BASE)
         
         yield self.create_text_message(
             f"🔍 **查询任务状态**\n\n"
@@ -185,8 +190,8 @@ class QueryTaskTool(Tool):
         }
         
         try:
-            response = requests.get(
-                f"{self.VOLCENGINE_API_BASE}/contents/generations/tasks/{task_id}",
+            response = http_client.get(
+                f"{api_base}/contents/generations/tasks/{task_id}",
                 headers=headers,
                 timeout=30
             )
@@ -277,10 +282,11 @@ class QueryTaskTool(Tool):
         self, task_id: str
     ) -> Generator[ToolInvokeMessage, None, None]:
         """查询 JXINCM (Sora2) 任务状态"""
-        api_key = self.runtime.credentials.get("jxincm_api_key", "")
+        api_key = keypool.for_task(self.runtime.credentials, "jxincm", task_id)
         if not api_key:
             yield self.create_text_message("❌ 错误：请配置 JXINCM API Key")
             return
+        api_base = endpoints.for_task(self.runtime.credentials, "jxincm", task_id, self.JXINCM_API_BASE)
         
         yield self.create_text_message(
             f"🔍 **查询任务状态**\n\n"
@@ -295,8 +301,8 @@ class QueryTaskTool(Tool):
         }
         
         try:
-            response = requests.get(
-                f"{self.JXINCM_API_BASE}/video/query?id={task_id}",
+            response = http_client.get(
+                f"{api_base}/video/query?id={task_id}",
                 headers=headers,
                 timeout=30
             )
@@ -18,12 +18,12 @@ API 文档参考:
 """
 
 import requests
-import struct
-import base64
 from typing import Any, Generator, Optional, Tuple, List
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils import endpoints, http_client, image_probe, keypool, output, spool, staging
+
 
 class TextToImageTool(Tool):
     """文本生成图片工具 - 火山引擎 Seedream 模型"""
@@ -69,18 +69,21 @@ class TextToImageTool(Tool):
     DEFAULT_SIZE_I2I = "2k"  # 图生图默认使用 2k
     DEFAULT_GUIDANCE_SCALE = 7.5
     
-    def _download_and_convert_to_base64(self, url: str) -> Optional[str]:
+    def _download_and_convert_to_base64(self, url: str) -> Optional[str | spool.Base64Value]:
         """
         下载图片并转换为 base64 数据 URL
         
         解决火山引擎无法访问 Dify 内部文件 URL 的问题。
         火山引擎 API 支持 data URL 格式的图片输入。
+        配置了暂存对象存储时返回签名 URL（见 utils/staging.py）。
+        图片边下载边写入缓冲区（大图片转存临时文件），data URL 在提交时才分块编码写入请求体，
+        14 张参考图不会同时以原始字节和 Base64 字符串的形式留在内存中（见 utils/spool.py）。
         
         Args:
             url: 图片的 URL 地址
             
         Returns:
-            base64 数据 URL (如 "data:image/jpeg;base64,...") 或 None
+            data URL 字段值、暂存签名 URL 或 None
         """
         # 如果已经是 data URL，直接返回
         if url.startswith('data:'):
@@ -91,15 +94,18 @@ class TextToImageTool(Tool):
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
             
-            response = requests.get(url, headers=headers, timeout=60)
-            
-            if response.status_code != 200:
-                return None
-            
-            image_data = response.content
+            response = http_client.get(
+                url, headers=headers, timeout=60, stream=True
+            )
+            try:
+                if response.status_code != 200:
+                    return None
+                buffer = spool.from_response(response)
+            finally:
+                response.close()
             
             # 检测图片 MIME 类型
-            content_type = response.headers.get('Content-Type', '').lower()
+            content_type = buffer.content_type.lower()
             if 'png' in content_type:
                 mime_type = 'image/png'
             elif 'gif' in content_type:
@@ -110,20 +116,29 @@ class TextToImageTool(Tool):
                 mime_type = 'image/jpeg'
             else:
                 # 从图片头部检测
-                if image_data[:8] == b'\x89PNG\r\n\x1a\n':
+                image_head = buffer.head(16)
+                if image_head[:8] == b'\x89PNG\r\n\x1a\n':
                     mime_type = 'image/png'
-                elif image_data[:2] == b'\xff\xd8':
+                elif image_head[:2] == b'\xff\xd8':
                     mime_type = 'image/jpeg'
-                elif image_data[:6] in (b'GIF87a', b'GIF89a'):
+                elif image_head[:6] in (b'GIF87a', b'GIF89a'):
                     mime_type = 'image/gif'
-                elif image_data[:4] == b'RIFF' and len(image_data) > 12 and image_data[8:12] == b'WEBP':
+                elif image_head[:4] == b'RIFF' and len(image_head) > 12 and image_head[8:12] == b'WEBP':
                     mime_type = 'image/webp'
                 else:
                     mime_type = 'image/jpeg'
             
-            # 转换为 base64
-            b64_data = base64.b64encode(image_data).decode('utf-8')
-            return f"data:{mime_type};base64,{b64_data}"
+            # 配置了暂存存储时上传一次并使用签名 URL，避免请求体内联 Base64
+            stager = staging.from_credentials(self.runtime.credentials)
+            if stager is not None:
+                try:
+                    staged_url = stager.stage_file(buffer, mime_type)
+                    buffer.close()
+                    return staged_url
+                except Exception:
+                    pass  # 暂存失败时退回 base64
+            
+            return spool.Base64Value(buffer, f"data:{mime_type};base64,")
             
         except Exception:
             return None
@@ -155,37 +170,23 @@ class TextToImageTool(Tool):
     def _get_image_size_from_url(self, url: str) -> Optional[Tuple[int, int]]:
         """
         从图片 URL 获取图片尺寸（宽, 高）
-        只下载图片头部信息，不下载完整图片，节省带宽
+        只按需分段读取图片头部，不下载完整图片，节省带宽（见 utils/image_probe.py）
         
         Args:
             url: 图片的 URL 地址
             
         Returns:
-            (width, height) 或 None（获取失败时）
+            按 EXIF 方向换算后的 (width, height) 或 None（获取失败时）
         """
-        try:
-            # 设置请求头，只获取部分内容
-            headers = {
-                'Range': 'bytes=0-65535',  # 只获取前64KB，足够解析大多数图片头部
-                'User-Agent': 'Mozilla/5.0'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=10, stream=True)
-            
-            # 读取图片数据
-            data = response.content
-            
-            # 尝试识别图片格式并获取尺寸
-            size = self._get_image_dimensions(data)
-            return size
-            
-        except Exception:
+        info = image_probe.probe(url)
+        if not info:
             return None
+        return image_probe.display_size(info)
     
     def _get_image_dimensions(self, data: bytes) -> Optional[Tuple[int, int]]:
         """
         从图片二进制数据解析图片尺寸
-        支持 PNG, JPEG, GIF, WEBP 格式
+        支持 PNG, JPEG, GIF, WEBP, BMP, TIFF, AVIF, HEIC 格式
         
         Args:
             data: 图片的二进制数据（至少需要头部信息）
@@ -193,93 +194,10 @@ class TextToImageTool(Tool):
         Returns:
             (width, height) 或 None
         """
-        # PNG 格式: 前8字节是签名，接下来是IHDR块
-        if data[:8] == b'\x89PNG\r\n\x1a\n':
-            # IHDR 块在第 16-24 字节包含宽度和高度
-            if len(data) >= 24:
-                width = struct.unpack('>I', data[16:20])[0]
-                height = struct.unpack('>I', data[20:24])[0]
-                return (width, height)
-        
-        # JPEG 格式
-        if data[:2] == b'\xff\xd8':
-            # JPEG 需要解析 SOF 标记
-            try:
-                return self._get_jpeg_dimensions(data)
-            except Exception:
-                pass
-        
-        # GIF 格式
-        if data[:6] in (b'GIF87a', b'GIF89a'):
-            if len(data) >= 10:
-                width = struct.unpack('<H', data[6:8])[0]
-                height = struct.unpack('<H', data[8:10])[0]
-                return (width, height)
-        
-        # WEBP 格式
-        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
-            try:
-                return self._get_webp_dimensions(data)
-            except Exception:
-                pass
-        
-        return None
-    
-    def _get_jpeg_dimensions(self, data: bytes) -> Optional[Tuple[int, int]]:
-        """解析 JPEG 图片尺寸"""
-        i = 2
-        while i < len(data) - 9:
-            if data[i] != 0xff:
-                i += 1
-                continue
-            
-            marker = data[i + 1]
-            
-            # SOF 标记 (0xC0-0xCF, 除了 0xC4, 0xC8, 0xCC)
-            if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
-                         0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
-                if i + 9 <= len(data):
-                    height = struct.unpack('>H', data[i + 5:i + 7])[0]
-                    width = struct.unpack('>H', data[i + 7:i + 9])[0]
-                    return (width, height)
-            
-            # 跳过当前标记块
-            if i + 4 <= len(data):
-                length = struct.unpack('>H', data[i + 2:i + 4])[0]
-                i += 2 + length
-            else:
-                break
-        
-        return None
-    
-    def _get_webp_dimensions(self, data: bytes) -> Optional[Tuple[int, int]]:
-        """解析 WEBP 图片尺寸"""
-        if len(data) < 30:
+        info = image_probe.parse(data)
+        if not info:
             return None
-        
-        # VP8 格式
-        if data[12:16] == b'VP8 ':
-            if len(data) >= 30:
-                width = struct.unpack('<H', data[26:28])[0] & 0x3fff
-                height = struct.unpack('<H', data[28:30])[0] & 0x3fff
-                return (width, height)
-        
-        # VP8L 格式 (无损)
-        if data[12:16] == b'VP8L':
-            if len(data) >= 25:
-                bits = struct.unpack('<I', data[21:25])[0]
-                width = (bits & 0x3fff) + 1
-                height = ((bits >> 14) & 0x3fff) + 1
-                return (width, height)
-        
-        # VP8X 格式 (扩展)
-        if data[12:16] == b'VP8X':
-            if len(data) >= 30:
-                width = struct.unpack('<I', data[24:27] + b'\x00')[0] + 1
-                height = struct.unpack('<I', data[27:30] + b'\x00')[0] + 1
-                return (width, height)
-        
-        return None
+        return image_probe.display_size(info)
     
     def _find_closest_supported_size(self, width: int, height: int, is_i2i: bool = False) -> str:
         """
@@ -329,6 +247,7 @@ class TextToImageTool(Tool):
         
         return self.DEFAULT_SIZE_I2I if is_i2i else self.DEFAULT_SIZE
 
+    @output.compactable
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -336,10 +255,10 @@ class TextToImageTool(Tool):
         执行工具调用 - 生成图片
         """
         # 获取凭证
-        api_key = self.runtime.credentials.get("volcengine_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "volcengine"):
             yield self.create_text_message("❌ 错误：请配置火山引擎 API Key")
             return
+        api_base = endpoints.select(self.runtime.credentials, "volcengine", self.VOLCENGINE_API_BASE)
         
         # 解析参数 - 直接使用工作流配置的模型
         # 注意：Seedream 是火山引擎的公共图像模型，不需要通过 endpoint 访问
@@ -473,7 +392,6 @@ class TextToImageTool(Tool):
         
         # 构建请求头
         headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
@@ -523,12 +441,15 @@ class TextToImageTool(Tool):
         
         try:
             # 发送请求 - 使用 images/generations 端点
-            response = requests.post(
-                f"{self.VOLCENGINE_API_BASE}/images/generations",
-                headers=headers,
-                json=payload,
-                timeout=120  # 图片生成可能需要较长时间
-            )
+            with keypool.reserve(self.runtime.credentials, "volcengine") as api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+                response = http_client.post(
+                    f"{api_base}/images/generations",
+                    headers=headers,
+                    json=payload,
+                    timeout=120,  # 图片生成可能需要较长时间
+                )
+            keypool.report(api_key, response.status_code, response.headers)
             
             if response.status_code != 200:
                 error_text = response.text
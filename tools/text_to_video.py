@@ -14,15 +14,18 @@
 """
 
 import time
-import base64
-import logging
 import requests
 from typing import Any, Generator
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils import (
+    breaker, callbacks, fetch, http_client, keypool, log, mp4, output, progress, reachability,
+    router, speech, spool, staging, task_api, task_store, task_wait,
+)
 
-class TextToVideoTool(Tool):
+
+class TextToVideoTool(task_wait.TaskWaitMixin, Tool):
     """文本生成视频工具 - 三平台支持"""
 
     # ========== 阿里云百炼配置 ==========
@@ -79,6 +82,18 @@ class TextToVideoTool(Tool):
     # 轮询配置 - Dify 插件有 10 分钟硬性超时，设置 8 分钟以留出余量
     POLL_INTERVAL = 5  # 轮询间隔（秒）
     MAX_POLL_ATTEMPTS = 96  # 96 * 5 = 480秒 = 8分钟
+    # 配置回调后轮询降为兜底：每 6 个间隔（30秒）查询一次，收到回调立即查询
+    CALLBACK_FALLBACK_EVERY = 6
+    # 跨调用累计等待上限（秒）- 长任务可分多次调用续等，超过后不再继续等待
+    MAX_TOTAL_WAIT = 3600
+
+    # 对冲提交配置 - 主平台超过 hedge_delay 秒仍未开始生成时，追加提交到备用平台
+    HEDGE_PROVIDERS = ("aliyun", "volcengine")
+    HEDGE_DEFAULT_DELAY = 60  # 默认等待秒数
+    HEDGE_FALLBACK_MODELS = {
+        "aliyun": "wan2.6-t2v",
+        "volcengine": "doubao-seedance-1-5-pro-251215",
+    }
 
     # ========== 图片处理方法（用于火山方舟 I2V 模式）==========
     def _extract_image_url(self, image_param: Any) -> tuple[str, str]:
@@ -119,61 +134,51 @@ class TextToVideoTool(Tool):
         except Exception:
             return image_url
 
-    def _convert_image_to_base64(self, image_url: str) -> tuple[str, str]:
-        """下载图片并转换为Base64格式"""
+    def _convert_image_to_base64(self, image_url: str) -> tuple[spool.Base64Value | str, str]:
+        """
+        下载图片并转换为Base64格式（内部地址与原地址竞速）
+
+        返回 data URL 字段值：图片保存在缓冲区中（大图片转存临时文件），
+        提交时才分块编码写入请求体（见 utils/spool.py）
+        """
         internal_url = self._convert_to_internal_url(image_url)
         
         try:
-            response = requests.get(internal_url, timeout=30, stream=True)
-            response.raise_for_status()
-            content_type = response.headers.get('Content-Type', 'image/jpeg')
-            if not content_type.startswith('image/'):
-                content_type = 'image/jpeg'
-            image_format = content_type.split('/')[-1].lower()
-            format_map = {'jpg': 'jpeg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
-            image_format = format_map.get(image_format, 'jpeg')
-            base64_data = base64.b64encode(response.content).decode('utf-8')
-            return f"data:image/{image_format};base64,{base64_data}", ""
+            content_type, buffer = fetch.fetch_buffer(
+                image_url, internal_url, timeout=30
+            )
         except Exception as e:
-            if internal_url != image_url:
-                try:
-                    response = requests.get(image_url, timeout=30, stream=True)
-                    response.raise_for_status()
-                    content_type = response.headers.get('Content-Type', 'image/jpeg')
-                    if not content_type.startswith('image/'):
-                        content_type = 'image/jpeg'
-                    image_format = content_type.split('/')[-1].lower()
-                    format_map = {'jpg': 'jpeg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
-                    image_format = format_map.get(image_format, 'jpeg')
-                    base64_data = base64.b64encode(response.content).decode('utf-8')
-                    return f"data:image/{image_format};base64,{base64_data}", ""
-                except Exception as e2:
-                    return "", f"图片处理失败: {str(e2)}"
             return "", f"图片处理失败: {str(e)}"
+        
+        if not content_type.startswith('image/'):
+            content_type = 'image/jpeg'
+        image_format = content_type.split('/')[-1].split(';')[0].lower()
+        format_map = {'jpg': 'jpeg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
+        image_format = format_map.get(image_format, 'jpeg')
+        return spool.Base64Value(buffer, f"data:image/{image_format};base64,"), ""
 
-    def _is_public_accessible_url(self, url: str) -> bool:
-        """判断URL是否可被火山引擎公网访问"""
-        from urllib.parse import urlparse
+    def _stage_image(self, image_url: str) -> tuple[str, str]:
+        """
+        下载图片并暂存到配置的对象存储，返回 (签名URL, 错误信息)
+
+        未配置暂存存储时返回 ("", "")，调用方继续使用 Base64（见 utils/staging.py）
+        """
+        stager = staging.from_credentials(self.runtime.credentials)
+        if stager is None:
+            return "", ""
+        internal_url = self._convert_to_internal_url(image_url)
         try:
-            parsed = urlparse(url)
-            host = parsed.hostname or ""
-            private_patterns = [
-                'localhost', '127.0.0.1', '127.', '10.',
-                '172.16.', '172.17.', '172.18.', '172.19.',
-                '172.20.', '172.21.', '172.22.', '172.23.',
-                '172.24.', '172.25.', '172.26.', '172.27.',
-                '172.28.', '172.29.', '172.30.', '172.31.',
-                '192.168.', '169.254.',
-            ]
-            for pattern in private_patterns:
-                if host.startswith(pattern) or host == pattern.rstrip('.'):
-                    return False
-            port = parsed.port
-            if port and port not in [80, 443]:
-                return False
-            return True
-        except Exception:
-            return False
+            content_type, buffer = fetch.fetch_buffer(
+                image_url, internal_url, timeout=30
+            )
+            with buffer:
+                return stager.stage_file(buffer, content_type), ""
+        except Exception as e:
+            return "", f"图片暂存失败: {str(e)}"
+
+    def _is_public_accessible_url(self, url: str) -> bool:
+        """判断URL是否可被火山引擎公网访问（按解析后的 IP 判断，见 utils/reachability.py）"""
+        return reachability.is_public_url(url)
 
     def _get_video_duration_from_url(self, video_url: str) -> float:
         """
@@ -187,25 +192,22 @@ class TextToVideoTool(Tool):
         Returns:
             视频时长（秒），失败返回0
         """
-        import struct
-        import logging
-        
         try:
             # 下载视频文件的前128KB（足够包含moov atom）
             headers = {"Range": "bytes=0-131072"}
-            response = requests.get(video_url, headers=headers, timeout=10)
+            response = http_client.get(video_url, headers=headers, timeout=10)
             
             if response.status_code not in [200, 206]:
-                logging.warning(f"下载视频头部失败: HTTP {response.status_code}")
+                log.warning("video_duration_failed", url=video_url, reason=f"HTTP {response.status_code}")
                 return 0
             
             data = response.content
-            logging.info(f"下载视频头部: {len(data)} bytes")
+            log.debug("video_header", url=video_url, bytes=len(data))
             
             # 解析MP4文件，查找moov/mvhd atom
             duration = self._parse_mp4_duration(data)
             if duration > 0:
-                logging.info(f"从MP4头部解析到时长: {duration}秒")
+                log.debug("video_duration", url=video_url, source="header", seconds=duration)
                 return duration
             
             # 如果头部没有moov，可能moov在文件末尾
@@ -216,24 +218,24 @@ class TextToVideoTool(Tool):
                 try:
                     total_size = int(content_range.split("/")[-1])
                     if total_size < 10 * 1024 * 1024:  # 小于10MB
-                        logging.info(f"视频较小({total_size}bytes)，下载完整文件解析")
-                        full_response = requests.get(video_url, timeout=30)
+                        log.debug("video_full_download", url=video_url, bytes=total_size)
+                        full_response = http_client.get(video_url, timeout=30)
                         if full_response.status_code == 200:
                             duration = self._parse_mp4_duration(full_response.content)
                             if duration > 0:
-                                logging.info(f"从完整MP4解析到时长: {duration}秒")
+                                log.debug("video_duration", url=video_url, source="full", seconds=duration)
                                 return duration
                 except (ValueError, IndexError):
                     pass
             
-            logging.warning("无法从视频URL解析时长")
+            log.warning("video_duration_failed", url=video_url, reason="moov not found")
             return 0
             
         except requests.Timeout:
-            logging.warning("下载视频超时")
+            log.warning("video_duration_failed", url=video_url, reason="timeout")
             return 0
         except Exception as e:
-            logging.warning(f"获取视频时长失败: {str(e)}")
+            log.warning("video_duration_failed", url=video_url, reason=str(e))
             return 0
     
     def _parse_mp4_duration(self, data: bytes) -> float:
@@ -244,88 +246,17 @@ class TextToVideoTool(Tool):
         - moov atom 包含元数据
         - moov/mvhd atom 包含时长信息
         
+        box 解析见 utils/mp4.py（同时用于无损拼接）
+        
         Args:
             data: MP4文件数据（部分或完整）
             
         Returns:
             视频时长（秒），失败返回0
         """
-        import struct
-        import logging
-        
-        def find_atom(data: bytes, atom_type: bytes, start: int = 0) -> tuple:
-            """查找指定类型的atom，返回(位置, 大小)"""
-            pos = start
-            while pos < len(data) - 8:
-                try:
-                    size = struct.unpack(">I", data[pos:pos+4])[0]
-                    atype = data[pos+4:pos+8]
-                    
-                    if size == 0:  # atom到文件末尾
-                        size = len(data) - pos
-                    elif size == 1:  # 扩展大小
-                        if pos + 16 <= len(data):
-                            size = struct.unpack(">Q", data[pos+8:pos+16])[0]
-                        else:
-                            break
-                    
-                    if atype == atom_type:
-                        return pos, size
-                    
-                    if size < 8:
-                        break
-                    pos += size
-                except:
-                    break
-            return -1, 0
-        
-        try:
-            # 查找moov atom
-            moov_pos, moov_size = find_atom(data, b'moov')
-            if moov_pos < 0:
-                logging.debug("未找到moov atom")
-                return 0
-            
-            # 在moov内查找mvhd atom
-            moov_end = min(moov_pos + moov_size, len(data))
-            mvhd_pos, mvhd_size = find_atom(data, b'mvhd', moov_pos + 8)
-            
-            if mvhd_pos < 0 or mvhd_pos >= moov_end:
-                logging.debug("未找到mvhd atom")
-                return 0
-            
-            # 解析mvhd atom
-            mvhd_data = data[mvhd_pos + 8:]  # 跳过size和type
-            if len(mvhd_data) < 20:
-                return 0
-            
-            version = mvhd_data[0]
-            
-            if version == 0:
-                # 32位版本
-                if len(mvhd_data) < 20:
-                    return 0
-                timescale = struct.unpack(">I", mvhd_data[12:16])[0]
-                duration = struct.unpack(">I", mvhd_data[16:20])[0]
-            elif version == 1:
-                # 64位版本
-                if len(mvhd_data) < 28:
-                    return 0
-                timescale = struct.unpack(">I", mvhd_data[20:24])[0]
-                duration = struct.unpack(">Q", mvhd_data[24:32])[0]
-            else:
-                return 0
-            
-            if timescale > 0:
-                duration_seconds = duration / timescale
-                return round(duration_seconds, 2)
-            
-            return 0
-            
-        except Exception as e:
-            logging.debug(f"解析MP4失败: {str(e)}")
-            return 0
+        return mp4.parse_duration(data)
 
+    @output.compactable
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -335,6 +266,12 @@ class TextToVideoTool(Tool):
         provider = tool_parameters.get("provider", "aliyun")
         prompt = tool_parameters.get("prompt", "").strip()
         
+        # 续等已提交的任务（不重新提交）
+        resume_task_id = (tool_parameters.get("task_id") or "").strip()
+        if resume_task_id:
+            yield from self._resume_task(resume_task_id, tool_parameters)
+            return
+        
         # 参数验证
         if not prompt:
             yield self.create_text_message("❌ 错误：视频描述不能为空")
@@ -359,15 +296,283 @@ class TextToVideoTool(Tool):
         # 将图片URL存入参数供后续使用
         tool_parameters["_image_url"] = image_url
         
+        # 自动路由：按历史耗时、平台熔断状态和参考价格选择平台与模型
+        if provider == "auto":
+            route, rejected = router.choose("text_to_video", tool_parameters, self.runtime.credentials)
+            if route is None:
+                reasons = "\n".join(f"   - {reason}" for reason in rejected)
+                yield self.create_text_message(f"❌ 自动路由失败：没有满足条件的平台/模型\n{reasons}")
+                yield self.create_json_message({
+                    "success": False,
+                    "provider": "auto",
+                    "error_message": "没有满足条件的平台/模型"
+                })
+                return
+            provider = route["provider"]
+            tool_parameters["provider"] = provider
+            tool_parameters["model"] = route["model"]
+            samples_text = f"{route['samples']}个历史样本" if route["samples"] else "无历史数据，按默认值估算"
+            cost_text = f"约 ¥{route['cost']}（按单价估算，以平台账单为准）" if route["cost"] is not None else "未知"
+            yield self.create_text_message(
+                f"🧭 **自动路由** ({'费用优先' if route['objective'] == 'cost' else '速度优先'})\n"
+                f"🏢 平台: {provider}\n"
+                f"📝 模型: {route['model']}\n"
+                f"⏱️ 预计耗时: p50 {route['p50']}秒 / p95 {route['p95']}秒 ({samples_text})\n"
+                f"💰 预计费用: {cost_text}"
+            )
+        
+        # 请求指纹 - 相同请求的未完成任务可直接续等
+        tool_parameters["_fingerprint"] = task_store.fingerprint(
+            "text_to_video", provider, tool_parameters.get("model"), prompt,
+            tool_parameters.get("narration"), image_url
+        )
+        if tool_parameters.get("resume_pending", False):
+            pending = task_store.find_unfinished(tool_parameters["_fingerprint"])
+            if pending:
+                yield from self._resume_task(pending["task_id"], tool_parameters)
+                return
+        
+        # 对冲模式：主平台迟迟未开始时追加提交到备用平台
+        if tool_parameters.get("hedge_mode", False):
+            yield from self._invoke_hedged(tool_parameters)
+            return
+        
         # 根据平台分发调用
         if provider == "aliyun":
-            yield from self._invoke_aliyun(tool_parameters)
+            messages = self._invoke_aliyun(tool_parameters)
         elif provider == "volcengine":
-            yield from self._invoke_volcengine(tool_parameters)
+            messages = self._invoke_volcengine(tool_parameters)
         elif provider == "jxincm":
-            yield from self._invoke_jxincm(tool_parameters)
+            messages = self._invoke_jxincm(tool_parameters)
         else:
             yield self.create_text_message(f"❌ 错误：不支持的平台 {provider}")
+            return
+        yield from self._track_submission(provider, messages)
+
+    # ========== 对冲提交实现 ==========
+    def _invoke_hedged(
+        self, params: dict
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        对冲提交 - 降低单一平台的长尾延迟
+
+        1. 提交到主平台
+        2. 超过 hedge_delay 秒仍未进入 running/succeeded，追加提交到备用平台
+           （主平台提交失败或任务失败时立即追加）
+        3. 先完成者胜出，另一个任务在平台支持时取消
+        """
+        primary = params.get("provider", "aliyun")
+        secondary = params.get("hedge_provider") or (
+            "volcengine" if primary == "aliyun" else "aliyun"
+        )
+
+        fallback_reason = ""
+        if primary not in self.HEDGE_PROVIDERS or secondary not in self.HEDGE_PROVIDERS:
+            fallback_reason = "对冲模式仅支持阿里云百炼和火山方舟"
+        elif primary == secondary:
+            fallback_reason = "备用平台与主平台相同"
+        elif params.get("_image_url") and "aliyun" in (primary, secondary):
+            fallback_reason = "阿里云百炼平台不支持在此工具中使用图片"
+        elif not params.get("wait_for_completion", True):
+            fallback_reason = "对冲模式需要开启【等待完成】"
+
+        if fallback_reason:
+            yield self.create_text_message(f"⚠️ {fallback_reason}，已按普通模式提交")
+            if primary == "aliyun":
+                yield from self._invoke_aliyun(params)
+            elif primary == "volcengine":
+                yield from self._invoke_volcengine(params)
+            elif primary == "jxincm":
+                yield from self._invoke_jxincm(params)
+            else:
+                yield self.create_text_message(f"❌ 错误：不支持的平台 {primary}")
+            return
+
+        try:
+            hedge_delay = float(params.get("hedge_delay") or self.HEDGE_DEFAULT_DELAY)
+        except (ValueError, TypeError):
+            hedge_delay = self.HEDGE_DEFAULT_DELAY
+
+        yield self.create_text_message(
+            f"⚡ **对冲模式已开启**\n"
+            f"🥇 主平台: {primary}\n"
+            f"🥈 备用平台: {secondary} ({self.HEDGE_FALLBACK_MODELS[secondary]})\n"
+            f"⏱️ 主平台 {int(hedge_delay)} 秒内未开始生成将追加提交到备用平台"
+        )
+
+        tasks = []
+        primary_task = yield from self._submit_for_hedge(primary, params)
+        if primary_task:
+            tasks.append(primary_task)
+        hedged = False
+        start_time = time.time()
+        winner = None
+
+        try:
+            for _ in range(self.MAX_POLL_ATTEMPTS):
+                # 主平台失败（或迟迟未开始）时追加提交到备用平台
+                primary_started = any(
+                    t["provider"] == primary and t["status"] in ("running", "succeeded")
+                    for t in tasks
+                )
+                if not hedged and (
+                    not tasks
+                    or (not primary_started and time.time() - start_time >= hedge_delay)
+                ):
+                    hedged = True
+                    yield self.create_text_message(f"⚡ 主平台未及时开始生成，追加提交到 {secondary}...")
+                    secondary_task = yield from self._submit_for_hedge(secondary, params)
+                    if secondary_task:
+                        tasks.append(secondary_task)
+
+                if not tasks:
+                    break
+
+                for task in list(tasks):
+                    status, result = task_api.fetch_status(
+                        task["provider"], task["api_base"], task["api_key"], task["task_id"]
+                    )
+                    if status == "succeeded":
+                        winner = task
+                        break
+                    if status in ("failed", "canceled"):
+                        tasks.remove(task)
+                        self._end_hedge_task(task, status)
+                        yield self.create_text_message(
+                            f"⚠️ {task['provider']} 任务 `{task['task_id']}` 状态为 {status}"
+                        )
+                        continue
+                    if status != "unknown":
+                        task["status"] = status
+                        progress_text = task["tracker"].update(status, result)
+                        if progress_text:
+                            yield self.create_text_message(f"[{task['provider']}] {progress_text}")
+
+                if winner:
+                    break
+                if not tasks:
+                    if hedged:
+                        break
+                    continue  # 主平台已失败：立即追加提交到备用平台，不再等待轮询间隔
+                http_client.sleep(self.POLL_INTERVAL)
+        except GeneratorExit:
+            # 调用被中止（如工作流被停止）：取消已提交的任务，释放平台配额与并发名额
+            for task in tasks:
+                self._cancel_abandoned(task["provider"], task["api_key"], task["task_id"])
+            raise
+        finally:
+            # 对冲阶段的等待计入各任务的累计等待时间（胜出任务续等时据此扣减剩余时间）
+            for task in tasks:
+                task_store.add_wait(task["task_id"], time.time() - task["polled_from"])
+
+        if winner:
+            # 取消落败的任务，释放平台配额
+            for task in tasks:
+                if task is winner:
+                    continue
+                cancelled, error = task_api.cancel_task(
+                    task["provider"], task["api_base"], task["api_key"], task["task_id"]
+                )
+                if cancelled:
+                    yield self.create_text_message(f"🛑 已取消 {task['provider']} 任务 `{task['task_id']}`")
+                else:
+                    # 平台无法取消（已开始生成）时标记为已放弃：不再续等，平台侧仍在生成
+                    task_store.record(task["task_id"], status=task_store.ABANDONED)
+                    yield self.create_text_message(
+                        f"⚠️ 未能取消 {task['provider']} 任务 `{task['task_id']}`: {error}，"
+                        f"平台侧仍会继续生成（已放弃，不再等待）"
+                    )
+
+            yield self.create_text_message(f"🏁 {winner['provider']} 先完成，输出其结果")
+            # 复用各平台的轮询输出（任务已完成，仅需一次查询）
+            yield from self._wait_task(
+                winner["provider"], winner["api_key"], winner["task_id"], winner["model"]
+            )
+            return
+
+        if not tasks:
+            yield self.create_text_message("❌ 视频生成失败: 主平台和备用平台均未成功")
+            yield self.create_json_message({
+                "success": False,
+                "provider": primary,
+                "hedge_provider": secondary,
+                "status": "failed",
+                "error_message": "主平台和备用平台均未成功"
+            })
+            return
+
+        # 超时 - 任务仍在进行中
+        task_lines = "\n".join(f"   - 平台: {t['provider']}, 任务ID: {t['task_id']}" for t in tasks)
+        yield self.create_text_message(
+            f"⏰ 视频生成仍在进行中，已超过等待时间\n\n"
+            f"💡 请使用【查询任务状态】工具查询结果：\n"
+            f"{task_lines}"
+        )
+        yield self.create_json_message({
+            "success": True,
+            "provider": tasks[0]["provider"],
+            "model": tasks[0]["model"],
+            "task_id": tasks[0]["task_id"],
+            "status": "running",
+            "hedge_tasks": [
+                {"provider": t["provider"], "task_id": t["task_id"], **t["tracker"].snapshot()}
+                for t in tasks
+            ],
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待或使用query_task查询结果",
+            **tasks[0]["tracker"].snapshot()
+        })
+
+    def _end_hedge_task(self, task: dict, status: str) -> None:
+        """对冲阶段结束的任务：记录状态与等待时间，失败计入平台熔断器"""
+        task_store.record(task["task_id"], status=status)
+        task_store.add_wait(task["task_id"], time.time() - task["polled_from"])
+        if status == "failed":
+            breaker.get(task["provider"]).record_failure()
+
+    def _submit_for_hedge(
+        self, provider: str, params: dict
+    ) -> Generator[ToolInvokeMessage, None, dict | None]:
+        """
+        复用 _invoke_aliyun / _invoke_volcengine 仅提交任务（不等待）
+
+        文本消息照常输出，JSON 结果消息被拦截，用于提取任务ID。
+        返回任务信息字典，提交失败返回 None。
+        """
+        submit_params = dict(params)
+        submit_params["provider"] = provider
+        submit_params["wait_for_completion"] = False
+        if provider != params.get("provider"):
+            submit_params["model"] = self.HEDGE_FALLBACK_MODELS[provider]
+
+        if provider == "aliyun":
+            messages = self._invoke_aliyun(submit_params)
+        else:
+            messages = self._invoke_volcengine(submit_params)
+
+        task = None
+        for message in messages:
+            payload = task_api.get_json_object(message)
+            if payload is None:
+                yield message
+            elif payload.get("success") and payload.get("task_id"):
+                task = {
+                    "provider": provider,
+                    "api_base": self._api_base(provider, payload["task_id"]),
+                    "api_key": keypool.for_task(self.runtime.credentials, provider, payload["task_id"]),
+                    "task_id": payload["task_id"],
+                    "model": payload.get("model", submit_params.get("model", "")),
+                    "status": "pending",
+                    "tracker": progress.ProgressTracker(
+                        provider, payload["task_id"], payload.get("model", submit_params.get("model", ""))
+                    ),
+                    "polled_from": time.time(),
+                }
+            else:
+                breaker.get(provider).record_failure()
+                yield self.create_text_message(
+                    f"⚠️ {provider} 提交失败: {payload.get('error_message', '未知错误')}"
+                )
+        return task
 
     # ========== 阿里云百炼实现 ==========
     def _invoke_aliyun(
@@ -383,10 +588,10 @@ class TextToVideoTool(Tool):
         - wan2.6-t2v: 通义万相 2.6 (支持5/10/15秒，多分辨率)
         """
         # 获取凭证
-        api_key = self.runtime.credentials.get("aliyun_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "aliyun"):
             yield self.create_text_message("❌ 错误：请配置阿里云百炼 API Key")
             return
+        api_base = self._api_base("aliyun")
         
         # 解析参数
         model = params.get("model", "wan2.5-t2v-preview")
@@ -464,7 +669,6 @@ class TextToVideoTool(Tool):
         
         # 构建请求
         headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
             "X-DashScope-Async": "enable"  # 启用异步模式
         }
@@ -500,12 +704,15 @@ class TextToVideoTool(Tool):
         
         try:
             # 提交任务 - 使用 video-synthesis 端点
-            response = requests.post(
-                f"{self.ALIYUN_API_BASE}/services/aigc/video-generation/video-synthesis",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            with keypool.reserve(self.runtime.credentials, "aliyun") as api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+                response = http_client.post(
+                    f"{api_base}/services/aigc/video-generation/video-synthesis",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+            keypool.report(api_key, response.status_code, response.headers)
             
             result = response.json()
             
@@ -527,10 +734,15 @@ class TextToVideoTool(Tool):
                 return
             
             yield self.create_text_message(f"✅ 任务已提交\n🔖 任务ID: `{task_id}`")
+            task_store.record(
+                task_id, provider="aliyun", model=model, resolution=params.get("resolution", ""),
+                duration=params.get("duration", ""), fingerprint=params.get("_fingerprint", ""),
+                key_id=keypool.key_id(api_key), api_base=api_base,
+            )
             
             # 是否等待完成
             if wait_for_completion:
-                yield from self._poll_aliyun(api_key, task_id, model)
+                yield from self._wait_task("aliyun", api_key, task_id, model)
             else:
                 yield self.create_json_message({
                     "success": True,
@@ -548,22 +760,33 @@ class TextToVideoTool(Tool):
             yield self.create_text_message(f"❌ 错误: {str(e)}")
 
     def _poll_aliyun(
-        self, api_key: str, task_id: str, model: str
+        self, api_key: str, task_id: str, model: str,
+        max_attempts: int | None = None, waited: float = 0
     ) -> Generator[ToolInvokeMessage, None, None]:
         """
         轮询阿里云任务状态
         """
         headers = {"Authorization": f"Bearer {api_key}"}
         
-        for attempt in range(self.MAX_POLL_ATTEMPTS):
+        # 配置了回调地址时，收到回调立即查询，轮询降为兜底
+        waiter = callbacks.waiter_for(self.runtime.credentials, task_id)
+        
+        # 进度跟踪：解析平台返回的进度 / 排队位次，结合历史耗时估算剩余时间
+        tracker = progress.ProgressTracker("aliyun", task_id, model, waited)
+        
+        for attempt, response in http_client.poll(
+            f"{self._api_base('aliyun', task_id)}/tasks/{task_id}",
+            headers=headers,
+            interval=self.POLL_INTERVAL,
+            max_attempts=max_attempts or self.MAX_POLL_ATTEMPTS,
+            waiter=waiter,
+            fallback_every=self.CALLBACK_FALLBACK_EVERY
+        ):
+            if response is None:
+                continue  # 网络错误，等待下次轮询
             try:
-                response = requests.get(
-                    f"{self.ALIYUN_API_BASE}/tasks/{task_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
-                output = response.json().get("output", {})
+                result = response.json()
+                output = result.get("output", {})
                 status = output.get("task_status", "UNKNOWN")
                 
                 if status == "SUCCEEDED":
@@ -603,16 +826,13 @@ class TextToVideoTool(Tool):
                     return
                     
                 else:
-                    # 每30秒输出一次进度
-                    if attempt % 6 == 0:
-                        elapsed = attempt * self.POLL_INTERVAL
-                        yield self.create_text_message(
-                            f"⏳ 正在生成... {status} ({elapsed}秒)"
-                        )
-                    time.sleep(self.POLL_INTERVAL)
+                    # 每30秒（或排队位次变化时）输出一次进度与预计剩余时间
+                    progress_text = tracker.update(status, result)
+                    if progress_text:
+                        yield self.create_text_message(progress_text)
                     
-            except Exception as e:
-                time.sleep(self.POLL_INTERVAL)
+            except Exception:
+                continue
         
         # 超时 - 任务仍在进行中
         yield self.create_text_message(
@@ -621,6 +841,7 @@ class TextToVideoTool(Tool):
             f"💡 请使用【查询任务状态】工具，输入以下信息查询结果：\n"
             f"   - 平台: aliyun\n"
             f"   - 任务ID: {task_id}"
+            f"\n\n🔄 也可再次调用本工具并填写【续等任务ID】继续等待"
         )
         yield self.create_json_message({
             "success": True,  # 改为 True，因为任务仍在进行中
@@ -628,7 +849,8 @@ class TextToVideoTool(Tool):
             "model": model,
             "task_id": task_id,
             "status": "RUNNING",
-            "error_message": "等待超时，任务仍在进行中，请使用query_task查询结果"
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待或使用query_task查询结果",
+            **tracker.snapshot()
         })
 
     # ========== 火山方舟实现 (使用 Ark API) ==========
@@ -643,10 +865,10 @@ class TextToVideoTool(Tool):
         - I2V: content 包含 image_url + text
         """
         # 获取凭证
-        api_key = self.runtime.credentials.get("volcengine_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "volcengine"):
             yield self.create_text_message("❌ 错误：请配置火山方舟 API Key")
             return
+        api_base = self._api_base("volcengine")
         
         # 获取 endpoint_id，如果配置了则使用 endpoint_id，否则使用 model 名称
         endpoint_id = self.runtime.credentials.get("volcengine_endpoint_id", "").strip()
@@ -706,11 +928,22 @@ class TextToVideoTool(Tool):
         is_i2v_mode = bool(image_url)
         final_image_url = ""
         need_base64 = False
+        staged_url = ""
         
         # 处理图片（如果是 I2V 模式）
         if is_i2v_mode:
             need_base64 = not self._is_public_accessible_url(image_url)
             if need_base64:
+                # 配置了暂存存储时上传一次并使用签名 URL，避免请求体内联 Base64
+                staged_url, stage_error = self._stage_image(image_url)
+                if stage_error:
+                    yield self.create_text_message(f"⚠️ {stage_error}，改用Base64")
+                if staged_url:
+                    need_base64 = False
+                    yield self.create_text_message("☁️ 图片已暂存到对象存储，使用签名URL提交")
+            if staged_url:
+                final_image_url = staged_url
+            elif need_base64:
                 yield self.create_text_message("🔄 检测到内网图片地址，正在转换为Base64格式...")
                 base64_url, error = self._convert_image_to_base64(image_url)
                 if error:
@@ -758,7 +991,8 @@ class TextToVideoTool(Tool):
             f"{duration_info}"
         )
         if is_i2v_mode:
-            info_text += f"🖼️ 图片: {'Base64' if need_base64 else '公网URL'}\n"
+            image_source = "Base64" if need_base64 else ("对象存储签名URL" if staged_url else "公网URL")
+            info_text += f"🖼️ 图片: {image_source}\n"
             info_text += f"📐 宽高比: 由图片决定\n"
         elif aspect_ratio == "smart":
             info_text += f"📐 宽高比: 智能比例（自动）\n"
@@ -779,7 +1013,6 @@ class TextToVideoTool(Tool):
         
         # 构建请求头
         headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
@@ -813,17 +1046,18 @@ class TextToVideoTool(Tool):
         if use_smart_duration:
             # 🆕 真正的智能时长模式：传递 --dur -1，让模型自主决定时长
             prompt_params.append("--dur -1")
-            logging.info(f"🎤 使用智能时长模式: --dur -1 (模型自主决定 4-12 秒)")
+            log.debug("volcengine_duration", mode="smart", dur=-1)
         elif enable_audio and full_prompt:
-            # 配音模式（非智能时长）：根据文本长度计算时长，确保视频时长与配音匹配
-            text_for_duration = full_prompt.split('--')[0].strip()  # 去掉参数后缀
-            char_count = len(text_for_duration.replace(' ', '').replace('\n', ''))
-            # 使用 8字/秒（比标准9字/秒慢），确保有足够时间配完
-            # 并且向上取整 +1 秒余量，避免配音被截断
-            import math
-            calculated_duration = max(4, min(12, math.ceil(char_count / 8) + 1))
+            # 配音模式（非智能时长）：按文本成分预测朗读时间，并用该模型的历史校正系数修正，
+            # 确保视频时长覆盖整段配音（见 utils/speech.py）
+            calculated_duration, detail = speech.predict_duration(full_prompt, model)
             prompt_params.append(f"--dur {calculated_duration}")
-            logging.info(f"🎤 配音时长计算: {char_count}字 ÷ 8字/秒 + 1秒余量 = {calculated_duration}秒")
+            samples_text = f"{detail['samples']}个样本" if detail["samples"] else "无样本"
+            yield self.create_text_message(
+                f"🎤 配音时长预测: 朗读约 {detail['speech_seconds']}秒 × 校正 {detail['factor']} "
+                f"({samples_text}) → {calculated_duration}秒"
+            )
+            log.debug("volcengine_duration", mode="speech", dur=calculated_duration, **detail)
         elif duration_mode == "frames" and frames:
             # 按帧数模式：使用 --frames 参数（优先级高于 --dur）
             prompt_params.append(f"--frames {frames}")
@@ -885,6 +1119,11 @@ class TextToVideoTool(Tool):
         if api_parameters:
             payload["parameters"] = api_parameters
         
+        # 任务状态回调（配置 callback_base_url 后启用，轮询作为兜底）
+        callback_url = callbacks.callback_url(self.runtime.credentials, "volcengine")
+        if callback_url:
+            payload["callback_url"] = callback_url
+        
         # ✅ generate_audio 放在请求体根级别（官方示例格式）
         # ⚠️ 重要：只有 seedance-1-5-pro 模型支持 generate_audio 参数
         # 错误信息：model type can not support generate_audio except for seedance-1-5-pro
@@ -908,12 +1147,15 @@ class TextToVideoTool(Tool):
         
         try:
             # 提交任务
-            response = requests.post(
-                f"{self.VOLCENGINE_API_BASE}/contents/generations/tasks",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            with keypool.reserve(self.runtime.credentials, "volcengine") as api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+                response = http_client.post(
+                    f"{api_base}/contents/generations/tasks",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+            keypool.report(api_key, response.status_code, response.headers)
             
             if response.status_code != 200:
                 yield self.create_text_message(f"❌ 提交失败: {response.status_code} - {response.text}")
@@ -933,10 +1175,18 @@ class TextToVideoTool(Tool):
                 return
             
             yield self.create_text_message(f"✅ 任务已提交\n🔖 任务ID: `{task_id}`")
+            task_store.record(
+                task_id, provider="volcengine", model=model, resolution=params.get("resolution", ""),
+                duration=params.get("duration", ""), fingerprint=params.get("_fingerprint", ""),
+                key_id=keypool.key_id(api_key), api_base=api_base,
+            )
+            if enable_audio and use_smart_duration and full_prompt:
+                # 智能时长由模型按配音决定，完成后用实际时长校正配音时长预测
+                task_store.record(task_id, speech_seconds=speech.estimate(full_prompt))
             
             # 是否等待完成
             if wait_for_completion:
-                yield from self._poll_volcengine(api_key, task_id, model)
+                yield from self._wait_task("volcengine", api_key, task_id, model)
             else:
                 yield self.create_json_message({
                     "success": True,
@@ -954,7 +1204,8 @@ class TextToVideoTool(Tool):
             yield self.create_text_message(f"❌ 错误: {str(e)}")
 
     def _poll_volcengine(
-        self, api_key: str, task_id: str, model: str
+        self, api_key: str, task_id: str, model: str,
+        max_attempts: int | None = None, waited: float = 0
     ) -> Generator[ToolInvokeMessage, None, None]:
         """
         轮询火山方舟任务状态 (Ark API)
@@ -966,15 +1217,24 @@ class TextToVideoTool(Tool):
             "Content-Type": "application/json"
         }
         
-        for attempt in range(self.MAX_POLL_ATTEMPTS):
+        # 配置了回调地址时，收到回调立即查询，轮询降为兜底
+        waiter = callbacks.waiter_for(self.runtime.credentials, task_id)
+        
+        # 进度跟踪：解析平台返回的进度 / 排队位次，结合历史耗时估算剩余时间
+        tracker = progress.ProgressTracker("volcengine", task_id, model, waited)
+        
+        # 查询任务状态 - GET 请求
+        for attempt, response in http_client.poll(
+            f"{self._api_base('volcengine', task_id)}/contents/generations/tasks/{task_id}",
+            headers=headers,
+            interval=self.POLL_INTERVAL,
+            max_attempts=max_attempts or self.MAX_POLL_ATTEMPTS,
+            waiter=waiter,
+            fallback_every=self.CALLBACK_FALLBACK_EVERY
+        ):
+            if response is None:
+                continue  # 网络错误，等待下次轮询
             try:
-                # 查询任务状态 - GET 请求
-                response = requests.get(
-                    f"{self.VOLCENGINE_API_BASE}/contents/generations/tasks/{task_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
                 if response.status_code != 200:
                     yield self.create_text_message(f"❌ 查询失败: {response.status_code} - {response.text}")
                     yield self.create_json_message({
@@ -990,9 +1250,8 @@ class TextToVideoTool(Tool):
                 result = response.json()
                 status = result.get("status", "unknown")
                 
-                # 调试：输出完整API返回结构
-                import logging
-                logging.info(f"[火山方舟] API返回结构: {result}")
+                # 调试：输出完整API返回结构（需开启调试日志，按任务采样，输出时才序列化）
+                log.debug("volcengine_poll", task_id=task_id, status=status, response=lambda: result)
                 
                 if status == "succeeded":
                     # 获取视频URL和时长
@@ -1009,13 +1268,18 @@ class TextToVideoTool(Tool):
                         0
                     )
                     
-                    logging.info(f"[火山方舟] content字段: {content}")
-                    logging.info(f"[火山方舟] API返回的时长: {video_duration}")
+                    log.debug("volcengine_result", task_id=task_id, content=lambda: content, duration=video_duration)
                     
                     # 如果API没有返回时长，从视频URL提取
                     if not video_duration and video_url:
                         video_duration = self._get_video_duration_from_url(video_url)
-                        logging.info(f"[火山方舟] 从视频URL提取的时长: {video_duration}")
+                        log.debug("video_duration", task_id=task_id, source="url", seconds=video_duration)
+                    
+                    # 智能时长配音任务：实际时长作为配音时长预测的校正样本
+                    speech_seconds = (task_store.get(task_id) or {}).get("speech_seconds")
+                    if speech_seconds and video_duration:
+                        speech.observe(model, speech_seconds, video_duration)
+                        task_store.record(task_id, speech_seconds=None)  # 每个任务只记录一次
                     
                     # 🔧 修复：第一个文本消息输出JSON格式，便于工作流提取duration
                     # 工作流使用 tool.text 接收数据，所以必须在文本中包含duration
@@ -1075,16 +1339,13 @@ class TextToVideoTool(Tool):
                     return
                     
                 else:
-                    # 每30秒输出一次进度
-                    if attempt % 6 == 0:
-                        elapsed = attempt * self.POLL_INTERVAL
-                        yield self.create_text_message(
-                            f"⏳ 正在生成... ({elapsed}秒)"
-                        )
-                    time.sleep(self.POLL_INTERVAL)
+                    # 每30秒（或排队位次变化时）输出一次进度与预计剩余时间
+                    progress_text = tracker.update(status, result)
+                    if progress_text:
+                        yield self.create_text_message(progress_text)
                     
-            except Exception as e:
-                time.sleep(self.POLL_INTERVAL)
+            except Exception:
+                continue
         
         # 超时 - 任务仍在进行中
         yield self.create_text_message(
@@ -1093,6 +1354,7 @@ class TextToVideoTool(Tool):
             f"💡 请使用【查询任务状态】工具，输入以下信息查询结果：\n"
             f"   - 平台: volcengine\n"
             f"   - 任务ID: {task_id}"
+            f"\n\n🔄 也可再次调用本工具并填写【续等任务ID】继续等待"
         )
         yield self.create_json_message({
             "success": True,  # 改为 True，因为任务仍在进行中
@@ -1100,7 +1362,8 @@ class TextToVideoTool(Tool):
             "model": model,
             "task_id": task_id,
             "status": "running",
-            "error_message": "等待超时，任务仍在进行中，请使用query_task查询结果"
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待或使用query_task查询结果",
+            **tracker.snapshot()
         })
 
     # ========== JXINCM (Sora2) 实现 ==========
@@ -1119,10 +1382,10 @@ class TextToVideoTool(Tool):
         注意：视频时长固定为15秒
         """
         # 获取凭证
-        api_key = self.runtime.credentials.get("jxincm_api_key", "")
-        if not api_key:
+        if not keypool.keys(self.runtime.credentials, "jxincm"):
             yield self.create_text_message("❌ 错误：请配置 JXINCM API Key")
             return
+        api_base = self._api_base("jxincm")
         
         # 解析参数
         model = params.get("model", "sora-2")
@@ -1134,6 +1397,14 @@ class TextToVideoTool(Tool):
         # 检查是否有图片参数（I2V 模式）
         image_url = params.get("_image_url", "")
         is_i2v_mode = bool(image_url)
+        if is_i2v_mode and not self._is_public_accessible_url(image_url):
+            # 内网图片平台无法访问，配置了暂存存储时改用签名 URL
+            staged_url, stage_error = self._stage_image(image_url)
+            if stage_error:
+                yield self.create_text_message(f"⚠️ {stage_error}，仍使用原图片URL")
+            if staged_url:
+                image_url = staged_url
+                yield self.create_text_message("☁️ 图片已暂存到对象存储，使用签名URL提交")
         image_urls = [image_url] if is_i2v_mode else []
         
         model_name = self.JXINCM_MODELS.get(model, {}).get("name", model)
@@ -1157,7 +1428,6 @@ class TextToVideoTool(Tool):
         
         # 构建请求头
         headers = {
-            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
@@ -1175,12 +1445,15 @@ class TextToVideoTool(Tool):
         
         try:
             # 提交任务
-            response = requests.post(
-                f"{self.JXINCM_API_BASE}/video/create",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            with keypool.reserve(self.runtime.credentials, "jxincm") as api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
+                response = http_client.post(
+                    f"{api_base}/video/create",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+            keypool.report(api_key, response.status_code, response.headers)
             
             if response.status_code != 200:
                 error_text = response.text
@@ -1206,10 +1479,15 @@ class TextToVideoTool(Tool):
                 return
             
             yield self.create_text_message(f"✅ 任务已提交\n🔖 任务ID: `{task_id}`")
+            task_store.record(
+                task_id, provider="jxincm", model=model, resolution=params.get("resolution", ""),
+                duration=params.get("duration", ""), fingerprint=params.get("_fingerprint", ""),
+                key_id=keypool.key_id(api_key), api_base=api_base,
+            )
             
             # 是否等待完成
             if wait_for_completion:
-                yield from self._poll_jxincm(api_key, task_id, model)
+                yield from self._wait_task("jxincm", api_key, task_id, model)
             else:
                 yield self.create_json_message({
                     "success": True,
@@ -1227,7 +1505,8 @@ class TextToVideoTool(Tool):
             yield self.create_text_message(f"❌ 错误: {str(e)}")
 
     def _poll_jxincm(
-        self, api_key: str, task_id: str, model: str
+        self, api_key: str, task_id: str, model: str,
+        max_attempts: int | None = None, waited: float = 0
     ) -> Generator[ToolInvokeMessage, None, None]:
         """
         轮询 JXINCM 任务状态
@@ -1239,15 +1518,19 @@ class TextToVideoTool(Tool):
             "Content-Type": "application/json"
         }
         
-        for attempt in range(self.MAX_POLL_ATTEMPTS):
+        # 进度跟踪：解析平台返回的进度 / 排队位次，结合历史耗时估算剩余时间
+        tracker = progress.ProgressTracker("jxincm", task_id, model, waited)
+        
+        # 查询任务状态
+        for attempt, response in http_client.poll(
+            f"{self._api_base('jxincm', task_id)}/video/query?id={task_id}",
+            headers=headers,
+            interval=self.POLL_INTERVAL,
+            max_attempts=max_attempts or self.MAX_POLL_ATTEMPTS
+        ):
+            if response is None:
+                continue  # 网络错误，等待下次轮询
             try:
-                # 查询任务状态
-                response = requests.get(
-                    f"{self.JXINCM_API_BASE}/video/query?id={task_id}",
-                    headers=headers,
-                    timeout=30
-                )
-                
                 if response.status_code != 200:
                     yield self.create_text_message(f"❌ 查询失败: {response.status_code} - {response.text}")
                     yield self.create_json_message({
@@ -1262,7 +1545,6 @@ class TextToVideoTool(Tool):
                 
                 result = response.json()
                 status = result.get("status", "unknown")
-                progress = result.get("progress", 0)
                 
                 if status == "completed":
                     # 获取视频信息
@@ -1309,16 +1591,13 @@ class TextToVideoTool(Tool):
                     return
                     
                 else:
-                    # 每30秒输出一次进度
-                    if attempt % 6 == 0:
-                        elapsed = attempt * self.POLL_INTERVAL
-                        yield self.create_text_message(
-                            f"⏳ 正在生成... {status} ({progress}% - {elapsed}秒)"
-                        )
-                    time.sleep(self.POLL_INTERVAL)
+                    # 每30秒（或排队位次变化时）输出一次进度与预计剩余时间
+                    progress_text = tracker.update(status, result)
+                    if progress_text:
+                        yield self.create_text_message(progress_text)
                     
-            except Exception as e:
-                time.sleep(self.POLL_INTERVAL)
+            except Exception:
+                continue
         
         # 超时 - 任务仍在进行中
         yield self.create_text_message(
@@ -1327,6 +1606,7 @@ class TextToVideoTool(Tool):
             f"💡 请使用【查询任务状态】工具，输入以下信息查询结果：\n"
             f"   - 平台: jxincm\n"
             f"   - 任务ID: {task_id}"
+            f"\n\n🔄 也可再次调用本工具并填写【续等任务ID】继续等待"
         )
         yield self.create_json_message({
             "success": True,
@@ -1334,5 +1614,6 @@ class TextToVideoTool(Tool):
             "model": model,
             "task_id": task_id,
             "status": "running",
-            "error_message": "等待超时，任务仍在进行中，请使用query_task查询结果"
+            "error_message": "等待超时，任务仍在进行中，可填写task_id继续等待或使用query_task查询结果",
+            **tracker.snapshot()
         })
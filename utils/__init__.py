@@ -0,0 +1,5 @@
+"""
+AI视频生成插件 - 公共工具模块
+
+各工具（tools/*.py）共用的平台接口封装与辅助函数。
+"""
@@ -0,0 +1,91 @@
+"""
+平台熔断器
+
+连续失败（提交失败、任务失败）达到阈值后熔断该平台，熔断期间自动路由不再选择它；
+冷却时间过后进入半开状态，允许一次试探，成功则恢复，失败则重新熔断。
+视频任务的结果要几分钟后才知道，试探期间其他调用仍视为熔断；试探超过 PROBE_TIMEOUT 秒
+仍未报告结果（如调用被中止）时，允许下一次试探。
+状态保存在进程内，插件进程重启后重置。
+"""
+
+import threading
+import time
+
+# 连续失败多少次后熔断
+FAILURE_THRESHOLD = 3
+# 熔断冷却时间（秒）
+RECOVERY_TIMEOUT = 300
+# 半开状态下单次试探的最长等待（秒），超过后允许新的试探
+PROBE_TIMEOUT = 900
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个平台的熔断器"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.opened_at: float | None = None
+        # 半开状态下试探开始的时间（None 表示没有进行中的试探）
+        self.probe_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.time() - self.opened_at >= RECOVERY_TIMEOUT:
+            return HALF_OPEN
+        return OPEN
+
+    def _probing(self, now: float) -> bool:
+        return self.probe_at is not None and now - self.probe_at < PROBE_TIMEOUT
+
+    def available(self) -> bool:
+        """是否可以选择该平台（不占用试探名额）"""
+        with self._lock:
+            state = self.state
+            return state == CLOSED or (state == HALF_OPEN and not self._probing(time.time()))
+
+    def allow(self) -> bool:
+        """
+        向该平台提交前调用：关闭状态始终允许；半开状态下只有第一个调用者获得试探名额
+        """
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            now = time.time()
+            if state == OPEN or self._probing(now):
+                return False
+            self.probe_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.probe_at = None
+            if self.state == HALF_OPEN or self.failures >= FAILURE_THRESHOLD:
+                self.opened_at = time.time()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get(name: str) -> CircuitBreaker:
+    """获取平台熔断器（按需创建）"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
@@ -0,0 +1,251 @@
+"""
+任务完成回调接收器
+
+火山方舟创建任务时支持传入 callback_url，任务状态变化时平台会 POST 任务详情到该地址；
+阿里云百炼的异步任务通知也可以转发到这里。收到回调后唤醒正在等待的调用，
+轮询仅作为兜底（间隔拉长），从而去掉绝大部分状态查询请求。
+
+组成：
+- CallbackReceiver: 内嵌的轻量 HTTP 服务（ThreadingHTTPServer），也可以不启动服务，
+  由其他入口直接调用 handle() 投递事件（可插拔）
+- TaskWaiter: 单个任务的等待句柄，供轮询循环在两次查询之间等待回调
+
+回调地址格式: {callback_base_url}/callbacks/{provider}?token=xxx
+token 由凭证确定性派生（HMAC-SHA256(callback_secret, callback_base_url)，未配置 callback_secret 时
+以已配置的平台 API Key 作为密钥），同一凭证的各插件进程、重启前后提交的任务使用同一个 token，
+既能拒绝伪造的回调，也不会因为回调落到另一个进程而被拒绝。
+
+监听端口被占用（如同机的另一个插件进程已启动接收器）时，失败结果缓存 BIND_RETRY_INTERVAL 秒，
+期间本进程只使用轮询，不再每次调用都尝试绑定。
+"""
+
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 默认监听端口
+DEFAULT_PORT = 8765
+# 最多缓存的事件数（回调可能早于等待方注册到达）
+MAX_PENDING_EVENTS = 1024
+# 端口绑定失败后多久再重试（秒）
+BIND_RETRY_INTERVAL = 300
+# 未配置 callback_secret 时，用于派生 token 的 API Key 凭证
+TOKEN_KEY_CREDENTIALS = ("volcengine_api_key", "aliyun_api_key", "jxincm_api_key")
+
+
+def callback_token(credentials: dict) -> str:
+    """按凭证派生回调 token（同一凭证在所有进程中相同）"""
+    secret = (credentials.get("callback_secret") or "").strip() or "\n".join(
+        (credentials.get(name) or "").strip() for name in TOKEN_KEY_CREDENTIALS
+    )
+    base_url = (credentials.get("callback_base_url") or "").strip().rstrip("/")
+    return hmac.new(secret.encode("utf-8"), base_url.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def parse_event(payload: dict) -> str:
+    """从回调内容中提取任务ID（兼容火山方舟与阿里云百炼的格式）"""
+    if not isinstance(payload, dict):
+        return ""
+    # 阿里云百炼: {"output": {"task_id": ..., "task_status": ...}}
+    output = payload.get("output")
+    if isinstance(output, dict) and output.get("task_id"):
+        return str(output["task_id"])
+    # 火山方舟: {"id": ..., "status": ...}；其他: {"task_id": ...}
+    return str(payload.get("id") or payload.get("task_id") or "")
+
+
+class TaskWaiter:
+    """单个任务的回调等待句柄"""
+
+    def __init__(self, receiver: "CallbackReceiver", task_id: str):
+        self.receiver = receiver
+        self.task_id = task_id
+        self.event = threading.Event()
+        self.payload: dict = {}
+
+    def wait(self, timeout: float) -> bool:
+        """阻塞等待回调，收到回调返回 True（并重置，以便等待下一次状态变化）"""
+        if self.event.wait(timeout):
+            self.event.clear()
+            return True
+        return False
+
+    def close(self) -> None:
+        self.receiver.release(self.task_id)
+
+
+class CallbackReceiver:
+    """任务完成回调接收器"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = DEFAULT_PORT, token: str = ""):
+        self.host = host
+        self.port = port
+        # 未指定时随机生成（测试 / 单独使用）
+        self.token = token or secrets.token_urlsafe(16)
+        self._tokens = {self.token}
+        self._lock = threading.Lock()
+        self._waiters: dict[str, TaskWaiter] = {}
+        self._pending: OrderedDict[str, dict] = OrderedDict()
+        self._server: ThreadingHTTPServer | None = None
+
+    # ---------- 等待方 ----------
+    def register(self, task_id: str) -> TaskWaiter:
+        """注册任务等待句柄；若回调已提前到达则立即处于触发状态"""
+        with self._lock:
+            waiter = self._waiters.get(task_id)
+            if waiter is None:
+                waiter = TaskWaiter(self, task_id)
+                self._waiters[task_id] = waiter
+            payload = self._pending.pop(task_id, None)
+        if payload is not None:
+            waiter.payload = payload
+            waiter.event.set()
+        return waiter
+
+    def release(self, task_id: str) -> None:
+        with self._lock:
+            self._waiters.pop(task_id, None)
+
+    # ---------- token ----------
+    def accept_token(self, token: str) -> None:
+        """接受另一个 token（同一进程服务多套凭证时）"""
+        with self._lock:
+            self._tokens.add(token)
+
+    def token_valid(self, token: str) -> bool:
+        with self._lock:
+            tokens = list(self._tokens)
+        return any(secrets.compare_digest(token, candidate) for candidate in tokens)
+
+    # ---------- 事件投递（可插拔入口）----------
+    def handle(self, payload: dict) -> bool:
+        """
+        投递一条回调事件
+
+        Returns:
+            是否识别出任务ID
+        """
+        task_id = parse_event(payload)
+        if not task_id:
+            return False
+        with self._lock:
+            waiter = self._waiters.get(task_id)
+            if waiter is None:
+                self._pending[task_id] = payload
+                self._pending.move_to_end(task_id)
+                while len(self._pending) > MAX_PENDING_EVENTS:
+                    self._pending.popitem(last=False)
+                return True
+        waiter.payload = payload
+        waiter.event.set()
+        return True
+
+    # ---------- 内嵌 HTTP 服务 ----------
+    def start(self) -> None:
+        """启动 HTTP 服务（后台线程）"""
+        if self._server is not None:
+            return
+        receiver = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                token = parse_qs(parsed.query).get("token", [""])[0]
+                if not parsed.path.startswith("/callbacks/") or not receiver.token_valid(token):
+                    self.send_response(403)
+                    self.end_headers()
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except (ValueError, json.JSONDecodeError):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                accepted = receiver.handle(payload)
+                self.send_response(200 if accepted else 422)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass  # 不输出访问日志
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        # 端口为 0 时由系统分配，回填实际端口
+        self.port = self._server.server_address[1]
+        threading.Thread(
+            target=self._server.serve_forever, name="ai-video-callbacks", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def callback_url(self, base_url: str, provider: str, token: str = "") -> str:
+        """生成传给平台的回调地址"""
+        return f"{base_url.rstrip('/')}/callbacks/{provider}?token={token or self.token}"
+
+
+# ========== 进程级单例 ==========
+_receiver: CallbackReceiver | None = None
+_receiver_lock = threading.Lock()
+# 端口绑定失败的时间（0 表示未失败）
+_bind_failed_at = 0.0
+
+
+def get_receiver(credentials: dict) -> CallbackReceiver | None:
+    """
+    根据凭证获取（必要时启动）回调接收器
+
+    未配置 callback_base_url，或监听端口绑定失败（BIND_RETRY_INTERVAL 秒内不再重试）时返回 None，
+    表示仅使用轮询。
+    """
+    global _receiver, _bind_failed_at
+    if not (credentials.get("callback_base_url") or "").strip():
+        return None
+    token = callback_token(credentials)
+    with _receiver_lock:
+        if _receiver is None:
+            if time.time() - _bind_failed_at < BIND_RETRY_INTERVAL:
+                return None
+            try:
+                port = int(credentials.get("callback_port") or DEFAULT_PORT)
+            except (ValueError, TypeError):
+                port = DEFAULT_PORT
+            receiver = CallbackReceiver(port=port, token=token)
+            try:
+                receiver.start()
+            except OSError:
+                _bind_failed_at = time.time()
+                return None
+            _bind_failed_at = 0.0
+            _receiver = receiver
+        receiver = _receiver
+    receiver.accept_token(token)
+    return receiver
+
+
+def callback_url(credentials: dict, provider: str) -> str:
+    """获取传给平台的回调地址，未启用回调时返回空字符串"""
+    receiver = get_receiver(credentials)
+    if receiver is None:
+        return ""
+    return receiver.callback_url(
+        credentials["callback_base_url"].strip(), provider, callback_token(credentials)
+    )
+
+
+def waiter_for(credentials: dict, task_id: str) -> TaskWaiter | None:
+    """为任务注册回调等待句柄，未启用回调时返回 None"""
+    receiver = get_receiver(credentials)
+    if receiver is None:
+        return None
+    return receiver.register(task_id)
@@ -0,0 +1,304 @@
+"""
+HTTP 录制 / 回放 (cassette)
+
+为了离线、可重复地测量 _invoke_* / _poll_* 中的解析、请求体构建和轮询逻辑的性能，
+共享 HTTP 层（utils/http_client.py）可以把所有平台请求录制到 cassette 文件并回放：
+- record：照常发送请求，把请求与响应（状态码、响应头、响应体、耗时）逐条写入 cassette（覆盖同名文件）
+- replay：不发送请求，按录制顺序返回响应；轮询间隔不再等待，以最快速度复现一次运行
+- replay_timed：回放时按录制的耗时等待，轮询间隔照常等待，复现原始时序
+
+通过环境变量开启：AI_VIDEO_CASSETTE=文件路径，AI_VIDEO_CASSETTE_MODE=record / replay / replay_timed
+（默认 replay）；测试和基准脚本也可以用 use() 临时开启。
+
+录制时脱敏：Authorization 等认证头、URL 与请求体中的密钥 / 签名参数替换为 REDACTED，
+Bearer Token 的原文在响应体中出现时同样替换。请求按 (方法, 脱敏后的 URL, Range) 匹配，
+同一请求多次出现（如轮询）时依次返回录制的响应，用完后重复最后一个。
+请求体只记录前 MAX_REQUEST_BODY 个字符用于排查，不参与匹配。
+"""
+
+import base64
+import contextlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+MODES = ("record", "replay", "replay_timed")
+REDACTED = "REDACTED"
+# 需要脱敏的请求头（小写）
+SECRET_HEADERS = (
+    "authorization", "x-api-key", "api-key", "cookie", "set-cookie", "x-amz-security-token",
+)
+# URL 查询参数 / JSON 字段名中出现这些词时脱敏
+SECRET_NAMES = re.compile(
+    r"signature|token|secret|password|credential|api[_-]?key|access[_-]?key", re.I
+)
+# 请求体记录的最大字符数（Base64 图片等大请求体只保留开头）
+MAX_REQUEST_BODY = 2000
+
+_lock = threading.Lock()
+_active: "Cassette | None" = None
+_env_loaded = False
+
+
+class CassetteError(Exception):
+    """回放时找不到对应的录制记录"""
+
+
+class Headers(dict):
+    """大小写不敏感的响应头"""
+
+    def __init__(self, items: dict):
+        super().__init__({key.lower(): value for key, value in items.items()})
+
+    def __getitem__(self, key: str) -> Any:
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and super().__contains__(key.lower())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return super().get(key.lower(), default)
+
+
+class Response:
+    """回放的响应，用法与 requests.Response 常用部分一致"""
+
+    def __init__(self, url: str, status_code: int, headers: dict, content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = Headers(headers)
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1):
+        for start in range(0, len(self.content), chunk_size or len(self.content) or 1):
+            yield self.content[start:start + (chunk_size or len(self.content))]
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            import requests
+
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def close(self) -> None:
+        pass
+
+
+def _scrub_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [
+        (name, REDACTED if SECRET_NAMES.search(name) else value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query, safe=":/")))
+
+
+def _scrub_json(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if SECRET_NAMES.search(str(key)) else _scrub_json(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_scrub_json(item) for item in value]
+    return value
+
+
+def _scrub_text(text: str, secrets: list[str]) -> str:
+    for secret in secrets:
+        text = text.replace(secret, REDACTED)
+    # 响应体中的签名 URL（视频 / 封面地址）
+    return re.sub(
+        r"((?:[?&]|\\u0026)[^=&\"'\s]*(?:" + SECRET_NAMES.pattern + r")[^=&\"'\s]*=)[^&\"'\s\\]*",
+        r"\1" + REDACTED, text, flags=re.I,
+    )
+
+
+def _match_key(method: str, url: str, headers: dict | None) -> str:
+    range_header = next(
+        (value for key, value in (headers or {}).items() if key.lower() == "range"), ""
+    )
+    return f"{method.upper()} {_scrub_url(url)} {range_header}".rstrip()
+
+
+class Cassette:
+    """一个 cassette 文件"""
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in MODES:
+            raise ValueError(f"不支持的 cassette 模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.interactions: list[dict] = []
+        self._cursors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode != "record":
+            with open(path, "r", encoding="utf-8") as f:
+                self.interactions = json.load(f).get("interactions", [])
+        self._by_key: dict[str, list[dict]] = {}
+        for interaction in self.interactions:
+            self._by_key.setdefault(interaction["key"], []).append(interaction)
+        self._started = time.monotonic()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode != "record"
+
+    def sleep(self, seconds: float) -> None:
+        """轮询间隔：快速回放时不等待"""
+        if self.mode != "replay":
+            time.sleep(seconds)
+
+    def request(self, method: str, url: str, send: Callable[[], Any], **kwargs) -> Any:
+        """录制模式下调用 send() 发送并记录，回放模式下返回录制的响应"""
+        key = _match_key(method, url, kwargs.get("headers"))
+        if self.replaying:
+            return self._replay(key)
+
+        secrets = self._secrets(kwargs.get("headers"))
+        start = time.monotonic()
+        try:
+            response = send()
+        except Exception as e:
+            self._append({
+                "key": key, "offset": round(start - self._started, 3),
+                "elapsed": round(time.monotonic() - start, 3),
+                "error": type(e).__name__, "message": _scrub_text(str(e), secrets),
+            })
+            raise
+        elapsed = time.monotonic() - start
+        content = response.content
+        interaction = {
+            "key": key,
+            "offset": round(start - self._started, 3),
+            "elapsed": round(elapsed, 3),
+            "request": self._request_record(method, url, kwargs, secrets),
+            "status": response.status_code,
+            "headers": {
+                name: REDACTED if name.lower() in SECRET_HEADERS else value
+                for name, value in response.headers.items()
+            },
+        }
+        try:
+            interaction["body"] = _scrub_text(content.decode("utf-8"), secrets)
+        except UnicodeDecodeError:
+            interaction["body_base64"] = base64.b64encode(content).decode("ascii")
+        self._append(interaction)
+        return response
+
+    @staticmethod
+    def _secrets(headers: dict | None) -> list[str]:
+        """请求头中的 Key / Token 原文（响应体中出现时替换）"""
+        secrets = []
+        for name, value in (headers or {}).items():
+            if name.lower() in SECRET_HEADERS and isinstance(value, str):
+                token = value.split(" ", 1)[-1].strip()
+                if len(token) >= 8:
+                    secrets.append(token)
+        return secrets
+
+    @staticmethod
+    def _request_record(method: str, url: str, kwargs: dict, secrets: list[str]) -> dict:
+        record = {
+            "method": method.upper(),
+            "url": _scrub_url(url),
+            "headers": {
+                name: REDACTED if name.lower() in SECRET_HEADERS else value
+                for name, value in (kwargs.get("headers") or {}).items()
+            },
+        }
+        if kwargs.get("json") is not None:
+            body = json.dumps(_scrub_json(kwargs["json"]), ensure_ascii=False)
+            record["body"] = _scrub_text(body, secrets)[:MAX_REQUEST_BODY]
+        elif isinstance(kwargs.get("data"), (bytes, bytearray)) or hasattr(kwargs.get("data"), "read"):
+            data = kwargs["data"]
+            # SpooledBuffer 等支持 len()；临时文件按文件大小记录
+            record["body_size"] = len(data) if hasattr(data, "__len__") else os.fstat(data.fileno()).st_size
+        elif hasattr(kwargs.get("data"), "__next__"):
+            record["body_streamed"] = True
+        return record
+
+    def _append(self, interaction: dict) -> None:
+        with self._lock:
+            self.interactions.append(interaction)
+            self._by_key.setdefault(interaction["key"], []).append(interaction)
+            self.save()
+
+    def save(self) -> None:
+        """写入 cassette 文件（临时文件 + os.replace）"""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "interactions": self.interactions}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _replay(self, key: str) -> Any:
+        with self._lock:
+            recorded = self._by_key.get(key)
+            if not recorded:
+                raise CassetteError(f"cassette 中没有录制该请求: {key}")
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            interaction = recorded[min(index, len(recorded) - 1)]
+        if self.mode == "replay_timed":
+            time.sleep(interaction.get("elapsed", 0))
+        if "error" in interaction:
+            import requests
+
+            error = getattr(requests, interaction["error"], None)
+            if not (isinstance(error, type) and issubclass(error, Exception)):
+                error = requests.RequestException
+            raise error(interaction.get("message", ""))
+        if "body_base64" in interaction:
+            content = base64.b64decode(interaction["body_base64"])
+        else:
+            content = interaction.get("body", "").encode("utf-8")
+        url = key.split(" ", 2)[1]
+        return Response(url, interaction["status"], interaction.get("headers", {}), content)
+
+
+def active() -> "Cassette | None":
+    """当前生效的 cassette（首次调用时读取环境变量）"""
+    global _active, _env_loaded
+    if not _env_loaded:
+        with _lock:
+            if not _env_loaded:
+                path = os.environ.get("AI_VIDEO_CASSETTE", "").strip()
+                if path and _active is None:
+                    mode = os.environ.get("AI_VIDEO_CASSETTE_MODE", "").strip() or "replay"
+                    _active = Cassette(path, mode)
+                _env_loaded = True
+    return _active
+
+
+@contextlib.contextmanager
+def use(path: str, mode: str = "replay"):
+    """临时开启 cassette（测试 / 基准脚本使用）"""
+    global _active, _env_loaded
+    previous = _active
+    with _lock:
+        _active = Cassette(path, mode)
+        _env_loaded = True
+    try:
+        yield _active
+    finally:
+        with _lock:
+            _active = previous
@@ -0,0 +1,128 @@
+"""
+多地域接入点选择
+
+火山方舟 / 阿里云百炼的 API 地址原先固定为北京地域和 DashScope 默认域名，
+部署在其他地域的节点每次提交、轮询都要承受较高的往返延迟。
+
+凭证 {provider}_endpoints 可以配置多个接入点（API 基础地址，逗号或换行分隔），
+未配置时使用工具中的默认地址：
+- 后台线程定期（PROBE_INTERVAL 秒）对各接入点做 TCP 连接探测，延迟按 EWMA 平滑
+- 提交任务时选择延迟最低的健康接入点；尚无探测结果时使用第一个，同时触发后台探测
+- 连续 FAILURE_THRESHOLD 次探测失败的接入点视为不健康，不再选择（全部不健康时使用第一个）
+- 任务 ID 只在创建它的地域有效：提交时把接入点登记到本地任务登记表（api_base），
+  续等、查询、取消用 for_task 取回同一个接入点
+
+注意：各地域的 API Key 可能不通用，请只配置当前账号可用的接入点。
+探测结果保存在进程内，插件进程重启后重置。
+"""
+
+import re
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from utils import task_store
+
+# 探测间隔（秒）
+PROBE_INTERVAL = 300
+# 单次探测超时（秒）
+PROBE_TIMEOUT = 3
+# 延迟平滑系数（新样本权重）
+EWMA_ALPHA = 0.3
+# 连续失败多少次视为不健康
+FAILURE_THRESHOLD = 2
+
+SEPARATORS = re.compile(r"[\s,;]+")
+
+_lock = threading.Lock()
+# 接入点 -> {"latency": 平滑延迟(秒) 或 None, "failures": 连续失败次数, "probed_at": 探测时间}
+_stats: dict[str, dict] = {}
+_probing: set[str] = set()
+
+
+def configured(credentials: dict, provider: str, default: str) -> list[str]:
+    """平台配置的接入点列表（未配置时为默认地址），去重并保持顺序"""
+    bases = []
+    for item in SEPARATORS.split(str(credentials.get(f"{provider}_endpoints") or "")):
+        base = item.rstrip("/")
+        if base.startswith(("http://", "https://")) and base not in bases:
+            bases.append(base)
+    return bases or [default]
+
+
+def measure(base: str) -> float | None:
+    """TCP 连接探测，返回耗时（秒），失败返回 None"""
+    parsed = urlparse(base)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    start = time.monotonic()
+    try:
+        with socket.create_connection((parsed.hostname, port), timeout=PROBE_TIMEOUT):
+            return time.monotonic() - start
+    except (OSError, ValueError):
+        return None
+
+
+def record(base: str, latency: float | None) -> None:
+    """记录一次探测结果"""
+    with _lock:
+        stats = _stats.setdefault(base, {"latency": None, "failures": 0, "probed_at": 0.0})
+        stats["probed_at"] = time.time()
+        if latency is None:
+            stats["failures"] += 1
+            return
+        stats["failures"] = 0
+        previous = stats["latency"]
+        stats["latency"] = latency if previous is None else (
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * previous
+        )
+
+
+def probe(bases: list[str]) -> None:
+    """探测一组接入点（在后台线程中执行）"""
+    try:
+        for base in bases:
+            record(base, measure(base))
+    finally:
+        with _lock:
+            _probing.difference_update(bases)
+
+
+def _schedule(bases: list[str]) -> None:
+    """探测结果过期的接入点交给后台线程探测"""
+    now = time.time()
+    with _lock:
+        stale = [
+            base for base in bases
+            if base not in _probing and now - _stats.get(base, {}).get("probed_at", 0) >= PROBE_INTERVAL
+        ]
+        _probing.update(stale)
+    if stale:
+        threading.Thread(target=probe, args=(stale,), name="endpoint-probe", daemon=True).start()
+
+
+def select(credentials: dict, provider: str, default: str) -> str:
+    """为新任务选择接入点：延迟最低的健康接入点"""
+    bases = configured(credentials, provider, default)
+    if len(bases) == 1:
+        return bases[0]
+    _schedule(bases)
+    with _lock:
+        healthy = [
+            (_stats[base]["latency"], index, base) for index, base in enumerate(bases)
+            if base in _stats and _stats[base]["latency"] is not None
+            and _stats[base]["failures"] < FAILURE_THRESHOLD
+        ]
+    return min(healthy)[2] if healthy else bases[0]
+
+
+def for_task(credentials: dict, provider: str, task_id: str, default: str) -> str:
+    """
+    取回任务创建时的接入点
+
+    登记表中没有记录时，使用第一个配置的接入点。
+    """
+    api_base = (task_store.get(task_id) or {}).get("api_base")
+    if api_base:
+        return api_base
+    return configured(credentials, provider, default)[0]
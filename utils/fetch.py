@@ -0,0 +1,184 @@
+"""
+Dify 文件下载：内部地址与外部地址竞速
+
+配置了 dify_internal_url 时，同一张图片有两条下载路线：
+- internal: 改写为 Dify 内部地址（插件与 Dify 同机 / 同网络时最快）
+- external: 原始外部地址
+
+原实现先用内部地址（30 秒超时），失败后才尝试外部地址，内部地址配置错误时每张图都要白等。
+这里按 happy eyeballs 方式竞速：先发起内部地址，STAGGER_DELAY 秒内未完成（或已失败）
+再发起外部地址，先下载成功者胜出，另一条立即取消。
+
+胜出路线按 Dify 主机记录在进程级可达性缓存中（ROUTE_TTL 秒），之后的下载直接走该路线，
+失败时才退回另一条。
+
+下载内容以 stream=True 分块写入 utils/spool.py 的缓冲区（大图片转存临时文件），
+fetch_buffer 直接返回缓冲区，供 Base64 内联时流式编码、暂存时流式上传，图片不整块读入内存。
+"""
+
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+from utils import http_client, spool
+
+# 首选路线未完成时，间隔多久发起备选路线（秒）
+STAGGER_DELAY = 0.25
+# 可达路线缓存时间（秒）
+ROUTE_TTL = 600
+# 流式下载块大小
+CHUNK_SIZE = 64 * 1024
+
+_routes: dict[str, tuple[float, str]] = {}
+_routes_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    """所有路线均下载失败"""
+
+    def __init__(self, errors: dict[str, Exception]):
+        self.errors = errors
+        labels = {"internal": "内部地址", "external": "原地址"}
+        super().__init__("; ".join(
+            f"{labels.get(name, name)}错误: {error}" for name, error in errors.items()
+        ))
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _cached_route(host: str) -> str:
+    with _routes_lock:
+        cached = _routes.get(host)
+    if cached and cached[0] > time.time():
+        return cached[1]
+    return ""
+
+
+def _remember_route(host: str, route: str) -> None:
+    with _routes_lock:
+        _routes[host] = (time.time() + ROUTE_TTL, route)
+
+
+def _forget_route(host: str) -> None:
+    with _routes_lock:
+        _routes.pop(host, None)
+
+
+def _download_sync(
+    url: str, timeout: float, cancelled: threading.Event | None = None
+) -> tuple[str, spool.SpooledBuffer]:
+    """同步流式下载到缓冲区，cancelled 置位时中止"""
+    response = http_client.get(url, timeout=timeout, stream=True)
+    try:
+        response.raise_for_status()
+
+        def chunks():
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if cancelled is not None and cancelled.is_set():
+                    raise _Cancelled()
+                yield chunk
+
+        content_type = response.headers.get("Content-Type", "")
+        return content_type, spool.from_chunks(chunks(), content_type)
+    finally:
+        response.close()
+
+
+def _close_late(results: queue.Queue, count: int) -> None:
+    """关闭竞速结束后才到达的下载结果（落败路线在取消生效前已下载完成时，缓冲区无人使用）"""
+    for _ in range(count):
+        _, result, _ = results.get()
+        if result is not None:
+            result[1].close()
+
+
+def _race(
+    candidates: list[tuple[str, str]], timeout: float
+) -> tuple[str, tuple[str, spool.SpooledBuffer]]:
+    """线程方式竞速，返回 (胜出路线, (content_type, content))"""
+    cancelled = threading.Event()
+    results: queue.Queue = queue.Queue()
+
+    def worker(name: str, url: str) -> None:
+        try:
+            results.put((name, _download_sync(url, timeout, cancelled), None))
+        except Exception as e:
+            results.put((name, None, e))
+
+    def start(index: int) -> None:
+        name, url = candidates[index]
+        threading.Thread(target=worker, args=(name, url), daemon=True).start()
+
+    errors: dict[str, Exception] = {}
+    start(0)
+    started, pending = 1, 1
+    while pending:
+        wait = STAGGER_DELAY if started < len(candidates) else None
+        try:
+            name, result, error = results.get(timeout=wait)
+        except queue.Empty:
+            # 首选路线迟迟未完成：发起下一条
+            start(started)
+            started += 1
+            pending += 1
+            continue
+        pending -= 1
+        if error is None:
+            cancelled.set()  # 取消落败的下载
+            if pending:
+                # 后台收取落败路线的结果并关闭缓冲区（临时文件），不阻塞胜出结果返回
+                threading.Thread(target=_close_late, args=(results, pending), daemon=True).start()
+            return name, result
+        errors[name] = error
+        if started < len(candidates):
+            # 失败时立即发起下一条，不必等待错开时间
+            start(started)
+            started += 1
+            pending += 1
+    raise FetchError(errors)
+
+
+def fetch_buffer(
+    image_url: str, internal_url: str, timeout: float = 30
+) -> tuple[str, spool.SpooledBuffer]:
+    """
+    下载 Dify 文件到缓冲区（调用方负责关闭）
+
+    Args:
+        image_url: 原始（外部）地址
+        internal_url: 改写后的内部地址，与原地址相同时只下载一次
+
+    Returns:
+        (content_type, buffer)
+
+    Raises:
+        FetchError: 所有路线均失败
+    """
+    routes = {"internal": internal_url, "external": image_url}
+    if internal_url == image_url:
+        return _race([("external", image_url)], timeout)[1]
+
+    host = urlparse(image_url).netloc
+    preferred = _cached_route(host)
+    if preferred:
+        # 已知可用路线：直接下载，失败再退回另一条
+        other = "external" if preferred == "internal" else "internal"
+        try:
+            return _race([(preferred, routes[preferred])], timeout)[1]
+        except FetchError as e:
+            _forget_route(host)
+            errors = dict(e.errors)
+        try:
+            result = _race([(other, routes[other])], timeout)[1]
+        except FetchError as e:
+            errors.update(e.errors)
+            raise FetchError(errors)
+        _remember_route(host, other)
+        return result
+
+    winner, result = _race([("internal", internal_url), ("external", image_url)], timeout)
+    _remember_route(host, winner)
+    return result
@@ -0,0 +1,132 @@
+"""
+共享 HTTP 层
+
+所有工具的平台请求（提交、轮询、下载）都经由这里发出（requests）。
+Dify 插件运行时已对标准库打了 gevent 补丁，requests 的网络读写和 time.sleep 本身就是协作式的，
+等待中的任务不会独占操作系统线程，因此这里不再另建事件循环。
+开启 cassette（utils/cassette.py）时，请求被录制或从录制文件回放；回放不经过网络。
+json= 请求体中含有 Base64 缓冲字段（utils/spool.py）时，请求体边编码边以 chunked 传输发送。
+"""
+
+import time
+from typing import Any, Generator
+
+import requests
+
+from utils import cassette, spool
+
+
+def request(method: str, url: str, **kwargs) -> Any:
+    """
+    发送 HTTP 请求
+
+    Args:
+        method: 请求方法
+        url: 请求地址
+        **kwargs: 与 requests.request 一致的参数
+
+    Returns:
+        requests.Response（开启 cassette 回放时为用法一致的 cassette.Response）
+    """
+    if spool.contains_values(kwargs.get("json")):
+        return _request_streamed(method, url, kwargs)
+
+    recorder = cassette.active()
+    if recorder is not None:
+        return recorder.request(method, url, lambda: requests.request(method, url, **kwargs), **kwargs)
+    return requests.request(method, url, **kwargs)
+
+
+def _request_streamed(method: str, url: str, kwargs: dict) -> Any:
+    """
+    发送含 Base64 缓冲字段的 JSON 请求体
+
+    请求体由 spool.stream_json 边编码边产出，以 chunked 传输发送；
+    服务端不接受 chunked 传输（411 Length Required）时，编码到缓冲区后带 Content-Length 重发。
+    """
+    payload = kwargs.pop("json")
+    kwargs["headers"] = {"Content-Type": "application/json", **(kwargs.get("headers") or {})}
+    response = request(method, url, data=spool.stream_json(payload), **kwargs)
+    if response.status_code != 411:
+        return response
+
+    body = spool.encode_json(payload)
+    try:
+        return request(method, url, data=body, **kwargs)
+    finally:
+        body.close()
+
+
+def get(url: str, **kwargs) -> Any:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> Any:
+    return request("POST", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> Any:
+    return request("DELETE", url, **kwargs)
+
+
+def sleep(seconds: float) -> None:
+    """
+    轮询循环中两次查询之间的等待
+
+    不经过 poll() 的自管轮询循环（对冲提交、批量生成、流水线）使用；
+    开启 cassette 时由 cassette 决定是否等待（快速回放时不等待）。
+    """
+    recorder = cassette.active()
+    if recorder is not None:
+        recorder.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def poll(
+    url: str,
+    headers: dict,
+    interval: float,
+    max_attempts: int,
+    timeout: int = 30,
+    waiter: Any = None,
+    fallback_every: int = 1,
+) -> Generator[tuple[int, Any], None, None]:
+    """
+    轮询任务状态
+
+    每次产出 (attempt, response)，网络错误时 response 为 None。
+    两次请求之间的等待由本函数完成，调用方无需 sleep。
+    开启 cassette 时按固定间隔轮询（不使用回调），快速回放时不等待。
+
+    Args:
+        waiter: 回调等待句柄（utils.callbacks.TaskWaiter），收到回调时立即查询
+        fallback_every: 使用回调时，每隔多少个轮询间隔兜底查询一次
+    """
+    try:
+        recorder = cassette.active()
+        if recorder is not None:
+            for attempt in range(max_attempts):
+                if attempt:
+                    recorder.sleep(interval)
+                try:
+                    response = request("GET", url, headers=headers, timeout=timeout)
+                except Exception:
+                    response = None
+                yield attempt, response
+            return
+
+        for attempt in range(max_attempts):
+            if attempt:
+                if waiter is None:
+                    time.sleep(interval)
+                elif not waiter.wait(interval) and attempt % fallback_every:
+                    continue  # 未收到回调，跳过本次查询
+            try:
+                response = requests.get(url, headers=headers, timeout=timeout)
+            except Exception:
+                response = None
+            yield attempt, response
+    finally:
+        if waiter is not None:
+            waiter.close()
@@ -0,0 +1,395 @@
+"""
+图片头部探测（只读取尺寸所需的字节）
+
+原实现固定下载前 64KB，EXIF 很大或带内嵌缩略图的 JPEG 在 64KB 内找不到 SOF，
+尺寸获取静默失败。这里改为按需的分段 Range 读取：
+- 首次读取 INITIAL_READ 字节；解析器缺哪段数据就请求哪段（至少 READ_SIZE 字节），
+  JPEG 的大段 APPn / EXIF、HEIF 的 mdat 等直接跳过，不下载其内容
+- 服务器不支持 Range（返回 200）时顺序流式读取，解析完成即断开
+
+支持 PNG、JPEG、GIF、WEBP、BMP、TIFF、AVIF / HEIC（ISO-BMFF ispe / irot），
+并读取 EXIF 方向（JPEG / TIFF）或 irot 旋转（AVIF / HEIC），按显示方向返回宽高。
+
+结果按 URL 缓存；另按首段内容哈希 + 文件大小缓存，同一张图片换了签名 URL 也只需一次请求。
+"""
+
+import hashlib
+import re
+import struct
+import threading
+import time
+
+# 首次读取字节数
+INITIAL_READ = 4096
+# 后续每次读取的最小字节数
+READ_SIZE = 4096
+# 最多读取的字节偏移（超过视为无法解析）
+MAX_PROBE_BYTES = 4 * 1024 * 1024
+# 单张图片最多请求次数
+MAX_REQUESTS = 8
+# 单次请求超时（秒）
+PROBE_TIMEOUT = 10
+# URL 缓存时间（秒）
+URL_CACHE_TTL = 3600
+# 缓存条目上限
+CACHE_SIZE = 512
+
+# EXIF 方向 5-8 表示图片需旋转 90°/270° 显示，宽高互换
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+HEIF_BRANDS = (b"avif", b"avis", b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1")
+# 带有子 box 的容器（meta 为 FullBox，需跳过 4 字节版本 / 标志）
+HEIF_CONTAINERS = {b"meta": 4, b"iprp": 0, b"ipco": 0}
+
+_url_cache: dict[str, tuple[float, dict]] = {}
+_content_cache: dict[str, dict] = {}
+_cache_lock = threading.Lock()
+
+
+class _NeedMore(Exception):
+    """解析需要尚未读取的数据"""
+
+    def __init__(self, offset: int, size: int):
+        self.offset = offset
+        self.size = size
+
+
+class _Truncated(Exception):
+    """数据在所需位置之前结束"""
+
+
+class _Source:
+    """已读取的数据片段（可不连续）"""
+
+    def __init__(self, data: bytes | bytearray | None = None, size: int | None = None):
+        self.chunks: list[tuple[int, bytes | bytearray]] = []
+        self.size = size
+        if data is not None:
+            self.chunks.append((0, data))
+
+    def add(self, offset: int, data: bytes) -> None:
+        self.chunks.append((offset, data))
+
+    def read(self, offset: int, size: int) -> bytes | bytearray:
+        if offset < 0 or size < 0:
+            raise _Truncated()
+        for start, chunk in self.chunks:
+            if start <= offset and offset + size <= start + len(chunk):
+                return chunk[offset - start:offset - start + size]
+        if self.size is not None and offset + size > self.size:
+            raise _Truncated()
+        raise _NeedMore(offset, size)
+
+
+# ========== 格式解析 ==========
+
+def _read_ifd(src: _Source, base: int, tags: tuple[int, ...]) -> dict[int, int]:
+    """读取 TIFF 结构 IFD0 中的指定标签（SHORT / LONG）"""
+    order = src.read(base, 2)
+    if order == b"II":
+        endian = "<"
+    elif order == b"MM":
+        endian = ">"
+    else:
+        return {}
+    magic, ifd_offset = struct.unpack(f"{endian}HI", src.read(base + 2, 6))
+    if magic != 42:
+        return {}
+    count = struct.unpack(f"{endian}H", src.read(base + ifd_offset, 2))[0]
+    entries = src.read(base + ifd_offset + 2, min(count, 512) * 12)
+    values = {}
+    for i in range(0, len(entries), 12):
+        tag, value_type = struct.unpack(f"{endian}HH", entries[i:i + 4])
+        if tag not in tags:
+            continue
+        if value_type == 3:  # SHORT
+            values[tag] = struct.unpack(f"{endian}H", entries[i + 8:i + 10])[0]
+        elif value_type == 4:  # LONG
+            values[tag] = struct.unpack(f"{endian}I", entries[i + 8:i + 12])[0]
+    return values
+
+
+def _parse_jpeg(src: _Source) -> tuple[int, int, int] | None:
+    orientation = 1
+    i = 2
+    while True:
+        marker = src.read(i, 2)
+        if marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:  # 填充字节
+            i += 1
+            continue
+        if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:  # 无长度字段的标记
+            i += 2
+            continue
+        if code in (0xD9, 0xDA):  # EOI / SOS 之前仍未找到 SOF
+            return None
+        length = struct.unpack(">H", src.read(i + 2, 2))[0]
+        # SOF 标记 (0xC0-0xCF, 除了 0xC4, 0xC8, 0xCC)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", src.read(i + 5, 4))
+            return width, height, orientation
+        if code == 0xE1 and src.read(i + 4, 6) == b"Exif\x00\x00":
+            try:
+                orientation = _read_ifd(src, i + 10, (274,)).get(274, 1)
+            except (_Truncated, struct.error):
+                pass
+        i += 2 + length  # 跳过整个段，不读取其内容
+
+
+def _parse_webp(src: _Source) -> tuple[int, int, int] | None:
+    chunk = src.read(12, 4)
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", src.read(26, 4))
+        return width & 0x3FFF, height & 0x3FFF, 1
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", src.read(21, 4))[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 1
+    if chunk == b"VP8X":
+        data = src.read(24, 6)
+        width = struct.unpack("<I", data[0:3] + b"\x00")[0] + 1
+        height = struct.unpack("<I", data[3:6] + b"\x00")[0] + 1
+        return width, height, 1
+    return None
+
+
+def _parse_bmp(src: _Source) -> tuple[int, int, int] | None:
+    header_size = struct.unpack("<I", src.read(14, 4))[0]
+    if header_size == 12:  # OS/2 BITMAPCOREHEADER
+        width, height = struct.unpack("<HH", src.read(18, 4))
+    else:
+        width, height = struct.unpack("<ii", src.read(18, 8))
+    return abs(width), abs(height), 1
+
+
+def _parse_tiff(src: _Source) -> tuple[int, int, int] | None:
+    values = _read_ifd(src, 0, (256, 257, 274))
+    if 256 not in values or 257 not in values:
+        return None
+    return values[256], values[257], values.get(274, 1)
+
+
+def _heif_boxes(src: _Source, start: int, end: int | None):
+    """遍历 ISO-BMFF box，产出 (类型, 内容起点, 内容终点)"""
+    offset = start
+    while end is None or offset + 8 <= end:
+        try:
+            size, box_type = struct.unpack(">I4s", src.read(offset, 8))
+        except _Truncated:
+            return
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", src.read(offset + 8, 8))[0]
+            header = 16
+        elif size == 0:  # 延伸到文件末尾
+            if end is None and src.size is None:
+                return
+            size = (end if end is not None else src.size) - offset
+        if size < header:
+            return
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _parse_heif(src: _Source) -> tuple[int, int, int] | None:
+    sizes = []
+    rotation = 0
+
+    def walk(start: int, end: int | None) -> None:
+        nonlocal rotation
+        for box_type, body, box_end in _heif_boxes(src, start, end):
+            if box_type in HEIF_CONTAINERS:
+                walk(body + HEIF_CONTAINERS[box_type], box_end)
+                if box_type == b"meta":
+                    return  # 尺寸信息都在 meta 中，不再读取其后的 mdat
+            elif box_type == b"ispe":
+                sizes.append(struct.unpack(">II", src.read(body + 4, 8)))
+            elif box_type == b"irot":
+                rotation = src.read(body, 1)[0] & 0x03
+
+    walk(0, None)
+    if not sizes:
+        return None
+    # 主图（或网格图）的 ispe 面积最大，缩略图和网格分块的较小
+    width, height = max(sizes, key=lambda size: size[0] * size[1])
+    # irot 为逆时针旋转 90° 的倍数，换算为对应的 EXIF 方向
+    orientation = {0: 1, 1: 8, 2: 3, 3: 6}[rotation]
+    return width, height, orientation
+
+
+def _parse(src: _Source) -> dict | None:
+    """
+    解析图片尺寸
+
+    Raises:
+        _NeedMore: 需要读取更多数据
+    """
+    try:
+        head = src.read(0, 12 if src.size is None else min(12, src.size))
+    except _Truncated:
+        return None
+    try:
+        if head[:8] == b"\x89PNG\r\n\x1a\n":
+            image_format = "png"
+            width, height = struct.unpack(">II", src.read(16, 8))
+            result = (width, height, 1)
+        elif head[:2] == b"\xff\xd8":
+            image_format = "jpeg"
+            result = _parse_jpeg(src)
+        elif head[:6] in (b"GIF87a", b"GIF89a"):
+            image_format = "gif"
+            width, height = struct.unpack("<HH", src.read(6, 4))
+            result = (width, height, 1)
+        elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            image_format = "webp"
+            result = _parse_webp(src)
+        elif head[:2] == b"BM":
+            image_format = "bmp"
+            result = _parse_bmp(src)
+        elif head[:4] in (b"II*\x00", b"MM\x00*"):
+            image_format = "tiff"
+            result = _parse_tiff(src)
+        elif head[4:8] == b"ftyp" and head[8:12] in HEIF_BRANDS:
+            image_format = "avif" if head[8:12] in (b"avif", b"avis") else "heic"
+            result = _parse_heif(src)
+        else:
+            return None
+    except _NeedMore as e:
+        if e.offset + e.size > MAX_PROBE_BYTES:
+            return None
+        raise
+    except (_Truncated, struct.error, IndexError, KeyError):
+        return None
+
+    if not result or result[0] <= 0 or result[1] <= 0:
+        return None
+    width, height, orientation = result
+    return {
+        "format": image_format,
+        "width": width,
+        "height": height,
+        "orientation": orientation if 1 <= orientation <= 8 else 1,
+    }
+
+
+def parse(data: bytes) -> dict | None:
+    """
+    从已读取的图片数据解析尺寸
+
+    Returns:
+        {"format", "width", "height", "orientation"}，数据不足或无法识别时返回 None
+    """
+    try:
+        return _parse(_Source(data, size=len(data)))
+    except _NeedMore:
+        return None
+
+
+def display_size(info: dict) -> tuple[int, int]:
+    """按 EXIF 方向换算后的显示宽高"""
+    if info.get("orientation") in TRANSPOSED_ORIENTATIONS:
+        return info["height"], info["width"]
+    return info["width"], info["height"]
+
+
+# ========== 网络读取 ==========
+
+def _get(url: str, headers: dict, timeout: float):
+    from utils import http_client
+
+    return http_client.get(url, headers=headers, timeout=timeout, stream=True)
+
+
+def _total_size(content_range: str) -> int | None:
+    match = re.match(r"bytes \d+-\d+/(\d+)", content_range or "")
+    return int(match.group(1)) if match else None
+
+
+def _content_key(src: _Source) -> str:
+    """首段内容哈希 + 文件大小"""
+    first = bytes(src.chunks[0][1][:INITIAL_READ])
+    return f"{hashlib.sha256(first).hexdigest()}:{src.size}"
+
+
+def _remember(cache: dict, key: str, value) -> None:
+    with _cache_lock:
+        cache[key] = value
+        while len(cache) > CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+
+
+def _probe_stream(response) -> dict | None:
+    """服务器不支持 Range：顺序读取，解析完成即停止"""
+    buffer = bytearray()
+    src = _Source(buffer)
+    for chunk in response.iter_content(READ_SIZE):
+        buffer += chunk
+        try:
+            return _parse(src)
+        except _NeedMore as e:
+            if e.offset + e.size > MAX_PROBE_BYTES:
+                return None
+    src.size = len(buffer)
+    try:
+        return _parse(src)
+    except _NeedMore:
+        return None
+
+
+def probe(url: str, timeout: float = PROBE_TIMEOUT) -> dict | None:
+    """
+    探测图片 URL 的尺寸
+
+    Returns:
+        {"format", "width", "height", "orientation"}，失败时返回 None
+    """
+    now = time.time()
+    with _cache_lock:
+        cached = _url_cache.get(url)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    src = _Source()
+    content_key = ""
+    offset, size = 0, INITIAL_READ
+    info = None
+    try:
+        for _ in range(MAX_REQUESTS):
+            size = max(size, READ_SIZE)
+            if src.size is not None:
+                size = min(size, src.size - offset)
+            response = _get(
+                url, {"Range": f"bytes={offset}-{offset + size - 1}", "User-Agent": "Mozilla/5.0"},
+                timeout,
+            )
+            try:
+                if response.status_code == 200:
+                    info = _probe_stream(response)
+                    break
+                if response.status_code != 206:
+                    return None
+                src.size = _total_size(response.headers.get("Content-Range", "")) or src.size
+                src.add(offset, response.content)
+            finally:
+                response.close()
+
+            if not content_key:
+                content_key = _content_key(src)
+                with _cache_lock:
+                    info = _content_cache.get(content_key)
+                if info:
+                    break
+            try:
+                info = _parse(src)
+                break
+            except _NeedMore as e:
+                offset, size = e.offset, e.size
+    except Exception:
+        return None
+
+    if info:
+        _remember(_url_cache, url, (now + URL_CACHE_TTL, info))
+        if content_key:
+            _remember(_content_cache, content_key, info)
+    return info
@@ -0,0 +1,199 @@
+"""
+API Key 池
+
+单个账号的并发上限限制了吞吐。各平台的 API Key 凭证可以填写多个 Key（逗号或换行分隔），
+每次提交任务时按凭证 api_key_strategy 选择一个：
+- round_robin（默认）：轮流使用
+- least_in_flight：进行中任务最少的 Key
+- quota：剩余并发额度最多的 Key；额度默认为 DEFAULT_QUOTA，可写作 "Key#额度" 单独指定，
+  所有 Key 额度用尽时退化为进行中任务最少
+
+进行中任务数取本地任务登记表中未结束的任务（IN_FLIGHT_TTL 秒内有更新），
+加上本进程正在提交的请求：工具在发出提交请求前用 reserve() 选择 Key 并占位，
+请求返回（或失败）后释放，由登记表接管计数；占位 RESERVATION_TTL 秒后自动失效。
+
+提交返回 401/403 的 Key 隔离 AUTH_QUARANTINE 秒，返回 429 的 Key 按 Retry-After
+（缺省 RATE_LIMIT_QUARANTINE 秒）隔离；所有 Key 都被隔离时选择最早解除隔离的。
+隔离状态保存在进程内，插件进程重启后重置。
+
+任务登记时记录所用 Key 的指纹（key_id，不保存 Key 本身），
+续等、查询、取消时用 for_task 取回同一个 Key。
+"""
+
+import contextlib
+import hashlib
+import re
+import threading
+import time
+from typing import Any
+
+from utils import task_store
+
+STRATEGIES = ("round_robin", "least_in_flight", "quota")
+# 各平台单个 Key 的默认并发额度
+DEFAULT_QUOTA = {
+    "aliyun": 2,
+    "volcengine": 5,
+    "jxincm": 3,
+}
+# 认证失败（401/403）隔离时间（秒）
+AUTH_QUARANTINE = 1800
+# 限流（429）未返回 Retry-After 时的隔离时间（秒）
+RATE_LIMIT_QUARANTINE = 60
+# 本进程选择后尚未登记的提交计入进行中的时间（秒）
+RESERVATION_TTL = 60
+# 登记表中未结束的任务超过该时间没有更新，不再计入进行中（秒）
+IN_FLIGHT_TTL = 3600
+
+SEPARATORS = re.compile(r"[\s,;]+")
+
+_lock = threading.Lock()
+_cursors: dict[str, int] = {}
+_quarantined: dict[str, float] = {}  # key_id -> 解除隔离时间
+_reservations: dict[str, list[float]] = {}  # key_id -> 选择时间列表
+
+
+def parse(raw: Any) -> list[tuple[str, int | None]]:
+    """解析凭证中的 Key 列表，返回 [(Key, 额度或 None)]，去重并保持顺序"""
+    entries = []
+    seen = set()
+    for item in SEPARATORS.split(str(raw or "")):
+        key, _, quota = item.partition("#")
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        entries.append((key, int(quota) if quota.isdigit() and int(quota) > 0 else None))
+    return entries
+
+
+def keys(credentials: dict, provider: str) -> list[str]:
+    """平台配置的全部 Key"""
+    return [key for key, _ in parse(credentials.get(f"{provider}_api_key"))]
+
+
+def key_id(api_key: str) -> str:
+    """Key 指纹（登记到任务记录，不保存 Key 本身）"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else ""
+
+
+def strategy(credentials: dict) -> str:
+    value = (credentials.get("api_key_strategy") or "").strip()
+    return value if value in STRATEGIES else "round_robin"
+
+
+def _in_flight(provider: str, now: float) -> dict[str, int]:
+    """各 Key 进行中的任务数（登记表 + 本进程未登记的选择）"""
+    counts: dict[str, int] = {}
+    for entry in task_store.unfinished(provider, now - IN_FLIGHT_TTL):
+        if entry.get("key_id"):
+            counts[entry["key_id"]] = counts.get(entry["key_id"], 0) + 1
+    for kid, times in _reservations.items():
+        times[:] = [t for t in times if now - t < RESERVATION_TTL]
+        if times:
+            counts[kid] = counts.get(kid, 0) + len(times)
+    return counts
+
+
+def acquire(credentials: dict, provider: str) -> str:
+    """
+    为一次提交选择 Key 并占位（占位至 release，通常通过 reserve() 使用）
+
+    Returns:
+        选中的 Key，未配置时返回空字符串
+    """
+    entries = parse(credentials.get(f"{provider}_api_key"))
+    if len(entries) <= 1:
+        return entries[0][0] if entries else ""
+
+    mode = strategy(credentials)
+    now = time.time()
+    with _lock:
+        available = [
+            (key, quota) for key, quota in entries
+            if _quarantined.get(key_id(key), 0) <= now
+        ]
+        if not available:
+            key = min(entries, key=lambda entry: _quarantined.get(key_id(entry[0]), 0))[0]
+        elif mode == "round_robin":
+            cursor = _cursors.get(provider, 0)
+            _cursors[provider] = cursor + 1
+            key = available[cursor % len(available)][0]
+        else:
+            counts = _in_flight(provider, now)
+            if mode == "quota":
+                default = DEFAULT_QUOTA.get(provider, 1)
+                headroom = {
+                    key: (quota or default) - counts.get(key_id(key), 0) for key, quota in available
+                }
+                if any(value > 0 for value in headroom.values()):
+                    # 剩余额度相同时保持配置顺序
+                    key = max(available, key=lambda entry: headroom[entry[0]])[0]
+                else:
+                    mode = "least_in_flight"
+            if mode == "least_in_flight":
+                key = min(available, key=lambda entry: counts.get(key_id(entry[0]), 0))[0]
+        _reservations.setdefault(key_id(key), []).append(now)
+    return key
+
+
+def release(api_key: str) -> None:
+    """释放 acquire 的占位（提交请求已返回或未发出）"""
+    with _lock:
+        times = _reservations.get(key_id(api_key))
+        if times:
+            times.pop(0)
+
+
+@contextlib.contextmanager
+def reserve(credentials: dict, provider: str, api_key: str = ""):
+    """
+    为一次提交请求选择 Key 并占位，退出时释放（包括请求异常）
+
+    只包住提交请求本身：参数校验、图片处理等提前返回的路径不会占用 Key 的并发名额。
+    提交成功后任务登记到本地任务登记表（带 key_id），由登记表计入进行中。
+    指定 api_key 时（如重试沿用同一个 Key）只为该 Key 占位。
+    """
+    if api_key:
+        with _lock:
+            _reservations.setdefault(key_id(api_key), []).append(time.time())
+    else:
+        api_key = acquire(credentials, provider)
+    try:
+        yield api_key
+    finally:
+        release(api_key)
+
+
+def report(api_key: str, status_code: int, headers: Any = None) -> None:
+    """报告提交结果：401/403/429 时隔离该 Key"""
+    kid = key_id(api_key)
+    now = time.time()
+    with _lock:
+        if status_code in (401, 403):
+            _quarantined[kid] = now + AUTH_QUARANTINE
+        elif status_code == 429:
+            retry_after = str((headers or {}).get("Retry-After", "")).strip()
+            seconds = int(retry_after) if retry_after.isdigit() else RATE_LIMIT_QUARANTINE
+            _quarantined[kid] = now + seconds
+
+
+def quarantined(api_key: str) -> bool:
+    with _lock:
+        return _quarantined.get(key_id(api_key), 0) > time.time()
+
+
+def for_task(credentials: dict, provider: str, task_id: str) -> str:
+    """
+    取回提交任务时使用的 Key（续等、查询、取消必须用同一个账号）
+
+    登记表中没有记录或 Key 已不在配置中时，返回第一个 Key。
+    """
+    configured = keys(credentials, provider)
+    if not configured:
+        return ""
+    kid = (task_store.get(task_id) or {}).get("key_id")
+    if kid:
+        for key in configured:
+            if key_id(key) == kid:
+                return key
+    return configured[0]
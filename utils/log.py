@@ -0,0 +1,137 @@
+"""
+结构化日志
+
+轮询路径原先每次查询都 logging.info 整个平台返回（f-string 立即格式化），
+数百个并发任务时既占 CPU 又刷屏。插件统一使用这里的结构化日志：
+- 默认只记录任务状态变化（transition）：同一任务同一状态只记一次
+- 调试日志（debug）需开启调试开关（环境变量 AI_VIDEO_DEBUG_LOG=1），开启后以 INFO 级别输出；
+  按任务采样：同一任务同一事件 DEBUG_TASK_INTERVAL 秒内最多一条
+- 字段可以传入无参函数，只有真正输出时才求值；JSON 序列化推迟到日志处理器格式化时
+- 每个事件名按令牌桶限流（每秒 EVENT_RATE 条，突发 EVENT_BURST 条），丢弃的条数在下一条中报告
+- 每条日志是一行 JSON：{"event", "ts", ...字段}
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+LOGGER_NAME = "ai_video_generation"
+# 调试开关（环境变量）
+DEBUG_ENV = "AI_VIDEO_DEBUG_LOG"
+# 每个事件每秒允许的条数 / 突发上限
+EVENT_RATE = 10.0
+EVENT_BURST = 50
+# 调试日志按任务采样的最小间隔（秒）
+DEBUG_TASK_INTERVAL = 30
+# 跟踪状态 / 采样时间的任务数上限（超出后淘汰最久未更新的任务）
+MAX_TRACKED_TASKS = 2000
+# 单个字段序列化后的最大长度
+MAX_FIELD_LENGTH = 2000
+
+logger = logging.getLogger(LOGGER_NAME)
+
+_lock = threading.Lock()
+_buckets: dict[str, list[float]] = {}  # 事件名 -> [令牌数, 上次补充时间, 已丢弃条数]
+_task_status: OrderedDict = OrderedDict()
+_debug_times: OrderedDict = OrderedDict()
+
+
+class _Record:
+    """延迟序列化的日志内容：日志处理器格式化时才求值并转为 JSON"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: dict):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        data = {}
+        for key, value in self.fields.items():
+            if callable(value):
+                try:
+                    value = value()
+                except Exception as e:
+                    value = f"<error: {e}>"
+            if not isinstance(value, (int, float, bool, type(None))):
+                text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+                if len(text) > MAX_FIELD_LENGTH:
+                    value = text[:MAX_FIELD_LENGTH] + "..."
+            data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def debug_enabled() -> bool:
+    return os.environ.get(DEBUG_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _take_token(event: str) -> tuple[bool, int]:
+    """令牌桶限流，返回 (是否允许, 此前丢弃的条数)"""
+    now = time.monotonic()
+    with _lock:
+        bucket = _buckets.setdefault(event, [float(EVENT_BURST), now, 0])
+        bucket[0] = min(float(EVENT_BURST), bucket[0] + (now - bucket[1]) * EVENT_RATE)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False, 0
+        bucket[0] -= 1
+        dropped, bucket[2] = int(bucket[2]), 0
+        return True, dropped
+
+
+def _remember(table: OrderedDict, key: Any, value: Any) -> None:
+    table[key] = value
+    table.move_to_end(key)
+    while len(table) > MAX_TRACKED_TASKS:
+        table.popitem(last=False)
+
+
+def _emit(level: int, event: str, fields: dict) -> None:
+    if not logger.isEnabledFor(level):
+        return
+    allowed, dropped = _take_token(event)
+    if not allowed:
+        return
+    record = {"event": event, "ts": round(time.time(), 3)}
+    record.update(fields)
+    if dropped:
+        record["dropped"] = dropped
+    logger.log(level, "%s", _Record(record))
+
+
+def event(name: str, level: int = logging.INFO, **fields) -> None:
+    """记录一条事件（受限流）"""
+    _emit(level, name, fields)
+
+
+def warning(name: str, **fields) -> None:
+    _emit(logging.WARNING, name, fields)
+
+
+def transition(task_id: str, status: str, **fields) -> None:
+    """记录任务状态变化；状态与上次相同时不记录"""
+    with _lock:
+        previous = _task_status.get(task_id)
+        if previous == status:
+            return
+        _remember(_task_status, task_id, status)
+    _emit(logging.INFO, "task_status", {"task_id": task_id, "status": status, "previous": previous, **fields})
+
+
+def debug(name: str, task_id: str = "", **fields) -> None:
+    """调试日志：需开启调试开关，按任务采样，字段可为无参函数（输出时才求值）"""
+    if not debug_enabled():
+        return
+    if task_id:
+        now = time.monotonic()
+        with _lock:
+            last = _debug_times.get((task_id, name))
+            if last is not None and now - last < DEBUG_TASK_INTERVAL:
+                return
+            _remember(_debug_times, (task_id, name), now)
+        fields = {"task_id": task_id, **fields}
+    _emit(logging.INFO, name, fields)
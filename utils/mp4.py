@@ -0,0 +1,578 @@
+"""
+MP4 (ISO-BMFF) 解析与无损拼接
+
+分镜片段原先要下载到本地再用 ffmpeg 转码拼接。同一平台 / 同一模型生成的片段编码参数相同，
+可以不解码直接拼接：
+1. 只读取每个片段的 moov（文件头或文件尾，按需 Range 读取），解析各轨道的样本表
+2. 合并样本表（stts / ctts / stss / stsc / stsz），按新位置重写块偏移（stco / co64），
+   每个片段写一条编辑列表（elst）条目，保持音画同步
+3. 输出 ftyp + moov + mdat（faststart，moov 在前可边下边播），
+   媒体数据按 COPY_CHUNK 分块从源片段复制到 mdat
+
+内存占用只与样本表大小有关，与视频大小无关。要求所有片段的轨道数、轨道类型、
+时间刻度和样本描述（stsd，含 SPS/PPS 等编码参数）完全一致，否则抛出 Mp4Error。
+分片 MP4（fMP4）不支持。
+"""
+
+import os
+import struct
+import tempfile
+
+# 媒体数据分块复制大小
+COPY_CHUNK = 4 * 1024 * 1024
+# 首次读取文件头的大小（通常足以包含 ftyp 和 faststart 文件的 moov）
+HEADER_READ = 64 * 1024
+# moov 大小上限（防止异常文件占用过多内存）
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+# Range 读取超时（秒）
+READ_TIMEOUT = 30
+
+# 需要递归解析的容器 box
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+# 按样本记录、拼接后无法保持一致而丢弃的 stbl 子 box
+SAMPLE_TABLES = {b"stts", b"ctts", b"stss", b"stsc", b"stsz", b"stz2", b"stco", b"co64",
+                 b"sdtp", b"sgpd", b"sbgp", b"stps", b"subs", b"cslg", b"saiz", b"saio"}
+
+
+class Mp4Error(Exception):
+    """文件无法解析或片段之间无法无损拼接"""
+
+
+def find_box(data: bytes, box_type: bytes, start: int = 0, end: int | None = None) -> tuple[int, int]:
+    """在 data[start:end] 中顺序查找指定类型的 box，返回 (位置, 大小)，未找到返回 (-1, 0)"""
+    end = len(data) if end is None else min(end, len(data))
+    pos = start
+    while pos + 8 <= end:
+        size, atype = struct.unpack_from(">I4s", data, pos)
+        if size == 0:  # box 到文件末尾
+            size = end - pos
+        elif size == 1:  # 扩展大小
+            if pos + 16 > end:
+                break
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+        if atype == box_type:
+            return pos, size
+        if size < 8:
+            break
+        pos += size
+    return -1, 0
+
+
+def parse_duration(data: bytes) -> float:
+    """从 MP4 数据（部分或完整）的 moov/mvhd 中读取时长（秒），失败返回 0"""
+    try:
+        moov_pos, moov_size = find_box(data, b"moov")
+        if moov_pos < 0:
+            return 0
+        mvhd_pos, _ = find_box(data, b"mvhd", moov_pos + 8, moov_pos + moov_size)
+        if mvhd_pos < 0:
+            return 0
+        timescale, duration = _read_times(data[mvhd_pos + 8:])
+        return round(duration / timescale, 2) if timescale > 0 else 0
+    except (struct.error, IndexError, Mp4Error):
+        return 0
+
+
+def _read_times(payload: bytes) -> tuple[int, int]:
+    """读取 mvhd / mdhd 的 (timescale, duration)"""
+    if payload[0] == 0:
+        return struct.unpack_from(">II", payload, 12)
+    if payload[0] == 1:
+        return struct.unpack_from(">IQ", payload, 20)
+    raise Mp4Error(f"不支持的版本 {payload[0]}")
+
+
+def _write_duration(payload: bytes, duration: int, offset_v0: int, offset_v1: int) -> bytes:
+    """改写 mvhd / tkhd / mdhd 中的 duration 字段"""
+    if payload[0] == 1:
+        return payload[:offset_v1] + struct.pack(">Q", duration) + payload[offset_v1 + 8:]
+    if duration > 0xFFFFFFFF:
+        raise Mp4Error("时长超出 32 位范围")
+    return payload[:offset_v0] + struct.pack(">I", duration) + payload[offset_v0 + 4:]
+
+
+class Box:
+    """box 树节点：容器 box 有 children，其余 box 保留原始 payload"""
+
+    __slots__ = ("type", "payload", "children")
+
+    def __init__(self, box_type: bytes, payload: bytes = b"", children: list | None = None):
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+
+    def find(self, box_type: bytes) -> "Box | None":
+        for child in self.children or ():
+            if child.type == box_type:
+                return child
+        return None
+
+    def findall(self, box_type: bytes) -> list:
+        return [child for child in self.children or () if child.type == box_type]
+
+    def serialize(self) -> bytes:
+        body = self.payload if self.children is None else b"".join(c.serialize() for c in self.children)
+        if len(body) + 8 > 0xFFFFFFFF:
+            return struct.pack(">I4sQ", 1, self.type, len(body) + 16) + body
+        return struct.pack(">I4s", len(body) + 8, self.type) + body
+
+
+def parse_boxes(data: bytes) -> list:
+    """把 data 解析为 box 树（只递归 CONTAINERS 中的容器）"""
+    boxes = []
+    pos = 0
+    while pos + 8 <= len(data):
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header or pos + size > len(data):
+            raise Mp4Error(f"box {box_type!r} 大小无效")
+        payload = data[pos + header:pos + size]
+        if box_type in CONTAINERS:
+            boxes.append(Box(box_type, children=parse_boxes(payload)))
+        else:
+            boxes.append(Box(box_type, payload))
+        pos += size
+    return boxes
+
+
+def _full_box(box_type: bytes, version: int, body: bytes, flags: int = 0) -> Box:
+    return Box(box_type, struct.pack(">I", (version << 24) | flags) + body)
+
+
+# ========== 数据源 ==========
+
+class FileSource:
+    """本地文件数据源"""
+
+    def __init__(self, path: str, temporary: bool = False):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._file = open(path, "rb")
+        self._temporary = temporary
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        self._file.seek(offset)
+        return self._file.read(size)
+
+    def close(self) -> None:
+        self._file.close()
+        if self._temporary:
+            os.unlink(self.path)
+
+
+class HttpSource:
+    """按 Range 读取的远程数据源（服务器须支持 Range），已读取的文件头部直接复用"""
+
+    def __init__(self, url: str, size: int, head: bytes = b"", timeout: float = READ_TIMEOUT):
+        self.url = url
+        self.size = size
+        self.head = head
+        self.timeout = timeout
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        from utils import http_client
+
+        size = min(size, self.size - offset)
+        if size <= 0:
+            return b""
+        if offset + size <= len(self.head):
+            return self.head[offset:offset + size]
+        response = http_client.get(
+            self.url, headers={"Range": f"bytes={offset}-{offset + size - 1}"},
+            timeout=self.timeout,
+        )
+        if response.status_code != 206:
+            raise Mp4Error(f"Range 读取失败: HTTP {response.status_code}")
+        return response.content
+
+    def close(self) -> None:
+        pass
+
+
+def open_url(url: str, timeout: float = READ_TIMEOUT):
+    """
+    打开远程 MP4
+
+    服务器支持 Range 时按需读取；不支持时（返回 200 完整内容）分块写入临时文件后读取。
+    """
+    from utils import http_client
+
+    # stream=True：服务器忽略 Range 返回完整内容时，直接分块落盘
+    response = http_client.get(
+        url, headers={"Range": f"bytes=0-{HEADER_READ - 1}"}, timeout=timeout, stream=True
+    )
+    if response.status_code == 206:
+        total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        head = response.content
+        response.close()
+        if total.isdigit():
+            return HttpSource(url, int(total), head, timeout)
+        # 未返回总大小：重新完整下载
+        response = http_client.get(url, timeout=timeout, stream=True)
+    try:
+        if response.status_code != 200:
+            raise Mp4Error(f"下载失败: HTTP {response.status_code}")
+        fd, path = tempfile.mkstemp(suffix=".mp4")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(COPY_CHUNK):
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+    finally:
+        response.close()
+    return FileSource(path, temporary=True)
+
+
+# ========== 解析 ==========
+
+def top_level_boxes(source) -> list[tuple[bytes, int, int]]:
+    """列出顶层 box：[(类型, 位置, 大小)]，只读取各 box 头部"""
+    boxes = []
+    pos = 0
+    while pos + 8 <= source.size:
+        header = source.read_at(pos, 16)
+        size, box_type = struct.unpack_from(">I4s", header)
+        if size == 1:
+            size = struct.unpack_from(">Q", header, 8)[0]
+        elif size == 0:
+            size = source.size - pos
+        if size < 8:
+            raise Mp4Error(f"顶层 box {box_type!r} 大小无效")
+        boxes.append((box_type, pos, size))
+        pos += size
+    return boxes
+
+
+class Track:
+    """轨道样本表（展开为便于合并的形式）"""
+
+    def __init__(self, trak: Box):
+        self.trak = trak
+        mdia = trak.find(b"mdia")
+        minf = mdia.find(b"minf") if mdia else None
+        stbl = minf.find(b"stbl") if minf else None
+        if stbl is None or mdia.find(b"mdhd") is None or mdia.find(b"hdlr") is None:
+            raise Mp4Error("轨道结构不完整")
+        self.handler = mdia.find(b"hdlr").payload[8:12]
+        self.timescale, _ = _read_times(mdia.find(b"mdhd").payload)
+        self.stsd = stbl.find(b"stsd").payload
+
+        self.stts = self._pairs(stbl.find(b"stts"), signed=False)
+        ctts = stbl.find(b"ctts")
+        self.ctts_version = ctts.payload[0] if ctts else 0
+        self.ctts = self._pairs(ctts, signed=self.ctts_version == 1) if ctts else None
+        stss = stbl.find(b"stss")
+        self.sync = self._uints(stss.payload, 4, 4) if stss else None
+
+        stsc = stbl.find(b"stsc")
+        count = struct.unpack_from(">I", stsc.payload, 4)[0]
+        values = struct.unpack_from(f">{count * 3}I", stsc.payload, 8)
+        self.stsc = [values[i:i + 3] for i in range(0, len(values), 3)]
+        if any(entry[2] != 1 for entry in self.stsc):
+            raise Mp4Error("不支持多个样本描述的轨道")
+
+        stsz = stbl.find(b"stsz")
+        if stsz is None:
+            raise Mp4Error("不支持的样本大小表（stz2）")
+        fixed_size, count = struct.unpack_from(">II", stsz.payload, 4)
+        self.fixed_size = fixed_size
+        self.sizes = [fixed_size] * count if fixed_size else list(self._uints(stsz.payload, 8, 4))
+
+        stco = stbl.find(b"stco")
+        co64 = stbl.find(b"co64")
+        if stco is not None:
+            self.offsets = list(self._uints(stco.payload, 4, 4))
+        elif co64 is not None:
+            self.offsets = list(self._uints(co64.payload, 4, 8))
+        else:
+            raise Mp4Error("缺少块偏移表")
+        self.chunk_sizes = self._chunk_sizes()
+        self.edits = self._edits(trak.find(b"edts"))
+
+    @staticmethod
+    def _uints(payload: bytes, count_at: int, width: int) -> tuple:
+        count = struct.unpack_from(">I", payload, count_at)[0]
+        return struct.unpack_from(f">{count}{'I' if width == 4 else 'Q'}", payload, count_at + 4)
+
+    @staticmethod
+    def _pairs(box: Box, signed: bool) -> list[tuple[int, int]]:
+        count = struct.unpack_from(">I", box.payload, 4)[0]
+        values = struct.unpack_from(f">{count * 2}{'i' if signed else 'I'}", box.payload, 8)
+        return [(values[i], values[i + 1]) for i in range(0, len(values), 2)]
+
+    @staticmethod
+    def _edits(edts: Box | None) -> list[tuple[int, int]] | None:
+        """编辑列表条目 [(片段时长(影片时间刻度), 媒体起点)]，媒体起点 -1 表示空白编辑"""
+        elst = edts.find(b"elst") if edts else None
+        if elst is None:
+            return None
+        version = elst.payload[0]
+        count = struct.unpack_from(">I", elst.payload, 4)[0]
+        edits = []
+        for i in range(count):
+            if version == 1:
+                edits.append(struct.unpack_from(">Qq", elst.payload, 8 + i * 20))
+            else:
+                edits.append(struct.unpack_from(">Ii", elst.payload, 8 + i * 12))
+        return edits
+
+    def _chunk_sizes(self) -> list[int]:
+        sizes = []
+        sample = 0
+        for i, (first_chunk, per_chunk, _) in enumerate(self.stsc):
+            last_chunk = self.stsc[i + 1][0] if i + 1 < len(self.stsc) else len(self.offsets) + 1
+            for _ in range(first_chunk, last_chunk):
+                sizes.append(sum(self.sizes[sample:sample + per_chunk]))
+                sample += per_chunk
+        if len(sizes) != len(self.offsets) or sample != len(self.sizes):
+            raise Mp4Error("样本表不一致")
+        return sizes
+
+    @property
+    def media_duration(self) -> int:
+        return sum(count * delta for count, delta in self.stts)
+
+
+class Movie:
+    """单个 MP4 文件：ftyp、moov 和媒体数据范围"""
+
+    def __init__(self, source):
+        self.source = source
+        boxes = top_level_boxes(source)
+        self.ftyp = b""
+        moov = None
+        for box_type, offset, size in boxes:
+            if box_type == b"ftyp":
+                self.ftyp = source.read_at(offset, size)
+            elif box_type == b"moov":
+                if size > MAX_MOOV_SIZE:
+                    raise Mp4Error("moov 过大")
+                moov = parse_boxes(source.read_at(offset, size))[0]
+            elif box_type == b"moof":
+                raise Mp4Error("不支持分片 MP4")
+        if moov is None:
+            raise Mp4Error("未找到 moov")
+        if moov.find(b"mvex") is not None:
+            raise Mp4Error("不支持分片 MP4")
+
+        self.moov = moov
+        self.timescale, self.duration = _read_times(moov.find(b"mvhd").payload)
+        self.tracks = [Track(trak) for trak in moov.findall(b"trak")]
+        if not self.tracks:
+            raise Mp4Error("没有媒体轨道")
+        spans = [
+            (offset, offset + size)
+            for track in self.tracks
+            for offset, size in zip(track.offsets, track.chunk_sizes)
+        ]
+        self.data_start = min(start for start, _ in spans)
+        self.data_end = max(end for _, end in spans)
+        if self.data_end > source.size:
+            raise Mp4Error("媒体数据不完整")
+
+
+# ========== 拼接 ==========
+
+def _check_compatible(first: Movie, other: Movie, index: int) -> None:
+    if [t.handler for t in first.tracks] != [t.handler for t in other.tracks]:
+        raise Mp4Error(f"第 {index + 1} 个片段的轨道与第 1 个片段不同")
+    for a, b in zip(first.tracks, other.tracks):
+        if a.timescale != b.timescale:
+            raise Mp4Error(f"第 {index + 1} 个片段的 {a.handler.decode(errors='replace')} 轨道时间刻度不同")
+        if a.stsd != b.stsd:
+            raise Mp4Error(
+                f"第 {index + 1} 个片段的 {a.handler.decode(errors='replace')} 编码参数与第 1 个片段不同，无法无损拼接"
+            )
+
+
+def _merge_runs(pairs) -> list[tuple[int, int]]:
+    """合并相邻且值相同的 (数量, 值) 条目"""
+    merged: list[list[int]] = []
+    for count, value in pairs:
+        if merged and merged[-1][1] == value:
+            merged[-1][0] += count
+        else:
+            merged.append([count, value])
+    return [tuple(item) for item in merged]
+
+
+def _build_stbl(stbl: Box, tracks: list[Track], offsets: list[int], use_co64: bool) -> None:
+    """用合并后的样本表替换 stbl 中的样本相关 box"""
+    stts = _merge_runs(pair for track in tracks for pair in track.stts)
+    children = [child for child in stbl.children if child.type not in SAMPLE_TABLES]
+    children.append(_full_box(
+        b"stts", 0, struct.pack(f">I{len(stts) * 2}I", len(stts), *[v for pair in stts for v in pair])
+    ))
+
+    if any(track.ctts is not None for track in tracks):
+        ctts = _merge_runs(
+            pair for track in tracks
+            for pair in (track.ctts if track.ctts is not None else [(len(track.sizes), 0)])
+        )
+        version = 1 if any(value < 0 for _, value in ctts) or any(t.ctts_version for t in tracks) else 0
+        children.append(_full_box(b"ctts", version, struct.pack(
+            f">I{len(ctts) * 2}{'i' if version else 'I'}", len(ctts), *[v for pair in ctts for v in pair]
+        )))
+
+    if any(track.sync is not None for track in tracks):
+        sync = []
+        base = 0
+        for track in tracks:
+            samples = track.sync if track.sync is not None else range(1, len(track.sizes) + 1)
+            sync.extend(base + sample for sample in samples)
+            base += len(track.sizes)
+        children.append(_full_box(b"stss", 0, struct.pack(f">I{len(sync)}I", len(sync), *sync)))
+
+    stsc = []
+    chunk_base = 0
+    for track in tracks:
+        for first_chunk, per_chunk, description in track.stsc:
+            if not stsc or stsc[-1][1] != per_chunk:
+                stsc.append((chunk_base + first_chunk, per_chunk, description))
+        chunk_base += len(track.offsets)
+    children.append(_full_box(
+        b"stsc", 0, struct.pack(f">I{len(stsc) * 3}I", len(stsc), *[v for entry in stsc for v in entry])
+    ))
+
+    fixed = {track.fixed_size for track in tracks}
+    sample_count = sum(len(track.sizes) for track in tracks)
+    if len(fixed) == 1 and 0 not in fixed:
+        children.append(_full_box(b"stsz", 0, struct.pack(">II", fixed.pop(), sample_count)))
+    else:
+        sizes = [size for track in tracks for size in track.sizes]
+        children.append(_full_box(b"stsz", 0, struct.pack(f">II{len(sizes)}I", 0, len(sizes), *sizes)))
+
+    if use_co64:
+        children.append(_full_box(b"co64", 0, struct.pack(f">I{len(offsets)}Q", len(offsets), *offsets)))
+    else:
+        children.append(_full_box(b"stco", 0, struct.pack(f">I{len(offsets)}I", len(offsets), *offsets)))
+    stbl.children = children
+
+
+def _build_moov(movies: list[Movie], data_base: int, use_co64: bool) -> tuple[bytes, int]:
+    """
+    生成拼接后的 moov
+
+    Args:
+        data_base: 输出文件中 mdat 数据起点
+
+    Returns:
+        (moov 字节, 影片时长(影片时间刻度))
+    """
+    first = movies[0]
+    moov = parse_boxes(first.moov.serialize())[0]  # 深拷贝
+    movie_timescale = first.timescale
+
+    # 每个片段的数据在输出 mdat 中的起点
+    clip_bases = []
+    position = data_base
+    for movie in movies:
+        clip_bases.append(position - movie.data_start)
+        position += movie.data_end - movie.data_start
+
+    movie_duration = 0
+    for track_index, trak in enumerate(moov.findall(b"trak")):
+        tracks = [movie.tracks[track_index] for movie in movies]
+        offsets = [
+            base + offset for base, track in zip(clip_bases, tracks) for offset in track.offsets
+        ]
+
+        # 每个片段一段编辑，跳过片段自身的起始偏移（如音频预滚、B 帧延迟）
+        edits = []
+        media_base = 0
+        for movie, track in zip(movies, tracks):
+            clip_edits = track.edits or [
+                (track.media_duration * movie.timescale // track.timescale, 0)
+            ]
+            for segment, media_time in clip_edits:
+                segment = segment * movie_timescale // movie.timescale
+                edits.append((segment, media_time if media_time < 0 else media_base + media_time))
+            media_base += track.media_duration
+        track_duration = sum(segment for segment, _ in edits)
+        movie_duration = max(movie_duration, track_duration)
+
+        wide = any(segment > 0xFFFFFFFF or abs(media_time) > 0x7FFFFFFF for segment, media_time in edits)
+        entry_format = ">QqI" if wide else ">IiI"
+        elst = _full_box(b"elst", 1 if wide else 0, struct.pack(">I", len(edits)) + b"".join(
+            struct.pack(entry_format, segment, media_time, 0x00010000)  # media_rate = 1.0
+            for segment, media_time in edits
+        ))
+
+        children = []
+        for child in trak.children:
+            if child.type == b"edts":
+                continue
+            if child.type == b"tkhd":
+                child.payload = _write_duration(child.payload, track_duration, 20, 28)
+            children.append(child)
+            if child.type == b"tkhd":
+                children.append(Box(b"edts", children=[elst]))
+        trak.children = children
+
+        mdia = trak.find(b"mdia")
+        mdhd = mdia.find(b"mdhd")
+        mdhd.payload = _write_duration(mdhd.payload, sum(t.media_duration for t in tracks), 16, 24)
+        _build_stbl(mdia.find(b"minf").find(b"stbl"), tracks, offsets, use_co64)
+
+    mvhd = moov.find(b"mvhd")
+    mvhd.payload = _write_duration(mvhd.payload, movie_duration, 16, 24)
+    return moov.serialize(), movie_duration
+
+
+def concat(movies: list[Movie], out) -> dict:
+    """
+    无损拼接多个 MP4，写入 out（可写二进制文件对象）
+
+    Returns:
+        {"duration": 秒, "size": 字节数, "tracks": 轨道数, "clips": 片段数}
+
+    Raises:
+        Mp4Error: 片段之间无法无损拼接
+    """
+    if not movies:
+        raise Mp4Error("没有可拼接的片段")
+    for index, movie in enumerate(movies[1:], start=1):
+        _check_compatible(movies[0], movie, index)
+
+    ftyp = movies[0].ftyp or Box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2avc1mp41").serialize()
+    data_size = sum(movie.data_end - movie.data_start for movie in movies)
+    mdat_header = 16 if data_size + 8 > 0xFFFFFFFF else 8
+
+    # moov 大小与偏移值无关：先按 stco 生成一次得到大小，超出 32 位时改用 co64
+    use_co64 = False
+    moov, _ = _build_moov(movies, 0, use_co64)
+    data_base = len(ftyp) + len(moov) + mdat_header
+    if data_base + data_size > 0xFFFFFFFF:
+        use_co64 = True
+        moov, _ = _build_moov(movies, 0, use_co64)
+        data_base = len(ftyp) + len(moov) + mdat_header
+    moov, duration = _build_moov(movies, data_base, use_co64)
+
+    out.write(ftyp)
+    out.write(moov)
+    if mdat_header == 16:
+        out.write(struct.pack(">I4sQ", 1, b"mdat", data_size + 16))
+    else:
+        out.write(struct.pack(">I4s", data_size + 8, b"mdat"))
+    for movie in movies:
+        position = movie.data_start
+        while position < movie.data_end:
+            chunk = movie.source.read_at(position, min(COPY_CHUNK, movie.data_end - position))
+            if not chunk:
+                raise Mp4Error("媒体数据读取不完整")
+            out.write(chunk)
+            position += len(chunk)
+
+    return {
+        "duration": round(duration / movies[0].timescale, 2),
+        "size": data_base + data_size,
+        "tracks": len(movies[0].tracks),
+        "clips": len(movies),
+    }
@@ -0,0 +1,77 @@
+"""
+紧凑输出模式
+
+每次调用会输出大量带表情的文本消息（提示信息、请求参数、进度），成功结果还会把 JSON 再序列化一遍放进文本
+供工作流提取。高并发扇出时，这些消息都要经 Dify daemon 转发和处理。
+
+所有工具支持 output_mode 参数：
+- full（默认）：保持原有输出
+- compact：只输出一条最终 JSON 消息（以及文件 / blob 消息，如 Base64 图片、拼接后的视频）
+- compact_progress：在 compact 基础上保留稀疏进度（"⏳" 开头的进度文本，每 PROGRESS_INTERVAL 秒最多一条）
+
+工具没有输出 JSON（如参数校验失败只输出了 "❌" 文本）时，按最后一条错误文本生成
+{"success": false, "error_message": ...}。紧凑模式下工作流应读取工具的 json 输出。
+"""
+
+import functools
+import time
+from typing import Any, Callable, Generator
+
+MODES = ("full", "compact", "compact_progress")
+# 稀疏进度的最小间隔（秒）
+PROGRESS_INTERVAL = 60
+# 进度文本前缀
+PROGRESS_PREFIX = "⏳"
+
+
+def compact(tool, messages: Generator, with_progress: bool = False) -> Generator:
+    """把工具的消息流压缩为最终 JSON（+ blob / 稀疏进度）"""
+    last_json = None
+    last_error = ""
+    last_text = ""
+    last_progress = 0.0
+    try:
+        for message in messages:
+            body = getattr(message, "message", None)
+            payload = getattr(body, "json_object", None)
+            if isinstance(payload, dict):
+                last_json = payload
+                continue
+            if isinstance(getattr(body, "blob", None), bytes):
+                yield message
+                continue
+            text = getattr(body, "text", None)
+            if not isinstance(text, str) or not text:
+                continue
+            if text.startswith("❌"):
+                last_error = text.lstrip("❌ ").strip()
+            elif text.startswith(PROGRESS_PREFIX):
+                if with_progress and time.time() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.time()
+                    yield message
+            else:
+                last_text = text
+    finally:
+        # 调用被中止时同时关闭工具的生成器，使其清理逻辑（如取消平台任务）照常执行
+        messages.close()
+
+    if last_json is None:
+        if last_error:
+            last_json = {"success": False, "error_message": last_error}
+        else:
+            last_json = {"success": True, "message": last_text}
+    yield tool.create_json_message(last_json)
+
+
+def compactable(invoke: Callable) -> Callable:
+    """工具 _invoke 的装饰器：按 output_mode 参数决定是否压缩输出"""
+
+    @functools.wraps(invoke)
+    def wrapper(self, tool_parameters: dict[str, Any]) -> Generator:
+        mode = tool_parameters.get("output_mode") or "full"
+        messages = invoke(self, tool_parameters)
+        if mode not in MODES or mode == "full":
+            return messages
+        return compact(self, messages, with_progress=mode == "compact_progress")
+
+    return wrapper
@@ -0,0 +1,175 @@
+"""
+任务进度、排队位次与预计剩余时间
+
+平台返回的进度字段：
+- 阿里云百炼: output.task_metrics {TOTAL, SUCCEEDED, FAILED}（多任务时可折算进度），
+  部分模型返回 output.progress
+- 火山方舟: 运行中通常不返回进度，兼容 progress / queue_position 等字段
+- JXINCM: progress (0-100)
+
+平台未返回进度时，按本地登记表中同平台、同模型、同分辨率的历史耗时（中位数）估算，
+样本不足时依次放宽到同模型、同平台，再退回默认耗时。
+"""
+
+import time
+
+from utils import log, task_store
+
+# 无历史数据时的默认生成耗时（秒）
+DEFAULT_DURATIONS = {
+    "aliyun": 180,
+    "volcengine": 120,
+    "jxincm": 300,
+}
+# 使用历史耗时所需的最少样本数
+MIN_SAMPLES = 3
+# 进度输出间隔（秒）：按时间而不是轮询次数节流，启用回调后轮询间隔拉长也能按时输出
+# （首次查询与排队位次变化时立即输出）
+REPORT_INTERVAL = 30
+
+PROGRESS_KEYS = ("progress", "percent", "percentage")
+QUEUE_KEYS = ("queue_position", "queue_rank", "position", "rank")
+
+
+def _number(value) -> float | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip("%"))
+        except ValueError:
+            return None
+    return None
+
+
+def parse_progress(result: dict) -> dict:
+    """
+    从平台查询结果中提取进度信息
+
+    Returns:
+        {"progress": 0-100 或 None, "queue_position": 排队位次或 None}
+    """
+    info = {"progress": None, "queue_position": None}
+    if not isinstance(result, dict):
+        return info
+
+    sources = [result]
+    for key in ("output", "content", "detail"):
+        if isinstance(result.get(key), dict):
+            sources.append(result[key])
+
+    for source in sources:
+        for key in PROGRESS_KEYS:
+            value = _number(source.get(key))
+            if value is not None and info["progress"] is None:
+                # 兼容 0-1 的小数进度
+                if isinstance(source.get(key), float) and 0 < value < 1:
+                    value *= 100
+                info["progress"] = max(0.0, min(value, 100.0))
+        for key in QUEUE_KEYS:
+            value = _number(source.get(key))
+            if value is not None and info["queue_position"] is None:
+                info["queue_position"] = int(value)
+
+    # 阿里云百炼多任务进度: task_metrics
+    output = result.get("output")
+    metrics = output.get("task_metrics") if isinstance(output, dict) else None
+    if info["progress"] is None and isinstance(metrics, dict):
+        total = _number(metrics.get("TOTAL")) or 0
+        done = (_number(metrics.get("SUCCEEDED")) or 0) + (_number(metrics.get("FAILED")) or 0)
+        if total > 1:
+            info["progress"] = done / total * 100
+
+    return info
+
+
+def expected_duration(provider: str, model: str = "", resolution: str = "") -> float:
+    """根据历史耗时估算整体生成时间（秒）"""
+    for samples in (
+        task_store.durations(provider, model, resolution) if resolution else [],
+        task_store.durations(provider, model) if model else [],
+        task_store.durations(provider),
+    ):
+        if len(samples) >= MIN_SAMPLES:
+            samples = sorted(samples)
+            return samples[len(samples) // 2]
+    return DEFAULT_DURATIONS.get(provider, 180)
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}秒"
+    return f"{seconds // 60}分{seconds % 60:02d}秒"
+
+
+class ProgressTracker:
+    """单个任务的进度跟踪（轮询循环中使用）"""
+
+    def __init__(self, provider: str, task_id: str, model: str = "", waited: float = 0):
+        record = task_store.get(task_id) or {}
+        self.provider = provider
+        self.task_id = task_id
+        self.submitted_at = record.get("submitted_at") or time.time() - waited
+        self.expected = expected_duration(
+            provider, model or record.get("model", ""), record.get("resolution", "")
+        )
+        self.progress: float | None = None
+        self.eta_seconds: int | None = None
+        self.queue_position: int | None = None
+        self._reported_at: float | None = None
+
+    def update(self, status: str, result: dict) -> str:
+        """
+        根据一次查询结果更新进度
+
+        Returns:
+            需要输出的进度文本；本次无需输出时返回空字符串
+        """
+        info = parse_progress(result)
+        log.transition(
+            self.task_id, status, provider=self.provider,
+            progress=info["progress"], queue_position=info["queue_position"]
+        )
+        elapsed = time.time() - self.submitted_at
+        queue_changed = (
+            info["queue_position"] is not None and info["queue_position"] != self.queue_position
+        )
+        self.queue_position = info["queue_position"]
+
+        if info["progress"]:
+            # 平台报告了进度：按已用时间线性外推
+            self.progress = info["progress"]
+            self.eta_seconds = int(elapsed * (100 - self.progress) / self.progress)
+        else:
+            # 按历史耗时估算（超出预期后进度停在 99%）
+            self.progress = min(elapsed / self.expected * 100, 99.0) if self.expected else None
+            self.eta_seconds = int(max(self.expected - elapsed, 0))
+
+        now = time.time()
+        if (
+            self._reported_at is not None
+            and now - self._reported_at < REPORT_INTERVAL
+            and not queue_changed
+        ):
+            return ""
+        self._reported_at = now
+
+        parts = [f"⏳ 正在生成... {status}"]
+        if self.queue_position is not None:
+            parts.append(f"排队第 {self.queue_position} 位")
+        if self.progress is not None:
+            parts.append(f"进度约 {int(self.progress)}%")
+        if self.eta_seconds:
+            parts.append(f"预计剩余 {_format_seconds(self.eta_seconds)}")
+        return " | ".join(parts) + f" (已用时 {_format_seconds(elapsed)})"
+
+    def snapshot(self) -> dict:
+        """当前进度（写入超时结果，供调用方决定继续等待、取消或改投其他平台）"""
+        return {
+            "progress": int(self.progress) if self.progress is not None else None,
+            "eta_seconds": self.eta_seconds,
+            "queue_position": self.queue_position,
+        }
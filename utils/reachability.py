@@ -0,0 +1,108 @@
+"""
+URL 公网可达性判断
+
+火山方舟 / 阿里云百炼从公网拉取输入图片，内网地址必须先转为 Base64（或暂存到对象存储）。
+原实现按字符串前缀（'10.'、'172.16.' ...）匹配主机名，解析到内网 IP 的域名会被误判为公网，
+导致提交失败后才走 Base64 重试。
+
+这里先把主机名解析为 IP（带 TTL 的 DNS 缓存），再用 ipaddress 判断：
+私有网段、回环、链路本地、CGNAT (100.64.0.0/10)、IPv6 ULA (fc00::/7)、保留 / 组播 / 未指定地址
+均视为不可公网访问。所有解析结果都是公网地址时才认为可访问；解析失败按不可访问处理。
+判断结果按 主机:端口 缓存。
+"""
+
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+# DNS 解析结果缓存时间（秒）
+DNS_TTL = 300
+# 解析失败的缓存时间（秒）
+NEGATIVE_TTL = 60
+# 平台可直接访问的端口（Dify 带签名的非标准端口 URL 平台可能无法访问）
+PUBLIC_PORTS = (80, 443)
+
+CGNAT_NETWORK = ipaddress.ip_network("100.64.0.0/10")
+
+_dns_cache: dict[str, tuple[float, tuple[str, ...]]] = {}
+_verdict_cache: dict[str, tuple[float, bool]] = {}
+_lock = threading.Lock()
+
+
+def _resolve(host: str) -> tuple[str, ...]:
+    """解析主机名为 IP 列表（不使用缓存）"""
+    infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    return tuple(sorted({info[4][0] for info in infos}))
+
+
+def resolve(host: str) -> tuple[str, ...]:
+    """带 TTL 缓存的 DNS 解析，失败返回空元组"""
+    now = time.time()
+    with _lock:
+        cached = _dns_cache.get(host)
+    if cached and cached[0] > now:
+        return cached[1]
+    try:
+        addresses = _resolve(host)
+        ttl = DNS_TTL
+    except (OSError, UnicodeError):
+        addresses = ()
+        ttl = NEGATIVE_TTL
+    with _lock:
+        _dns_cache[host] = (now + ttl, addresses)
+    return addresses
+
+
+def is_public_ip(address: str) -> bool:
+    """判断 IP 地址是否为公网地址"""
+    try:
+        ip = ipaddress.ip_address(address.split("%")[0])  # 去掉 IPv6 zone id
+    except ValueError:
+        return False
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if (
+        ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+        or ip.is_multicast or ip.is_unspecified
+    ):
+        return False
+    if isinstance(ip, ipaddress.IPv4Address) and ip in CGNAT_NETWORK:
+        return False
+    return True
+
+
+def is_public_url(url: str) -> bool:
+    """判断 URL 是否可被平台从公网访问"""
+    try:
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower()
+        port = parsed.port
+    except ValueError:
+        return False
+    if parsed.scheme not in ("http", "https") or not host:
+        return False
+    if port and port not in PUBLIC_PORTS:
+        return False
+
+    key = f"{host}:{port or ''}"
+    now = time.time()
+    with _lock:
+        cached = _verdict_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    if host == "localhost" or host.endswith(".localhost"):
+        verdict = False
+    else:
+        try:
+            # IP 字面量无需解析
+            addresses = (str(ipaddress.ip_address(host)),)
+        except ValueError:
+            addresses = resolve(host)
+        verdict = bool(addresses) and all(is_public_ip(address) for address in addresses)
+
+    with _lock:
+        _verdict_cache[key] = (now + DNS_TTL, verdict)
+    return verdict
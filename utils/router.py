@@ -0,0 +1,210 @@
+"""
+平台 / 模型自动路由 (provider=auto)
+
+候选模型来自 CATALOG，先按能力过滤（视频时长、分辨率、是否需要图片、是否配置了 API Key、
+熔断器状态），再按目标排序：
+- latency: 预计耗时最短（本地登记表中同模型 / 分辨率 / 时长的历史 p50）
+- cost: 预计费用最低（单价 × 视频时长）
+
+费用只是估算：内置的 PRICES 为整理时的公开参考价，平台调价、折扣、套餐都不会反映在这里。
+凭证 route_prices 可以覆盖单价（见 prices()），费用优先路由和 max_cost 约束以覆盖后的单价为准。
+
+可选约束：
+- max_latency: 历史 p95 耗时上限（秒）
+- max_cost: 单个视频费用上限（元）
+
+历史样本不足时，耗时按平台默认值估算（p95 取 p50 的 2 倍）。
+"""
+
+import math
+import re
+
+from utils import breaker, task_store
+from utils.progress import DEFAULT_DURATIONS, MIN_SAMPLES
+
+# 候选模型及能力
+CATALOG = {
+    "text_to_video": [
+        {"provider": "aliyun", "model": "wan2.6-t2v", "durations": (5, 10, 15), "image": False},
+        {"provider": "aliyun", "model": "wan2.5-t2v-preview", "durations": (5,), "image": False},
+        {"provider": "volcengine", "model": "doubao-seedance-1-5-pro-251215", "durations": tuple(range(4, 13)), "image": True},
+        {"provider": "volcengine", "model": "doubao-seedance-1-0-lite-t2v-250428", "durations": tuple(range(4, 13)), "image": False},
+        {"provider": "jxincm", "model": "sora-2", "durations": (15,), "image": True},
+        {"provider": "jxincm", "model": "sora-2-pro", "durations": (15,), "image": True},
+    ],
+    "image_to_video": [
+        {"provider": "aliyun", "model": "wan2.6-i2v", "durations": (5, 10, 15), "image": True},
+        {"provider": "aliyun", "model": "wan2.5-i2v-preview", "durations": (5,), "image": True},
+        {"provider": "volcengine", "model": "doubao-seedance-1-5-pro-251215", "durations": tuple(range(4, 13)), "image": True},
+        {"provider": "volcengine", "model": "doubao-seaweed-241128", "durations": (5, 10), "image": True},
+        {"provider": "jxincm", "model": "sora-2", "durations": (15,), "image": True},
+        {"provider": "jxincm", "model": "sora-2-pro", "durations": (15,), "image": True},
+    ],
+}
+
+# 参考单价（元 / 秒视频），近似值，仅用于路由估算，以平台账单为准
+# JXINCM 为第三方按次计费，这里折算为每秒单价；实际单价请通过凭证 route_prices 覆盖
+PRICES = {
+    "wan2.6-t2v": {"720p": 0.6, "1080p": 1.0},
+    "wan2.6-i2v": {"720p": 0.6, "1080p": 1.0},
+    "wan2.5-t2v-preview": {"480p": 0.3, "720p": 0.6, "1080p": 1.0},
+    "wan2.5-i2v-preview": {"480p": 0.3, "720p": 0.6, "1080p": 1.0},
+    "doubao-seedance-1-5-pro-251215": {"480p": 0.2, "720p": 0.45, "1080p": 1.0},
+    "doubao-seedance-1-0-lite-t2v-250428": {"480p": 0.1, "720p": 0.2, "1080p": 0.5},
+    "doubao-seaweed-241128": {"720p": 0.3},
+    "sora-2": {"720p": 0.1},
+    "sora-2-pro": {"720p": 0.3},
+}
+
+RESOLUTIONS = ("480p", "720p", "1080p")
+OBJECTIVES = ("latency", "cost")
+
+SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def prices(credentials: dict) -> dict[str, dict[str, float]]:
+    """
+    单价表：内置参考价 + 凭证 route_prices 覆盖
+
+    route_prices 为逗号或换行分隔的 模型=单价 或 模型@分辨率=单价（元 / 秒视频），
+    例如 "wan2.6-t2v@720p=0.5, sora-2=0.08"；不带分辨率时覆盖该模型的所有分辨率。
+    格式不正确的条目忽略。
+    """
+    table = {model: dict(by_resolution) for model, by_resolution in PRICES.items()}
+    for item in SEPARATORS.split(str(credentials.get("route_prices") or "")):
+        name, _, value = item.partition("=")
+        price = _to_float(value)
+        if not name or price is None:
+            continue
+        model, _, resolution = name.partition("@")
+        if resolution:
+            if resolution in RESOLUTIONS:
+                table.setdefault(model, {})[resolution] = price
+        else:
+            table[model] = {candidate: price for candidate in RESOLUTIONS}
+    return table
+
+
+def _price(table: dict, model: str, resolution: str) -> float | None:
+    """查找单价，无该分辨率价格时取更高一档（平台会自动升档）"""
+    table = table.get(model)
+    if not table:
+        return None
+    start = RESOLUTIONS.index(resolution) if resolution in RESOLUTIONS else 0
+    for candidate in RESOLUTIONS[start:]:
+        if candidate in table:
+            return table[candidate]
+    return max(table.values())
+
+
+def latency_stats(provider: str, model: str, resolution: str = "", duration: str = "") -> tuple[float, float, int]:
+    """
+    历史耗时统计
+
+    Returns:
+        (p50, p95, 样本数)，样本不足时依次放宽到同模型+分辨率、同模型
+    """
+    for samples in (
+        task_store.durations(provider, model, resolution, duration) if resolution and duration else [],
+        task_store.durations(provider, model, resolution) if resolution else [],
+        task_store.durations(provider, model),
+    ):
+        if len(samples) >= MIN_SAMPLES:
+            samples = sorted(samples)
+            p50 = samples[len(samples) // 2]
+            p95 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.95) - 1)]
+            return p50, p95, len(samples)
+    default = DEFAULT_DURATIONS.get(provider, 180)
+    return default, default * 2, 0
+
+
+def _to_float(value) -> float | None:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def choose(tool: str, params: dict, credentials: dict) -> tuple[dict | None, list[str]]:
+    """
+    选择平台和模型
+
+    Args:
+        tool: text_to_video / image_to_video
+        params: 工具参数（duration、resolution、route_objective、max_cost、max_latency 等）
+        credentials: 插件凭证（用于排除未配置 API Key 的平台、读取 route_prices）
+
+    Returns:
+        (路由结果, 排除原因列表)，无可用候选时路由结果为 None
+    """
+    try:
+        duration = int(params.get("duration") or 5)
+    except (TypeError, ValueError):
+        duration = 5
+    resolution = params.get("resolution") or "720p"
+    needs_image = bool(params.get("_image_url"))
+    objective = params.get("route_objective") or "latency"
+    if objective not in OBJECTIVES:
+        objective = "latency"
+    max_cost = _to_float(params.get("max_cost"))
+    max_latency = _to_float(params.get("max_latency"))
+    price_table = prices(credentials)
+
+    candidates = []
+    rejected = []
+    for entry in CATALOG.get(tool, []):
+        provider, model = entry["provider"], entry["model"]
+        label = f"{provider}/{model}"
+        if not credentials.get(f"{provider}_api_key"):
+            rejected.append(f"{label}: 未配置 API Key")
+            continue
+        if needs_image and not entry["image"]:
+            rejected.append(f"{label}: 不支持图片输入")
+            continue
+        if duration not in entry["durations"]:
+            rejected.append(f"{label}: 不支持 {duration} 秒时长")
+            continue
+        circuit = breaker.get(provider)
+        if not circuit.available():
+            rejected.append(f"{label}: 平台已熔断（连续失败或试探中）")
+            continue
+
+        p50, p95, samples = latency_stats(provider, model, resolution, str(duration))
+        price = _price(price_table, model, resolution)
+        cost = round(price * duration, 2) if price is not None else None
+        if max_latency and p95 > max_latency:
+            rejected.append(f"{label}: 预计 p95 耗时 {int(p95)} 秒超过上限")
+            continue
+        if max_cost and (cost is None or cost > max_cost):
+            rejected.append(f"{label}: 预计费用超过上限")
+            continue
+
+        candidates.append({
+            "provider": provider,
+            "model": model,
+            "p50": round(p50),
+            "p95": round(p95),
+            "samples": samples,
+            "cost": cost,
+            "breaker": circuit.state,
+        })
+
+    if not candidates:
+        return None, rejected
+
+    def score(candidate: dict) -> tuple:
+        # 半开状态的平台排在最后（仅作为试探）
+        probing = candidate["breaker"] != breaker.CLOSED
+        cost = candidate["cost"] if candidate["cost"] is not None else float("inf")
+        if objective == "cost":
+            return probing, cost, candidate["p50"]
+        return probing, candidate["p50"], cost
+
+    # 按评分依次占用提交名额：半开平台只有一个调用者能拿到试探名额，拿不到时换下一个候选
+    for best in sorted(candidates, key=score):
+        if breaker.get(best["provider"]).allow():
+            best["objective"] = objective
+            return best, rejected
+        rejected.append(f"{best['provider']}/{best['model']}: 平台试探中")
+    return None, rejected
@@ -0,0 +1,179 @@
+"""
+配音时长预测
+
+火山方舟 Seedance 1.5 Pro 生成音频时，视频时长（--dur）必须覆盖整段配音，否则配音被截断，
+只能重新生成（费用翻倍）。原规则固定按 8 字/秒 + 1 秒估算，数字、英文单词和标点停顿都按"字"计。
+
+这里按文本成分分别估算朗读时间：
+- 中日韩文字：每字 CJK_SECONDS
+- 英文等拉丁文字：按元音组估算音节数，每音节 SYLLABLE_SECONDS
+- 数字：每位 DIGIT_SECONDS（中文读作"二零二五 / 两千零二十五"，每位约 1~2 个音节），小数点、百分号另计
+- 标点：句末停顿 SENTENCE_PAUSE，句中停顿 CLAUSE_PAUSE
+
+并按模型学习校正系数：智能时长模式（--dur -1）下由模型按配音决定视频时长，
+把 (实际时长 - TAIL_MARGIN) / 预测朗读时间 的比值记录到本地（每个模型保留最近 MAX_SAMPLES 个），
+校正系数取比值的 CORRECTION_QUANTILE 分位数（宁长勿短），样本少时向 1.0 收缩。
+指定时长的任务实际时长就是请求值，不反映配音长度，不参与学习；
+落在时长上下限的样本可能被截断，同样忽略。
+
+存储位置: 环境变量 AI_VIDEO_SPEECH_STORE 指定的文件，默认为系统临时目录下的
+ai_video_generation/speech.json。多个插件进程共用该文件，记录样本时与任务登记表一样
+加文件锁（task_store.locked_file）。
+"""
+
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+
+from utils import task_store
+
+# 每个中日韩文字的朗读时间（秒）
+CJK_SECONDS = 0.15
+# 每个拉丁文字音节的朗读时间（秒）
+SYLLABLE_SECONDS = 0.17
+# 每位数字的朗读时间（秒）
+DIGIT_SECONDS = 0.25
+# 句末 / 句中标点停顿（秒）
+SENTENCE_PAUSE = 0.35
+CLAUSE_PAUSE = 0.15
+# 配音结束后的余量（秒）
+TAIL_MARGIN = 1.0
+
+# Seedance 1.5 Pro 支持的时长范围（秒）
+MIN_DURATION = 4
+MAX_DURATION = 12
+
+# 每个模型保留的校正样本数
+MAX_SAMPLES = 50
+# 校正系数取比值的分位数（高于中位数，避免截断）
+CORRECTION_QUANTILE = 0.75
+# 先验权重：样本数少于该值时校正系数明显向 1.0 收缩
+PRIOR_WEIGHT = 5
+# 校正系数范围
+MIN_FACTOR = 0.5
+MAX_FACTOR = 2.0
+
+CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]")
+WORD_PATTERN = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)*")
+VOWEL_PATTERN = re.compile(r"[aeiouy]+")
+DIGIT_PATTERN = re.compile(r"\d")
+# 数字中的小数点 / 千分位，读作"点"或不读，不算停顿
+NUMBER_SEPARATOR = re.compile(r"(?<=\d)[.,](?=\d)")
+SENTENCE_PUNCTUATION = re.compile(r"[。！？!?；;…]|\.(?!\d)")
+CLAUSE_PUNCTUATION = re.compile(r"[，、,：:—～~]")
+# 提示词中的参数后缀（--rs 720p --dur 5 ...）
+PARAMETER_SUFFIX = re.compile(r"\s--[a-z]+\s.*$", re.S)
+
+_lock = threading.Lock()
+
+
+def _store_path() -> str:
+    path = os.environ.get("AI_VIDEO_SPEECH_STORE", "").strip()
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), "ai_video_generation", "speech.json")
+
+
+def _load() -> dict:
+    try:
+        with open(_store_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(samples: dict) -> None:
+    path = _store_path()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(samples, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # 校正样本仅用于优化估算，写入失败不影响任务本身
+
+
+def _syllables(word: str) -> int:
+    word = word.lower()
+    count = len(VOWEL_PATTERN.findall(word))
+    if count > 1 and word.endswith("e") and not word.endswith(("le", "ee")):
+        count -= 1  # 词尾不发音的 e
+    return max(1, count)
+
+
+def estimate(text: str) -> float:
+    """估算文本的朗读时间（秒），不含余量和校正"""
+    text = PARAMETER_SUFFIX.sub("", text or "")
+    separators = len(NUMBER_SEPARATOR.findall(text))
+    text = NUMBER_SEPARATOR.sub("", text)
+
+    seconds = len(CJK_PATTERN.findall(text)) * CJK_SECONDS
+    seconds += sum(_syllables(word) for word in WORD_PATTERN.findall(text)) * SYLLABLE_SECONDS
+    seconds += len(DIGIT_PATTERN.findall(text)) * DIGIT_SECONDS
+    seconds += separators * CJK_SECONDS  # "点"
+    seconds += text.count("%") * 3 * CJK_SECONDS  # "百分之"
+    seconds += len(SENTENCE_PUNCTUATION.findall(text.rstrip("。！？!?.…；; "))) * SENTENCE_PAUSE
+    seconds += len(CLAUSE_PUNCTUATION.findall(text)) * CLAUSE_PAUSE
+    return round(seconds, 2)
+
+
+def _factor(ratios: list[float]) -> float:
+    if not ratios:
+        return 1.0
+    ratios = sorted(ratios)
+    position = CORRECTION_QUANTILE * (len(ratios) - 1)
+    lower = ratios[math.floor(position)]
+    upper = ratios[math.ceil(position)]
+    quantile = lower + (upper - lower) * (position - math.floor(position))
+    factor = (quantile * len(ratios) + PRIOR_WEIGHT) / (len(ratios) + PRIOR_WEIGHT)
+    return round(max(MIN_FACTOR, min(MAX_FACTOR, factor)), 3)
+
+
+def predict_duration(text: str, model: str) -> tuple[int, dict]:
+    """
+    预测覆盖整段配音所需的视频时长
+
+    Returns:
+        (视频时长(整数秒，限制在 MIN_DURATION ~ MAX_DURATION), 明细
+        {"speech_seconds": 朗读时间, "factor": 校正系数, "samples": 样本数})
+    """
+    speech_seconds = estimate(text)
+    ratios = _load().get(model or "", [])
+    factor = _factor(ratios)
+    duration = math.ceil(speech_seconds * factor + TAIL_MARGIN)
+    return max(MIN_DURATION, min(MAX_DURATION, duration)), {
+        "speech_seconds": speech_seconds,
+        "factor": factor,
+        "samples": len(ratios),
+    }
+
+
+def observe(model: str, speech_seconds: float, actual_seconds: float) -> bool:
+    """
+    记录一次模型自主决定时长的实际结果
+
+    Returns:
+        是否作为校正样本记录（时长落在上下限或估算为 0 时不记录）
+    """
+    try:
+        speech_seconds = float(speech_seconds)
+        actual_seconds = float(actual_seconds)
+    except (TypeError, ValueError):
+        return False
+    if speech_seconds <= 0 or not MIN_DURATION < actual_seconds < MAX_DURATION:
+        return False
+    ratio = round((actual_seconds - TAIL_MARGIN) / speech_seconds, 4)
+    if ratio <= 0:
+        return False
+    with task_store.locked_file(_store_path(), _lock):
+        samples = _load()
+        ratios = samples.get(model or "", [])
+        ratios.append(ratio)
+        samples[model or ""] = ratios[-MAX_SAMPLES:]
+        _save(samples)
+    return True
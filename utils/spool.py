@@ -0,0 +1,242 @@
+"""
+大图片的内存 / 临时文件缓冲
+
+原先把图片内联进请求体时，原始字节、Base64 字符串、data URL 字符串、json 序列化结果
+同时留在内存里，Seedream 14 张参考图时每次调用的峰值约为图片总大小的 4 倍以上。这里：
+- SpooledBuffer：下载的图片先写入内存，超过 SPOOL_THRESHOLD 后转存临时文件，读取时 mmap，
+  不再整块复制到堆内存
+- Base64Value：请求体中的 Base64 / data URL 字段值，只记录来源缓冲区，len() 可直接得到编码长度
+- stream_json：边序列化边产出请求体，Base64Value 按 ENCODE_CHUNK 从图片缓冲区分块编码，
+  小片段合并到 WRITE_CHUNK 再产出，以 chunked 传输发送，请求体从不完整出现在内存中
+- encode_json：把同样的输出写入请求体缓冲区（同样按阈值转存临时文件），带 Content-Length
+  以文件方式发送，用于不接受 chunked 传输的服务端
+
+http_client 检测到 json= 中含有 Base64Value 时自动改用 stream_json，工具侧用法不变。
+临时文件为匿名文件，缓冲区关闭（或被回收）时即删除。
+"""
+
+import base64
+import io
+import json
+import mmap
+import tempfile
+from typing import Any, Iterator
+
+# 超过该大小（字节）的内容转存临时文件
+SPOOL_THRESHOLD = 2 * 1024 * 1024
+# 每次 Base64 编码的原始字节数（3 的倍数，保证分块编码结果可直接拼接）
+ENCODE_CHUNK = 3 * 64 * 1024
+# 下载时的读取块大小
+READ_CHUNK = 64 * 1024
+# 流式请求体的最小发送块（字节），避免每个 JSON 片段单独成为一个 chunk
+WRITE_CHUNK = 64 * 1024
+
+
+class SpooledBuffer(io.RawIOBase):
+    """
+    内存 / 临时文件缓冲区
+
+    先 write() 写入内容，再 read() / view() / iter_base64() 读取；
+    读取后不应再写入。作为文件对象可直接用作 requests 的 data=（带 Content-Length 发送）。
+    """
+
+    def __init__(self, content_type: str = "", threshold: int | None = None):
+        super().__init__()
+        self.content_type = content_type
+        self.threshold = SPOOL_THRESHOLD if threshold is None else threshold
+        self._memory = bytearray()
+        self._file = None
+        self._map: mmap.mmap | None = None
+        self._size = 0
+        self._position = 0
+
+    @property
+    def spooled(self) -> bool:
+        """是否已转存临时文件"""
+        return self._file is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._map is not None:
+            raise ValueError("缓冲区已开始读取，不能继续写入")
+        length = len(data)
+        if self._file is None and self._size + length > self.threshold:
+            self._file = tempfile.TemporaryFile(prefix="ai_video_spool_")
+            self._file.write(self._memory)
+            self._memory = bytearray()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._memory += data
+        self._size += length
+        return length
+
+    def view(self) -> memoryview:
+        """只读视图（临时文件通过 mmap 映射，不占用堆内存）"""
+        if self._file is None:
+            return memoryview(self._memory)
+        if self._map is None:
+            self._file.flush()
+            if not self._size:
+                return memoryview(b"")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def head(self, size: int) -> bytes:
+        """开头的若干字节（用于识别图片格式）"""
+        with self.view() as view:
+            return bytes(view[:size])
+
+    def getvalue(self) -> bytes:
+        """完整内容（需要 bytes 的场景，如暂存上传）"""
+        with self.view() as view:
+            return bytes(view)
+
+    def iter_base64(self, chunk_size: int = ENCODE_CHUNK) -> Iterator[bytes]:
+        """分块产出 Base64 编码（ASCII 字节）"""
+        chunk_size -= chunk_size % 3
+        with self.view() as view:
+            for start in range(0, self._size, chunk_size):
+                yield base64.b64encode(view[start:start + chunk_size])
+
+    def base64_length(self) -> int:
+        return (self._size + 2) // 3 * 4
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def readinto(self, target) -> int:
+        with self.view() as view:
+            chunk = view[self._position:self._position + len(target)]
+            length = len(chunk)
+            target[:length] = chunk
+        self._position += length
+        return length
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # 仍有未释放的视图（如未读完的 iter_base64），随视图回收
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._memory = bytearray()
+        super().close()
+
+
+def from_chunks(chunks, content_type: str = "") -> SpooledBuffer:
+    """把分块内容写入新缓冲区（出错时关闭缓冲区）"""
+    buffer = SpooledBuffer(content_type)
+    try:
+        for chunk in chunks:
+            if chunk:
+                buffer.write(chunk)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer
+
+
+def from_response(response: Any) -> SpooledBuffer:
+    """把 HTTP 响应体分块写入缓冲区（以 stream=True 请求时边下载边写入）"""
+    return from_chunks(response.iter_content(READ_CHUNK), response.headers.get("Content-Type", ""))
+
+
+class Base64Value:
+    """
+    请求体中的 Base64 字段值
+
+    prefix 为 "data:image/png;base64," 时表示 data URL，为空时表示纯 Base64。
+    """
+
+    def __init__(self, buffer: SpooledBuffer, prefix: str = ""):
+        self.buffer = buffer
+        self.prefix = prefix
+
+    def __len__(self) -> int:
+        return len(self.prefix) + self.buffer.base64_length()
+
+    def __repr__(self) -> str:
+        return f"<Base64Value {self.prefix or 'base64:'}... {len(self)} chars>"
+
+    def chunks(self) -> Iterator[bytes]:
+        if self.prefix:
+            yield self.prefix.encode("ascii")
+        yield from self.buffer.iter_base64()
+
+
+def contains_values(payload: Any) -> bool:
+    """请求体中是否含有 Base64Value"""
+    if isinstance(payload, Base64Value):
+        return True
+    if isinstance(payload, dict):
+        return any(contains_values(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return any(contains_values(value) for value in payload)
+    return False
+
+
+def iter_json(payload: Any) -> Iterator[bytes]:
+    """逐段产出 JSON 编码（与 json.dumps 默认输出一致），Base64Value 分块写出"""
+    if isinstance(payload, Base64Value):
+        yield b'"'
+        yield from payload.chunks()
+        yield b'"'
+    elif isinstance(payload, dict):
+        yield b"{"
+        for index, (key, value) in enumerate(payload.items()):
+            yield (", " if index else "").encode("ascii") + json.dumps(str(key)).encode("ascii") + b": "
+            yield from iter_json(value)
+        yield b"}"
+    elif isinstance(payload, (list, tuple)):
+        yield b"["
+        for index, value in enumerate(payload):
+            if index:
+                yield b", "
+            yield from iter_json(value)
+        yield b"]"
+    else:
+        yield json.dumps(payload).encode("ascii")
+
+
+def stream_json(payload: Any) -> Iterator[bytes]:
+    """按块产出 JSON 请求体（用作 chunked 传输的请求体）"""
+    pending = bytearray()
+    for piece in iter_json(payload):
+        if not pending and len(piece) >= WRITE_CHUNK:
+            yield piece  # 大块（Base64 编码块）直接发送，不再复制
+            continue
+        pending += piece
+        if len(pending) >= WRITE_CHUNK:
+            yield bytes(pending)
+            pending.clear()
+    if pending:
+        yield bytes(pending)
+
+
+def encode_json(payload: Any) -> SpooledBuffer:
+    """把请求体编码为 JSON 写入缓冲区（超过阈值时在临时文件中），读取位置在开头"""
+    body = from_chunks(stream_json(payload), "application/json")
+    body.seek(0)
+    return body
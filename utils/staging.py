@@ -0,0 +1,405 @@
+"""
+输入图片暂存（对象存储）
+
+Dify 内网图片原先统一转 Base64 内联到提交请求中，火山方舟 / 阿里云百炼的提交请求体动辄数 MB，
+阿里云百炼还有 61440 字符的长度限制。配置了暂存对象存储后：
+- 图片只上传一次到 S3 兼容存储（AWS S3、阿里云 OSS、MinIO 等），返回短期有效的签名 URL
+- 对象键由内容 SHA-256 决定，同一张图片重复使用时不再上传（进程内缓存签名 URL，
+  跨进程时先 HEAD 检查对象是否已存在）
+- 提交请求只携带 URL
+
+后端可替换：
+- S3Backend: S3 兼容存储，AWS Signature V4 签名（纯标准库实现）
+- LocalBackend: 本地 MinIO 风格替身，对象写入本地目录，签名 URL 用 HMAC 校验，
+  仅用于测试（平台无法访问其 URL，不能通过凭证配置）
+
+stage_file() 用于大文件（拼接后的视频）：分块计算哈希、从文件流式上传，内容不整块读入内存。
+
+凭证中的 staging_endpoint 只接受 http(s) 地址；staging_region 为 SigV4 签名区域，
+留空时从阿里云 OSS / AWS S3 的 endpoint 推断，其余（MinIO 等）默认 us-east-1。
+【视频拼接】工具也用同一存储返回拼接后的 MP4。
+"""
+
+import datetime
+import hashlib
+import hmac
+import os
+import re
+import shutil
+import threading
+import time
+from urllib.parse import parse_qs, quote, urlparse
+
+# 签名 URL 有效期（秒）
+URL_TTL = 3600
+# 签名 URL 剩余有效期不足该值时重新签名（秒）
+REFRESH_MARGIN = 300
+# 对象键前缀
+KEY_PREFIX = "ai_video_generation/inputs"
+# 上传 / 检查超时（秒）
+REQUEST_TIMEOUT = 30
+# 文件哈希 / 复制的读取块大小
+FILE_CHUNK = 1024 * 1024
+
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "image/bmp": "bmp",
+    "video/mp4": "mp4",
+}
+
+
+class StagingError(Exception):
+    """暂存上传或签名 URL 校验失败"""
+
+
+def _sniff_content_type(content: bytes, content_type: str = "") -> str:
+    """按声明的 Content-Type 或文件头判断图片（或拼接后视频）类型"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type == "image/jpg":
+        content_type = "image/jpeg"
+    if content_type in EXTENSIONS:
+        return content_type
+    if content[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if content[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    if content[:2] == b"BM":
+        return "image/bmp"
+    if content[4:8] == b"ftyp":
+        return "video/mp4"
+    return "image/jpeg"
+
+
+def _object_key(digest: str, content_type: str) -> str:
+    return f"{KEY_PREFIX}/{digest[:2]}/{digest}.{EXTENSIONS[content_type]}"
+
+
+def object_key(content: bytes, content_type: str = "") -> str:
+    """按内容哈希生成对象键"""
+    return _object_key(hashlib.sha256(content).hexdigest(), _sniff_content_type(content, content_type))
+
+
+def _file_digest(file) -> str:
+    """分块计算文件对象的 SHA-256（从开头读取，读完后回到开头）"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(FILE_CHUNK), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _hmac_sha256(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _uri_encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+class S3Backend:
+    """S3 兼容对象存储（AWS Signature V4）"""
+
+    SERVICE = "s3"
+    ALGORITHM = "AWS4-HMAC-SHA256"
+    UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+    # SigV4 预签名 URL 最长有效期（秒）
+    MAX_EXPIRES = 7 * 24 * 3600
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "",
+        path_style: bool | None = None,
+    ):
+        if "://" not in endpoint:
+            endpoint = f"https://{endpoint}"
+        parsed = urlparse(endpoint)
+        self.scheme = parsed.scheme
+        self.endpoint_host = parsed.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region or self._guess_region(parsed.hostname or "")
+        # 带端口的自建服务（MinIO 等）默认使用路径风格，云厂商默认使用虚拟主机风格
+        self.path_style = parsed.port is not None if path_style is None else path_style
+
+    @staticmethod
+    def _guess_region(host: str) -> str:
+        """未配置区域时从 endpoint 推断：oss-cn-beijing.aliyuncs.com / s3.ap-east-1.amazonaws.com"""
+        match = re.match(r"^(oss-[a-z0-9-]+)\.aliyuncs\.com$", host)
+        if match:
+            return match.group(1)
+        match = re.match(r"^s3[.-]([a-z0-9-]+)\.amazonaws\.com$", host)
+        if match:
+            return match.group(1)
+        return "us-east-1"
+
+    def _location(self, key: str) -> tuple[str, str]:
+        """返回 (host, 规范化路径)"""
+        encoded_key = _uri_encode(key, safe="-_.~/")
+        if self.path_style:
+            return self.endpoint_host, f"/{self.bucket}/{encoded_key}"
+        return f"{self.bucket}.{self.endpoint_host}", f"/{encoded_key}"
+
+    def _signing_key(self, date: str) -> bytes:
+        key = _hmac_sha256(f"AWS4{self.secret_key}".encode("utf-8"), date)
+        key = _hmac_sha256(key, self.region)
+        key = _hmac_sha256(key, self.SERVICE)
+        return _hmac_sha256(key, "aws4_request")
+
+    def _signature(
+        self, method: str, path: str, query: dict[str, str], headers: dict[str, str],
+        payload_hash: str, amz_date: str,
+    ) -> str:
+        canonical_query = "&".join(
+            f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items())
+        )
+        names = sorted(headers)
+        canonical_headers = "".join(f"{name}:{headers[name].strip()}\n" for name in names)
+        canonical_request = "\n".join([
+            method, path, canonical_query, canonical_headers, ";".join(names), payload_hash
+        ])
+        date = amz_date[:8]
+        scope = f"{date}/{self.region}/{self.SERVICE}/aws4_request"
+        string_to_sign = "\n".join([
+            self.ALGORITHM, amz_date, scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ])
+        return hmac.new(
+            self._signing_key(date), string_to_sign.encode("utf-8"), hashlib.sha256
+        ).hexdigest()
+
+    @staticmethod
+    def _amz_date(now: float | None = None) -> str:
+        moment = datetime.datetime.fromtimestamp(
+            time.time() if now is None else now, tz=datetime.timezone.utc
+        )
+        return moment.strftime("%Y%m%dT%H%M%SZ")
+
+    def _signed_headers(self, method: str, key: str, payload_hash: str) -> tuple[str, dict[str, str]]:
+        """请求头签名，返回 (URL, 请求头)"""
+        host, path = self._location(key)
+        amz_date = self._amz_date()
+        headers = {"host": host, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date}
+        signature = self._signature(method, path, {}, headers, payload_hash, amz_date)
+        scope = f"{amz_date[:8]}/{self.region}/{self.SERVICE}/aws4_request"
+        signed_headers = ";".join(sorted(headers))
+        headers["Authorization"] = (
+            f"{self.ALGORITHM} Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        del headers["host"]
+        return f"{self.scheme}://{host}{path}", headers
+
+    def exists(self, key: str) -> bool:
+        from utils import http_client
+
+        url, headers = self._signed_headers("HEAD", key, self.UNSIGNED_PAYLOAD)
+        response = http_client.request("HEAD", url, headers=headers, timeout=REQUEST_TIMEOUT)
+        return response.status_code == 200
+
+    def put(self, key: str, content, content_type: str, payload_hash: str = "") -> None:
+        """上传对象；content 为 bytes 或文件对象（流式上传，此时需传入 payload_hash）"""
+        from utils import http_client
+
+        url, headers = self._signed_headers(
+            "PUT", key, payload_hash or hashlib.sha256(content).hexdigest()
+        )
+        headers["Content-Type"] = content_type
+        response = http_client.request(
+            "PUT", url, headers=headers, data=content, timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code not in (200, 201):
+            raise StagingError(f"上传失败 HTTP {response.status_code}: {response.text[:200]}")
+
+    def presign(self, key: str, expires: int, now: float | None = None) -> str:
+        """生成 GET 预签名 URL"""
+        expires = max(1, min(int(expires), self.MAX_EXPIRES))
+        host, path = self._location(key)
+        amz_date = self._amz_date(now)
+        scope = f"{amz_date[:8]}/{self.region}/{self.SERVICE}/aws4_request"
+        query = {
+            "X-Amz-Algorithm": self.ALGORITHM,
+            "X-Amz-Credential": f"{self.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        signature = self._signature(
+            "GET", path, query, {"host": host}, self.UNSIGNED_PAYLOAD, amz_date
+        )
+        query_string = "&".join(
+            f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items())
+        )
+        return f"{self.scheme}://{host}{path}?{query_string}&X-Amz-Signature={signature}"
+
+
+class LocalBackend:
+    """本地 MinIO 风格替身：对象写入本地目录，签名 URL 用 HMAC 校验"""
+
+    def __init__(self, root: str, base_url: str = "http://127.0.0.1:9000",
+                 bucket: str = "local", secret: str = "local-staging"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.bucket = bucket
+        self.secret = secret.encode("utf-8")
+        self.uploads = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, self.bucket, *key.split("/"))
+
+    def _sign(self, key: str, expires_at: int) -> str:
+        return hmac.new(self.secret, f"{key}\n{expires_at}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, content, content_type: str, payload_hash: str = "") -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            if isinstance(content, (bytes, bytearray)):
+                f.write(content)
+            else:
+                shutil.copyfileobj(content, f, FILE_CHUNK)
+        os.replace(tmp_path, path)
+        self.uploads += 1
+
+    def presign(self, key: str, expires: int, now: float | None = None) -> str:
+        expires_at = int((time.time() if now is None else now) + expires)
+        return (
+            f"{self.base_url}/{self.bucket}/{quote(key)}"
+            f"?X-Expires={expires_at}&X-Signature={self._sign(key, expires_at)}"
+        )
+
+    def open(self, url: str, now: float | None = None) -> bytes:
+        """按签名 URL 读取对象（模拟存储服务端的校验）"""
+        parsed = urlparse(url)
+        prefix = f"/{self.bucket}/"
+        if not parsed.path.startswith(prefix):
+            raise StagingError("存储桶不匹配")
+        key = parsed.path[len(prefix):]
+        query = parse_qs(parsed.query)
+        try:
+            expires_at = int(query["X-Expires"][0])
+            signature = query["X-Signature"][0]
+        except (KeyError, ValueError):
+            raise StagingError("缺少签名参数")
+        if not hmac.compare_digest(signature, self._sign(key, expires_at)):
+            raise StagingError("签名无效")
+        if (time.time() if now is None else now) > expires_at:
+            raise StagingError("签名已过期")
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise StagingError("对象不存在")
+
+
+class Stager:
+    """按内容哈希去重的图片暂存"""
+
+    def __init__(self, backend, url_ttl: int = URL_TTL):
+        self.backend = backend
+        self.url_ttl = url_ttl
+        self._urls: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, content: bytes, content_type: str = "") -> str:
+        """
+        暂存图片并返回签名 URL
+
+        Raises:
+            StagingError: 上传失败
+        """
+        content_type = _sniff_content_type(content, content_type)
+        key = object_key(content, content_type)
+        return self._stage(key, lambda: self.backend.put(key, content, content_type))
+
+    def stage_file(self, file, content_type: str = "") -> str:
+        """
+        暂存文件对象（二进制、可 seek）并返回签名 URL，分块计算哈希并流式上传
+
+        Raises:
+            StagingError: 上传失败
+        """
+        digest = _file_digest(file)
+        content_type = _sniff_content_type(file.read(16), content_type)
+        file.seek(0)
+        key = _object_key(digest, content_type)
+        return self._stage(key, lambda: self.backend.put(key, file, content_type, payload_hash=digest))
+
+    def _stage(self, key: str, upload) -> str:
+        """对象不存在时调用 upload() 上传，返回（缓存的）签名 URL"""
+        now = time.time()
+        with self._lock:
+            cached = self._urls.get(key)
+        if cached and cached[0] - REFRESH_MARGIN > now:
+            return cached[1]
+
+        if not cached and not self.backend.exists(key):
+            upload()
+        url = self.backend.presign(key, self.url_ttl)
+        with self._lock:
+            self._urls[key] = (now + self.url_ttl, url)
+        return url
+
+
+_stagers: dict[tuple, Stager] = {}
+_stagers_lock = threading.Lock()
+
+
+def _config(credentials: dict) -> tuple[str, str, str, str, str]:
+    """(endpoint, bucket, access_key, secret_key, region)"""
+    return tuple(
+        (credentials.get(f"staging_{name}") or "").strip()
+        for name in ("endpoint", "bucket", "access_key", "secret_key", "region")
+    )
+
+
+def validate(credentials: dict) -> str:
+    """
+    检查暂存存储凭证
+
+    Returns:
+        错误信息，未配置或配置有效时返回空字符串
+    """
+    endpoint, bucket, access_key, secret_key, _ = _config(credentials)
+    if not endpoint and not bucket:
+        return ""
+    if not endpoint or not bucket:
+        return "图片暂存存储需要同时配置 Endpoint 和存储桶"
+    scheme = urlparse(endpoint).scheme if "://" in endpoint else "https"
+    if scheme not in ("http", "https"):
+        return f"图片暂存存储 Endpoint 必须是 http(s) 地址（平台需要能访问签名 URL）: {endpoint}"
+    if not access_key or not secret_key:
+        return "图片暂存存储需要配置 AccessKey ID 和 AccessKey Secret"
+    return ""
+
+
+def from_credentials(credentials: dict) -> Stager | None:
+    """
+    按插件凭证获取暂存器（同一配置复用，以便共享去重缓存）
+
+    未配置或配置无效（见 validate）时返回 None
+    """
+    config = _config(credentials)
+    if not config[0] or validate(credentials):
+        return None
+    with _stagers_lock:
+        stager = _stagers.get(config)
+        if stager is None:
+            endpoint, bucket, access_key, secret_key, region = config
+            backend = S3Backend(endpoint, bucket, access_key, secret_key, region=region)
+            stager = _stagers[config] = Stager(backend)
+        return stager
@@ -0,0 +1,177 @@
+"""
+任务查询 / 取消通用接口
+
+三大平台的任务状态字段各不相同，这里统一转换为小写状态：
+- pending: 排队中
+- running: 生成中
+- succeeded: 已完成
+- failed: 失败
+- canceled: 已取消
+- unknown: 未知（网络错误、无法识别的状态等）
+
+取消接口：
+- 阿里云百炼: POST /tasks/{task_id}/cancel（仅 PENDING 状态可取消）
+- 火山方舟: DELETE /contents/generations/tasks/{task_id}（仅 queued 状态可取消）
+- JXINCM: 未提供取消接口
+
+取消成功后同步在本地任务登记表中标记为 canceled（不再续等）。
+"""
+
+from utils import http_client, task_store
+
+# 各平台原始状态 -> 统一状态
+STATUS_MAP = {
+    "aliyun": {
+        "PENDING": "pending",
+        "RUNNING": "running",
+        "SUCCEEDED": "succeeded",
+        "FAILED": "failed",
+        "CANCELED": "canceled",
+        "UNKNOWN": "unknown",
+    },
+    "volcengine": {
+        "queued": "pending",
+        "running": "running",
+        "succeeded": "succeeded",
+        "done": "succeeded",
+        "failed": "failed",
+        "canceled": "canceled",
+        "cancelled": "canceled",
+    },
+    "jxincm": {
+        "queued": "pending",
+        "processing": "running",
+        "completed": "succeeded",
+        "failed": "failed",
+    },
+}
+
+# 终态：到达后不再轮询
+FINAL_STATUSES = ("succeeded", "failed", "canceled")
+
+
+def _headers(api_key: str) -> dict:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+def normalize_status(provider: str, raw_status: str) -> str:
+    """将平台原始状态转换为统一状态"""
+    if not isinstance(raw_status, str):
+        return "unknown"
+    mapping = STATUS_MAP.get(provider, {})
+    if provider == "aliyun":
+        return mapping.get(raw_status.upper(), "unknown")
+    return mapping.get(raw_status.lower(), "unknown")
+
+
+def fetch_status(
+    provider: str, api_base: str, api_key: str, task_id: str,
+    timeout: int = 30
+) -> tuple[str, dict]:
+    """
+    查询任务状态
+
+    Returns:
+        (统一状态, 平台原始返回)，请求失败时返回 ("unknown", {})
+    """
+    try:
+        if provider == "aliyun":
+            response = http_client.get(
+                f"{api_base}/tasks/{task_id}",
+                headers=_headers(api_key),
+                timeout=timeout
+            )
+            result = response.json()
+            raw_status = result.get("output", {}).get("task_status", "UNKNOWN")
+        elif provider == "volcengine":
+            response = http_client.get(
+                f"{api_base}/contents/generations/tasks/{task_id}",
+                headers=_headers(api_key),
+                timeout=timeout
+            )
+            result = response.json()
+            raw_status = result.get("status", "unknown")
+        elif provider == "jxincm":
+            response = http_client.get(
+                f"{api_base}/video/query?id={task_id}",
+                headers=_headers(api_key),
+                timeout=timeout
+            )
+            result = response.json()
+            raw_status = result.get("status", "unknown")
+        else:
+            return "unknown", {}
+    except Exception:
+        return "unknown", {}
+
+    if response.status_code != 200:
+        return "unknown", result
+    return normalize_status(provider, raw_status), result
+
+
+def cancel_task(
+    provider: str, api_base: str, api_key: str, task_id: str,
+    timeout: int = 30
+) -> tuple[bool, str]:
+    """
+    取消任务（平台支持时），成功后在本地登记表中标记为已取消
+
+    Returns:
+        (是否成功, 错误信息)
+    """
+    try:
+        if provider == "aliyun":
+            response = http_client.post(
+                f"{api_base}/tasks/{task_id}/cancel",
+                headers=_headers(api_key),
+                timeout=timeout
+            )
+        elif provider == "volcengine":
+            response = http_client.delete(
+                f"{api_base}/contents/generations/tasks/{task_id}",
+                headers=_headers(api_key),
+                timeout=timeout
+            )
+        else:
+            return False, f"平台 {provider} 不支持取消任务"
+    except Exception as e:
+        return False, str(e)
+
+    if response.status_code not in (200, 204):
+        return False, f"{response.status_code} - {response.text}"
+    task_store.record(task_id, provider=provider, status="canceled")
+    return True, ""
+
+
+def get_json_object(message) -> dict | None:
+    """从 ToolInvokeMessage 中取出 JSON 消息体，非 JSON 消息返回 None"""
+    json_object = getattr(getattr(message, "message", None), "json_object", None)
+    return json_object if isinstance(json_object, dict) else None
+
+
+def get_text(message) -> str:
+    """从 ToolInvokeMessage 中取出文本消息内容，非文本消息返回空字符串"""
+    text = getattr(getattr(message, "message", None), "text", None)
+    return text if isinstance(text, str) else ""
+
+
+def extract_video(provider: str, result: dict) -> tuple[str, str]:
+    """
+    从平台原始返回（fetch_status 的结果）中取出视频地址和错误信息
+
+    Returns:
+        (视频URL, 错误信息)
+    """
+    if provider == "aliyun":
+        output = result.get("output") or {}
+        return output.get("video_url", ""), output.get("message", "")
+    if provider == "volcengine":
+        error = result.get("error") or {}
+        message = error.get("message", "") if isinstance(error, dict) else str(error)
+        return (result.get("content") or {}).get("video_url", ""), message
+    if provider == "jxincm":
+        return (result.get("detail") or {}).get("url", ""), str(result.get("error") or "")
+    return "", ""
@@ -0,0 +1,233 @@
+"""
+本地任务登记表
+
+Dify 插件单次调用有 10 分钟硬性超时，Seedance / Sora 等长任务经常需要跨多次调用才能等到结果。
+提交成功的任务登记到本地 JSON 文件，记录平台、模型、状态与累计等待时间，
+后续调用可以凭任务ID（或相同请求的指纹）找回任务继续等待，不必重新提交。
+
+存储位置: 环境变量 AI_VIDEO_TASK_STORE 指定的文件，默认为系统临时目录下的
+ai_video_generation/tasks.json。写入采用临时文件 + os.replace，避免中途崩溃写坏文件。
+
+Dify 可能同时运行多个插件进程共用这个文件：
+- 读-改-写在同目录锁文件（tasks.json.lock）上加 fcntl.flock 排他锁，多进程的更新不会互相覆盖
+  （无 fcntl 的平台只有进程内锁）
+- 读取按文件标识（inode、修改时间、大小）缓存解析结果，文件未变化时只需一次 stat，
+  Key 选择、接入点查询、进度估算等高频调用不再每次重新解析整个文件
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from utils import log
+
+# 最多保留的任务数（超出后淘汰最久未更新的记录）
+MAX_RECORDS = 1000
+# 记录保留时长（秒）- 平台侧视频链接通常 24 小时内有效，保留 7 天足够续等与统计
+RECORD_TTL = 7 * 24 * 3600
+# 终态（与 task_api.FINAL_STATUSES 一致）
+FINAL_STATUSES = ("succeeded", "failed", "canceled")
+# 本地状态：不再等待、但平台无法取消（仍在生成、仍占用并发额度）的任务。
+# 不是终态（Key 选择仍计入进行中），但不会被按请求指纹找回续等
+ABANDONED = "abandoned"
+
+_lock = threading.Lock()
+# 读取缓存：文件标识 (路径, inode, mtime_ns, 大小) 与解析结果
+_cache_lock = threading.Lock()
+_cache: dict[str, Any] = {"key": None, "records": {}}
+
+
+def _store_path() -> str:
+    path = os.environ.get("AI_VIDEO_TASK_STORE", "").strip()
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), "ai_video_generation", "tasks.json")
+
+
+def _file_key(path: str) -> tuple | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@contextlib.contextmanager
+def locked_file(path: str, thread_lock: threading.Lock):
+    """
+    JSON 文件读-改-写互斥：进程内锁 + 同目录锁文件（<path>.lock）上的 flock（跨进程）
+
+    多个插件进程共用的本地文件（任务登记表、配音校正样本等）都通过它更新。
+    """
+    with thread_lock:
+        lock_file = None
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                lock_file = open(f"{path}.lock", "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError:
+                if lock_file is not None:
+                    lock_file.close()
+                lock_file = None  # 无法加锁时退化为进程内锁
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+
+def _locked():
+    return locked_file(_store_path(), _lock)
+
+
+def _load() -> dict:
+    """读取全部记录（文件未变化时返回缓存，调用方不得修改返回值）"""
+    path = _store_path()
+    key = _file_key(path)
+    if key is None:
+        return {}
+    with _cache_lock:
+        if _cache["key"] == key:
+            return _cache["records"]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    records = data if isinstance(data, dict) else {}
+    with _cache_lock:
+        _cache.update(key=key, records=records)
+    return records
+
+
+def _load_for_update() -> dict:
+    """读取可修改的记录副本（在 _locked() 内调用）"""
+    return {task_id: dict(entry) for task_id, entry in _load().items()}
+
+
+def _save(records: dict) -> None:
+    now = time.time()
+    records = {
+        task_id: record for task_id, record in records.items()
+        if now - record.get("updated_at", 0) < RECORD_TTL
+    }
+    if len(records) > MAX_RECORDS:
+        newest = sorted(records.items(), key=lambda item: item[1].get("updated_at", 0))
+        records = dict(newest[-MAX_RECORDS:])
+
+    path = _store_path()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        return  # 登记表仅用于续等，写入失败不影响任务本身
+    key = _file_key(path)
+    with _cache_lock:
+        _cache.update(key=key, records=records)
+
+
+def fingerprint(*parts: Any) -> str:
+    """计算请求指纹（工具、平台、模型、提示词等），用于找回相同请求的未完成任务"""
+    text = "\x1f".join(str(part or "") for part in parts)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def record(task_id: str, **fields) -> dict:
+    """登记（或更新）任务信息，返回最新记录"""
+    with _locked():
+        records = _load_for_update()
+        now = time.time()
+        entry = records.get(task_id) or {
+            "task_id": task_id,
+            "status": "pending",
+            "waited_seconds": 0,
+            "submitted_at": now,
+        }
+        previous_status = entry.get("status") if task_id in records else None
+        entry.update(fields)
+        entry["updated_at"] = now
+        # 首次进入终态时记录完成时间，用于统计各平台 / 模型的生成耗时
+        if entry.get("status") in FINAL_STATUSES and "finished_at" not in entry:
+            entry["finished_at"] = now
+        records[task_id] = entry
+        _save(records)
+    if entry.get("status") != previous_status:
+        log.transition(task_id, entry["status"], provider=entry.get("provider"), model=entry.get("model"))
+    return dict(entry)
+
+
+def get(task_id: str) -> dict | None:
+    """查询任务记录，不存在返回 None"""
+    entry = _load().get(task_id)
+    return dict(entry) if entry else None
+
+
+def add_wait(task_id: str, seconds: float) -> float:
+    """累加任务的等待时间，返回累计等待秒数"""
+    with _locked():
+        records = _load_for_update()
+        entry = records.get(task_id)
+        if entry is None:
+            return 0
+        entry["waited_seconds"] = entry.get("waited_seconds", 0) + max(seconds, 0)
+        entry["updated_at"] = time.time()
+        _save(records)
+        return entry["waited_seconds"]
+
+
+def find_unfinished(request_fingerprint: str) -> dict | None:
+    """按请求指纹查找最近提交且尚未结束的任务（不含已放弃的任务）"""
+    candidates = [
+        entry for entry in _load().values()
+        if entry.get("fingerprint") == request_fingerprint
+        and entry.get("status") not in FINAL_STATUSES + (ABANDONED,)
+    ]
+    if not candidates:
+        return None
+    return dict(max(candidates, key=lambda entry: entry.get("submitted_at", 0)))
+
+
+def unfinished(provider: str, updated_after: float = 0) -> list[dict]:
+    """平台尚未结束的任务（updated_after 之后有更新的）"""
+    return [
+        dict(entry) for entry in _load().values()
+        if entry.get("provider") == provider
+        and entry.get("status") not in FINAL_STATUSES
+        and entry.get("updated_at", 0) > updated_after
+    ]
+
+
+def durations(
+    provider: str, model: str = "", resolution: str = "", duration: str = ""
+) -> list[float]:
+    """
+    历史生成耗时（提交到成功的秒数）
+
+    model / resolution / duration（视频时长）为空时不按该字段过滤。
+    """
+    entries = list(_load().values())
+    return [
+        entry["finished_at"] - entry["submitted_at"]
+        for entry in entries
+        if entry.get("status") == "succeeded"
+        and entry.get("provider") == provider
+        and (not model or entry.get("model") == model)
+        and (not resolution or entry.get("resolution") == resolution)
+        and (not duration or str(entry.get("duration", "")) == str(duration))
+        and "finished_at" in entry and "submitted_at" in entry
+    ]
@@ -0,0 +1,162 @@
+"""
+视频任务续等 / 取消的公共实现
+
+文生视频与图生视频（以及继承它们的批量、流水线工具）共用：跨调用续等已提交的任务、
+累计等待时间、任务结果计入平台熔断器、按任务取回接入点、取消不再等待的任务。
+
+TaskWaitMixin 与 dify_plugin.Tool 一起继承使用，依赖工具类提供：
+- ALIYUN_API_BASE / VOLCENGINE_API_BASE / JXINCM_API_BASE 默认接入点
+- MAX_TOTAL_WAIT / MAX_POLL_ATTEMPTS / POLL_INTERVAL 等待参数
+- _poll_aliyun / _poll_volcengine / _poll_jxincm(api_key, task_id, model, max_attempts, waited)
+"""
+
+import time
+from typing import Any, Generator
+
+from utils import breaker, endpoints, keypool, task_api, task_store
+
+PROVIDERS = ("aliyun", "volcengine", "jxincm")
+# 取消请求超时（秒）
+CANCEL_TIMEOUT = 10
+
+
+class TaskWaitMixin:
+    """视频工具的任务续等、熔断统计与取消"""
+
+    def _resume_task(self, task_id: str, params: dict) -> Generator[Any, None, None]:
+        """
+        继续等待已提交的任务
+
+        平台和模型优先取本地登记表中的记录，未登记时使用本次调用的参数。
+        """
+        record = task_store.get(task_id) or {}
+        provider = record.get("provider") or params.get("provider", "aliyun")
+        model = record.get("model") or params.get("model", "")
+
+        if provider not in PROVIDERS:
+            yield self.create_text_message(f"❌ 错误：不支持的平台 {provider}")
+            return
+
+        api_key = keypool.for_task(self.runtime.credentials, provider, task_id)
+        if not api_key:
+            yield self.create_text_message(f"❌ 错误：请配置 {provider} API Key")
+            return
+
+        if not record:
+            task_store.record(task_id, provider=provider, model=model)
+
+        waited = int(record.get("waited_seconds", 0))
+        yield self.create_text_message(
+            f"🔄 **继续等待已提交的任务**\n"
+            f"🏢 平台: {provider}\n"
+            f"🔖 任务ID: `{task_id}`\n"
+            f"⏱️ 已累计等待: {waited}秒"
+        )
+        yield from self._wait_task(provider, api_key, task_id, model)
+
+    def _wait_task(
+        self, provider: str, api_key: str, task_id: str, model: str
+    ) -> Generator[Any, None, None]:
+        """
+        等待任务完成 - 跨调用累计等待时间
+
+        单次调用最多等待 MAX_POLL_ATTEMPTS 个间隔，累计等待超过 MAX_TOTAL_WAIT 后不再续等。
+        轮询结果中的任务状态同步写回本地登记表。
+        """
+        record = task_store.get(task_id) or {}
+        waited = record.get("waited_seconds", 0)
+        remaining = self.MAX_TOTAL_WAIT - waited
+
+        if remaining <= 0:
+            yield self.create_text_message(
+                f"⏰ 任务累计等待已超过 {self.MAX_TOTAL_WAIT // 60} 分钟，不再继续等待\n"
+                f"🔖 任务ID: `{task_id}`\n\n"
+                f"💡 请使用【查询任务状态】工具确认任务是否仍在进行"
+            )
+            yield self.create_json_message({
+                "success": False,
+                "provider": provider,
+                "model": model,
+                "task_id": task_id,
+                "status": "unknown",
+                "error_message": "累计等待时间已用尽"
+            })
+            return
+
+        max_attempts = min(self.MAX_POLL_ATTEMPTS, int(remaining // self.POLL_INTERVAL) + 1)
+        if provider == "aliyun":
+            messages = self._poll_aliyun(api_key, task_id, model, max_attempts, waited)
+        elif provider == "volcengine":
+            messages = self._poll_volcengine(api_key, task_id, model, max_attempts, waited)
+        else:
+            messages = self._poll_jxincm(api_key, task_id, model, max_attempts, waited)
+
+        start_time = time.time()
+        finished = False
+        try:
+            for message in messages:
+                payload = task_api.get_json_object(message)
+                if payload and payload.get("task_id") == task_id:
+                    finished = True
+                    status = task_api.normalize_status(provider, payload.get("status"))
+                    task_store.record(task_id, status=status)
+                    # 任务结果计入平台熔断器（自动路由据此避开故障平台）
+                    if status == "succeeded":
+                        breaker.get(provider).record_success()
+                    elif status == "failed":
+                        breaker.get(provider).record_failure()
+                yield message
+        except GeneratorExit:
+            # 调用被中止（如工作流被停止）：取消任务，释放平台配额与并发名额
+            if not finished:
+                self._cancel_abandoned(provider, api_key, task_id)
+            raise
+        finally:
+            # 调用被中止时同样累计已等待的时间
+            task_store.add_wait(task_id, time.time() - start_time)
+
+    def _track_submission(
+        self, provider: str, messages: Generator[Any, None, None]
+    ) -> Generator[Any, None, None]:
+        """透传消息，提交失败（没有任务ID的失败结果）计入平台熔断器"""
+        for message in messages:
+            payload = task_api.get_json_object(message)
+            if payload and payload.get("success") is False and not payload.get("task_id"):
+                breaker.get(provider).record_failure()
+            yield message
+
+    def _api_base(self, provider: str, task_id: str = "") -> str:
+        """平台接入点：新任务选延迟最低的，已有任务取回创建时的（见 utils/endpoints.py）"""
+        default = {
+            "aliyun": self.ALIYUN_API_BASE,
+            "volcengine": self.VOLCENGINE_API_BASE,
+            "jxincm": self.JXINCM_API_BASE,
+        }[provider]
+        if task_id:
+            return endpoints.for_task(self.runtime.credentials, provider, task_id, default)
+        return endpoints.select(self.runtime.credentials, provider, default)
+
+    def _cancel_abandoned(self, provider: str, api_key: str, task_id: str) -> None:
+        """
+        取消不再等待的任务
+
+        平台不支持取消（JXINCM）或取消失败时标记为已放弃：不再续等，平台侧仍在生成。
+        """
+        if provider == "jxincm":
+            cancelled = False  # JXINCM 未提供取消接口
+        else:
+            cancelled, _ = task_api.cancel_task(
+                provider, self._api_base(provider, task_id), api_key, task_id, timeout=CANCEL_TIMEOUT
+            )
+        if not cancelled:
+            task_store.record(task_id, status=task_store.ABANDONED)
+
+    def _cancel_late_submission(self, provider: str, future) -> None:
+        """放弃等待的提交完成后取消其创建的任务（在工作线程中执行）"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        task_id, _ = future.result()
+        if task_id:
+            self._cancel_abandoned(
+                provider, keypool.for_task(self.runtime.credentials, provider, task_id), task_id
+            )